@@ -57,7 +57,11 @@ final class GhostAssistantModel: ObservableObject {
         backendBridge.backendScript = "no_backend"
     }
     private var retreatTask: Task<Void, Never>?
-    private var actionHistory: [String] = []
+    /// Actions executed in the current task, as sent to the backend: {"action", "position", "value"} or {"error"}
+    private var actionHistory: [[String: Any]] = []
+    /// The backend keeps the history per session; each turn only sends the actions after `sentActionCount`
+    private var sessionID = UUID().uuidString
+    private var sentActionCount = 0
     private var pendingNewlines = 0
 
     func togglePeekAndListenMode() {
@@ -109,6 +113,8 @@ final class GhostAssistantModel: ObservableObject {
             guard let self else { return }
             
             self.actionHistory = []
+            self.sessionID = UUID().uuidString
+            self.sentActionCount = 0
             var turn = 0
             let maxTurns = 10
             var isFinished = false
@@ -118,15 +124,12 @@ final class GhostAssistantModel: ObservableObject {
                 turn += 1
                 
                 do {
-                    // Capture fresh screenshot and get next step (off main thread)
-                    var turnPrompt = trimmed
-                    if !self.actionHistory.isEmpty {
-                        turnPrompt += "\n\nACTION HISTORY:\n" + self.actionHistory.joined(separator: "\n")
-                    }
-                    
-                    let response = try await Task.detached {
-                        try self.backendBridge.runPythonTemplate(input: turnPrompt)
-                    }.value
+                    // Capture fresh screenshot and get next step (off main thread).
+                    // The thought streams into its own bubble while the orchestrator is still generating
+                    // Positions are normalized to the captured frame; the FRAME_TRANSFORM line says where it is
+                    let turnResponse = try await self.runAgentTurn(intent: trimmed)
+                    let (frame, response) = BackendFrameTransform.extract(from: turnResponse)
+                    let thoughtStreamed = self.finishThoughtBubble()
                     
                     print("[Loop Turn \(turn)] Response: \(response)")
                     
@@ -137,10 +140,11 @@ final class GhostAssistantModel: ObservableObject {
                     }
                     
                     // Parse and execute actions natively
-                    let result = self.parseAndExecuteGUIAction(from: response)
+                    let result = self.parseAndExecuteGUIAction(from: response, showThought: !thoughtStreamed, frame: frame)
                     
                     // Track consecutive ENTER-only turns to avoid infinite loops
-                    let isEnterOnly = result.count == 1 && response.contains("'action': 'ENTER'")
+                    let isEnterOnly = result.count == 1
+                        && (response.contains("\"action\": \"ENTER\"") || response.contains("'action': 'ENTER'"))
                     if isEnterOnly {
                         consecutiveEnterCount += 1
                     } else {
@@ -167,12 +171,16 @@ final class GhostAssistantModel: ObservableObject {
                         isFinished = true
                         self.assistantState = .complete
                         self.scheduleRetreat()
+                    } else if let settle = await self.backendBridge.awaitScreenSettle() {
+                        // The backend watched the screen react to the actions and come to rest
+                        print("[Loop] Screen \(settle.reason ?? "settled") after \(Int(settle.ms ?? 0)) ms")
                     } else {
                         // Settle time for UI before next screenshot turn
                         try? await Task.sleep(nanoseconds: 1_000_000_000) // 1s
                     }
                     
                 } catch {
+                    _ = self.finishThoughtBubble()
                     print("[Loop] turn \(turn) failed: \(error)")
                     isFinished = true
                     self.assistantState = .idle
@@ -183,8 +191,85 @@ final class GhostAssistantModel: ObservableObject {
         }
     }
 
+    /// Runs one agent turn and returns the full response. Only the actions executed since the
+    /// previous turn are sent; if the backend no longer has the session's history, all of it is.
+    private func runAgentTurn(intent: String) async throws -> String {
+        var (payload, sent) = turnPayload(intent: intent)
+        var response = try await streamAgentTurn(arguments: ["--turn", payload])
+        if response.hasPrefix("Error: session_miss") {
+            print("[Loop] Backend lost session \(sessionID), re-sending the whole history.")
+            sentActionCount = 0
+            (payload, sent) = turnPayload(intent: intent)
+            response = try await streamAgentTurn(arguments: ["--turn", payload])
+        }
+        sentActionCount = sent
+        return response
+    }
+
+    /// The structured turn for the backend (see session_history.py) and how many actions it covers.
+    private func turnPayload(intent: String) -> (String, Int) {
+        let count = actionHistory.count
+        let payload: [String: Any] = [
+            "session": sessionID,
+            "intent": intent,
+            "base": sentActionCount,
+            "actions": Array(actionHistory[min(sentActionCount, count)..<count]),
+        ]
+        let data = (try? JSONSerialization.data(withJSONObject: payload)) ?? Data("{}".utf8)
+        return (String(decoding: data, as: UTF8.self), count)
+    }
+
+    /// Runs the backend through the streaming bridge and returns the full response.
+    /// The THOUGHT line is shown in a streaming bubble as its tokens arrive.
+    private func streamAgentTurn(arguments: [String]) async throws -> String {
+        let buffer = StreamBuffer()
+        try await withCheckedThrowingContinuation { (continuation: CheckedContinuation<Void, Error>) in
+            do {
+                try backendBridge.runPythonTemplateStreaming(
+                    arguments: arguments,
+                    onChunk: { [weak self] chunk in
+                        let response = buffer.append(chunk)
+                        DispatchQueue.main.async {
+                            self?.showStreamingThought(in: response)
+                        }
+                    },
+                    onComplete: { result in
+                        continuation.resume(with: result)
+                    }
+                )
+            } catch {
+                continuation.resume(throwing: error)
+            }
+        }
+        return buffer.text.trimmingCharacters(in: .whitespacesAndNewlines)
+    }
+
+    private func showStreamingThought(in response: String) {
+        guard let thoughtRange = response.range(of: "THOUGHT: ") else { return }
+        let thought = response[thoughtRange.upperBound...]
+            .prefix { $0 != "\n" }
+            .trimmingCharacters(in: .whitespaces)
+        guard !thought.isEmpty else { return }
+
+        let item = AssistantOutputItem(content: .streamingText("Thought: \(thought)"))
+        if case .streamingText = outputItems.last?.content {
+            outputItems[outputItems.count - 1] = item
+        } else {
+            outputItems.append(item)
+        }
+    }
+
+    /// Finalises the streamed thought bubble, if any. Returns whether there was one.
+    private func finishThoughtBubble() -> Bool {
+        guard case .streamingText(let text) = outputItems.last?.content else { return false }
+        outputItems[outputItems.count - 1] = AssistantOutputItem(content: .text(text))
+        return true
+    }
+
     /// Parses all JSON action blocks from the string and executes them in sequence natively
-    private func parseAndExecuteGUIAction(from response: String) -> (count: Int, isCompleted: Bool) {
+    private func parseAndExecuteGUIAction(
+        from response: String, showThought: Bool = true, frame: BackendFrameTransform? = nil
+    ) -> (count: Int, isCompleted: Bool) {
         print("Attempting to parse GUI actions from response: \(response)")
         
         let pattern = "\\{[^\\}]*['\"]action['\"]\\s*:\\s*.*?\\}"
@@ -202,7 +287,7 @@ final class GhostAssistantModel: ObservableObject {
            let newlineRange = response.range(of: "\n", range: thoughtRange.upperBound..<response.endIndex) {
             let thought = String(response[thoughtRange.upperBound..<newlineRange.lowerBound]).trimmingCharacters(in: .whitespacesAndNewlines)
             print("[Ghosty Thought] \(thought)")
-            if !thought.isEmpty {
+            if !thought.isEmpty && showThought {
                 self.appendOutput(from: "Thought: \(thought)")
             }
         }
@@ -212,13 +297,15 @@ final class GhostAssistantModel: ObservableObject {
             var jsonString = String(response[range])
             print("Found JSON candidate: \(jsonString)")
             
+            // The backend sends strict JSON; older backends sent Python dict text
+            var parsedJSON = try? JSONSerialization.jsonObject(with: Data(jsonString.utf8), options: []) as? [String: Any]
+            
             // Sanitize common Pythonisms that break standard parsers
             jsonString = jsonString.replacingOccurrences(of: "None", with: "null")
             jsonString = jsonString.replacingOccurrences(of: "True", with: "true")
             jsonString = jsonString.replacingOccurrences(of: "False", with: "false")
             
-            var parsedJSON: [String: Any]? = nil
-            if let data = jsonString.data(using: .utf8) {
+            if parsedJSON == nil, let data = jsonString.data(using: .utf8) {
                 if #available(macOS 12.0, *) {
                     parsedJSON = try? JSONSerialization.jsonObject(with: data, options: [.json5Allowed]) as? [String: Any]
                 }
@@ -259,15 +346,21 @@ final class GhostAssistantModel: ObservableObject {
                     position = nil
                 }
                 
-                if let error = self.executeNativeAction(actionType: actionType, position: position, value: value) {
-                    self.actionHistory.append("- Turn: \(error)")
+                if let error = self.executeNativeAction(actionType: actionType, position: position, value: value, frame: frame) {
+                    self.actionHistory.append(["error": error])
                     print("DEBUG: \(error)")
                     continue // Skip this action but continue to next (e.g. INPUT after refused CLICK)
                 }
                 
                 // Add to history
-                let actionDesc = "\(actionType) at \(String(describing: position))" + (value != nil ? " with value '\(value!)'" : "")
-                self.actionHistory.append("- Turn: \(actionDesc)")
+                var record: [String: Any] = ["action": actionType]
+                if let position {
+                    record["position"] = [Double(position.x), Double(position.y)]
+                }
+                if let value {
+                    record["value"] = value
+                }
+                self.actionHistory.append(record)
 
                 // Allow the OS UI to process the physical action before the next sequence
                 try? await Task.sleep(nanoseconds: 500_000_000) // 0.5s pause
@@ -281,12 +374,18 @@ final class GhostAssistantModel: ObservableObject {
         return (parsedActions.count, isTaskCompleted)
     }
 
-    private func executeNativeAction(actionType: String, position: CGPoint?, value: String?) -> String? {
+    private func executeNativeAction(
+        actionType: String, position: CGPoint?, value: String?, frame: BackendFrameTransform? = nil
+    ) -> String? {
         print("Executing Native Action: \(actionType) at \(String(describing: position)) with value: \(String(describing: value))")
         
-        // Safety Guard: Check if coordinates fall in the Ghosty Zone (Top Center)
+        // Safety Guard: Check if coordinates fall on Ghosty's own windows, or in the Ghosty Zone (Top Center)
+        // when the backend didn't say where its frame is
         let isInGhostyZone: Bool = {
             guard let pos = position else { return false }
+            if let point = frame?.screenPoint(for: pos) {
+                return ghostyWindowFrames().contains { $0.contains(point) }
+            }
             return pos.x >= 0.3 && pos.x <= 0.7 && pos.y >= 0.0 && pos.y <= 0.4
         }()
         
@@ -308,16 +407,20 @@ final class GhostAssistantModel: ObservableObject {
             return nil // Not an error - we successfully typed
         }
 
-        // ShowUI returns normalized coordinates [0.0 - 1.0] for the main screen. 
+        // ShowUI returns normalized coordinates [0.0 - 1.0] of the captured frame: the display or window
+        // the backend's transform places on the screen, or else the main screen.
         // We need to convert these to absolute screen coordinates.
-        guard let screen = NSScreen.main else { return "No screen found" }
-        let screenRect = screen.frame
-        
         var targetPoint: CGPoint? = nil
         if let pos = position {
-            let x = screenRect.origin.x + (pos.x * screenRect.width)
-            let y = screenRect.origin.y + (pos.y * screenRect.height)
-            targetPoint = CGPoint(x: x, y: y)
+            if let point = frame?.screenPoint(for: pos) {
+                targetPoint = point
+            } else {
+                guard let screen = NSScreen.main else { return "No screen found" }
+                let screenRect = screen.frame
+                let x = screenRect.origin.x + (pos.x * screenRect.width)
+                let y = screenRect.origin.y + (pos.y * screenRect.height)
+                targetPoint = CGPoint(x: x, y: y)
+            }
         }
 
         switch normalizedAction {
@@ -347,6 +450,19 @@ final class GhostAssistantModel: ObservableObject {
         return nil
     }
 
+    /// Ghosty's visible windows in global display points with a top-left origin, like CGEvent positions.
+    private func ghostyWindowFrames() -> [CGRect] {
+        guard let primary = NSScreen.screens.first else { return [] }
+        return NSApp.windows.filter { $0.isVisible }.map { window in
+            CGRect(
+                x: window.frame.minX,
+                y: primary.frame.maxY - window.frame.maxY,
+                width: window.frame.width,
+                height: window.frame.height
+            )
+        }
+    }
+
     private func performClick(at point: CGPoint) {
         let eventDown = CGEvent(mouseEventSource: nil, mouseType: .leftMouseDown, mouseCursorPosition: point, mouseButton: .left)
         let eventUp = CGEvent(mouseEventSource: nil, mouseType: .leftMouseUp, mouseCursorPosition: point, mouseButton: .left)
@@ -582,3 +698,23 @@ final class GhostAssistantModel: ObservableObject {
         }
     }
 }
+
+/// Collects streamed stdout chunks; appended to from the pipe's background queue.
+private final class StreamBuffer: @unchecked Sendable {
+    private var value = ""
+    private let lock = NSLock()
+
+    /// Appends `chunk` and returns everything received so far.
+    func append(_ chunk: String) -> String {
+        lock.lock()
+        defer { lock.unlock() }
+        value += chunk
+        return value
+    }
+
+    var text: String {
+        lock.lock()
+        defer { lock.unlock() }
+        return value
+    }
+}
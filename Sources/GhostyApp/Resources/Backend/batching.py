@@ -0,0 +1,106 @@
+"""In-container micro-batching for model calls.
+
+Both Modal classes accept several inputs at once (@modal.concurrent), and each
+input runs on its own thread. Instead of letting every thread call the model on
+its own, callers hand their request to a MicroBatcher. A single worker thread
+collects requests for up to `window_ms` (or until `max_batch_size` are
+waiting), runs them through the model as one padded batch, and hands each
+caller its own result. All GPU work therefore stays on one thread.
+A traced request (tracing.py) gets a queue_wait span, and the batch runs
+under the traces of all its requests.
+
+Configuration (server side):
+  GHOSTY_BATCH_WINDOW_MS  - how long the first request of a batch waits for company (default 10)
+  GHOSTY_MAX_BATCH        - largest batch run at once (default 8)
+"""
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+import tracing
+
+
+def window_ms() -> float:
+    return float(os.environ.get("GHOSTY_BATCH_WINDOW_MS", "10"))
+
+
+def max_batch_size() -> int:
+    return int(os.environ.get("GHOSTY_MAX_BATCH", "8"))
+
+
+class MicroBatcher:
+    """Runs `run_batch(items) -> results` (same length, same order) over requests from many threads."""
+
+    def __init__(self, run_batch, max_batch_size: int = 8, window_ms: float = 10.0, name: str = "batcher"):
+        self.run_batch = run_batch
+        self.max_batch_size = max(1, max_batch_size)
+        self.window = max(0.0, window_ms) / 1000.0
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self.batches = 0
+        self.items = 0
+        self.largest = 0
+        self._worker = threading.Thread(target=self._loop, name=name, daemon=True)
+        self._worker.start()
+
+    def submit(self, item):
+        """Blocks until the batch containing `item` has run; returns its result or raises its error."""
+        return self.submit_many([item])[0]
+
+    def submit_many(self, items: list) -> list:
+        """Queues several items together, so they normally share a batch."""
+        futures = [self.submit_async(item) for item in items]
+        return [future.result() for future in futures]
+
+    def submit_async(self, item) -> Future:
+        """Queues `item` and returns at once; the Future resolves when its batch has run."""
+        future = Future()
+        self._queue.put((item, future, tracing.current(), time.time()))
+        return future
+
+    def _collect(self) -> list:
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.window
+        while len(batch) < self.max_batch_size:
+            try:
+                # Whatever is already queued joins without waiting
+                batch.append(self._queue.get(timeout=max(0.0, deadline - time.monotonic())))
+            except queue.Empty:
+                break
+        return batch
+
+    def _loop(self):
+        while True:
+            batch = self._collect()
+            items = [item for item, *_ in batch]
+            started = time.time()
+            for _, _, traces, queued in batch:
+                for trace in traces:
+                    trace.add("queue_wait", queued, (started - queued) * 1000, batch=len(items))
+            try:
+                with tracing.attach(*(trace for _, _, traces, _ in batch for trace in traces)):
+                    results = self.run_batch(items)
+                if len(results) != len(items):
+                    raise RuntimeError(f"Batch of {len(items)} returned {len(results)} results")
+            except Exception as e:
+                for _, future, *_ in batch:
+                    future.set_exception(e)
+                continue
+            finally:
+                with self._lock:
+                    self.batches += 1
+                    self.items += len(items)
+                    self.largest = max(self.largest, len(items))
+            for (_, future, *_), result in zip(batch, results):
+                future.set_result(result)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "batches": self.batches,
+                "items": self.items,
+                "mean_batch": self.items / self.batches if self.batches else 0.0,
+                "largest_batch": self.largest,
+            }
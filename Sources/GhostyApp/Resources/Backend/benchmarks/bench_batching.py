@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+"""Throughput and latency of the in-container micro-batcher under concurrent callers.
+
+Simulated users (threads) each send requests back to back through the same
+MicroBatcher the Modal classes use. Every concurrency level runs twice: with
+batching off (max batch 1, i.e. one request at a time as before) and on.
+
+The default stand-in model costs a fixed --batch-ms per forward pass plus
+--row-ms per request in it, which is how GPU decoding behaves (weight reads
+dominate, extra rows are nearly free). --model tiny-qwen runs the real
+generation functions on a small random-weight Qwen2-VL instead; on CPU that is
+compute bound, so expect little gain there.
+
+    python benchmarks/bench_batching.py --concurrency 1,2,4,8 --requests 32
+    python benchmarks/bench_batching.py --model tiny-qwen --service orchestrator --window-ms 20
+"""
+import argparse
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import batching  # noqa: E402
+import orchestrator_modal  # noqa: E402
+import screen_capture  # noqa: E402
+import showui_modal  # noqa: E402
+import tiny_qwen  # noqa: E402
+
+
+def percentile(samples: list, q: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(round(q / 100 * (len(ordered) - 1))))]
+
+
+def simulated_runner(batch_ms: float, row_ms: float):
+    def run_batch(requests):
+        time.sleep((batch_ms + row_ms * len(requests)) / 1000.0)
+        return [f"answer {i}" for _, i in requests]
+
+    def make_request(img, i):
+        return (img, i)
+    return run_batch, make_request
+
+
+def make_runner(service: str, max_new_tokens: int, hidden_size: int, layers: int):
+    model, processor = tiny_qwen.load(hidden_size=hidden_size, layers=layers)
+    pixels = dict(min_pixels=tiny_qwen.MIN_PIXELS, max_pixels=tiny_qwen.MAX_PIXELS)
+    if service == "showui":
+        def run_batch(requests):
+            return showui_modal.generate_requests(model, processor, requests, max_new_tokens=max_new_tokens, **pixels)
+
+        def make_request(img, i):
+            return (img, f"Click the item number {i} in the list")
+    else:
+        prefix = orchestrator_modal.build_prefix(model, processor)
+
+        def run_batch(batch_messages):
+            return orchestrator_modal.generate_many(model, processor, batch_messages, prefix, max_new_tokens)
+
+        def make_request(img, i):
+            return orchestrator_modal.build_messages(f"Tell my group chat {i}", img, **pixels)
+    return run_batch, make_request
+
+
+def run_level(run_batch, make_request, frames: list, concurrency: int, requests: int, max_batch: int, window_ms: float) -> dict:
+    batcher = batching.MicroBatcher(run_batch, max_batch_size=max_batch, window_ms=window_ms)
+    latencies = []
+    lock = threading.Lock()
+
+    def user(index: int):
+        for i in range(index, requests, concurrency):
+            start = time.perf_counter()
+            batcher.submit(make_request(frames[index], i))
+            with lock:
+                latencies.append((time.perf_counter() - start) * 1000)
+
+    threads = [threading.Thread(target=user, args=(index,)) for index in range(concurrency)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    return dict(
+        throughput=len(latencies) / elapsed,
+        p50=percentile(latencies, 50),
+        p99=percentile(latencies, 99),
+        **batcher.stats(),
+    )
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--model", choices=("simulated", "tiny-qwen"), default="simulated")
+    parser.add_argument("--batch-ms", type=float, default=150.0, help="simulated cost of one batched generate")
+    parser.add_argument("--row-ms", type=float, default=10.0, help="simulated extra cost per request in the batch")
+    parser.add_argument("--service", choices=("showui", "orchestrator"), default="showui", help="tiny-qwen only")
+    parser.add_argument("--concurrency", default="1,2,4,8")
+    parser.add_argument("--requests", type=int, default=16, help="requests per concurrency level")
+    parser.add_argument("--max-batch", type=int, default=batching.max_batch_size())
+    parser.add_argument("--window-ms", type=float, default=batching.window_ms())
+    parser.add_argument("--max-new-tokens", type=int, default=16)
+    parser.add_argument("--size", default="1288x784")
+    parser.add_argument("--hidden-size", type=int, default=256, help="stand-in model width")
+    parser.add_argument("--layers", type=int, default=4)
+    args = parser.parse_args()
+
+    if args.model == "simulated":
+        run_batch, make_request = simulated_runner(args.batch_ms, args.row_ms)
+    else:
+        run_batch, make_request = make_runner(args.service, args.max_new_tokens, args.hidden_size, args.layers)
+    levels = [int(level) for level in args.concurrency.split(",")]
+    backend = screen_capture.get_capture_backend(f"synthetic:{args.size}")
+    frames = []
+    for _ in range(max(levels)):  # every simulated user looks at a different screen
+        frames.append(backend.capture())
+        backend.frame_index += 1
+    run_level(run_batch, make_request, frames, 1, 2, 1, 0)  # warm-up
+
+    name = f"simulated {args.batch_ms:g}+{args.row_ms:g}/row ms" if args.model == "simulated" else f"tiny-qwen {args.service}"
+    print(f"{name}: {args.requests} requests per level, window {args.window_ms:g} ms, max batch {args.max_batch}")
+    print(f"{'users':>5}  {'batching':<8} {'req/s':>7} {'p50 ms':>8} {'p99 ms':>8} {'mean batch':>10}")
+    for concurrency in levels:
+        for label, max_batch, window in (("off", 1, 0.0), ("on", args.max_batch, args.window_ms)):
+            r = run_level(run_batch, make_request, frames, concurrency, args.requests, max_batch, window)
+            print(f"{concurrency:>5}  {label:<8} {r['throughput']:7.1f} {r['p50']:8.1f} {r['p99']:8.1f} {r['mean_batch']:10.1f}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
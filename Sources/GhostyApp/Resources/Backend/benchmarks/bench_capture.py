@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""Screenshot pipeline cost: the old disk round-trip path vs. the in-memory path,
+and upload size per format once the frame is fitted to the model's pixel budget.
+
+Uses the synthetic capture backend, so it runs anywhere. The old path is
+reproduced here as it was in get_screenshot(): screencapture writes a PNG, PIL
+re-opens it, masks it, saves it back to disk and encodes it once more.
+
+    python benchmarks/bench_capture.py --size 2880x1800 --frames 10
+"""
+import argparse
+import io
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import screen_capture  # noqa: E402
+
+
+def legacy_pipeline(backend, tmp_dir: str) -> bytes:
+    from PIL import Image, ImageDraw
+
+    path = os.path.join(tmp_dir, "ghosty_legacy.png")
+    backend.capture().save(path)  # stands in for `screencapture -x path`
+    with Image.open(path) as img:
+        width, height = img.size
+        draw = ImageDraw.Draw(img)
+        draw.rectangle([int(0.3 * width), 0, int(0.7 * width), int(0.6 * height)], fill="black")
+        img.save(path)
+        buffer = io.BytesIO()
+        img.save(buffer, format="PNG")
+        return buffer.getvalue()
+
+
+def in_memory_pipeline(backend, tmp_dir: str) -> bytes:
+    return screen_capture.capture_screenshot(backend)
+
+
+def run(name, pipeline, backend, frames: int, tmp_dir: str):
+    samples = []
+    size = 0
+    for _ in range(frames):
+        start = time.perf_counter()
+        size = len(pipeline(backend, tmp_dir))
+        samples.append((time.perf_counter() - start) * 1000)
+    print(f"{name:<26} mean {statistics.mean(samples):8.1f} ms   p50 {statistics.median(samples):8.1f} ms   {size / 1024:8.0f} KiB")
+
+
+def run_format(fmt: str, backend, frames: int):
+    samples = []
+    frame = None
+    for _ in range(frames):
+        start = time.perf_counter()
+        frame = screen_capture.capture_frame(backend, fmt)
+        samples.append((time.perf_counter() - start) * 1000)
+    width, height = frame["size"]
+    name = f"fitted {fmt} {width}x{height}"
+    print(f"{name:<26} mean {statistics.mean(samples):8.1f} ms   p50 {statistics.median(samples):8.1f} ms   {len(frame['data']) / 1024:8.0f} KiB")
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--size", default="2880x1800")
+    parser.add_argument("--frames", type=int, default=10)
+    args = parser.parse_args()
+
+    backend = screen_capture.get_capture_backend(f"synthetic:{args.size}")
+    # The synthetic frame itself costs the same in both paths; report it separately
+    start = time.perf_counter()
+    for _ in range(args.frames):
+        backend.capture()
+    print(f"{'synthetic frame only':<26} mean {(time.perf_counter() - start) * 1000 / args.frames:8.1f} ms")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        screen_capture.SCREENSHOT_DIR = os.path.join(tmp, "archive")
+        # Full resolution PNG first, to compare like for like with the old path
+        os.environ["GHOSTY_DOWNSCALE"] = "0"
+        run("legacy (disk round-trips)", legacy_pipeline, backend, args.frames, tmp)
+        os.environ["GHOSTY_ARCHIVE_SCREENSHOTS"] = "0"
+        run("in-memory", in_memory_pipeline, backend, args.frames, tmp)
+        os.environ["GHOSTY_ARCHIVE_SCREENSHOTS"] = "1"
+        run("in-memory + async archive", in_memory_pipeline, backend, args.frames, tmp)
+        if screen_capture._archive_executor is not None:
+            screen_capture._archive_executor.shutdown(wait=True)
+
+        os.environ["GHOSTY_DOWNSCALE"] = "1"
+        os.environ["GHOSTY_ARCHIVE_SCREENSHOTS"] = "0"
+        for fmt in ("png", "webp", "jpeg"):
+            run_format(fmt, backend, args.frames)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
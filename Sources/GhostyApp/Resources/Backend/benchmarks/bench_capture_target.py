@@ -0,0 +1,180 @@
+#!/usr/bin/env python3
+"""Capture targets: frame size and cost per display or window, masking, and the frame-to-screen mapping.
+
+Runs screen_capture's target resolution (TargetCaptureBackend, as Quartz
+uses it) against a simulated desktop: a built-in display and a 5K external
+one to its right, a few app windows and the Ghosty panel at the top center of
+the built-in display. For each GHOSTY_CAPTURE_TARGET it reports what was
+captured, the grabbed and uploaded frame sizes, vision tokens, detail
+(uploaded pixels per screen point, vs. the whole main display), upload bytes
+and capture_frame time, and checks that:
+
+  mapping   every window's marker, found in the frame and mapped back through
+            the frame's transform, lands within 1 point of where it is on the
+            screen (and how far off the old main-display mapping would be)
+  masking   no pixel of the Ghosty panel is left in a frame; the share of the
+            frame masked vs. the fixed Ghosty Zone
+
+    python benchmarks/bench_capture_target.py --runs 3
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("GHOSTY_ARCHIVE_SCREENSHOTS", "0")
+
+import screen_capture  # noqa: E402
+
+SCALE = 2
+DISPLAYS = [
+    {"id": 1, "bounds": (0, 0, 1512, 982), "main": True},
+    {"id": 2, "bounds": (1512, -300, 2560, 1440), "main": False},
+]
+GHOSTY_COLOR = (255, 0, 255)
+# Front to back, as the window server lists them: (id, owner, layer, bounds, background, marker color)
+WINDOWS = [
+    (40, "Ghosty", 25, (576, 0, 360, 140), GHOSTY_COLOR, None),
+    (41, "Messages", 0, (2100, 100, 1000, 720), (236, 236, 240), (255, 0, 0)),
+    (42, "Safari", 0, (60, 80, 1300, 860), (250, 250, 250), (0, 200, 0)),
+    (43, "Finder", 0, (200, 200, 900, 600), (232, 236, 244), (0, 0, 255)),
+]
+# Where each window's marker is, as a fraction of the window, and its size in points
+MARKER_AT = (0.93, 0.9)
+MARKER_PT = 6
+TARGETS = ["display", "display:1", "display:front", "window", "window:Safari", "window:Notes"]
+
+
+def marker_point(bounds: tuple) -> tuple:
+    """Global display points of the centre of a window's marker."""
+    x, y, w, h = bounds
+    return (round(x + MARKER_AT[0] * w) + MARKER_PT / 2, round(y + MARKER_AT[1] * h) + MARKER_PT / 2)
+
+
+class SimulatedDesktop(screen_capture.TargetCaptureBackend):
+    """Two displays and a handful of windows, pre-rendered; grabs copy the pixels like the window server does."""
+    name = "simulated"
+
+    def __init__(self, target: str = None):
+        from PIL import Image, ImageDraw
+
+        super().__init__(target)
+        self._windows = [
+            {"id": wid, "owner": owner, "name": owner, "layer": layer, "alpha": 1.0, "bounds": bounds}
+            for wid, owner, layer, bounds, _, _ in WINDOWS
+        ]
+        self._window_images = {}
+        for wid, owner, _, (x, y, w, h), background, marker in WINDOWS:
+            img = Image.new("RGB", (w * SCALE, h * SCALE), background)
+            draw = ImageDraw.Draw(img)
+            if marker is not None:
+                draw.rectangle([0, 0, w * SCALE, 28 * SCALE], fill=(210, 210, 215))
+                draw.rectangle([0, 28 * SCALE, int(0.22 * w * SCALE), h * SCALE], fill=(200, 204, 214))
+                for row in range(int(h / 40)):
+                    top = (48 + row * 36) * SCALE
+                    draw.rectangle([int(0.26 * w * SCALE), top, int(0.8 * w * SCALE), top + 12 * SCALE], fill=(90, 90, 100))
+                mx, my = marker_point((0, 0, w, h))
+                half = MARKER_PT / 2
+                draw.rectangle([int((mx - half) * SCALE), int((my - half) * SCALE),
+                                int((mx + half) * SCALE) - 1, int((my + half) * SCALE) - 1], fill=marker)
+            self._window_images[wid] = img
+        self._display_images = {}
+        for display in DISPLAYS:
+            dx, dy, dw, dh = display["bounds"]
+            img = Image.new("RGB", (dw * SCALE, dh * SCALE), (58, 82, 120))
+            for wid, _, _, (x, y, _, _), _, _ in reversed(WINDOWS):
+                img.paste(self._window_images[wid], ((x - dx) * SCALE, (y - dy) * SCALE))
+            self._display_images[display["id"]] = img
+
+    def displays(self) -> list:
+        return [dict(display) for display in DISPLAYS]
+
+    def windows(self) -> list:
+        return [dict(window) for window in self._windows]
+
+    def grab_display(self, display_id: int):
+        return self._display_images[display_id].copy()
+
+    def grab_window(self, window_id: int):
+        return self._window_images[window_id].copy()
+
+
+def find(img, color: tuple):
+    """Normalized centre of the pixels of exactly `color` in `img`, and how many there are."""
+    import numpy as np
+
+    pixels = np.asarray(img)
+    ys, xs = np.nonzero(np.all(pixels == np.array(color, dtype=pixels.dtype), axis=-1))
+    if len(xs) == 0:
+        return None, 0
+    return ((xs.mean() + 0.5) / img.width, (ys.mean() + 0.5) / img.height), len(xs)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=3, help="captures per target")
+    args = parser.parse_args()
+
+    main_display = next(d for d in DISPLAYS if d["main"])
+    fixed = screen_capture.GHOSTY_ZONE
+    fixed_share = (fixed[2] - fixed[0]) * (fixed[3] - fixed[1])
+    old = {"origin": [0, 0], "size": list(main_display["bounds"][2:])}
+
+    print(f"{'target':<14} {'captured':<12} {'grabbed':>10} {'uploaded':>9} {'tokens':>6} {'detail':>6} "
+          f"{'bytes':>8} {'ms':>6} {'masked':>6} {'mapping err':>11} {'old err':>8}")
+    failures = 0
+    reference_detail = None
+    for spec in TARGETS:
+        backend = SimulatedDesktop(spec)
+        samples, frame = [], None
+        for _ in range(args.runs):
+            start = time.perf_counter()
+            frame = screen_capture.capture_frame(backend)
+            samples.append((time.perf_counter() - start) * 1000)
+        transform = frame["transform"]
+        kind = "window" if "window" in transform else "display"
+        width, height = frame["size"]
+        detail = width / transform["size"][0]
+        if reference_detail is None:
+            reference_detail = detail
+        masked = sum((x1 - x0) * (y1 - y0) for x0, y0, x1, y1 in frame["zones"])
+
+        # Every marker in the frame maps back onto its place on the screen
+        errors, old_errors = [], []
+        for _, _, _, bounds, _, marker in WINDOWS:
+            if marker is None:
+                continue
+            position, _ = find(frame["source"], marker)
+            if position is None:
+                continue
+            expected = marker_point(bounds)
+            for mapping, into in ((transform, errors), (old, old_errors)):
+                x, y = screen_capture.to_screen(position, mapping)
+                into.append(max(abs(x - expected[0]), abs(y - expected[1])))
+        _, leaked = find(frame["source"], GHOSTY_COLOR)
+        error = max(errors) if errors else 0.0
+        failures += error > 1.0 or leaked > 0 or not errors
+        print(
+            f"{spec:<14} {kind + ' ' + str(transform[kind]):<12} "
+            f"{frame['source_size'][0]:>5}x{frame['source_size'][1]:<4} {width:>4}x{height:<4} "
+            f"{width * height // (28 * 28):>6} {detail / reference_detail:>5.2f}x {len(frame['data']):>8} "
+            f"{statistics.median(samples):>6.0f} {masked:>6.1%} {error:>8.2f} pt {max(old_errors or [0]):>5.0f} pt"
+            + (f"  {leaked} Ghosty pixels left" if leaked else "")
+        )
+
+    print()
+    panel = screen_capture.ghosty_zones(main_display["bounds"], SimulatedDesktop().windows())[0]
+    print(f"fixed Ghosty Zone: {fixed_share:.0%} of every main-display frame masked; the panel's real frame: "
+          f"{(panel[2] - panel[0]) * (panel[3] - panel[1]):.1%} at ({', '.join(f'{v:.2f}' for v in panel)})")
+    print(f"detail: uploaded pixels per screen point relative to the main display frame ({reference_detail:.2f} px/pt); "
+          f"old err: the old mapping onto the main display as a whole")
+    if failures:
+        print(f"{failures} target(s) mapped or masked wrongly", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""Cold start phases of the orchestrator, measured locally with a tiny model.
+
+Saves a tiny random-weight Qwen2-VL with its processor (fp32, standing in
+for the Hub checkpoint), bakes it with cold_start.bake(), and then starts
+fresh Python processes that load it the way OrchestratorAgent does:
+
+  snapshot step   imports, processor, weights_cpu   (a memory snapshot restores these)
+  restore step    to_gpu (no-op without CUDA), warmup (prefix cache, grammar masks, one decode)
+
+once from the checkpoint and once from the baked weights, --runs times each,
+and prints the median of every phase. A restored container only pays for
+the restore step (plus Modal's restore itself). With --record, appends
+the medians as a JSON line to a file, to track cold start regressions.
+
+    python benchmarks/bench_cold_start.py --runs 3 --hidden-size 1024 --layers 8
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import cold_start  # noqa: E402
+
+
+def child(model_id: str):
+    """One container start, in this fresh process; prints the PhaseTimer report as JSON."""
+    timer = cold_start.PhaseTimer("orchestrator", "bf16")
+    with timer.phase("imports"):
+        from transformers import AutoProcessor, Qwen2VLForConditionalGeneration
+        import json_grammar
+        import orchestrator_modal
+    import tiny_qwen
+
+    processor = cold_start.load_processor(
+        timer, AutoProcessor, model_id, "bf16", min_pixels=tiny_qwen.MIN_PIXELS, max_pixels=tiny_qwen.MAX_PIXELS,
+    )
+    model, draft, _ = cold_start.load_weights(timer, Qwen2VLForConditionalGeneration, model_id, "bf16", cold_start.snapshot_device("bf16"))
+    timer.step = "restore"
+    cold_start.to_gpu(timer, model, draft)
+    with timer.phase("warmup"):
+        orchestrator_modal.warm_up(model, processor, orchestrator_modal.DECISION_GRAMMAR if json_grammar.enabled() else None, draft)
+    print(json.dumps(timer.report()))
+
+
+def run(model_id: str, baked_dir: str, runs: int) -> list:
+    env = {**os.environ, "GHOSTY_BAKED_DIR": baked_dir, "GHOSTY_SNAPSHOT": "1", "GHOSTY_GPU_SNAPSHOT": "0"}
+    reports = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        out = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), "--child", model_id],
+            env=env, capture_output=True, text=True, check=True,
+        ).stdout
+        report = json.loads(out.strip().splitlines()[-1])
+        report["process_ms"] = (time.perf_counter() - start) * 1000
+        reports.append(report)
+    return reports
+
+
+def medians(reports: list) -> dict:
+    phases = {}
+    for step in ("snapshot", "restore"):
+        for name in reports[0][step]:
+            phases[f"{step}.{name}"] = statistics.median(r[step][name] for r in reports)
+        phases[f"{step}_ms"] = statistics.median(r[f"{step}_ms"] for r in reports)
+    phases["process_ms"] = statistics.median(r["process_ms"] for r in reports)
+    return phases
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--hidden-size", type=int, default=1024)
+    parser.add_argument("--layers", type=int, default=8)
+    parser.add_argument("--record", help="append the medians as a JSON line to this file")
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        child(args.child)
+        return 0
+
+    from transformers import AutoProcessor, Qwen2VLForConditionalGeneration
+    import tiny_qwen
+
+    model, processor = tiny_qwen.load(hidden_size=args.hidden_size, layers=args.layers)
+    with tempfile.TemporaryDirectory() as directory:
+        checkpoint = os.path.join(directory, "checkpoint")
+        model.save_pretrained(checkpoint)
+        processor.save_pretrained(checkpoint)
+        os.environ["GHOSTY_BAKED_DIR"] = os.path.join(directory, "baked")
+        cold_start.bake(Qwen2VLForConditionalGeneration, AutoProcessor, checkpoint, "bf16")
+        results = {
+            "checkpoint": medians(run(checkpoint, os.path.join(directory, "none"), args.runs)),
+            "baked": medians(run(checkpoint, os.path.join(directory, "baked"), args.runs)),
+        }
+
+    names = list(results["checkpoint"])
+    print(f"{'phase (median ms)':<26} {'checkpoint':>11} {'baked':>9}")
+    for name in names:
+        print(f"{name:<26} {results['checkpoint'][name]:>11.1f} {results['baked'][name]:>9.1f}")
+    print(
+        f"a restored container skips the snapshot step: {results['baked']['snapshot_ms']:.0f} of "
+        f"{results['baked']['snapshot_ms'] + results['baked']['restore_ms']:.0f} ms (baked)"
+    )
+    if args.record:
+        with open(args.record, "a", encoding="utf-8") as f:
+            f.write(json.dumps({"time": time.time(), "hidden_size": args.hidden_size, "layers": args.layers, **results}) + "\n")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""Grammar-constrained decoding: parse failures and generated tokens, before and after.
+
+Runs orchestrator_modal.compare_constrained and showui_modal.compare_constrained
+on a tiny random-weight Qwen2-VL on CPU, and checks that the constrained batched
+decode loop picks the same tokens as constrained model.generate(). Exits
+non-zero if it doesn't, or if a constrained answer fails to parse for any
+reason other than running into --max-new-tokens.
+
+Random weights only show the mechanics: free-form output never parses, and a
+constrained string rarely closes before the token limit. Against the real
+models on Modal: `modal run orchestrator_modal.py::check_constrained` and
+`modal run showui_modal.py::check_constrained`.
+
+    python benchmarks/bench_constrained.py --max-new-tokens 64
+"""
+import argparse
+import os
+import statistics
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import orchestrator_modal  # noqa: E402
+import screen_capture  # noqa: E402
+import showui_modal  # noqa: E402
+import tiny_qwen  # noqa: E402
+
+DECISION_PROMPTS = [
+    "Hi Ghosty, are you there?",
+    "Tell my DIBZS group chat 67",
+    "ACTION HISTORY:\n- Turn: INPUT at Optional((0.5, 0.9)) with value '67'\nUser: Tell my DIBZS group chat 67",
+    "Thanks, I'm done",
+]
+ACTION_PROMPTS = [
+    "Click the DIBZS chat on the left side",
+    "Type '67' in the chat box",
+    "Scroll down the page.",
+    "Click the search icon.",
+]
+
+
+def summarize(name: str, report: dict, max_new_tokens: int) -> bool:
+    """Prints one line per mode; False if a constrained answer failed to parse before the token limit."""
+    ok = True
+    for mode, rows in report.items():
+        failed = [row for row in rows if not row["parsed"]]
+        truncated = sum(row["tokens"] >= max_new_tokens for row in failed)
+        tokens = statistics.mean(row["tokens"] for row in rows)
+        ms = statistics.mean(row["ms"] for row in rows)
+        print(
+            f"{name:<13} {mode:<12} parse failures {len(failed)}/{len(rows)} ({truncated} at the token limit)"
+            f"  mean tokens {tokens:6.1f}  mean {ms:7.1f} ms"
+        )
+        if mode == "constrained" and truncated < len(failed):
+            ok = False
+    return ok
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--size", default="1288x784")
+    parser.add_argument("--max-new-tokens", type=int, default=64)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--verbose", action="store_true", help="print every answer")
+    args = parser.parse_args()
+
+    model, processor = tiny_qwen.load(seed=args.seed)
+    img = screen_capture.get_capture_backend(f"synthetic:{args.size}").capture()
+    pixels = dict(min_pixels=tiny_qwen.MIN_PIXELS, max_pixels=tiny_qwen.MAX_PIXELS)
+    prefix = orchestrator_modal.build_prefix(model, processor)
+
+    decisions = orchestrator_modal.compare_constrained(
+        model, processor, prefix, DECISION_PROMPTS, img, max_new_tokens=args.max_new_tokens, **pixels
+    )
+    actions = showui_modal.compare_constrained(
+        model, processor, img, ACTION_PROMPTS, max_new_tokens=args.max_new_tokens, **pixels
+    )
+    ok = summarize("orchestrator", decisions, args.max_new_tokens)
+    ok = summarize("showui", actions, args.max_new_tokens) and ok
+    if args.verbose:
+        for name, report in (("orchestrator", decisions), ("showui", actions)):
+            for mode, rows in report.items():
+                for row in rows:
+                    print(f"  {name} {mode:<12} {'ok  ' if row['parsed'] else 'FAIL'} {row['text'][:90]!r}")
+
+    # The batched loop's masks must match the logits processor used with model.generate()
+    same = orchestrator_modal.compare_prefix_cache(
+        model, processor, prefix, DECISION_PROMPTS, img, max_new_tokens=args.max_new_tokens,
+        grammar=orchestrator_modal.DECISION_GRAMMAR, **pixels,
+    )["rows"]
+    same = [row["match"] for row in same]
+    single = [
+        showui_modal.generate_single(model, processor, img, prompt, max_new_tokens=args.max_new_tokens, grammar=showui_modal.ACTION_GRAMMAR, **pixels)
+        for prompt in ACTION_PROMPTS
+    ]
+    batched = showui_modal.generate_batch(
+        model, processor, img, ACTION_PROMPTS, max_new_tokens=args.max_new_tokens, grammar=showui_modal.ACTION_GRAMMAR, **pixels
+    )
+    same += [a == b for a, b in zip(single, batched)]
+    print(f"constrained greedy_generate == constrained generate(): {sum(same)}/{len(same)}")
+
+    if not all(same):
+        print("constrained batched outputs differ from model.generate()", file=sys.stderr)
+        return 1
+    if not ok:
+        print("a constrained answer failed to parse before the token limit", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
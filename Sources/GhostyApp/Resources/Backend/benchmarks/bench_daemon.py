@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+"""Per-turn latency of template_backend.py: one process per turn vs. the warm daemon.
+
+Runs against the local orchestrator stand-in and a fixed screenshot, so it only
+measures what the client side pays per turn.
+
+    python benchmarks/bench_daemon.py --turns 10 --invoke-ms 50
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SCRIPT = os.path.join(BACKEND_DIR, "template_backend.py")
+PROMPT = "Tell my DIBZS group chat 67"
+
+
+def _write_fixture(path: str):
+    try:
+        from PIL import Image
+        Image.new("RGB", (2880, 1800), (40, 44, 52)).save(path)
+    except ImportError:
+        with open(path, "wb") as f:
+            f.write(b"\x89PNG\r\n\x1a\n" + b"\x00" * 1024)
+
+
+def _summary(name: str, samples: list) -> str:
+    samples_ms = sorted(s * 1000 for s in samples)
+    p95 = samples_ms[min(len(samples_ms) - 1, int(round(0.95 * (len(samples_ms) - 1))))]
+    return (
+        f"{name:<22} mean {statistics.mean(samples_ms):8.1f} ms   "
+        f"p50 {statistics.median(samples_ms):8.1f} ms   p95 {p95:8.1f} ms"
+    )
+
+
+def bench_per_process(env: dict, turns: int) -> list:
+    env = dict(env, GHOSTY_DAEMON="0")
+    samples = []
+    for _ in range(turns):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, SCRIPT, PROMPT], env=env, check=True, capture_output=True)
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+def bench_socket_daemon(env: dict, turns: int, socket_path: str) -> list:
+    # Same path the app takes: a thin-client process per turn talking to the daemon
+    env = dict(env, GHOSTY_SOCKET=socket_path)
+    subprocess.run([sys.executable, SCRIPT, PROMPT], env=env, check=True, capture_output=True)  # spawn + warm
+    samples = []
+    try:
+        for _ in range(turns):
+            start = time.perf_counter()
+            subprocess.run([sys.executable, SCRIPT, PROMPT], env=env, check=True, capture_output=True)
+            samples.append(time.perf_counter() - start)
+    finally:
+        sys.path.insert(0, BACKEND_DIR)
+        import template_backend
+        try:
+            template_backend._send_to_daemon(socket_path, {"op": "shutdown"})
+        except OSError:
+            pass
+    return samples
+
+
+def bench_stdio_daemon(env: dict, turns: int) -> list:
+    proc = subprocess.Popen(
+        [sys.executable, SCRIPT, "--serve", "--stdio"],
+        env=env, stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True,
+    )
+    request = json.dumps({"op": "generate", "text": PROMPT}) + "\n"
+    samples = []
+    try:
+        for i in range(turns + 1):
+            start = time.perf_counter()
+            proc.stdin.write(request)
+            proc.stdin.flush()
+            response = json.loads(proc.stdout.readline())
+            assert response["ok"], response
+            if i > 0:  # the first request also waits for the warm-up
+                samples.append(time.perf_counter() - start)
+    finally:
+        proc.stdin.close()
+        proc.wait()
+    return samples
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--turns", type=int, default=10)
+    parser.add_argument("--invoke-ms", type=float, default=0.0, help="simulated orchestrator inference time")
+    parser.add_argument("--lookup-ms", type=float, default=0.0, help="simulated service lookup time")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        fixture = os.path.join(tmp, "screen.png")
+        _write_fixture(fixture)
+        env = dict(
+            os.environ,
+            GHOSTY_SERVICES="local",
+            GHOSTY_SCREENSHOT=fixture,
+            GHOSTY_LOCAL_INVOKE_MS=str(args.invoke_ms),
+            GHOSTY_LOCAL_LOOKUP_MS=str(args.lookup_ms),
+        )
+
+        results = [
+            ("process per turn", bench_per_process(env, args.turns)),
+            ("daemon (unix socket)", bench_socket_daemon(env, args.turns, os.path.join(tmp, "backend.sock"))),
+            ("daemon (stdio)", bench_stdio_daemon(env, args.turns)),
+        ]
+
+    print(f"{args.turns} turns, stubbed orchestrator ({args.invoke_ms:.0f} ms inference, {args.lookup_ms:.0f} ms lookup)")
+    for name, samples in results:
+        print(_summary(name, samples))
+
+    # The stand-in never imports modal; report what the per-process path pays for it on top
+    start = time.perf_counter()
+    probe = subprocess.run([sys.executable, "-c", "import modal"], capture_output=True)
+    if probe.returncode == 0:
+        print(f"(+ {1000 * (time.perf_counter() - start):.0f} ms per process-per-turn call to import modal)")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+"""Bytes uploaded per turn with frame references/deltas vs. always sending the full frame.
+
+Synthetic frames change a little between turns (a moving cursor), with an
+occasional identical frame and an occasional full screen change, and go
+through the same FrameUploader the backend uses, against the local stand-in.
+
+    python benchmarks/bench_frame_delta.py --turns 10 --mbps 5
+"""
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("GHOSTY_ARCHIVE_SCREENSHOTS", "0")
+
+import frame_cache  # noqa: E402
+import local_services  # noqa: E402
+import screen_capture  # noqa: E402
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--turns", type=int, default=10)
+    parser.add_argument("--size", default="2880x1800")
+    parser.add_argument("--format", default="png")
+    parser.add_argument("--mbps", type=float, default=5.0, help="uplink speed used to estimate upload time")
+    args = parser.parse_args()
+
+    backend = screen_capture.get_capture_backend(f"synthetic:{args.size}")
+    uploader = frame_cache.FrameUploader()
+    orch = local_services.LocalOrchestrator()
+
+    frame = None
+    print(f"{'turn':>4}  {'mode':<6} {'sent':>10} {'full':>10} {'saved':>10}  {'upload @ %.0f Mbit/s' % args.mbps}")
+    for turn in range(1, args.turns + 1):
+        if turn % 4 != 0 or frame is None:  # every 4th turn nothing on screen changed
+            if turn % 7 == 0:
+                backend.frame_index += 25  # bigger jump, e.g. a new window
+            frame = screen_capture.capture_frame(backend, args.format)
+        kwargs, report = uploader.prepare(frame)
+        orch.invoke.remote(user_prompt="turn", **kwargs)
+        report = uploader.commit(report)
+        upload_ms = report["sent_bytes"] * 8 / (args.mbps * 1e6) * 1000
+        print(
+            f"{turn:>4}  {report['mode']:<6} {report['sent_bytes']:>10} {report['full_bytes']:>10} "
+            f"{report['saved_bytes']:>10}  {upload_ms:8.1f} ms"
+        )
+
+    print(
+        f"hit rate {uploader.hits / uploader.turns:.0%}, sent {uploader.bytes_sent} of {uploader.bytes_full} bytes "
+        f"({1 - uploader.bytes_sent / uploader.bytes_full:.0%} saved); server cache {orch.frames.stats()}"
+    )
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""ShowUI grounding cache: hit rate, latency, and stale hits over a session.
+
+Replays turns against synthetic frames through showui_modal.ground_cached,
+with a tiny random-weight Qwen2-VL on CPU standing in for ShowUI-2B. Every
+turn captures a new frame, so the cursor in the input box moves. Every
+--switch-every turns the "app" changes: the frame is flipped upside down
+until the next switch. Each turn grounds the INPUT short-circuit's click
+prompt plus a couple of ordinary instructions.
+
+A hit is stale if the region around the cached answer's position differs
+from the frame the answer came from by more than --stale-delta grey levels
+on average. Exits non-zero if there are any.
+
+    python benchmarks/bench_grounding_cache.py --turns 24 --switch-every 6
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import grounding_cache  # noqa: E402
+import orchestrator_modal  # noqa: E402
+import screen_capture  # noqa: E402
+import showui_modal  # noqa: E402
+import tiny_qwen  # noqa: E402
+
+PROMPTS = [
+    orchestrator_modal.plan_gui_action("Type '67' in the chat box")["prompt"],
+    "Click the DIBZS chat on the left side",
+    "Scroll down the page.",
+]
+
+
+def region_delta(before, after, answer: str, margin: float) -> float:
+    """Mean absolute grey-level difference of the answer's region between two frames."""
+    from PIL import ImageChops, ImageStat
+
+    box = grounding_cache.region(before.size, grounding_cache.action_points(answer), margin)
+    diff = ImageChops.difference(before.crop(box).convert("L"), after.crop(box).convert("L"))
+    return ImageStat.Stat(diff).mean[0]
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--size", default="1288x784")
+    parser.add_argument("--turns", type=int, default=24)
+    parser.add_argument("--switch-every", type=int, default=6, help="turns between app switches")
+    parser.add_argument("--max-new-tokens", type=int, default=96)
+    parser.add_argument("--stale-delta", type=float, default=8.0, help="grey levels that make a cached region stale")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    from PIL import Image
+
+    model, processor = tiny_qwen.load(seed=args.seed)
+    capture = screen_capture.get_capture_backend(f"synthetic:{args.size}")
+
+    def run(requests):
+        return showui_modal.generate_requests(
+            model, processor, requests, tiny_qwen.MIN_PIXELS, tiny_qwen.MAX_PIXELS,
+            max_new_tokens=args.max_new_tokens, grammar=showui_modal.ACTION_GRAMMAR,
+        )
+
+    run([(capture.capture(), PROMPTS[0])])  # warm up
+    cache = grounding_cache.GroundingCache()
+    sources = {}  # (prompt, answer) -> frames that answer was grounded on
+    hit_ms, miss_ms, stale = [], [], []
+    for turn in range(args.turns):
+        img = capture.capture()
+        if (turn // args.switch_every) % 2:
+            img = img.transpose(Image.FLIP_TOP_BOTTOM)
+        for prompt in PROMPTS:
+            before = cache.hits
+            start = time.perf_counter()
+            answer = showui_modal.ground_cached(cache, [(img, prompt)], run)[0]
+            ms = (time.perf_counter() - start) * 1000
+            if cache.hits > before:
+                hit_ms.append(ms)
+                delta = min(region_delta(source, img, answer, cache.margin) for source in sources[prompt, answer])
+                if delta > args.stale_delta:
+                    stale.append((turn, prompt, delta))
+            else:
+                miss_ms.append(ms)
+                sources.setdefault((prompt, answer), []).append(img)
+
+    stats = cache.stats()
+    print(
+        f"lookups {stats['hits'] + stats['misses']}: hits {stats['hits']}, misses {stats['misses']} "
+        f"(hit rate {stats['hit_rate']:.0%}), stored {stats['stores']} answers"
+    )
+    if hit_ms:
+        print(f"mean hit  {statistics.mean(hit_ms):8.2f} ms")
+    if miss_ms:
+        print(f"mean miss {statistics.mean(miss_ms):8.2f} ms")
+    for turn, prompt, delta in stale:
+        print(f"stale hit on turn {turn}: {prompt[:50]!r} region differs by {delta:.1f}", file=sys.stderr)
+    return 1 if stale else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+"""Orchestrator system-prompt KV cache: greedy equality and time to first token.
+
+Runs orchestrator_modal.compare_prefix_cache on a tiny random-weight Qwen2-VL
+on CPU, with the real SYSTEM_INSTRUCTIONS as the cached prefix. Exits non-zero
+if any output differs from the uncached path. Then checks what invoke_stream
+streams on both paths (compare_streamed): the text must be the decision
+alone and stream_decision's THOUGHT the decision's, not the prompt's, also
+with the prefix cache off (GHOSTY_PREFIX_CACHE=0). Against Qwen2.5-VL-7B on
+Modal: `modal run orchestrator_modal.py::check_prefix_cache`.
+
+    python benchmarks/bench_prefix_cache.py --size 1288x784
+"""
+import argparse
+import os
+import statistics
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import orchestrator_modal  # noqa: E402
+import screen_capture  # noqa: E402
+import tiny_qwen  # noqa: E402
+
+PROMPTS = [
+    "Hi Ghosty, are you there?",
+    "Tell my DIBZS group chat 67",
+    "ACTION HISTORY:\n- Turn: INPUT at Optional((0.5, 0.9)) with value '67'\nUser: Tell my DIBZS group chat 67",
+    "Thanks, I'm done",
+]
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--size", default="1288x784", help="screenshot size; 'none' for text-only turns")
+    parser.add_argument("--max-new-tokens", type=int, default=24)
+    args = parser.parse_args()
+
+    model, processor = tiny_qwen.load()
+    img = None if args.size == "none" else screen_capture.get_capture_backend(f"synthetic:{args.size}").capture()
+    prefix = orchestrator_modal.build_prefix(model, processor)
+    orchestrator_modal.compare_prefix_cache(model, processor, prefix, PROMPTS[:1], img, tiny_qwen.MIN_PIXELS, tiny_qwen.MAX_PIXELS, 2)  # warm-up
+    report = orchestrator_modal.compare_prefix_cache(
+        model, processor, prefix, PROMPTS, img, tiny_qwen.MIN_PIXELS, tiny_qwen.MAX_PIXELS, args.max_new_tokens
+    )
+
+    print(f"system prompt prefix: {report['prefix_tokens']} tokens")
+    for row in report["rows"]:
+        prompt = row["prompt"].replace("\n", " ")
+        print(f"{'ok  ' if row['match'] else 'DIFF'} ttft {row['ttft_full_ms']:7.1f} ms -> {row['ttft_cached_ms']:7.1f} ms  {prompt[:50]}")
+    full = statistics.median(row["ttft_full_ms"] for row in report["rows"])
+    cached = statistics.median(row["ttft_cached_ms"] for row in report["rows"])
+    print(f"median time to first token {full:.1f} ms -> {cached:.1f} ms")
+    failed = not all(row["match"] for row in report["rows"])
+    if failed:
+        print("cached outputs differ from the full-prefill path", file=sys.stderr)
+
+    print()
+    for name, path_prefix in (("prefix cache", prefix), ("no prefix", None)):
+        rows = orchestrator_modal.compare_streamed(
+            model, processor, path_prefix, PROMPTS, img, tiny_qwen.MIN_PIXELS, tiny_qwen.MAX_PIXELS, args.max_new_tokens,
+            orchestrator_modal.DECISION_GRAMMAR,
+        )
+        for row in rows:
+            print(f"{'ok  ' if row['match'] else 'DIFF'} streamed, {name:<12} THOUGHT {row['thought'][:30]!r:<34} {row['streamed'][:30]!r}")
+        if not all(row["match"] for row in rows):
+            print(f"streamed decisions differ from the generated ones ({name})", file=sys.stderr)
+            failed = True
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
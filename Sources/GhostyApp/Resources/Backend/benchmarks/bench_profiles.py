@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+"""Inference profiles: load time, weight memory and tokens/s on a fixed prompt set.
+
+Saves a tiny random-weight Qwen2-VL (the "7B") and a smaller one (its draft)
+to a temporary directory and loads them through inference_profiles.load(),
+the code path OrchestratorAgent.setup uses, once per profile. Each profile
+then decodes the same prompts about the same synthetic screenshot the way
+the orchestrator does (measure_profile), constrained to DECISION_GRAMMAR.
+
+int8 and nf4 need CUDA and bitsandbytes and are skipped without them.
+Random-weight drafts almost never agree with the target, so speculative
+numbers here are its overhead rather than its speedup. Its outputs must still
+equal plain model.generate() with the same weights (greedy verification); the
+script exits non-zero if they don't. "same as bf16" compares with the bf16
+profile, which decodes through the prefix cache; in bf16 the two paths can
+round differently and part ways on an unlucky token.
+
+"streamed" is what invoke_stream would stream under the profile
+(compare_streamed): the generated text alone, with stream_decision's THOUGHT
+taken from the decision rather than the prompt. The script also exits
+non-zero if any profile streams something else.
+
+Against Qwen2.5-VL-7B, each profile on its GPU: `modal run orchestrator_modal.py::check_profiles`.
+
+    python benchmarks/bench_profiles.py --profiles bf16,speculative --max-new-tokens 48
+"""
+import argparse
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import inference_profiles  # noqa: E402
+import orchestrator_modal  # noqa: E402
+import screen_capture  # noqa: E402
+import tiny_qwen  # noqa: E402
+
+PROMPTS = [
+    "Hi Ghosty, are you there?",
+    "Tell my DIBZS group chat 67",
+    "Open Safari and search for the weather",
+    "Thanks, I'm done",
+]
+
+
+def unavailable(profile: str) -> str:
+    """Why `profile` can't run here, or "" if it can."""
+    import torch
+
+    if profile not in inference_profiles.QUANTIZED:
+        return ""
+    if not torch.cuda.is_available():
+        return "needs CUDA"
+    try:
+        import bitsandbytes  # noqa: F401
+    except ImportError:
+        return "needs bitsandbytes"
+    return ""
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--profiles", default=",".join(inference_profiles.PROFILES))
+    parser.add_argument("--size", default="1288x784", help="screenshot size; 'none' for text-only prompts")
+    parser.add_argument("--max-new-tokens", type=int, default=48)
+    parser.add_argument("--hidden-size", type=int, default=512, help="width of the target model (the draft is 64)")
+    args = parser.parse_args()
+    from transformers import Qwen2VLForConditionalGeneration
+
+    target, processor = tiny_qwen.load(hidden_size=args.hidden_size, layers=4)
+    draft, _ = tiny_qwen.load(seed=1)
+    img = None if args.size == "none" else screen_capture.get_capture_backend(f"synthetic:{args.size}").capture()
+
+    reports = {}
+    with tempfile.TemporaryDirectory() as directory:
+        target.save_pretrained(os.path.join(directory, "target"))
+        draft.save_pretrained(os.path.join(directory, "draft"))
+        os.environ["GHOSTY_DRAFT_MODEL"] = os.path.join(directory, "draft")
+        for profile in args.profiles.split(","):
+            profile = inference_profiles.resolve(profile)
+            reason = unavailable(profile)
+            if reason:
+                print(f"{profile:<12} skipped: {reason}")
+                continue
+            model, draft_model, stats = inference_profiles.load(Qwen2VLForConditionalGeneration, os.path.join(directory, "target"), profile)
+            prefix = orchestrator_modal.build_prefix(model, processor) if draft_model is None else None
+            measure = lambda: orchestrator_modal.measure_profile(  # noqa: E731
+                model, processor, prefix, PROMPTS, img, tiny_qwen.MIN_PIXELS, tiny_qwen.MAX_PIXELS,
+                args.max_new_tokens, orchestrator_modal.DECISION_GRAMMAR, draft_model,
+            )
+            measure()  # warm-up
+            reports[profile] = {**stats, **measure()}
+            reports[profile]["streamed"] = orchestrator_modal.compare_streamed(
+                model, processor, prefix, PROMPTS, img, tiny_qwen.MIN_PIXELS, tiny_qwen.MAX_PIXELS,
+                args.max_new_tokens, orchestrator_modal.DECISION_GRAMMAR, draft_model,
+            )
+            if draft_model is not None:
+                plain = orchestrator_modal.measure_profile(
+                    model, processor, None, PROMPTS, img, tiny_qwen.MIN_PIXELS, tiny_qwen.MAX_PIXELS,
+                    args.max_new_tokens, orchestrator_modal.DECISION_GRAMMAR,
+                )
+                reports[profile]["plain"] = [row["text"] for row in plain["rows"]]
+
+    baseline = reports.get("bf16")
+    print(f"{'profile':<12} {'load s':>7} {'weights MiB':>12} {'tokens':>7} {'tokens/s':>9} {'same as bf16':>13} {'streamed':>9}")
+    failed = False
+    for profile, report in reports.items():
+        same = sum(a["text"] == b["text"] for a, b in zip(report["rows"], baseline["rows"])) if baseline else 0
+        streamed = sum(row["match"] for row in report["streamed"])
+        print(
+            f"{profile:<12} {report['load_s']:>7.2f} {report['memory_mb']:>12.1f} {sum(r['tokens'] for r in report['rows']):>7} "
+            f"{report['tokens_per_s']:>9.1f} {f'{same}/{len(PROMPTS)}' if baseline else '-':>13} {f'{streamed}/{len(PROMPTS)}':>9}"
+        )
+        for row in report["streamed"]:
+            if not row["match"]:
+                print(f"    {profile} streamed {row['streamed'][:60]!r} for {row['text'][:40]!r}", file=sys.stderr)
+                failed = True
+    speculative = reports.get("speculative")
+    if speculative and [row["text"] for row in speculative["rows"]] != speculative["plain"]:
+        print("speculative outputs differ from model.generate() without the draft", file=sys.stderr)
+        failed = True
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
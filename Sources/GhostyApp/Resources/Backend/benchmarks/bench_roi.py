@@ -0,0 +1,184 @@
+#!/usr/bin/env python3
+"""Region-of-interest grounding: vision tokens and coordinate mapping, full frame vs. ROI crop.
+
+For each labelled target in corpus/roi_targets.jsonl ({"screen", "prompt",
+"region", "box"}) the screen is captured and fitted the way the client
+uploads it, then grounded the way ShowUI does (showui_modal.crop_requests,
+generate_requests with a tiny random-weight Qwen2-VL at ShowUI's pixel budget):
+
+  tokens   vision tokens of the full frame vs. the region's crop
+  zoom     how much larger the crop shows the region than the full frame does
+  ms       grounding time on the CPU, full frame vs. crop
+  mapping  an answer at the target's centre in crop coordinates, mapped back with
+           roi.map_answer, must land in the target's box (and the box in the region)
+
+Random weights can't say where anything is, so accuracy is checked offline
+with a grounder that can: the OCR text index (text_index.build, RapidOCR).
+bench_text_index's screens are rendered at a native display size (--native,
+--font-px) with ground-truth boxes for every text, uploaded the way the client
+does with GHOSTY_ROI off and on (roi.upload_max_pixels), and each text inside a
+region is looked up in what the model would see:
+
+  full        the uploaded frame at the processor's budget (the region as a filter)
+  crop        the region's crop of the frame uploaded with ROI off (upsampled pixels)
+  crop+roi    the region's crop of the frame uploaded with ROI on (native pixels)
+
+A lookup counts as a hit when it maps back into the text's box. The real
+model's accuracy is `modal run showui_modal.py::check_roi`. --upload-max-pixels
+sets GHOSTY_MAX_PIXELS for the token and mapping table.
+
+    python benchmarks/bench_roi.py --native 5120x2880 --font-px 26
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import bench_text_index  # noqa: E402
+import roi  # noqa: E402
+import screen_capture  # noqa: E402
+import showui_modal  # noqa: E402
+import text_index  # noqa: E402
+import tiny_qwen  # noqa: E402
+
+TARGETS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "corpus", "roi_targets.jsonl")
+# ShowUI's processor budget
+MIN_PIXELS = 256 * 28 * 28
+MAX_PIXELS = 1344 * 28 * 28
+
+
+def grounding_ms(model, processor, requests: list, runs: int) -> float:
+    samples = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        showui_modal.generate_requests(model, processor, requests, MIN_PIXELS, MAX_PIXELS, max_new_tokens=8)
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples)
+
+
+def upload(img, roi_on: bool):
+    """`img` fitted the way the client uploads it with GHOSTY_ROI off or on (and GHOSTY_MAX_PIXELS unset)."""
+    saved = {name: os.environ.pop(name, None) for name in ("GHOSTY_MAX_PIXELS", "GHOSTY_ROI")}
+    os.environ["GHOSTY_ROI"] = "1" if roi_on else "0"
+    try:
+        return screen_capture.fit_to_model(img)
+    finally:
+        for name, value in saved.items():
+            os.environ.pop(name, None)
+            if value is not None:
+                os.environ[name] = value
+
+
+def grounding_accuracy(native: tuple, font_px: int) -> dict:
+    """Text hits per view (full, crop, crop+roi) over every rendered text inside a region; prints one row per text."""
+    from PIL import Image
+
+    hits = {"full": 0, "crop": 0, "crop+roi": 0}
+    total = 0
+    print(f"{'screen':<7} {'text':<14} {'region':<8} {'upload':>11} {'zoom':>11}  full crop crop+roi")
+    for name in bench_text_index.SCREENS:
+        img, boxes = bench_text_index.render(name, native, font_px)
+        frames = {"off": upload(img, False), "on": upload(img, True)}
+        height, width = screen_capture.smart_resize(frames["off"].height, frames["off"].width, min_pixels=MIN_PIXELS, max_pixels=MAX_PIXELS)
+        full = frames["off"].resize((width, height), Image.BICUBIC)
+        indexes = {"full": text_index.build(full)}
+        for text, box in boxes.items():
+            region = next((r for r, (x0, y0, x1, y1) in roi.REGIONS.items()
+                           if x0 <= box[0] and box[2] <= x1 and y0 <= box[1] and box[3] <= y1), None)
+            if region is None:
+                continue
+            region_box = roi.box(region)
+            total += 1
+            row, zooms = [], []
+            for view, frame in (("full", None), ("crop", frames["off"]), ("crop+roi", frames["on"])):
+                if frame is None:
+                    position, _ = indexes["full"].lookup(text, region)
+                else:
+                    key = f"{view}:{region}"
+                    if key not in indexes:
+                        crop = roi.crop(frame, region_box)
+                        # Crop pixels per pixel of the region in the uploaded frame; above 1 they are upsampled
+                        indexes[key] = text_index.build(crop)
+                        indexes[key + ":zoom"] = crop.width / ((region_box[2] - region_box[0]) * frame.width)
+                    position, _ = indexes[key].lookup(text)
+                    position = roi.to_frame(position, region_box)
+                    zooms.append(indexes[key + ":zoom"])
+                hit = position is not None and box[0] <= position[0] <= box[2] and box[1] <= position[1] <= box[3]
+                hits[view] += hit
+                row.append("ok" if hit else ("miss" if position is None else "WRONG"))
+            print(f"{name:<7} {text[:14]:<14} {region:<8} {frames['off'].width:>5}/{frames['on'].width:<5} "
+                  f"{zooms[0]:>5.2f}/{zooms[1]:<5.2f}  {row[0]:<4} {row[1]:<4} {row[2]}")
+    print(f"hits of {total} texts: " + ", ".join(f"{view} {count}" for view, count in hits.items())
+          + f"   (upload and zoom: GHOSTY_ROI off/on, {native[0]}x{native[1]} native, {font_px}px text)")
+    return hits
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--targets", default=TARGETS)
+    parser.add_argument("--upload-max-pixels", type=int, help="GHOSTY_MAX_PIXELS for the uploaded frames")
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--native", default="5120x2880", help="display size the accuracy screens are rendered at")
+    parser.add_argument("--font-px", type=int, default=26, help="text height on the native display (13pt at 2x)")
+    args = parser.parse_args()
+    if args.upload_max_pixels:
+        os.environ["GHOSTY_MAX_PIXELS"] = str(args.upload_max_pixels)
+    os.environ.setdefault("GHOSTY_ARCHIVE_SCREENSHOTS", "0")
+
+    with open(args.targets, encoding="utf-8") as f:
+        targets = [json.loads(line) for line in f if line.strip()]
+    model, processor = tiny_qwen.load()
+
+    print(f"{'region':<8} {'prompt':<40} {'upload':>10} {'tokens':>13} {'zoom':>5} {'ms':>17} mapping")
+    totals = {"full": [], "roi": []}
+    failures = 0
+    for target in targets:
+        img = screen_capture.capture_frame(screen_capture.get_capture_backend(target["screen"]))["image"]
+        full, _ = showui_modal.crop_requests(img, [target["prompt"]])
+        cropped, boxes = showui_modal.crop_requests(img, [target["prompt"]], [target["region"]])
+        region_box = boxes[0]
+        # What the model sees: the full frame after the processor's resize, the crop as is
+        full_size = screen_capture.smart_resize(img.height, img.width, min_pixels=MIN_PIXELS, max_pixels=MAX_PIXELS)
+        crop_size = screen_capture.smart_resize(cropped[0][0].height, cropped[0][0].width, min_pixels=MIN_PIXELS, max_pixels=MAX_PIXELS)
+        zoom = crop_size[1] / ((region_box[2] - region_box[0]) * full_size[1])
+        tokens = {mode: showui_modal.vision_tokens(requests[0][0], MIN_PIXELS, MAX_PIXELS) for mode, requests in (("full", full), ("roi", cropped))}
+        ms = {mode: grounding_ms(model, processor, requests, args.runs) for mode, requests in (("full", full), ("roi", cropped))}
+
+        x0, y0, x1, y1 = target["box"]
+        rx0, ry0, rx1, ry1 = region_box
+        centre = [((x0 + x1) / 2 - rx0) / (rx1 - rx0), ((y0 + y1) / 2 - ry0) / (ry1 - ry0)]
+        mapped = showui_modal.parse_action(roi.map_answer(repr({"action": "CLICK", "value": None, "position": centre}), region_box))["position"]
+        inside = rx0 <= x0 and x1 <= rx1 and ry0 <= y0 and y1 <= ry1
+        ok = inside and x0 <= mapped[0] <= x1 and y0 <= mapped[1] <= y1
+        failures += not ok
+        for mode in totals:
+            totals[mode].append((tokens[mode], ms[mode]))
+        print(
+            f"{target['region']:<8} {target['prompt'][:40]:<40} {f'{img.width}x{img.height}':>10} "
+            f"{tokens['full']:>5} -> {tokens['roi']:>4} {zoom:>5.2f} {ms['full']:>7.1f} -> {ms['roi']:>6.1f} "
+            f"{'ok' if ok else 'FAIL'} {mapped}{'' if inside else ' (target outside the region)'}"
+        )
+
+    for mode, rows in totals.items():
+        print(f"{mode:<5} mean vision tokens {statistics.mean(t for t, _ in rows):7.1f}   median grounding {statistics.median(m for _, m in rows):7.1f} ms")
+
+    print()
+    if text_index.enabled():
+        hits = grounding_accuracy(tuple(int(v) for v in args.native.split("x")), args.font_px)
+        if hits["crop+roi"] < hits["crop"]:
+            print("crops of ROI uploads found fewer texts than crops of regular ones", file=sys.stderr)
+            failures += 1
+    else:
+        print("grounding accuracy skipped: pip install rapidocr-onnxruntime", file=sys.stderr)
+    if failures:
+        print(f"{failures} check(s) failed", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
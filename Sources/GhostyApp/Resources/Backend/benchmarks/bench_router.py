@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""Local intent router: hit rate and latency per turn, with and without it.
+
+Replays a session of intents through template_backend.generate_response
+in-process, against the local orchestrator stand-in (GHOSTY_LOCAL_INVOKE_MS
+simulates inference) and a synthetic screen. Fresh intents only, as the app
+sends them at the start of a task.
+
+    python benchmarks/bench_router.py --invoke-ms 1500 --rounds 3
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("GHOSTY_ARCHIVE_SCREENSHOTS", "0")
+os.environ["GHOSTY_SERVICES"] = "local"
+os.environ["GHOSTY_STREAM"] = "0"
+
+import intent_router  # noqa: E402
+import template_backend  # noqa: E402
+
+SESSION = [
+    "Hi Ghosty, are you there?",
+    "Tell my DIBZS group chat 67",
+    "Press enter",
+    "Thanks, I'm done",
+    "Open Safari and search for the weather",
+    "Scroll down",
+    "Never mind",
+    "What does that error mean?",
+    "Type 'on my way' in the chat box",
+    "Hit return",
+    "Go away",
+    "Thanks, that's all",
+]
+
+
+def run(intents: list, router: bool) -> list:
+    os.environ["GHOSTY_ROUTER"] = "1" if router else "0"
+    template_backend._router = None
+    samples = []
+    for intent in intents:
+        start = time.perf_counter()
+        template_backend.generate_response(intent)
+        samples.append((intent, (time.perf_counter() - start) * 1000))
+    return samples
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--invoke-ms", type=float, default=1500, help="simulated orchestrator inference per turn")
+    parser.add_argument("--rounds", type=int, default=3, help="times the session is replayed")
+    parser.add_argument("--size", default="2880x1800")
+    args = parser.parse_args()
+    os.environ["GHOSTY_LOCAL_INVOKE_MS"] = str(args.invoke_ms)
+    os.environ["GHOSTY_CAPTURE"] = f"synthetic:{args.size}"
+
+    intents = SESSION * args.rounds
+    template_backend.generate_response("warm up")  # imports, capture backend, stand-in lookup
+    without = run(intents, router=False)
+    routed = run(intents, router=True)
+    stats = template_backend._router.stats()
+
+    print(f"{'intent':<42} {'rule':<9} {'without':>10} {'with':>10}")
+    router = intent_router.IntentRouter()
+    for (intent, before_ms), (_, after_ms) in list(zip(without, routed))[: len(SESSION)]:
+        hit = router.route(intent)
+        print(f"{intent:<42} {hit[0] if hit else '-':<9} {before_ms:8.1f} ms {after_ms:8.1f} ms")
+    before = statistics.mean(ms for _, ms in without)
+    after = statistics.mean(ms for _, ms in routed)
+    print(
+        f"hit rate {stats['hit_rate']:.0%} ({stats['hits']}/{stats['hits'] + stats['misses']}, "
+        f"{stats['cache_hits']} from the recent-intent cache), mean route {stats['mean_route_ms'] * 1000:.0f} us"
+    )
+    print(f"mean turn {before:.1f} ms -> {after:.1f} ms; {stats['saved_ms'] / 1000:.1f} s saved over {len(intents)} turns")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
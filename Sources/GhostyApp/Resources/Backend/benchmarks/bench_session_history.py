@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""Structured session history: prompt tokens, prefill and upload size per turn.
+
+Replays a 10-turn task through orchestrator_modal.compare_session_prefill on
+a tiny random-weight Qwen2-VL on CPU, with the real SYSTEM_INSTRUCTIONS:
+
+  transcript  every turn re-sends the intent plus the app's full history in
+              its old free-text form; only the system prompt's KV is reused
+  session     the history lives in the session (session_history.py); the
+              turn sends the new action only and the session's KV cache from
+              the previous turn is extended by the lines that changed
+
+Exits non-zero if a session turn's output differs from the full-prefill
+path. Against Qwen2.5-VL-7B on Modal: `modal run orchestrator_modal.py::check_sessions`.
+
+    python benchmarks/bench_session_history.py --turns 10 --size 1288x784
+"""
+import argparse
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import orchestrator_modal  # noqa: E402
+import screen_capture  # noqa: E402
+import session_history  # noqa: E402
+import tiny_qwen  # noqa: E402
+
+INTENT = "Tell my DIBZS group chat that I'm running 10 minutes late"
+
+
+def task_actions(count: int) -> list:
+    """A messaging task that needs a few attempts: open the chat, type, send, with some misses."""
+    pattern = [
+        {"action": "CLICK", "position": [0.1, 0.31]},
+        {"action": "CLICK", "position": [0.1, 0.37]},
+        {"action": "CLICK", "position": [0.49, 0.94]},
+        {"action": "INPUT", "position": [0.49, 0.94], "value": "I'm running 10 minutes late"},
+        {"action": "ENTER", "position": None},
+    ]
+    return [pattern[i % len(pattern)] for i in range(count)]
+
+
+def upload_sizes(actions: list) -> list:
+    """Characters sent to the orchestrator per turn for the history: whole prompt vs. session payload."""
+    uploader = session_history.SessionUploader()
+    sizes = []
+    for turn in range(len(actions) + 1):
+        lines = [session_history.format_action(a) for a in actions[:turn]]
+        transcript = [
+            f"- Turn: {a['action']} at " + (f"Optional(({a['position'][0]}, {a['position'][1]}))" if a["position"] else "nil")
+            + (f" with value '{a['value']}'" if a.get("value") else "")
+            for a in actions[:turn]
+        ]
+        payload = uploader.prepare("session-1", INTENT, lines)
+        uploader.commit()
+        sizes.append((len(session_history.render_prompt(INTENT, transcript)), len(json.dumps(payload))))
+    return sizes
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--turns", type=int, default=10)
+    parser.add_argument("--size", default="1288x784", help="screenshot size; 'none' for text-only turns")
+    parser.add_argument("--max-new-tokens", type=int, default=16)
+    args = parser.parse_args()
+
+    model, processor = tiny_qwen.load()
+    img = None if args.size == "none" else screen_capture.get_capture_backend(f"synthetic:{args.size}").capture()
+    prefix = orchestrator_modal.build_prefix(model, processor)
+    actions = task_actions(args.turns - 1)
+    orchestrator_modal.compare_session_prefill(model, processor, prefix, INTENT, actions[:1], img, tiny_qwen.MIN_PIXELS, tiny_qwen.MAX_PIXELS, 2)  # warm-up
+    rows = orchestrator_modal.compare_session_prefill(
+        model, processor, prefix, INTENT, actions, img, tiny_qwen.MIN_PIXELS, tiny_qwen.MAX_PIXELS, args.max_new_tokens
+    )
+
+    print(f"system prompt prefix: {prefix['length']} tokens (reused by both)")
+    print(f"{'turn':>6} {'prompt tokens':>15} {'prefilled':>15} {'ttft ms':>19} {'history chars sent':>20}")
+    for row, (transcript_chars, session_chars) in zip(rows, upload_sizes(actions)):
+        print(
+            f"{'ok  ' if row['match'] else 'DIFF'}{row['turn']:>2} {row['transcript_tokens']:>6} -> {row['session_tokens']:<6} "
+            f"{row['transcript_prefilled']:>5} -> {row['session_prefilled']:<5} "
+            f"{row['transcript_ms']:>8.1f} -> {row['session_ms']:<8.1f} {transcript_chars:>7} -> {session_chars:<7}"
+        )
+    prefilled = sum(row["transcript_prefilled"] for row in rows), sum(row["session_prefilled"] for row in rows)
+    ms = sum(row["transcript_ms"] for row in rows), sum(row["session_ms"] for row in rows)
+    print(f"prefilled over the task: {prefilled[0]} -> {prefilled[1]} tokens; time to first token {ms[0]:.0f} -> {ms[1]:.0f} ms")
+    if not all(row["match"] for row in rows):
+        print("session outputs differ from the full-prefill path", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+"""Settle detection vs. the fixed one-second pause between turns, on a scripted synthetic screen.
+
+Each scenario is a UI reaction to the last turn's actions: nothing for
+`delay` seconds, then a panel sliding in for `duration` seconds, then still
+(the synthetic desktop's caret keeps moving throughout, as noise). For
+screen_settle.wait_for_settle and for the fixed pause it reports how long the
+loop waited and whether the next turn's frame would be the final one (fresh)
+or a screen still on its way there (stale). "video" never stops changing,
+"no effect" never changes, and "page load" starts reacting after the quiet
+period, which looks the same as no effect. Also prints the per-sample cost of the thumbnail
+and difference at the capture size.
+
+    python benchmarks/bench_settle.py --size 2880x1800
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import screen_capture  # noqa: E402
+import screen_settle  # noqa: E402
+
+FIXED_PAUSE = 1.0
+# name: (delay, duration) in seconds; duration None: changes forever, delay None: never changes
+SCENARIOS = [
+    ("selection", 0.03, 0.0),
+    ("menu", 0.05, 0.25),
+    ("sheet", 0.1, 0.6),
+    ("app launch", 0.4, 0.5),
+    ("slow window", 0.3, 0.9),
+    ("page load", 1.2, 0.3),
+    ("no effect", None, 0.0),
+    ("video", 0.05, None),
+]
+
+
+class ScriptedScreen(screen_capture.CaptureBackend):
+    """The synthetic desktop, reacting to an action at `acted_at` with a panel that slides in."""
+    name = "scripted"
+
+    def __init__(self, width: int, height: int, delay, duration, clock=time.monotonic):
+        self.desktop = screen_capture.SyntheticCaptureBackend(width, height)
+        self.delay = delay
+        self.duration = duration
+        self.clock = clock
+        self.acted_at = None
+
+    def progress(self, now: float = None) -> float:
+        """0 before the reaction, 1 once it is over; grows without bound for a never-ending one."""
+        if self.acted_at is None or self.delay is None:
+            return 0.0
+        elapsed = (self.clock() if now is None else now) - self.acted_at - self.delay
+        if elapsed <= 0:
+            return 0.0
+        if self.duration is None:
+            return elapsed / 0.1
+        return 1.0 if elapsed >= self.duration else elapsed / self.duration
+
+    def final_at(self):
+        if self.delay is None:
+            return self.acted_at
+        return None if self.duration is None else self.acted_at + self.delay + self.duration
+
+    def capture(self):
+        from PIL import ImageDraw
+
+        img = self.desktop.capture()
+        progress = self.progress()
+        if progress > 0:
+            w, h = img.size
+            draw = ImageDraw.Draw(img)
+            if self.duration is None:
+                # A playing video: a block whose brightness changes every frame
+                shade = int(progress * 60) % 200 + 30
+                draw.rectangle([int(0.72 * w), int(0.62 * h), int(0.98 * w), int(0.86 * h)], fill=(shade, shade, shade))
+            else:
+                left = int((1.0 - 0.45 * progress) * w)
+                draw.rectangle([left, int(0.62 * h), w, int(0.88 * h)], fill=(230, 230, 235))
+                if left + 20 < w - 20:
+                    draw.rectangle([left + 20, int(0.66 * h), w - 20, int(0.7 * h)], fill=(60, 120, 220))
+        return img
+
+
+def run(width: int, height: int, delay, duration) -> tuple:
+    screen = ScriptedScreen(width, height, delay, duration)
+    baseline = screen_settle.thumbnail(screen.capture())
+    screen.acted_at = time.monotonic()
+    result = screen_settle.wait_for_settle(screen, baseline)
+    returned_at = time.monotonic()
+    final_at = screen.final_at()
+    settle_fresh = final_at is not None and returned_at >= final_at
+    fixed_fresh = final_at is not None and screen.acted_at + FIXED_PAUSE >= final_at
+    return result, settle_fresh, fixed_fresh
+
+
+def sample_cost(width: int, height: int, runs: int = 20) -> float:
+    desktop = screen_capture.SyntheticCaptureBackend(width, height)
+    frames = [desktop.capture() for _ in range(2)]
+    previous = screen_settle.thumbnail(frames[1])
+    start = time.perf_counter()
+    for i in range(runs):
+        # One new thumbnail per sample, compared with the previous one (and the baseline)
+        frame = screen_settle.thumbnail(frames[i % 2])
+        screen_settle.changed_fraction(previous, frame)
+        screen_settle.changed_fraction(previous, frame)
+        previous = frame
+    return (time.perf_counter() - start) * 1000 / runs
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--size", default="1440x900", help="synthetic screen size, WxH")
+    args = parser.parse_args()
+    width, height = (int(v) for v in args.size.lower().split("x"))
+
+    print(f"thumbnail + difference: {sample_cost(width, height):.1f} ms per sample at {width}x{height} "
+          f"(interval {screen_settle.interval() * 1000:.0f} ms, quiet {screen_settle.quiet_period():.1f} s, "
+          f"timeout {screen_settle.timeout():.1f} s)")
+    print(f"{'scenario':<12} {'reaction':>13} {'settle':>9} {'reason':<10} {'samples':>7} {'frame':<6} {'fixed':>8} frame")
+    waited = {"settle": 0.0, "fixed": 0.0}
+    stale = {"settle": 0, "fixed": 0}
+    failures = 0
+    for name, delay, duration in SCENARIOS:
+        result, settle_fresh, fixed_fresh = run(width, height, delay, duration)
+        reaction = "none" if delay is None else f"{delay:.2f}+{'inf' if duration is None else f'{duration:.2f}'} s"
+        # Changing forever can't end fresh; the timeout is the right answer there
+        if duration is None:
+            expected = "timeout"
+        elif delay is None or delay >= screen_settle.quiet_period():
+            expected = "unchanged"
+        else:
+            expected = "settled"
+        failures += result["reason"] != expected or (expected == "settled" and not settle_fresh)
+        if duration is not None:
+            waited["settle"] += result["ms"]
+            waited["fixed"] += FIXED_PAUSE * 1000
+            stale["settle"] += delay is not None and not settle_fresh
+            stale["fixed"] += delay is not None and not fixed_fresh
+        print(
+            f"{name:<12} {reaction:>13} {result['ms']:>6.0f} ms {result['reason']:<10} {result['samples']:>7} "
+            f"{'fresh' if settle_fresh else 'stale':<6} {FIXED_PAUSE * 1000:>5.0f} ms {'fresh' if fixed_fresh else 'stale'}"
+        )
+    print(f"waited (finite reactions): settle {waited['settle']:.0f} ms, fixed {waited['fixed']:.0f} ms; "
+          f"stale frames: settle {stale['settle']}, fixed {stale['fixed']}")
+    if failures:
+        print(f"{failures} scenario(s) did not settle as expected", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""Async service client: fan-out and speculative chat-input grounding, offline.
+
+Runs against the local stand-ins for both services (GHOSTY_SERVICES=local),
+where reasoning and grounding are simulated delays. Two measurements:
+
+  fan-out      N ShowUI calls one after another with .remote() vs. together
+               through service_clients.fan_out (.remote.aio)
+  speculation  a replayed session through template_backend.generate_response.
+               For messaging intents the orchestrator locates the chat input
+               while it reasons (orchestrator_modal.speculate); the type step
+               then uses that answer instead of calling ShowUI after reasoning.
+
+    python benchmarks/bench_speculation.py --invoke-ms 1500 --showui-ms 400
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("GHOSTY_ARCHIVE_SCREENSHOTS", "0")
+os.environ["GHOSTY_SERVICES"] = "local"
+os.environ["GHOSTY_STREAM"] = "0"
+os.environ["GHOSTY_ROUTER"] = "0"
+os.environ["GHOSTY_PLAN"] = "0"  # one step per turn; plan continuation is measured by replay_sessions.py
+
+import screen_capture  # noqa: E402
+import service_clients  # noqa: E402
+import template_backend  # noqa: E402
+
+HISTORY = "\n\nACTION HISTORY:\n"
+# (intent, follow-up turns as the app sends them: the intent plus the actions so far)
+SESSION = [
+    ("Tell my DIBZS group chat 67", [
+        "- Turn: CLICK at Optional((0.1, 0.3))",
+        "- Turn: CLICK at Optional((0.1, 0.3))\n- Turn: INPUT at Optional((0.49, 0.94)) with value '67'",
+    ]),
+    ("Open Safari and search for the weather", []),
+    ("Reply 'on my way' to Sam", [
+        "- Turn: CLICK at Optional((0.1, 0.3))",
+        "- Turn: CLICK at Optional((0.1, 0.3))\n- Turn: INPUT at Optional((0.49, 0.94)) with value 'on my way'",
+    ]),
+    ("Scroll down", []),
+    ("Message the team that the build is green", []),
+]
+
+
+def turns() -> list:
+    prompts = []
+    for intent, follow_ups in SESSION:
+        prompts.append((intent, intent))
+        prompts += [(intent, intent + HISTORY + history) for history in follow_ups]
+    return prompts
+
+
+def bench_fan_out(calls: int) -> tuple:
+    showui = service_clients.get("showui")
+    frame = screen_capture.capture_frame(screen_capture.get_capture_backend("synthetic:1288x784"))["data"]
+    prompts = [f"Click item {i}" for i in range(calls)]
+
+    start = time.perf_counter()
+    sequential = [showui.run_inference.remote(image_bytes=frame, prompt=prompt) for prompt in prompts]
+    sequential_ms = (time.perf_counter() - start) * 1000
+    start = time.perf_counter()
+    concurrent = service_clients.run(service_clients.fan_out(
+        *(service_clients.call(showui.run_inference, image_bytes=frame, prompt=prompt) for prompt in prompts)
+    ))
+    fan_out_ms = (time.perf_counter() - start) * 1000
+    assert concurrent == sequential
+    return sequential_ms, fan_out_ms
+
+
+def replay(speculate: bool) -> list:
+    os.environ["GHOSTY_SPECULATE"] = "1" if speculate else "0"
+    samples = []
+    for intent, prompt in turns():
+        start = time.perf_counter()
+        template_backend.generate_response(prompt)
+        samples.append((intent, prompt, (time.perf_counter() - start) * 1000))
+    return samples
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--invoke-ms", type=float, default=1500, help="simulated orchestrator reasoning per turn")
+    parser.add_argument("--showui-ms", type=float, default=400, help="simulated ShowUI grounding per call")
+    parser.add_argument("--calls", type=int, default=4, help="ShowUI calls in the fan-out measurement")
+    parser.add_argument("--size", default="2880x1800")
+    args = parser.parse_args()
+    os.environ["GHOSTY_LOCAL_INVOKE_MS"] = str(args.invoke_ms)
+    os.environ["GHOSTY_LOCAL_SHOWUI_MS"] = str(args.showui_ms)
+    os.environ["GHOSTY_CAPTURE"] = f"synthetic:{args.size}"
+
+    sequential_ms, fan_out_ms = bench_fan_out(args.calls)
+    print(f"fan-out: {args.calls} ShowUI calls sequential {sequential_ms:7.1f} ms, concurrent {fan_out_ms:7.1f} ms")
+
+    template_backend.generate_response("warm up")  # imports, capture backend, handles
+    without = replay(speculate=False)
+    before = service_clients.prefetch_stats()
+    with_speculation = replay(speculate=True)
+    after = service_clients.prefetch_stats()
+
+    print(f"\n{'turn':<52} {'without':>10} {'with':>10}")
+    for (intent, prompt, before_ms), (_, _, after_ms) in zip(without, with_speculation):
+        label = intent if prompt == intent else "  + follow-up"
+        print(f"{label[:52]:<52} {before_ms:8.1f} ms {after_ms:8.1f} ms")
+    started = after["started"] - before["started"]
+    used = after["used"] - before["used"]
+    print(
+        f"speculative groundings: {started} started, {used} used, {after['wasted'] - before['wasted']} wasted"
+    )
+    print(
+        f"mean turn {statistics.mean(ms for *_, ms in without):.1f} ms -> "
+        f"{statistics.mean(ms for *_, ms in with_speculation):.1f} ms"
+    )
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+"""Text-index grounding: ShowUI calls avoided, and index build time vs. a ShowUI call.
+
+Renders three screens with real text (a chat app, a file browser, a login
+form) at the size the client uploads, builds their text index with the OCR
+the orchestrator uses (text_index.build, RapidOCR on the CPU), and resolves
+every step in corpus/text_targets.jsonl the way execute_gui_actions does
+(plan_gui_action's target and target_region, TextIndex.lookup). A step is:
+
+  resolved   found in the index; must land in the expected text's box (else WRONG)
+  fallback   missing, ambiguous or not a named target: ShowUI grounds it as before
+
+"expect": null marks steps that must fall back. Then every step is timed end
+to end through execute_gui_actions against the local ShowUI stand-in
+(--showui-ms per call; measure yours as orchestrator/showui in
+trace_summary.py), with and without the index. The index of each screen is
+started as the frame arrives and gets --invoke-ms of simulated reasoning to
+finish; if it hasn't, grounding waits up to GHOSTY_TEXT_INDEX_WAIT_MS (default
+0) and falls back to ShowUI. A last run has the decision arrive right away,
+before any index is built, which must cost about what ShowUI alone does.
+
+    python benchmarks/bench_text_index.py --showui-ms 400 --invoke-ms 1500
+"""
+import argparse
+import contextlib
+import json
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ["GHOSTY_SERVICES"] = "local"
+
+import frame_cache  # noqa: E402
+import orchestrator_modal  # noqa: E402
+import screen_capture  # noqa: E402
+import text_index  # noqa: E402
+
+TARGETS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "corpus", "text_targets.jsonl")
+SIZE = (1288, 784)
+# Per screen: (text, left, top) in 0-1 coordinates, drawn on a dark sidebar + light content layout
+SCREENS = {
+    "chat": [
+        ("DIBZS", 0.03, 0.10), ("Family", 0.03, 0.17), ("Work chat", 0.03, 0.24), ("Sam", 0.03, 0.31),
+        ("Mom", 0.03, 0.38), ("Team", 0.03, 0.45), ("New Message", 0.82, 0.03),
+        ("Sam: running late, start without me", 0.42, 0.30), ("Mom: call me when you can", 0.42, 0.40),
+        ("Team meeting moved to 3pm", 0.42, 0.50), ("iMessage", 0.42, 0.92),
+    ],
+    "finder": [
+        ("Recents", 0.03, 0.10), ("Applications", 0.03, 0.16), ("Desktop", 0.03, 0.22), ("Documents", 0.03, 0.28),
+        ("Downloads", 0.03, 0.34), ("Report.pdf", 0.42, 0.12), ("Budget 2025.xlsx", 0.42, 0.19),
+        ("Downloads.zip", 0.42, 0.26), ("Notes.txt", 0.42, 0.33),
+    ],
+    "login": [
+        ("Sign in to Acme", 0.42, 0.20), ("Username", 0.42, 0.32), ("Password", 0.42, 0.44),
+        ("Remember me", 0.45, 0.55), ("Login", 0.47, 0.64), ("Forgot password?", 0.42, 0.74),
+    ],
+}
+
+
+def render(name: str, size: tuple = SIZE, font_px: int = 17) -> tuple:
+    """The screen as an RGB image and each text's normalized (x0, y0, x1, y1) box."""
+    from PIL import Image, ImageDraw, ImageFont
+
+    width, height = size
+    img = Image.new("RGB", size, (246, 246, 248))
+    draw = ImageDraw.Draw(img)
+    draw.rectangle([0, 0, int(0.25 * width), height], fill=(36, 38, 44))
+    font = ImageFont.load_default(size=font_px)
+    boxes = {}
+    for text, x, y in SCREENS[name]:
+        position = (int(x * width), int(y * height))
+        fill = (235, 235, 240) if x < 0.25 else (30, 30, 35)
+        draw.text(position, text, fill=fill, font=font)
+        x0, y0, x1, y1 = draw.textbbox(position, text, font=font)
+        boxes[text] = (x0 / width, y0 / height, x1 / width, y1 / height)
+    return img, boxes
+
+
+def grounding_ms(steps: list, images: dict, invoke_ms: float, use_index: bool) -> list:
+    """Wall time of execute_gui_actions per step, each screen's frame arriving `invoke_ms` before its first step."""
+    os.environ["GHOSTY_TEXT_INDEX"] = "1" if use_index else "0"
+    samples = []
+    for name, img in images.items():
+        key = frame_cache.frame_key(img)
+        data = screen_capture.encode_image(img)
+        orchestrator_modal.text_indexes.start(key, img)
+        time.sleep(invoke_ms / 1000)
+        for step in steps:
+            if step["screen"] != name:
+                continue
+            start = time.perf_counter()
+            orchestrator_modal.execute_gui_actions([step["instruction"]], data, key)
+            samples.append((time.perf_counter() - start) * 1000)
+    return samples
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--targets", default=TARGETS)
+    parser.add_argument("--showui-ms", type=float, default=400, help="one ShowUI grounding call, to compare with")
+    parser.add_argument("--invoke-ms", type=float, default=1500, help="reasoning time the index build overlaps with")
+    parser.add_argument("--runs", type=int, default=3, help="index builds per screen")
+    args = parser.parse_args()
+    os.environ["GHOSTY_LOCAL_SHOWUI_MS"] = str(args.showui_ms)
+    if not text_index.enabled():
+        print("text index unavailable: pip install rapidocr-onnxruntime (or unset GHOSTY_TEXT_INDEX=0)", file=sys.stderr)
+        return 1
+
+    with open(args.targets, encoding="utf-8") as f:
+        steps = [json.loads(line) for line in f if line.strip()]
+
+    indexes, boxes, build_ms, images = {}, {}, {}, {}
+    start = time.perf_counter()
+    text_index.build(render("chat")[0])
+    first_ms = (time.perf_counter() - start) * 1000
+    for name in SCREENS:
+        img, boxes[name] = render(name)
+        images[name] = img
+        builds = [text_index.build(img) for _ in range(args.runs)]
+        indexes[name] = builds[-1]
+        build_ms[name] = statistics.median(index.build_ms for index in builds)
+
+    print(f"{'screen':<7} {'instruction':<58} {'target':<18} {'outcome':<10} result")
+    resolved = wrong = 0
+    lookup_ms = []
+    for step in steps:
+        plan = orchestrator_modal.plan_gui_action(step["instruction"])
+        target = plan.get("target")
+        outcome, position = "untargeted", None
+        if target:
+            start = time.perf_counter()
+            position, outcome = indexes[step["screen"]].lookup(target, plan["target_region"])
+            lookup_ms.append((time.perf_counter() - start) * 1000)
+        verdict = "fallback"
+        if position is not None:
+            resolved += 1
+            box = boxes[step["screen"]].get(step["expect"]) if step["expect"] else None
+            hit = box is not None and box[0] <= position[0] <= box[2] and box[1] <= position[1] <= box[3]
+            wrong += not hit
+            verdict = f"{position} {'ok' if hit else 'WRONG'}"
+        elif step["expect"]:
+            verdict = "fallback (expected a match)"
+        print(f"{step['screen']:<7} {step['instruction'][:58]:<58} {str(target)[:18]:<18} {outcome:<10} {verdict}")
+
+    named = sum(1 for step in steps if step["expect"])
+    build = statistics.mean(build_ms.values())
+    print()
+    print(f"ShowUI calls avoided: {resolved} of {len(steps)} grounding steps ({resolved / len(steps):.0%}); "
+          f"{named} name text on screen; wrong: {wrong}")
+    print(f"index build: {', '.join(f'{name} {ms:.0f} ms' for name, ms in build_ms.items())} "
+          f"(first build incl. model load {first_ms:.0f} ms); lookup {statistics.mean(lookup_ms):.2f} ms mean")
+    print(f"one ShowUI call: {args.showui_ms:.0f} ms; mean index build: {build:.0f} ms, "
+          f"overlapping {args.invoke_ms:.0f} ms of reasoning")
+
+    # Its [Orchestrator] logging would drown the report
+    with contextlib.redirect_stdout(sys.stderr):
+        showui_only = grounding_ms(steps, images, args.invoke_ms, use_index=False)
+        with_index = grounding_ms(steps, images, args.invoke_ms, use_index=True)
+        print(f"text index: {orchestrator_modal.text_indexes.stats()}", file=sys.__stdout__)
+        # Fresh indexes, so none is built when the decision arrives
+        orchestrator_modal.text_indexes = text_index.IndexCache(capacity=16)
+        before_build = grounding_ms(steps, images, 0, use_index=True)
+        print(f"text index, decision first: {orchestrator_modal.text_indexes.stats()}", file=sys.__stdout__)
+    for label, samples in (("ShowUI only", showui_only), ("with index", with_index), ("before build", before_build)):
+        print(f"grounding per step, {label:<12} mean {statistics.mean(samples):7.1f} ms   p50 {statistics.median(samples):7.1f} ms")
+    if wrong:
+        print(f"{wrong} step(s) resolved to the wrong place", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
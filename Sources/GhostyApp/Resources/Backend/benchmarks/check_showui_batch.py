@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+"""Checks that ShowUI's batched grounding path answers exactly like the sequential one.
+
+Runs showui_modal.compare_batch: generate_requests (one vision-tower pass, one
+padded batch) against generate_single per prompt on a tiny random-weight
+Qwen2-VL on CPU, and reports the time of each. The same comparison against the
+real ShowUI-2B on Modal, through the served batcher and without the grounding
+cache, is `modal run showui_modal.py::check_batch`.
+
+    python benchmarks/check_showui_batch.py --prompts 4 --size 1288x784
+"""
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import screen_capture  # noqa: E402
+import showui_modal  # noqa: E402
+import tiny_qwen  # noqa: E402
+
+PROMPTS = [
+    "Click the DIBZS chat on the left side",
+    "Click on the text input field or chat box where a message can be typed.",
+    "Type '67' in the chat box",
+    "Click the search icon.",
+    "Scroll down the page.",
+    "Open the settings menu in the top right corner",
+]
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--prompts", type=int, default=4)
+    parser.add_argument("--size", default="1288x784")
+    parser.add_argument("--max-new-tokens", type=int, default=32)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    model, processor = tiny_qwen.load(seed=args.seed)
+    img = screen_capture.get_capture_backend(f"synthetic:{args.size}").capture()
+    prompts = (PROMPTS * args.prompts)[: args.prompts]
+    pixels = dict(min_pixels=tiny_qwen.MIN_PIXELS, max_pixels=tiny_qwen.MAX_PIXELS)
+
+    report = showui_modal.compare_batch(
+        model, processor, img, prompts, **pixels, max_new_tokens=args.max_new_tokens,
+        run=lambda requests: showui_modal.generate_requests(model, processor, requests, **pixels, max_new_tokens=args.max_new_tokens),
+    )
+    sequential, batched = report["reference"], report["batched"]
+
+    for prompt, a, b in zip(prompts, sequential, batched):
+        print(f"{'ok  ' if a == b else 'DIFF'} {prompt[:50]:<50} {a[:40]!r}")
+    print(f"sequential {report['reference_s'] * 1000:8.1f} ms   batched {report['batched_s'] * 1000:8.1f} ms   ({len(prompts)} prompts)")
+    if sequential != batched:
+        print("batched outputs differ from the sequential path", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
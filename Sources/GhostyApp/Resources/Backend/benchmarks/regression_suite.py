@@ -0,0 +1,276 @@
+#!/usr/bin/env python3
+"""Offline benchmark and regression suite for the backend, no Modal or GPU needed.
+
+Runs a recorded corpus of screenshots, prompts and model outputs
+(corpus/cases.jsonl) through the backend code against the local stand-ins
+for both services (GHOSTY_SERVICES=local):
+
+  turn        template_backend.generate_response: route, capture, frame upload, orchestrator call
+  gui_action  orchestrator_modal.execute_gui_action for every step of each recorded decision
+  routing     orchestrator_modal.route_output on each recorded model output, the JSON
+              parsing and tool routing of OrchestratorAgent.invoke
+  decide      with --model tiny: a tiny random-weight Qwen2-VL on the CPU writes the decision
+              (prefix cache, DECISION_GRAMMAR, as OrchestratorAgent does) and it is routed
+
+A case is {"prompt", "screen", "output"}: "screen" is a capture backend spec
+(synthetic:WxH, or file:<path> relative to the corpus), "output" the model's
+raw decision text. Each scenario reports throughput, latency (mean, p50, p95,
+max), the bytes sent to and received from the stand-ins per operation, the
+peak RSS so far, and a digest of its responses; the stand-ins are
+deterministic, so the digest only changes with behaviour.
+
+--output writes the report as JSON. With --baseline (an earlier --output) the
+suite exits non-zero when a latency, byte or memory figure grows by more than
+--tolerance (plus --slack-ms for latencies), the time per operation behind the
+throughput does, or a digest changes. --budget scenario.metric=value adds
+absolute ceilings.
+
+    python benchmarks/regression_suite.py --repeat 5 --output baseline.json
+    python benchmarks/regression_suite.py --repeat 5 --baseline baseline.json --budget turn.p95_ms=80
+"""
+import argparse
+import contextlib
+import hashlib
+import json
+import os
+import statistics
+import sys
+import time
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+os.environ["GHOSTY_SERVICES"] = "local"
+os.environ["GHOSTY_STREAM"] = "0"
+os.environ["GHOSTY_ARCHIVE_SCREENSHOTS"] = "0"
+os.environ.pop("GHOSTY_SESSION_LOG", None)
+os.environ.pop("GHOSTY_TRACE", None)
+# On Modal the text index OCR runs on the orchestrator's CPUs; in-process it would compete with the client measured here
+os.environ.setdefault("GHOSTY_TEXT_INDEX", "0")
+
+import frame_cache  # noqa: E402
+import local_services  # noqa: E402
+import orchestrator_modal  # noqa: E402
+import screen_capture  # noqa: E402
+import template_backend  # noqa: E402
+
+CORPUS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "corpus", "cases.jsonl")
+SCENARIOS = ("turn", "gui_action", "routing", "decide")
+# Figures where more is worse; throughput is the one where less is
+WORSE_IF_HIGHER = ("p50_ms", "p95_ms", "sent_bytes_per_op", "received_bytes_per_op", "rss_mb")
+
+
+def load_corpus(path: str) -> list:
+    cases = []
+    with open(os.path.expanduser(path), encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                cases.append(json.loads(line))
+    return cases
+
+
+def capture_backend(spec: str, corpus: str):
+    name, _, arg = spec.partition(":")
+    if name == "file" and not os.path.isabs(arg):
+        spec = "file:" + os.path.join(os.path.dirname(os.path.abspath(corpus)), arg)
+    return screen_capture.get_capture_backend(spec)
+
+
+def rss_mb() -> float:
+    import resource
+
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def percentile(samples: list, q: float) -> float:
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(round(q * (len(samples) - 1))))]
+
+
+def measure(run, items: list, repeat: int, warmup: int) -> dict:
+    """Times run(item) for every item, `repeat` times after `warmup` untimed passes."""
+    for _ in range(warmup):
+        for item in items:
+            run(item)
+    local_services.reset_transfer_stats()
+    digest = hashlib.sha256()
+    samples = []
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for item in items:
+            call_start = time.perf_counter()
+            result = run(item)
+            samples.append((time.perf_counter() - call_start) * 1000)
+            digest.update(json.dumps(result).encode("utf-8"))
+    wall = time.perf_counter() - start
+    transfers = local_services.transfer_stats().values()
+    ops = max(1, len(samples))
+    return {
+        "ops": len(samples),
+        "throughput": len(samples) / wall if wall else 0.0,
+        "mean_ms": statistics.mean(samples) if samples else 0.0,
+        "p50_ms": statistics.median(samples) if samples else 0.0,
+        "p95_ms": percentile(samples, 0.95) if samples else 0.0,
+        "max_ms": max(samples, default=0.0),
+        "remote_calls": sum(t["calls"] for t in transfers),
+        "sent_bytes_per_op": sum(t["sent_bytes"] for t in transfers) / ops,
+        "received_bytes_per_op": sum(t["received_bytes"] for t in transfers) / ops,
+        "rss_mb": rss_mb(),
+        "digest": digest.hexdigest()[:16],
+    }
+
+
+def frames_for(cases: list, corpus: str) -> list:
+    """The fitted, encoded frame of each case, as the client would upload it; (bytes, key, image)."""
+    frames = []
+    for case in cases:
+        frame = screen_capture.capture_frame(capture_backend(case["screen"], corpus))
+        frames.append((frame["data"], frame_cache.frame_key(frame["image"]), frame["image"]))
+    return frames
+
+
+def turn_scenario(cases: list, corpus: str):
+    backends = [capture_backend(case["screen"], corpus) for case in cases]
+
+    def run(i):
+        template_backend._capture_backend = backends[i]
+        template_backend._last_turn.clear()
+        return template_backend.generate_response(cases[i]["prompt"])
+    return run, list(range(len(cases)))
+
+
+def gui_action_scenario(cases: list, frames: list):
+    steps = []
+    for case, (data, key, _) in zip(cases, frames):
+        try:
+            decision = orchestrator_modal.parse_decision(case["output"])
+        except json.JSONDecodeError:
+            continue
+        if decision.get("tool") == "gui_action":
+            steps += [(step, data, key) for step in decision["tool_input"]]
+
+    def run(step):
+        return orchestrator_modal.execute_gui_action(*step)
+    return run, steps
+
+
+def routing_scenario(cases: list, frames: list):
+    def run(i):
+        data, key, _ = frames[i]
+        return orchestrator_modal.route_output(cases[i]["output"], data, key)
+    return run, list(range(len(cases)))
+
+
+def decide_scenario(cases: list, frames: list, max_new_tokens: int):
+    import tiny_qwen
+
+    model, processor = tiny_qwen.load()
+    prefix = orchestrator_modal.build_prefix(model, processor)
+
+    def run(i):
+        data, key, img = frames[i]
+        messages = orchestrator_modal.build_messages(cases[i]["prompt"], img, tiny_qwen.MIN_PIXELS, tiny_qwen.MAX_PIXELS)
+        output = orchestrator_modal.generate_many(
+            model, processor, [messages], prefix, max_new_tokens, grammar=orchestrator_modal.DECISION_GRAMMAR,
+        )[0]
+        return orchestrator_modal.route_output(output, data, key)
+    return run, list(range(len(cases)))
+
+
+def regressions(report: dict, baseline: dict, tolerance: float, slack_ms: float, budgets: dict) -> list:
+    failures = []
+    for name, current in report["scenarios"].items():
+        before = baseline.get("scenarios", {}).get(name) if baseline else None
+        if before is not None:
+            if current["digest"] != before["digest"]:
+                failures.append(f"{name}: responses changed (digest {before['digest']} -> {current['digest']})")
+            for metric in WORSE_IF_HIGHER:
+                slack = slack_ms if metric.endswith("_ms") else 0.0
+                if current[metric] > before[metric] * (1 + tolerance) + slack:
+                    failures.append(f"{name}.{metric}: {before[metric]:.1f} -> {current[metric]:.1f}")
+            # Throughput as time per operation, so the slack applies to sub-millisecond operations too
+            if current["throughput"] and before["throughput"] and 1000 / current["throughput"] > 1000 / before["throughput"] * (1 + tolerance) + slack_ms:
+                failures.append(f"{name}.throughput: {before['throughput']:.1f} -> {current['throughput']:.1f} ops/s")
+        for metric, limit in budgets.get(name, {}).items():
+            if current[metric] > limit:
+                failures.append(f"{name}.{metric}: {current[metric]:.1f} over the budget of {limit:g}")
+    return failures
+
+
+def parse_budgets(specs: list) -> dict:
+    budgets = {}
+    for spec in specs:
+        key, _, value = spec.partition("=")
+        scenario, _, metric = key.partition(".")
+        budgets.setdefault(scenario, {})[metric] = float(value)
+    return budgets
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--corpus", default=CORPUS)
+    parser.add_argument("--scenarios", default="turn,gui_action,routing", help=f"any of {','.join(SCENARIOS)}")
+    parser.add_argument("--repeat", type=int, default=3, help="timed passes over the corpus")
+    parser.add_argument("--warmup", type=int, default=1, help="untimed passes first")
+    parser.add_argument("--model", choices=("none", "tiny"), default="none", help="tiny adds the decide scenario")
+    parser.add_argument("--max-new-tokens", type=int, default=64, help="decide scenario")
+    parser.add_argument("--invoke-ms", type=float, default=0.0, help="simulated orchestrator inference")
+    parser.add_argument("--showui-ms", type=float, default=0.0, help="simulated ShowUI grounding")
+    parser.add_argument("--output", help="write the report as JSON")
+    parser.add_argument("--baseline", help="an earlier --output to compare with")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed relative growth (default 0.25)")
+    parser.add_argument("--slack-ms", type=float, default=2.0, help="allowed absolute latency growth on top (default 2)")
+    parser.add_argument("--budget", action="append", default=[], metavar="SCENARIO.METRIC=VALUE")
+    args = parser.parse_args()
+    os.environ["GHOSTY_LOCAL_INVOKE_MS"] = str(args.invoke_ms)
+    os.environ["GHOSTY_LOCAL_SHOWUI_MS"] = str(args.showui_ms)
+
+    cases = load_corpus(args.corpus)
+    names = [name for name in args.scenarios.split(",") if name]
+    if args.model == "tiny" and "decide" not in names:
+        names.append("decide")
+    frames = frames_for(cases, args.corpus)
+    report = {"time": time.time(), "corpus": os.path.abspath(args.corpus), "cases": len(cases), "repeat": args.repeat, "scenarios": {}}
+    # The tool code prints its [Orchestrator] log to stdout; the report owns stdout here
+    with contextlib.redirect_stdout(sys.stderr):
+        for name in names:
+            if name == "turn":
+                run, items = turn_scenario(cases, args.corpus)
+            elif name == "gui_action":
+                run, items = gui_action_scenario(cases, frames)
+            elif name == "routing":
+                run, items = routing_scenario(cases, frames)
+            elif name == "decide":
+                run, items = decide_scenario(cases, frames, args.max_new_tokens)
+            else:
+                parser.error(f"unknown scenario {name!r}")
+            report["scenarios"][name] = measure(run, items, args.repeat, args.warmup)
+
+    print(f"{len(cases)} cases x {args.repeat}")
+    print(
+        f"{'scenario':<11} {'ops':>5} {'ops/s':>8} {'mean ms':>8} {'p50 ms':>8} {'p95 ms':>8} {'max ms':>8} "
+        f"{'calls':>6} {'sent B/op':>10} {'recv B/op':>10} {'RSS MiB':>8}  digest"
+    )
+    for name, row in report["scenarios"].items():
+        print(
+            f"{name:<11} {row['ops']:>5} {row['throughput']:>8.1f} {row['mean_ms']:>8.2f} {row['p50_ms']:>8.2f} {row['p95_ms']:>8.2f} "
+            f"{row['max_ms']:>8.2f} {row['remote_calls']:>6} {row['sent_bytes_per_op']:>10.0f} {row['received_bytes_per_op']:>10.0f} "
+            f"{row['rss_mb']:>8.1f}  {row['digest']}"
+        )
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+    failures = regressions(report, baseline, args.tolerance, args.slack_ms, parse_budgets(args.budget))
+    for failure in failures:
+        print(f"REGRESSION {failure}", file=sys.stderr)
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+"""Replays recorded sessions through the agent loop, with and without plans.
+
+Each task is driven the way GhostAssistantModel.swift drives it: structured
+turns under a session id carrying the actions executed since the previous
+turn (template_backend.generate_turn), at most 10 turns, stopping
+on TASK_STATUS: completed, COMMAND_HIDE_GHOSTY or two ENTER-only turns in a
+row. Runs against the local stand-ins (GHOSTY_SERVICES=local), where
+reasoning, precondition checks and grounding are simulated delays, once with
+GHOSTY_PLAN=0 (one step per turn, reasoning every turn) and once with plans
+continued through continue_plan().
+
+Sessions are JSON lines with a "prompt" each; prompts without an ACTION
+HISTORY are the tasks. A log written with GHOSTY_SESSION_LOG can be replayed
+as is. Tasks marked "stuck": true keep getting the same frame, so plan
+preconditions fail and the orchestrator re-plans.
+
+Reasoning calls include re-plans after a failed precondition. Wall time per
+task is the backend's time plus the app's settle time between turns
+(--settle-ms).
+
+    python benchmarks/replay_sessions.py --sessions ~/Ghosty/sessions.jsonl --invoke-ms 1500
+"""
+import argparse
+import json
+import os
+import re
+import statistics
+import sys
+import time
+import uuid
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("GHOSTY_ARCHIVE_SCREENSHOTS", "0")
+os.environ["GHOSTY_SERVICES"] = "local"
+os.environ["GHOSTY_STREAM"] = "0"
+os.environ.pop("GHOSTY_SESSION_LOG", None)
+
+import screen_capture  # noqa: E402
+import service_clients  # noqa: E402
+import template_backend  # noqa: E402
+
+EXAMPLE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "sessions", "example.jsonl")
+MAX_TURNS = 10
+# GhostAssistantModel.parseAndExecuteGUIAction's pattern
+ACTION = re.compile(r"\{[^\}]*['\"]action['\"]\s*:\s*.*?\}", re.DOTALL)
+
+
+class FrozenCaptureBackend(screen_capture.CaptureBackend):
+    """The same frame every time: the UI never reacts."""
+    name = "frozen"
+
+    def __init__(self, backend):
+        self.frame = backend.capture()
+
+    def capture(self):
+        return self.frame.copy()
+
+
+def load_tasks(path: str) -> list:
+    tasks = []
+    with open(os.path.expanduser(path), encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            entry = json.loads(line)
+            if template_backend.HISTORY_MARKER not in entry["prompt"]:
+                tasks.append((entry["prompt"], bool(entry.get("stuck"))))
+    return tasks
+
+
+def parse_actions(response: str) -> list:
+    actions = []
+    for match in ACTION.finditer(response):
+        text = match.group(0)
+        try:
+            action = json.loads(text)
+        except json.JSONDecodeError:
+            try:
+                action = json.loads(text.replace("None", "null").replace("'", '"'))
+            except json.JSONDecodeError:
+                continue
+        if isinstance(action.get("action"), str):
+            actions.append(action)
+    return actions
+
+
+def run_task(intent: str, settle_ms: float) -> dict:
+    orchestrator = service_clients.get("orchestrator")
+    decisions, checks = orchestrator.decisions, orchestrator.checks
+    session = uuid.uuid4().hex
+    history = []
+    stats = {"turns": 0, "backend_ms": 0.0, "wall_ms": 0.0, "completed": False}
+    enters = 0
+    sent = 0
+    while stats["turns"] < MAX_TURNS:
+        stats["turns"] += 1
+        turn = {"session": session, "intent": intent, "base": sent, "actions": history[sent:]}
+        template_backend._last_turn.clear()
+        start = time.perf_counter()
+        response = template_backend.generate_turn(turn)
+        sent = len(history)
+        ms = (time.perf_counter() - start) * 1000
+        stats["backend_ms"] += ms
+        stats["wall_ms"] += ms
+        if "COMMAND_HIDE_GHOSTY" in response:
+            stats["completed"] = True
+            break
+        actions = parse_actions(response)
+        history += [{key: action.get(key) for key in ("action", "position", "value") if action.get(key) is not None} for action in actions]
+        enters = enters + 1 if len(actions) == 1 and actions[0]["action"] == "ENTER" else 0
+        if enters >= 2 or "TASK_STATUS: completed" in response:
+            stats["completed"] = True
+            break
+        stats["wall_ms"] += settle_ms
+    # Re-plans after a failed precondition count as reasoning
+    stats["reasoning"] = orchestrator.decisions - decisions
+    stats["checks"] = orchestrator.checks - checks
+    return stats
+
+
+def replay(tasks: list, plan: bool, settle_ms: float) -> list:
+    os.environ["GHOSTY_PLAN"] = "1" if plan else "0"
+    template_backend.PLAN = plan
+    results = []
+    for intent, stuck in tasks:
+        template_backend._plan = None
+        backend = template_backend._capture_backend
+        if stuck:
+            template_backend._capture_backend = FrozenCaptureBackend(backend)
+        try:
+            results.append(run_task(intent, settle_ms))
+        finally:
+            template_backend._capture_backend = backend
+    return results
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sessions", default=EXAMPLE, help="session JSONL (default: benchmarks/sessions/example.jsonl)")
+    parser.add_argument("--invoke-ms", type=float, default=1500, help="simulated orchestrator reasoning per call")
+    parser.add_argument("--check-ms", type=float, default=150, help="simulated precondition check")
+    parser.add_argument("--showui-ms", type=float, default=400, help="simulated ShowUI grounding per call")
+    parser.add_argument("--settle-ms", type=float, default=1000, help="the app's settle time between turns")
+    parser.add_argument("--size", default="1288x784")
+    args = parser.parse_args()
+    os.environ["GHOSTY_LOCAL_INVOKE_MS"] = str(args.invoke_ms)
+    os.environ["GHOSTY_LOCAL_CHECK_MS"] = str(args.check_ms)
+    os.environ["GHOSTY_LOCAL_SHOWUI_MS"] = str(args.showui_ms)
+    os.environ["GHOSTY_CAPTURE"] = f"synthetic:{args.size}"
+
+    tasks = load_tasks(args.sessions)
+    if not tasks:
+        print(f"no tasks in {args.sessions}", file=sys.stderr)
+        return 1
+    template_backend.capture_frame()  # imports, capture backend, handles
+    single = replay(tasks, plan=False, settle_ms=args.settle_ms)
+    planned = replay(tasks, plan=True, settle_ms=args.settle_ms)
+
+    print(f"{'task':<44} {'turns':>9} {'reasoning':>11} {'checks':>6} {'wall ms':>17}")
+    for (intent, stuck), before, after in zip(tasks, single, planned):
+        label = intent + (" (stuck)" if stuck else "")
+        print(
+            f"{label[:44]:<44} {before['turns']:>4} -> {after['turns']:<2} {before['reasoning']:>5} -> {after['reasoning']:<3} "
+            f"{after['checks']:>6} {before['wall_ms']:>7.0f} -> {after['wall_ms']:<7.0f}"
+        )
+    for name, results in (("one step per turn", single), ("plans", planned)):
+        print(
+            f"{name:<18} turns {sum(r['turns'] for r in results):>3}, reasoning calls {sum(r['reasoning'] for r in results):>3}, "
+            f"precondition checks {sum(r['checks'] for r in results):>3}, "
+            f"mean task {statistics.mean(r['wall_ms'] for r in results):7.0f} ms, "
+            f"completed {sum(r['completed'] for r in results)}/{len(results)}"
+        )
+    return 0 if all(r["completed"] for r in planned) else 1
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,111 @@
+"""A tiny random-weight Qwen2-VL and matching processor, built fully offline.
+
+Stands in for ShowUI-2B / Qwen2.5-VL-7B in local benchmarks and equivalence
+checks: same architecture, processor and chat template shape, a few MB of
+weights, runs on CPU. Outputs are gibberish but deterministic, which is all
+the comparisons need.
+"""
+import functools
+
+# Small pixel budget so a screenshot is a few dozen vision tokens on CPU
+MIN_PIXELS = 16 * 28 * 28
+MAX_PIXELS = 64 * 28 * 28
+
+SPECIAL_TOKENS = [
+    "<|endoftext|>", "<|im_start|>", "<|im_end|>",
+    "<|vision_start|>", "<|vision_end|>", "<|image_pad|>", "<|video_pad|>",
+]
+
+CHAT_TEMPLATE = (
+    "{% for message in messages %}<|im_start|>{{ message['role'] }}\n"
+    "{% if message['content'] is string %}{{ message['content'] }}"
+    "{% else %}{% for content in message['content'] %}"
+    "{% if content['type'] == 'image' %}<|vision_start|><|image_pad|><|vision_end|>"
+    "{% elif content['type'] == 'text' %}{{ content['text'] }}{% endif %}"
+    "{% endfor %}{% endif %}<|im_end|>\n{% endfor %}"
+    "{% if add_generation_prompt %}<|im_start|>assistant\n{% endif %}"
+)
+
+_CORPUS = [
+    '{"thought": "", "tool": "gui_action", "tool_input": ["Click the chat"], "preconditions": [""], "task_status": "working"}',
+    '{"holds": true} {"holds": false}',
+    "{'action': 'CLICK', 'value': None, 'position': [0.49, 0.94]}",
+    "You are Ghosty, a helpful MacOS assistant. Analyze the user's screen and request.",
+    "Click on the text input field or chat box where a message can be typed at the BOTTOM.",
+    "Tell my DIBZS group chat 67. Press enter. Thanks, I'm done. 0123456789 [x, y] null true false",
+]
+
+
+def _build_tokenizer():
+    from tokenizers import Tokenizer, decoders, models, pre_tokenizers, trainers
+    from transformers import PreTrainedTokenizerFast
+
+    tokenizer = Tokenizer(models.BPE())
+    tokenizer.pre_tokenizer = pre_tokenizers.ByteLevel(add_prefix_space=False)
+    tokenizer.decoder = decoders.ByteLevel()
+    trainer = trainers.BpeTrainer(
+        vocab_size=600, special_tokens=SPECIAL_TOKENS,
+        initial_alphabet=pre_tokenizers.ByteLevel.alphabet(),
+    )
+    tokenizer.train_from_iterator(_CORPUS * 4, trainer)
+    return PreTrainedTokenizerFast(
+        tokenizer_object=tokenizer,
+        eos_token="<|im_end|>",
+        pad_token="<|endoftext|>",
+        additional_special_tokens=SPECIAL_TOKENS[1:],
+        chat_template=CHAT_TEMPLATE,
+    )
+
+
+@functools.lru_cache(maxsize=None)
+def load(seed: int = 0, min_pixels: int = MIN_PIXELS, max_pixels: int = MAX_PIXELS, hidden_size: int = 64, layers: int = 2):
+    """Returns (model, processor). Cached per arguments, like a warm container.
+
+    A wider `hidden_size` makes decoding bound by weight reads, as it is for the
+    real models on a GPU, rather than by attention over the prompt.
+    """
+    import torch
+    from transformers import Qwen2VLConfig, Qwen2VLForConditionalGeneration, Qwen2VLImageProcessor, Qwen2VLProcessor
+
+    tokenizer = _build_tokenizer()
+    image_processor = Qwen2VLImageProcessor(min_pixels=min_pixels, max_pixels=max_pixels)
+    parts = {"image_processor": image_processor, "tokenizer": tokenizer, "chat_template": CHAT_TEMPLATE}
+    try:
+        from transformers import Qwen2VLVideoProcessor
+        parts["video_processor"] = Qwen2VLVideoProcessor()
+    except ImportError:
+        pass  # older transformers: no separate video processor
+    processor = Qwen2VLProcessor(**parts)
+
+    ids = {token: tokenizer.convert_tokens_to_ids(token) for token in SPECIAL_TOKENS}
+    config = Qwen2VLConfig(
+        text_config=dict(
+            vocab_size=len(tokenizer),
+            hidden_size=hidden_size,
+            intermediate_size=2 * hidden_size,
+            num_hidden_layers=layers,
+            # head_dim stays 16 to match mrope_section
+            num_attention_heads=hidden_size // 16,
+            num_key_value_heads=hidden_size // 32,
+            max_position_embeddings=4096,
+            initializer_range=0.5,
+            rope_scaling={"type": "mrope", "mrope_section": [2, 3, 3]},
+            rope_parameters={"rope_type": "default", "rope_theta": 10000.0, "mrope_section": [2, 3, 3]},
+            bos_token_id=ids["<|im_start|>"],
+            eos_token_id=ids["<|im_end|>"],
+            pad_token_id=ids["<|endoftext|>"],
+        ),
+        vision_config=dict(
+            depth=2, embed_dim=32, hidden_size=hidden_size, num_heads=2, mlp_ratio=2,
+            patch_size=14, spatial_merge_size=2, temporal_patch_size=2, in_channels=3,
+        ),
+        image_token_id=ids["<|image_pad|>"],
+        video_token_id=ids["<|video_pad|>"],
+        vision_start_token_id=ids["<|vision_start|>"],
+        vision_end_token_id=ids["<|vision_end|>"],
+    )
+    torch.manual_seed(seed)
+    model = Qwen2VLForConditionalGeneration(config).eval()
+    model.generation_config.eos_token_id = ids["<|im_end|>"]
+    model.generation_config.pad_token_id = ids["<|endoftext|>"]
+    return model, processor
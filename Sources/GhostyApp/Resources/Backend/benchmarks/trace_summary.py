@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+"""Per-stage latency from the spans written with GHOSTY_TRACE (see tracing.py).
+
+Reads one or more JSONL span files and prints count, mean, p50, p95 and max
+per service and stage, in pipeline order. Two stages are derived per trace:
+
+  client/transport  remote - orchestrator invoke: the network, Modal's dispatch and queueing
+  orchestrator/showui_transport  showui - ShowUI invoke, the same for the ShowUI calls
+
+--timeline prints the spans of the last trace (or of --trace) as a waterfall.
+Without files, --local-turns N first runs N traced turns against the local
+stand-ins (GHOSTY_SERVICES=local) and summarizes those, to check the plumbing:
+
+    GHOSTY_TRACE=~/Ghosty/trace.jsonl ...   # collect while using the app
+    python benchmarks/trace_summary.py ~/Ghosty/trace.jsonl --timeline
+    python benchmarks/trace_summary.py --local-turns 20 --invoke-ms 300 --showui-ms 120
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+from collections import OrderedDict, defaultdict
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+SERVICES = ("client", "orchestrator", "showui")
+PROMPTS = [
+    "Tell my DIBZS group chat 67",
+    "Open Safari and search for the weather",
+    "Message Alex 'running late'",
+    "Click the Downloads folder",
+]
+
+
+def load(paths: list) -> list:
+    spans = []
+    for path in paths:
+        with open(os.path.expanduser(path), encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if line:
+                    spans.append(json.loads(line))
+    return spans
+
+
+def derived(spans: list) -> list:
+    """Transport spans per trace: time a caller waited that the callee didn't spend serving it."""
+    by_trace = defaultdict(lambda: defaultdict(float))
+    for span in spans:
+        by_trace[span["trace"]][(span["service"], span["name"])] += span["ms"]
+    extra = []
+    for trace, totals in by_trace.items():
+        pairs = (
+            ("client", "transport", ("client", "remote"), ("orchestrator", "invoke")),
+            ("orchestrator", "showui_transport", ("orchestrator", "showui"), ("showui", "invoke")),
+        )
+        for service, name, caller, callee in pairs:
+            if caller in totals and callee in totals:
+                extra.append({"trace": trace, "service": service, "name": name, "ms": totals[caller] - totals[callee]})
+    return extra
+
+
+def percentile(samples: list, q: float) -> float:
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(round(q * (len(samples) - 1))))]
+
+
+def summarize(spans: list) -> OrderedDict:
+    stages = OrderedDict()
+    # Pipeline order: services in call order, stages in the order they first started
+    for span in sorted(spans, key=lambda s: (SERVICES.index(s["service"]) if s["service"] in SERVICES else len(SERVICES), s.get("start", float("inf")))):
+        stages.setdefault((span["service"], span["name"]), []).append(span["ms"])
+    return OrderedDict(
+        (key, {
+            "count": len(samples),
+            "mean": statistics.mean(samples),
+            "p50": statistics.median(samples),
+            "p95": percentile(samples, 0.95),
+            "max": max(samples),
+        })
+        for key, samples in stages.items()
+    )
+
+
+def print_summary(summary: OrderedDict, traces: int):
+    print(f"{traces} trace(s)")
+    print(f"{'service/stage':<32} {'count':>6} {'mean ms':>9} {'p50 ms':>9} {'p95 ms':>9} {'max ms':>9}")
+    for (service, name), row in summary.items():
+        print(f"{service + '/' + name:<32} {row['count']:>6} {row['mean']:>9.1f} {row['p50']:>9.1f} {row['p95']:>9.1f} {row['max']:>9.1f}")
+
+
+def print_timeline(spans: list, trace_id: str = None):
+    if trace_id is None:
+        trace_id = max(spans, key=lambda s: s["start"])["trace"]
+    spans = sorted((s for s in spans if s["trace"] == trace_id), key=lambda s: s["start"])
+    if not spans:
+        print(f"no spans for trace {trace_id}")
+        return
+    origin = spans[0]["start"]
+    print(f"trace {trace_id}")
+    for span in spans:
+        attrs = {k: v for k, v in span.items() if k not in ("trace", "service", "name", "start", "ms")}
+        offset = (span["start"] - origin) * 1000
+        print(f"  +{offset:8.1f} ms {span['ms']:8.1f} ms  {span['service'] + '/' + span['name']:<28} {json.dumps(attrs) if attrs else ''}")
+
+
+def run_local(path: str, turns: int, invoke_ms: float, showui_ms: float):
+    """Runs `turns` traced turns through template_backend against the local stand-ins, writing spans to `path`."""
+    os.environ.update({
+        "GHOSTY_SERVICES": "local",
+        "GHOSTY_TRACE": path,
+        "GHOSTY_CAPTURE": os.environ.get("GHOSTY_CAPTURE", "synthetic:1288x784"),
+        "GHOSTY_ARCHIVE_SCREENSHOTS": "0",
+        "GHOSTY_STREAM": "0",
+        "GHOSTY_LOCAL_INVOKE_MS": str(invoke_ms),
+        "GHOSTY_LOCAL_SHOWUI_MS": str(showui_ms),
+    })
+    os.environ.pop("GHOSTY_SESSION_LOG", None)
+    import template_backend
+
+    for turn in range(turns):
+        template_backend.generate_response(PROMPTS[turn % len(PROMPTS)])
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("paths", nargs="*", help="span files written with GHOSTY_TRACE")
+    parser.add_argument("--timeline", action="store_true", help="also print the last trace as a waterfall")
+    parser.add_argument("--trace", help="the trace id for --timeline")
+    parser.add_argument("--local-turns", type=int, default=0, help="first run this many traced turns against the local stand-ins")
+    parser.add_argument("--invoke-ms", type=float, default=300.0, help="simulated reasoning time (--local-turns)")
+    parser.add_argument("--showui-ms", type=float, default=120.0, help="simulated grounding time (--local-turns)")
+    args = parser.parse_args()
+
+    paths = list(args.paths)
+    with tempfile.TemporaryDirectory() as directory:
+        if args.local_turns:
+            paths.append(os.path.join(directory, "trace.jsonl"))
+            run_local(paths[-1], args.local_turns, args.invoke_ms, args.showui_ms)
+        if not paths:
+            parser.error("no span files (pass some, or --local-turns)")
+        spans = load(paths)
+    if not spans:
+        print("no spans", file=sys.stderr)
+        return 1
+
+    print_summary(summarize(spans + derived(spans)), len({span["trace"] for span in spans}))
+    if args.timeline or args.trace:
+        print()
+        print_timeline(spans, args.trace)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,145 @@
+"""Cold starts: baked weights, memory snapshots and per-phase timing.
+
+Every new container (scale-out, restart, redeploy) pays for what the classes
+do in @modal.enter(): resolving the model in the Hub cache, deserializing
+the weights, moving them to the GPU and warming up. Three things cut that down:
+
+  bake()          writes a profile's weights (already quantized for int8/nf4) and the
+                  processor to the volume as safetensors, which from_pretrained memory-maps
+                  from one local directory (`modal run orchestrator_modal.py::bake`, and
+                  the same in showui_modal.py). Without baked weights the Hub id is used.
+  snapshots       the classes load in two steps. @modal.enter(snap=True) loads the processor
+                  and the weights into CPU memory; Modal snapshots the container after it and
+                  restores later containers from the snapshot. @modal.enter(snap=False) moves
+                  the weights to the GPU, warms up and starts the batcher thread.
+                  bitsandbytes quantizes on the GPU, so int8 and nf4 load in the second step
+                  unless GPU snapshots are on.
+  PhaseTimer      times each load phase and logs them as one "[ColdStart] {json}" line
+                  per container, split into the snapshotted and the after-restore part
+
+Configuration (deploy time; baked into the image's environment):
+  GHOSTY_SNAPSHOT=0      - no memory snapshots
+  GHOSTY_GPU_SNAPSHOT=1  - also snapshot GPU memory (Modal's experimental GPU snapshots);
+                           the weights go straight to the GPU before the snapshot
+  GHOSTY_BAKED_DIR       - where bake() writes (default /root/.cache/huggingface/ghosty-baked,
+                           on the shared volume)
+"""
+import json
+import os
+import time
+from contextlib import contextmanager
+
+import inference_profiles
+
+
+def snapshots_enabled() -> bool:
+    return os.environ.get("GHOSTY_SNAPSHOT", "1") != "0"
+
+
+def gpu_snapshots_enabled() -> bool:
+    return snapshots_enabled() and os.environ.get("GHOSTY_GPU_SNAPSHOT", "0") == "1"
+
+
+def image_env() -> dict:
+    """The deploy-time settings, for Image.env(): the container must see the ones the app was deployed with."""
+    return {
+        "GHOSTY_SNAPSHOT": "1" if snapshots_enabled() else "0",
+        "GHOSTY_GPU_SNAPSHOT": "1" if gpu_snapshots_enabled() else "0",
+    }
+
+
+def cls_options() -> dict:
+    """Snapshot keyword arguments for @app.cls."""
+    options = {"enable_memory_snapshot": snapshots_enabled()}
+    if gpu_snapshots_enabled():
+        options["experimental_options"] = {"enable_gpu_snapshot": True}
+    return options
+
+
+def baked_dir() -> str:
+    return os.environ.get("GHOSTY_BAKED_DIR", "/root/.cache/huggingface/ghosty-baked")
+
+
+def baked_path(model_id: str, profile: str) -> str:
+    # The speculative profile's main model is the bf16 one
+    return os.path.join(baked_dir(), model_id.replace("/", "--"), "bf16" if profile == "speculative" else profile)
+
+
+def weights_path(model_id: str, profile: str) -> str:
+    """The baked directory for `model_id` under `profile` if bake() wrote one, else `model_id` itself."""
+    path = baked_path(model_id, profile)
+    return path if os.path.exists(os.path.join(path, "config.json")) else model_id
+
+
+def snapshot_device(profile: str):
+    """Where the snap=True step puts the weights: "cpu", "auto" (the GPU), or None to leave them to the
+    after-restore step."""
+    if not snapshots_enabled() or gpu_snapshots_enabled():
+        return "auto"
+    return None if profile in inference_profiles.QUANTIZED else "cpu"
+
+
+class PhaseTimer:
+    """Wall time per load phase, grouped by step ("snapshot" runs before a memory snapshot, "restore" after)."""
+
+    def __init__(self, service: str, profile: str):
+        self.service = service
+        self.profile = profile
+        self.steps = {"snapshot": {}, "restore": {}}
+        self.step = "snapshot"
+
+    @contextmanager
+    def phase(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.steps[self.step][name] = (time.perf_counter() - start) * 1000
+
+    def report(self) -> dict:
+        return {
+            "service": self.service,
+            "profile": self.profile,
+            "snapshots": snapshots_enabled(),
+            **{step: {name: round(ms, 1) for name, ms in phases.items()} for step, phases in self.steps.items()},
+            **{f"{step}_ms": round(sum(phases.values()), 1) for step, phases in self.steps.items()},
+        }
+
+    def log(self):
+        print(f"[ColdStart] {json.dumps(self.report())}", flush=True)
+
+
+def load_processor(timer: PhaseTimer, processor_cls, model_id: str, profile: str, **kwargs):
+    with timer.phase("processor"):
+        return processor_cls.from_pretrained(weights_path(model_id, profile), **kwargs)
+
+
+def load_weights(timer: PhaseTimer, model_cls, model_id: str, profile: str, device_map: str) -> tuple:
+    """inference_profiles.load() from the baked weights if there are any; (model, draft or None, stats)."""
+    with timer.phase("weights_cpu" if device_map == "cpu" else "weights_gpu"):
+        return inference_profiles.load(
+            model_cls, weights_path(model_id, profile), profile, device_map,
+            draft_id=weights_path(inference_profiles.draft_model_id(), "bf16"),
+        )
+
+
+def to_gpu(timer: PhaseTimer, *models):
+    """Moves models staged on the CPU to the GPU (None skipped); a no-op without CUDA."""
+    import torch
+
+    with timer.phase("to_gpu"):
+        if torch.cuda.is_available():
+            for model in models:
+                if model is not None:
+                    model.to("cuda")
+            torch.cuda.synchronize()
+
+
+def bake(model_cls, processor_cls, model_id: str, profile: str) -> str:
+    """Writes `model_id`'s weights under `profile` and its processor to baked_path(); returns the path."""
+    path = baked_path(model_id, profile)
+    model, _, stats = inference_profiles.load(model_cls, model_id, "bf16" if profile == "speculative" else profile)
+    model.save_pretrained(path)
+    processor_cls.from_pretrained(model_id).save_pretrained(path)
+    print(f"[ColdStart] Baked {model_id} ({profile}, {stats['memory_mb']:.0f} MiB) to {path}", flush=True)
+    return path
@@ -0,0 +1,206 @@
+"""Content-addressed screenshot cache and tile-level frame deltas.
+
+Shared by the client (template_backend.py) and both Modal apps. Within a task
+consecutive screenshots are usually identical or differ in a few places, so
+instead of re-uploading the whole image the client sends one of:
+
+  image_bytes + image_key   full frame, stored by the server under image_key
+  image_key                 reference to a frame the server already holds
+  image_delta               changed tiles on top of a frame the server holds
+
+Servers keep a small LRU of decoded frames (FrameCache) and raise
+FrameCacheMiss when a reference can't be resolved; the caller then retries
+with the full frame.
+"""
+import io
+import hashlib
+import threading
+from collections import OrderedDict
+
+# Multiple of the 28px patch grid
+TILE_SIZE = 112
+# Above this fraction of changed tiles a delta isn't worth it
+MAX_DELTA_FRACTION = 0.5
+
+
+class FrameCacheMiss(KeyError):
+    pass
+
+
+def is_cache_miss(error: Exception) -> bool:
+    # Remote exceptions may come back re-wrapped; match on the name as well
+    return isinstance(error, FrameCacheMiss) or "FrameCacheMiss" in type(error).__name__
+
+
+def frame_key(img) -> str:
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(f"{img.mode}:{img.size[0]}x{img.size[1]}:".encode("ascii"))
+    digest.update(img.tobytes())
+    return digest.hexdigest()
+
+
+def decode_image(data: bytes):
+    from PIL import Image
+
+    img = Image.open(io.BytesIO(data))
+    img.load()
+    return img.convert("RGB") if img.mode != "RGB" else img
+
+
+def _encode_png(img) -> bytes:
+    buffer = io.BytesIO()
+    img.save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+def changed_tiles(prev_img, img, tile: int = TILE_SIZE) -> list:
+    """Boxes (left, top, right, bottom) of the tiles that differ between two same-sized frames."""
+    from PIL import ImageChops
+
+    diff = ImageChops.difference(prev_img, img)
+    width, height = img.size
+    boxes = []
+    for top in range(0, height, tile):
+        for left in range(0, width, tile):
+            box = (left, top, min(left + tile, width), min(top + tile, height))
+            if diff.crop(box).getbbox() is not None:
+                boxes.append(box)
+    return boxes
+
+
+def make_delta(base_key: str, key: str, img, boxes: list) -> dict:
+    return {
+        "base": base_key,
+        "key": key,
+        "size": list(img.size),
+        "tiles": [[box[0], box[1], _encode_png(img.crop(box))] for box in boxes],
+    }
+
+
+def delta_size(delta: dict) -> int:
+    return sum(len(tile[2]) for tile in delta["tiles"])
+
+
+def apply_delta(base_img, delta: dict):
+    img = base_img.copy()
+    for left, top, data in delta["tiles"]:
+        img.paste(decode_image(data), (left, top))
+    return img
+
+
+class FrameCache:
+    """Bounded LRU of decoded frames keyed by content hash. Thread-safe."""
+
+    def __init__(self, capacity: int = 8):
+        self.capacity = capacity
+        self._frames = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def put(self, key: str, img, data: bytes = None):
+        with self._lock:
+            self._frames[key] = {"image": img, "data": data}
+            self._frames.move_to_end(key)
+            while len(self._frames) > self.capacity:
+                self._frames.popitem(last=False)
+
+    def _entry(self, key: str) -> dict:
+        with self._lock:
+            entry = self._frames.get(key)
+            if entry is None:
+                self.misses += 1
+                raise FrameCacheMiss(key)
+            self.hits += 1
+            self._frames.move_to_end(key)
+            return entry
+
+    def get(self, key: str):
+        return self._entry(key)["image"]
+
+    def get_bytes(self, key: str) -> bytes:
+        """Encoded frame, for forwarding to another service. Frames rebuilt from deltas are encoded lazily."""
+        entry = self._entry(key)
+        if entry["data"] is None:
+            entry["data"] = _encode_png(entry["image"])
+        return entry["data"]
+
+    def resolve(self, image_bytes: bytes = None, image_key: str = None, image_delta: dict = None):
+        """Turns any of the three upload forms into (key, image), caching new frames."""
+        if image_delta is not None:
+            img = apply_delta(self.get(image_delta["base"]), image_delta)
+            self.put(image_delta["key"], img)
+            return image_delta["key"], img
+        if image_bytes is not None:
+            img = decode_image(image_bytes)
+            key = image_key or hashlib.blake2b(image_bytes, digest_size=16).hexdigest()
+            self.put(key, img, image_bytes)
+            return key, img
+        if image_key is not None:
+            return image_key, self.get(image_key)
+        return None, None
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "frames": len(self._frames),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
+
+
+class FrameUploader:
+    """Client side: decides per turn whether to send a reference, a delta or the full frame."""
+
+    def __init__(self, max_delta_fraction: float = MAX_DELTA_FRACTION):
+        self.max_delta_fraction = max_delta_fraction
+        self.last_key = None
+        self.last_image = None
+        self.turns = 0
+        self.hits = 0
+        self.bytes_full = 0
+        self.bytes_sent = 0
+        self._pending = None
+
+    def prepare(self, frame: dict):
+        """Returns (invoke kwargs, report) for a frame from screen_capture.capture_frame()."""
+        img = frame["image"]
+        key = frame_key(img)
+        full_bytes = len(frame["data"])
+
+        if self.last_key is not None and key == self.last_key:
+            kwargs, mode, sent = {"image_key": key}, "ref", 0
+        else:
+            kwargs, mode, sent = None, "full", full_bytes
+            if self.last_image is not None and self.last_image.size == img.size:
+                boxes = changed_tiles(self.last_image, img)
+                tiles_total = -(-img.size[0] // TILE_SIZE) * -(-img.size[1] // TILE_SIZE)
+                if len(boxes) <= self.max_delta_fraction * tiles_total:
+                    delta = make_delta(self.last_key, key, img, boxes)
+                    if delta_size(delta) < full_bytes:
+                        kwargs, mode, sent = {"image_delta": delta}, "delta", delta_size(delta)
+            if kwargs is None:
+                kwargs = {"image_bytes": frame["data"], "image_key": key}
+
+        report = {"mode": mode, "key": key, "full_bytes": full_bytes, "sent_bytes": sent}
+        self._pending = (key, img)
+        return kwargs, report
+
+    def full(self, frame: dict) -> dict:
+        """Kwargs for re-sending the whole frame after a FrameCacheMiss."""
+        return {"image_bytes": frame["data"], "image_key": frame_key(frame["image"])}
+
+    def commit(self, report: dict) -> dict:
+        """Records a successful upload and returns the report with running totals."""
+        self.last_key, self.last_image = self._pending
+        self.turns += 1
+        self.hits += report["mode"] != "full"
+        self.bytes_full += report["full_bytes"]
+        self.bytes_sent += report["sent_bytes"]
+        return dict(
+            report,
+            saved_bytes=report["full_bytes"] - report["sent_bytes"],
+            hit_rate=self.hits / self.turns,
+            total_saved_bytes=self.bytes_full - self.bytes_sent,
+        )
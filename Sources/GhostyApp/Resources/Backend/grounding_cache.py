@@ -0,0 +1,157 @@
+"""Cache of ShowUI answers for UI targets that haven't changed.
+
+Within a session ShowUI is asked to find the same things again and again:
+the chat input at the bottom, the same sidebar conversation, the same
+button. An answer is stored under the normalized instruction, together with
+a perceptual fingerprint (a 16x16 greyscale thumbnail) of the screen region
+around the position it returned, or of the whole screen for actions without
+one. A later request with the same instruction is answered from the cache
+when that region still looks the same. Changes elsewhere on screen (new messages, a
+moving cursor) don't invalidate it; the target being covered or moved does.
+
+Entries expire `ttl_s` after they were stored and the least recently used
+ones are evicted beyond `capacity`.
+
+Configuration (server side):
+  GHOSTY_GROUNDING_CACHE=0   - always run ShowUI
+  GHOSTY_GROUNDING_TTL_S     - seconds an answer stays valid (default 600)
+"""
+import ast
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+
+# Side of the greyscale thumbnail a region is compared by
+THUMBNAIL_SIZE = 16
+
+
+def enabled() -> bool:
+    return os.environ.get("GHOSTY_GROUNDING_CACHE", "1") != "0"
+
+
+def ttl_s() -> float:
+    return float(os.environ.get("GHOSTY_GROUNDING_TTL_S", "600"))
+
+
+def normalize_instruction(prompt: str) -> str:
+    return " ".join(re.sub(r"[^\w\s']", " ", prompt.lower()).split())
+
+
+def fingerprint(img, box: tuple = None) -> bytes:
+    """Greyscale 16x16 thumbnail of `img`, or of its `box` region."""
+    from PIL import Image
+
+    region = img.crop(box) if box is not None else img
+    return region.convert("L").resize((THUMBNAIL_SIZE, THUMBNAIL_SIZE), Image.BILINEAR, reducing_gap=2.0).tobytes()
+
+
+def difference(a: bytes, b: bytes) -> float:
+    """Mean absolute grey-level difference of two fingerprints."""
+    return sum(abs(x - y) for x, y in zip(a, b)) / len(a)
+
+
+def action_points(result: str):
+    """The relative [x, y] points of a ShowUI answer: [] if it has no position, None if it isn't an action."""
+    try:
+        action = ast.literal_eval(result.strip())
+    except (ValueError, SyntaxError):
+        return None
+    if not isinstance(action, dict) or "action" not in action:
+        return None
+    position = action.get("position")
+    if position is None:
+        return []
+    points = position if position and isinstance(position[0], (list, tuple)) else [position]
+    try:
+        return [(float(x), float(y)) for x, y in points]
+    except (TypeError, ValueError):
+        return None
+
+
+def region(size: tuple, points: list, margin: float) -> tuple:
+    """Pixel box around relative points, `margin` of the screen on each side; the whole screen for no points."""
+    width, height = size
+    if not points:
+        return (0, 0, width, height)
+    xs, ys = [x for x, _ in points], [y for _, y in points]
+    left = max(0.0, min(xs) - margin)
+    top = max(0.0, min(ys) - margin)
+    right = min(1.0, max(xs) + margin)
+    bottom = min(1.0, max(ys) + margin)
+    return (int(left * width), int(top * height), max(int(left * width) + 1, int(right * width)), max(int(top * height) + 1, int(bottom * height)))
+
+
+class GroundingCache:
+    """Thread-safe LRU of (instruction, screen region) -> ShowUI answer, with hit/miss counters."""
+
+    def __init__(self, capacity: int = 256, ttl_s: float = 600.0, max_difference: float = 4.0, margin: float = 0.06):
+        self.capacity = capacity
+        self.ttl_s = ttl_s
+        self.max_difference = max_difference
+        self.margin = margin
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.evictions = 0
+        self.expired = 0
+
+    def lookup(self, prompt: str, img):
+        """The stored answer if this instruction's target region looks unchanged in `img`, else None."""
+        instruction = normalize_instruction(prompt)
+        now = time.monotonic()
+        with self._lock:
+            candidates = []
+            for key, entry in reversed(self._entries.items()):
+                if key[0] != instruction:
+                    continue
+                if now - entry["time"] > self.ttl_s:
+                    candidates.append((key, None))
+                elif entry["size"] == img.size:
+                    candidates.append((key, entry))
+            for key, entry in candidates:
+                if entry is None:
+                    del self._entries[key]
+                    self.expired += 1
+        for key, entry in candidates:
+            if entry is not None and difference(fingerprint(img, entry["box"]), entry["fingerprint"]) <= self.max_difference:
+                with self._lock:
+                    if key in self._entries:
+                        self._entries.move_to_end(key)
+                    self.hits += 1
+                return entry["result"]
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def store(self, prompt: str, img, result: str):
+        """Remembers ShowUI's answer; answers that aren't an action dict are not cached."""
+        points = action_points(result)
+        if points is None:
+            return
+        box = region(img.size, points, self.margin)
+        entry = {"box": box, "fingerprint": fingerprint(img, box), "size": img.size, "result": result, "time": time.monotonic()}
+        with self._lock:
+            key = (normalize_instruction(prompt), box)
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            self.stores += 1
+            while len(self._entries) > self.capacity:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "stores": self.stores,
+                "evictions": self.evictions,
+                "expired": self.expired,
+            }
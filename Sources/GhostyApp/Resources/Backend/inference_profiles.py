@@ -0,0 +1,107 @@
+"""Inference profiles: how a Modal service loads its model and decodes with it.
+
+  bf16         bfloat16 weights (the default)
+  int8         LLM.int8() weights via bitsandbytes; the vision tower and lm_head stay bf16
+  nf4          4-bit NF4 weights via bitsandbytes (double quantization, bf16 compute);
+               the vision tower and lm_head stay bf16
+  speculative  bf16 weights plus a small draft model from the same family; each
+               conversation is decoded with transformers' assisted generation, which
+               handles one conversation at a time and doesn't use the prefix cache
+
+A deployment picks its profile with GHOSTY_PROFILE at deploy time (it is baked
+into the image's environment). Callers can also ask for another one with the
+class's `profile` parameter, e.g. `OrchestratorAgent(profile="nf4")`, which
+Modal serves from separate containers.
+
+Every profile runs on an L4 (24 GB) except speculative: the 7B target and the
+3B draft are ~22 GB of bf16 weights before any KV cache or activations, so it
+gets an L40S (48 GB). gpu() is what a class is deployed with; callers asking
+for another profile pass its GPU along, e.g.
+`OrchestratorAgent.with_options(gpu=inference_profiles.gpu("speculative"))(profile="speculative")`.
+
+Configuration:
+  GHOSTY_PROFILE       - bf16, int8, nf4 or speculative (default bf16)
+  GHOSTY_DRAFT_MODEL   - draft model of the speculative profile (default Qwen/Qwen2.5-VL-3B-Instruct)
+"""
+import os
+import time
+
+PROFILES = ("bf16", "int8", "nf4", "speculative")
+QUANTIZED = ("int8", "nf4")
+
+DEFAULT_GPU = "L4"
+# Profiles whose weights don't fit the default GPU
+GPUS = {"speculative": "L40S"}
+
+# Kept in bf16 by the quantized profiles: small, and sensitive to quantization error
+SKIP_MODULES = ["visual", "lm_head"]
+
+
+def default() -> str:
+    return resolve()
+
+
+def resolve(profile: str = None) -> str:
+    """`profile`, or the deployment's default if it is empty. Raises ValueError for unknown names."""
+    profile = profile or os.environ.get("GHOSTY_PROFILE", "bf16")
+    if profile not in PROFILES:
+        raise ValueError(f"Unknown inference profile {profile!r}; expected one of {', '.join(PROFILES)}")
+    return profile
+
+
+def gpu(profile: str = None) -> str:
+    """The Modal GPU `profile` (or the deployment's default) is served on."""
+    return GPUS.get(resolve(profile), DEFAULT_GPU)
+
+
+def draft_model_id() -> str:
+    return os.environ.get("GHOSTY_DRAFT_MODEL", "Qwen/Qwen2.5-VL-3B-Instruct")
+
+
+def from_pretrained_kwargs(profile: str, device_map: str = "auto") -> dict:
+    """Keyword arguments for `from_pretrained` of the main model under `profile`."""
+    import torch
+
+    kwargs = {"torch_dtype": torch.bfloat16, "device_map": device_map}
+    if profile == "int8":
+        from transformers import BitsAndBytesConfig
+        kwargs["quantization_config"] = BitsAndBytesConfig(load_in_8bit=True, llm_int8_skip_modules=SKIP_MODULES)
+    elif profile == "nf4":
+        from transformers import BitsAndBytesConfig
+        kwargs["quantization_config"] = BitsAndBytesConfig(
+            load_in_4bit=True,
+            bnb_4bit_quant_type="nf4",
+            bnb_4bit_use_double_quant=True,
+            bnb_4bit_compute_dtype=torch.bfloat16,
+            llm_int8_skip_modules=SKIP_MODULES,
+        )
+    return kwargs
+
+
+def load(model_cls, model_id: str, profile: str, device_map: str = "auto", draft_id: str = None) -> tuple:
+    """Loads `model_id` (and the draft for speculative, `draft_id` or draft_model_id()) under `profile`.
+
+    `model_id` may also be a local directory, e.g. weights baked by cold_start.bake().
+    Returns (model, draft or None, stats) with stats {"profile", "load_s", "memory_mb"}.
+    """
+    import torch
+
+    start = time.perf_counter()
+    model = model_cls.from_pretrained(model_id, **from_pretrained_kwargs(profile, device_map))
+    draft = None
+    if profile == "speculative":
+        draft = model_cls.from_pretrained(draft_id or draft_model_id(), torch_dtype=torch.bfloat16, device_map=device_map)
+    stats = {"profile": profile, "load_s": time.perf_counter() - start, "memory_mb": memory_mb(model, draft)}
+    return model, draft, stats
+
+
+def memory_mb(*models) -> float:
+    """Parameter and buffer memory of the given models (None skipped), in MiB."""
+    return sum(model.get_memory_footprint() for model in models if model is not None) / 2**20
+
+
+def peak_memory_mb() -> float:
+    """Peak CUDA memory allocated so far (weights, KV caches, activations); 0 without CUDA."""
+    import torch
+
+    return torch.cuda.max_memory_allocated() / 2**20 if torch.cuda.is_available() else 0.0
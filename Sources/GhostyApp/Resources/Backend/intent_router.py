@@ -0,0 +1,153 @@
+"""Answers trivial intents on the client, before any screenshot or network call.
+
+"Thanks, I'm done" doesn't need a 7B vision model to work out that it means
+hide, and "press enter" doesn't need a screenshot. The router matches the
+user's intent against a table of compiled patterns. On a hit it returns the
+text the orchestrator's invoke() would have returned, in well under a
+millisecond. Anything it isn't sure about goes to the orchestrator as before.
+
+It also remembers recent intent -> response pairs. Those are its own rule
+hits, plus hide decisions the orchestrator made for a fresh intent, since
+hiding doesn't depend on what is on screen. Asking the same thing again is
+then answered locally.
+
+Only fresh intents are routed; follow-up turns carrying an ACTION HISTORY
+always go to the orchestrator.
+
+Configuration:
+  GHOSTY_ROUTER=0        - send every intent to the orchestrator
+  GHOSTY_ROUTER_CACHE    - how many recent intents to remember (default 64)
+"""
+import os
+import re
+import time
+from collections import OrderedDict
+
+HISTORY_MARKER = "\n\nACTION HISTORY:"
+
+_ACK = r"(?:ok|okay|great|cool|perfect|awesome|nice|got it)"
+_THANKS = r"(?:thanks|thank you|thx|ty|cheers)(?: so much| a lot)?"
+_DONE = (
+    r"(?:that's all|that's it|i'm done|i am done|we're done|all done|done|go away|hide|hide yourself"
+    r"|dismiss|bye|goodbye|see you|see ya|never ?mind|cancel|stop)"
+)
+_NAME = r"(?: ghosty)?"
+
+
+def enabled() -> bool:
+    return os.environ.get("GHOSTY_ROUTER", "1") != "0"
+
+
+def normalize(intent: str) -> str:
+    """Lower case, straight apostrophes, no punctuation but apostrophes, single spaces."""
+    text = intent.lower().replace("’", "'")
+    text = re.sub(r"[^\w\s']", " ", text)
+    return " ".join(text.split())
+
+
+def response(status: str, thought: str, output: str) -> str:
+    """The same layout as OrchestratorAgent.invoke()."""
+    return f"TASK_STATUS: {status}\nTHOUGHT: {thought}\n{output}"
+
+
+def _hide(match) -> str:
+    return response("completed", "The user is done.", "COMMAND_HIDE_GHOSTY")
+
+
+def _enter(match) -> str:
+    return response(
+        "completed", "The user asked to press enter.",
+        'GUI Action executed. Result from vision model: {"action": "ENTER", "position": null}',
+    )
+
+
+def _greeting(match) -> str:
+    reply = "I'm here! What should I do on your screen?"
+    return response("completed", reply, reply)
+
+
+def _help(match) -> str:
+    reply = "I'm Ghosty. Tell me what to do on your screen, like \"Tell my DIBZS group chat 67\"."
+    return response("completed", reply, reply)
+
+
+# (name, pattern over normalize()d text, respond(match) -> response); the whole intent must match
+DEFAULT_RULES = [
+    ("hide", rf"(?:hey{_NAME} )?(?:{_ACK} )*(?:(?:{_THANKS}{_NAME})(?: {_ACK})*(?: {_DONE})?|{_DONE}){_NAME}", _hide),
+    ("enter", rf"(?:please )?(?:(?:press|hit|tap|push) (?:the )?(?:enter|return)(?: key)?|send it|send the message)(?: please)?", _enter),
+    ("greeting", rf"(?:(?:hi|hey|hello|yo)(?: there)?{_NAME}(?: are you (?:there|awake|here))?|(?:ghosty )?are you (?:there|awake|here))", _greeting),
+    ("help", rf"(?:(?:who|what) are you|what can you do|help(?: me)?){_NAME}", _help),
+]
+
+
+class IntentRouter:
+    """Pattern table + LRU of recent intent -> response pairs. route() returns None for a miss."""
+
+    def __init__(self, rules: list = None, capacity: int = 64):
+        self.rules = []
+        for name, pattern, respond in (DEFAULT_RULES if rules is None else rules):
+            self.add_rule(name, pattern, respond)
+        self.capacity = capacity
+        self._recent = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.cache_hits = 0
+        self.route_ms = 0.0
+        self.miss_turn_ms = 0.0
+
+    def add_rule(self, name: str, pattern: str, respond):
+        """Adds a rule after the existing ones; `respond(match)` returns the response text."""
+        self.rules.append((name, re.compile(pattern), respond))
+
+    def route(self, prompt: str):
+        """(rule name, response) if the intent can be answered locally, else None."""
+        start = time.perf_counter()
+        try:
+            if HISTORY_MARKER in prompt:
+                return None
+            intent = normalize(prompt)
+            if intent in self._recent:
+                self._recent.move_to_end(intent)
+                self.cache_hits += 1
+                return self._recent[intent]
+            for name, pattern, respond in self.rules:
+                match = pattern.fullmatch(intent)
+                if match:
+                    return self._remember(intent, (name, respond(match)))
+            return None
+        finally:
+            self.route_ms += (time.perf_counter() - start) * 1000
+
+    def record(self, routed, turn_ms: float = 0.0):
+        """Counts a turn; for a miss, `turn_ms` is what the full capture + orchestrator turn took."""
+        if routed is not None:
+            self.hits += 1
+        else:
+            self.misses += 1
+            self.miss_turn_ms += turn_ms
+
+    def learn(self, prompt: str, result: str):
+        """Remembers the orchestrator's answer to a fresh intent when it doesn't depend on the screen."""
+        if HISTORY_MARKER not in prompt and "COMMAND_HIDE_GHOSTY" in result:
+            self._remember(normalize(prompt), ("learned", result))
+
+    def _remember(self, intent: str, routed: tuple) -> tuple:
+        self._recent[intent] = routed
+        self._recent.move_to_end(intent)
+        while len(self._recent) > self.capacity:
+            self._recent.popitem(last=False)
+        return routed
+
+    def stats(self) -> dict:
+        turns = self.hits + self.misses
+        mean_miss_ms = self.miss_turn_ms / self.misses if self.misses else 0.0
+        mean_route_ms = self.route_ms / turns if turns else 0.0
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "cache_hits": self.cache_hits,
+            "hit_rate": self.hits / turns if turns else 0.0,
+            "mean_route_ms": mean_route_ms,
+            # Each hit skipped a capture + orchestrator turn of about the mean miss
+            "saved_ms": self.hits * max(0.0, mean_miss_ms - mean_route_ms),
+        }
@@ -0,0 +1,390 @@
+"""Grammar-constrained decoding: the model can only write text a small grammar accepts.
+
+Both models are asked for an object of a fixed shape (the orchestrator's
+decision, ShowUI's action). Instead of parsing whatever comes back and hoping,
+the shape is described here, compiled to a character automaton, and at every
+decode step the tokens that would leave it are masked out of the logits.
+Generation ends as soon as the object is closed, without waiting for EOS.
+
+  obj([("action", enum(...)), ...])     describes the object, field order and separators included
+  Grammar(node)                          compiles it (once, at import)
+  Matcher(grammar, tokenizer)            follows one row: allowed() is its mask, advance() consumes a token
+  generate_kwargs(grammar, tokenizer)    the same for model.generate (logits processor + stopping criteria)
+  warm(grammar, tokenizer, example, ...) builds the masks an example answer needs, at container start
+
+Masks only depend on the automaton state, so each is built once per process
+and reused; a decode step costs a dict lookup and a masked_fill.
+
+Configuration (server side):
+  GHOSTY_CONSTRAINED  - 0 to let the models write free-form text again (default 1)
+"""
+import os
+import string as _string
+
+DIGITS = frozenset(_string.digits)
+_HEX = frozenset(_string.hexdigits)
+
+
+def enabled() -> bool:
+    return os.environ.get("GHOSTY_CONSTRAINED", "1") != "0"
+
+
+class _StringChar:
+    """Any character allowed unescaped inside a string delimited by `quote`."""
+
+    def __init__(self, quote: str):
+        self.quote = quote
+
+    def __contains__(self, char: str) -> bool:
+        return char != self.quote and char != "\\" and char >= " "
+
+    def __iter__(self):
+        # Only the characters that can't appear in it matter when comparing labels
+        return iter(())
+
+
+# Grammar nodes: plain tuples, compiled by Grammar
+
+def literal(text: str):
+    return ("lit", text)
+
+
+def sequence(*parts):
+    return ("seq", [literal(p) if isinstance(p, str) else p for p in parts])
+
+
+def choice(*parts):
+    return ("alt", [literal(p) if isinstance(p, str) else p for p in parts])
+
+
+def repeat(part, min_count: int = 0, max_count: int = None):
+    return ("rep", literal(part) if isinstance(part, str) else part, min_count, max_count)
+
+
+def optional(part):
+    return repeat(part, 0, 1)
+
+
+def chars(allowed):
+    """One character out of `allowed` (a set, or a _StringChar)."""
+    return ("chars", allowed)
+
+
+def string(quote: str = '"'):
+    """A quoted string with JSON-style escapes; raw control characters are not allowed."""
+    return sequence(quote, ("body", quote), quote)
+
+
+def enum(*values, quote: str = '"'):
+    return choice(*(f"{quote}{value}{quote}" for value in values))
+
+
+def array(item, min_items: int = 0):
+    items = sequence(item, repeat(sequence(", ", item)))
+    return sequence("[", items if min_items else optional(items), "]")
+
+
+def obj(fields: list, quote: str = '"'):
+    """An object with exactly these (key, value) fields, in order, separated like json.dumps()."""
+    parts = ["{"]
+    for i, (key, value) in enumerate(fields):
+        parts += [f"{', ' if i else ''}{quote}{key}{quote}: ", value]
+    return sequence(*parts, "}")
+
+
+class Grammar:
+    """A grammar node compiled to an NFA, turned into a DFA lazily as text is matched.
+
+    States are ints; -1 is the dead state. All methods are meant to be called
+    from a single thread (the batcher's worker).
+    """
+
+    def __init__(self, node):
+        self._edges = []  # per NFA state: [(label, target)]; a label supports `char in label`
+        self._eps = []
+        entry, self._accept = self._build(node)
+        self._sets, self._index, self._moves = [], {}, []
+        self.start = self._intern(self._closure({entry}))
+
+    def _new(self) -> int:
+        self._edges.append([])
+        self._eps.append([])
+        return len(self._edges) - 1
+
+    def _build(self, node):
+        kind = node[0]
+        if kind == "lit":
+            entry = exit = self._new()
+            for char in node[1]:
+                nxt = self._new()
+                self._edges[exit].append((char, nxt))
+                exit = nxt
+            return entry, exit
+        if kind == "chars":
+            entry, exit = self._new(), self._new()
+            self._edges[entry].append((node[1], exit))
+            return entry, exit
+        if kind == "seq":
+            entry = exit = self._new()
+            for part in node[1]:
+                start, end = self._build(part)
+                self._eps[exit].append(start)
+                exit = end
+            return entry, exit
+        if kind == "alt":
+            entry, exit = self._new(), self._new()
+            for part in node[1]:
+                start, end = self._build(part)
+                self._eps[entry].append(start)
+                self._eps[end].append(exit)
+            return entry, exit
+        if kind == "rep":
+            _, part, min_count, max_count = node
+            entry = exit = self._new()
+            for _ in range(min_count):
+                start, end = self._build(part)
+                self._eps[exit].append(start)
+                exit = end
+            if max_count is None:
+                start, end = self._build(part)
+                self._eps[exit].append(start)
+                self._eps[end].append(exit)
+                return entry, exit
+            done = self._new()
+            for _ in range(max_count - min_count):
+                self._eps[exit].append(done)
+                start, end = self._build(part)
+                self._eps[exit].append(start)
+                exit = end
+            self._eps[exit].append(done)
+            return entry, done
+        if kind == "body":
+            quote = node[1]
+            loop, escape = self._new(), self._new()
+            self._edges[loop] += [(_StringChar(quote), loop), ("\\", escape)]
+            self._edges[escape] += [(char, loop) for char in quote + "\\/bfnrt"]
+            hexes = [self._new() for _ in range(4)]
+            self._edges[escape].append(("u", hexes[0]))
+            for here, there in zip(hexes, hexes[1:] + [loop]):
+                self._edges[here].append((_HEX, there))
+            return loop, loop
+        raise ValueError(f"Unknown grammar node {kind!r}")
+
+    def _closure(self, states) -> frozenset:
+        stack, seen = list(states), set(states)
+        while stack:
+            for nxt in self._eps[stack.pop()]:
+                if nxt not in seen:
+                    seen.add(nxt)
+                    stack.append(nxt)
+        return frozenset(seen)
+
+    def _intern(self, states: frozenset) -> int:
+        if states not in self._index:
+            self._index[states] = len(self._sets)
+            self._sets.append(states)
+            self._moves.append({})
+        return self._index[states]
+
+    def labels(self, state: int) -> list:
+        return [label for s in self._sets[state] for label, _ in self._edges[s]]
+
+    def move(self, state: int, char: str) -> int:
+        moves = self._moves[state]
+        if char not in moves:
+            targets = {t for s in self._sets[state] for label, t in self._edges[s] if char in label}
+            moves[char] = self._intern(self._closure(targets)) if targets else -1
+        return moves[char]
+
+    def walk(self, state: int, text: str) -> int:
+        for char in text:
+            if state < 0:
+                break
+            state = self.move(state, char)
+        return state
+
+    def accepts(self, state: int) -> bool:
+        return state >= 0 and self._accept in self._sets[state]
+
+    def finished(self, state: int) -> bool:
+        """Accepted, and nothing may follow: generation can stop here."""
+        return self.accepts(state) and not self.labels(state)
+
+    def string_loop(self, state: int):
+        """The _StringChar if `state` is inside a string body, where any run of plain characters is allowed."""
+        labels = self.labels(state)
+        loops = {label for label in labels if isinstance(label, _StringChar)}
+        if len(loops) != 1:
+            return None
+        loop = loops.pop()
+        # Plain characters must only be able to continue the string, not e.g. close it
+        if any(char in loop for label in labels if label is not loop for char in label):
+            return None
+        return loop
+
+
+class Vocabulary:
+    """The text of every token, indexed for building masks quickly."""
+
+    def __init__(self, tokenizer):
+        size = len(tokenizer)
+        excluded = set(getattr(tokenizer, "added_tokens_decoder", {})) | set(tokenizer.all_special_ids)
+        texts = tokenizer.batch_decode([[i] for i in range(size)], skip_special_tokens=False, clean_up_tokenization_spaces=False)
+        self.texts = ["" if i in excluded else text for i, text in enumerate(texts)]
+        self.eos_ids = {tokenizer.eos_token_id} - {None}
+        self.by_first = {}
+        for i, text in enumerate(self.texts):
+            if text:
+                self.by_first.setdefault(text[0], []).append(i)
+        self._plain = {}
+        self._masks = {}
+
+    def plain(self, loop: _StringChar):
+        """(ids of tokens made only of `loop` characters, ids of the other tokens)."""
+        if loop.quote not in self._plain:
+            plain, other = [], []
+            for i, text in enumerate(self.texts):
+                if text:
+                    (plain if all(char in loop for char in text) else other).append(i)
+            self._plain[loop.quote] = (plain, other)
+        return self._plain[loop.quote]
+
+    def allowed_ids(self, grammar: Grammar, state: int) -> list:
+        loop = grammar.string_loop(state)
+        if loop is not None:
+            ids, candidates = self.plain(loop)
+        else:
+            labels = grammar.labels(state)
+            ids = []
+            candidates = [
+                i for first, group in self.by_first.items()
+                if any(first in label for label in labels)
+                for i in group
+            ]
+        ids = list(ids) + [i for i in candidates if grammar.walk(state, self.texts[i]) >= 0]
+        if grammar.accepts(state) or not ids:
+            # Nothing fits (or the object is complete): let the model end the turn
+            ids += sorted(self.eos_ids)
+        return ids
+
+    def mask(self, grammar: Grammar, state: int, size: int, device=None):
+        """Boolean tensor of `size` (the logits width), True where a token is allowed."""
+        import torch
+
+        key = (grammar, state, size, str(device))
+        if key not in self._masks:
+            mask = torch.zeros(size, dtype=torch.bool)
+            ids = [i for i in self.allowed_ids(grammar, state) if i < size]
+            mask[torch.tensor(ids, dtype=torch.long)] = True
+            self._masks[key] = mask.to(device) if device is not None else mask
+        return self._masks[key]
+
+
+_vocabularies = {}
+
+
+def vocabulary(tokenizer) -> Vocabulary:
+    """One Vocabulary per tokenizer, built on first use (a second or two for a 150k vocabulary)."""
+    entry = _vocabularies.get(id(tokenizer))
+    if entry is None or entry[0] is not tokenizer:
+        entry = _vocabularies[id(tokenizer)] = (tokenizer, Vocabulary(tokenizer))
+    return entry[1]
+
+
+def warm(grammar: Grammar, tokenizer, example: str, size: int, device=None):
+    """Builds the vocabulary index and the masks along `example`, so the first requests don't pay for them."""
+    vocab = vocabulary(tokenizer)
+    state = grammar.start
+    for char in example:
+        vocab.mask(grammar, state, size, device)
+        state = grammar.move(state, char)
+        if state < 0:
+            raise ValueError(f"Example does not match the grammar: {example!r}")
+
+
+class Matcher:
+    """Where one generated row is in the grammar."""
+
+    def __init__(self, grammar: Grammar, tokenizer):
+        self.grammar = grammar
+        self.vocab = vocabulary(tokenizer)
+        self.state = grammar.start
+        self.done = False
+
+    def allowed(self, size: int, device=None):
+        return self.vocab.mask(self.grammar, self.state, size, device)
+
+    def advance(self, token_id: int):
+        if self.done:
+            return
+        if token_id in self.vocab.eos_ids:
+            self.done = True
+            return
+        self.state = self.grammar.walk(self.state, self.vocab.texts[token_id])
+        self.done = self.state < 0 or self.grammar.finished(self.state)
+
+
+def mask_logits(logits, matchers: list):
+    """-inf for every token a row's grammar doesn't allow. Rows with no matcher, or a finished one, are left alone."""
+    import torch
+
+    masks = [
+        matcher.allowed(logits.shape[-1], logits.device) if matcher is not None and not matcher.done else None
+        for matcher in matchers
+    ]
+    if all(mask is None for mask in masks):
+        return logits
+    everything = torch.ones(logits.shape[-1], dtype=torch.bool, device=logits.device)
+    allowed = torch.stack([everything if mask is None else mask for mask in masks])
+    return logits.masked_fill(~allowed, float("-inf"))
+
+
+class _GenerateHooks:
+    """Logits processor + stopping criteria that drive Matchers from inside model.generate().
+
+    A row's Matcher is looked up by the tokens generated so far rather than advanced once per
+    call: assisted generation (the speculative profile) scores several draft positions per step
+    and throws some of them away, and its draft model calls the same processor.
+    """
+
+    def __init__(self, grammar: Grammar, tokenizer, rows: int):
+        self.start = [Matcher(grammar, tokenizer) for _ in range(rows)]
+        self.prompt_length = None
+        # (row, generated tokens) -> Matcher after them
+        self._matchers = {}
+
+    def matchers(self, input_ids) -> list:
+        import copy
+
+        if self.prompt_length is None:
+            # The first call is for the first new token: everything so far is prompt
+            self.prompt_length = input_ids.shape[1]
+        matchers = []
+        for row, ids in enumerate(input_ids[:, self.prompt_length:].tolist()):
+            known = len(ids)
+            while known and (row, tuple(ids[:known])) not in self._matchers:
+                known -= 1
+            matcher = self._matchers[(row, tuple(ids[:known]))] if known else self.start[row]
+            for end in range(known + 1, len(ids) + 1):
+                matcher = copy.copy(matcher)
+                matcher.advance(ids[end - 1])
+                self._matchers[(row, tuple(ids[:end]))] = matcher
+            matchers.append(matcher)
+        return matchers
+
+    def __call__(self, input_ids, scores):
+        return mask_logits(scores, self.matchers(input_ids))
+
+    def stop(self, input_ids, scores, **kwargs):
+        import torch
+
+        # Called once the chosen tokens have been appended
+        return torch.tensor([matcher.done for matcher in self.matchers(input_ids)], device=input_ids.device)
+
+
+def generate_kwargs(grammar: Grammar, tokenizer, rows: int = 1) -> dict:
+    """Keyword arguments that constrain model.generate() like Matchers constrain vl_decoding.greedy_generate()."""
+    from transformers import LogitsProcessorList, StoppingCriteriaList
+
+    hooks = _GenerateHooks(grammar, tokenizer, rows)
+    return {"logits_processor": LogitsProcessorList([hooks]), "stopping_criteria": StoppingCriteriaList([hooks.stop])}
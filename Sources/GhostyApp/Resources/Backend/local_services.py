@@ -0,0 +1,326 @@
+"""In-process stand-ins for the Modal services.
+
+Selected with GHOSTY_SERVICES=local. They expose the same call surface the
+backend uses on the real handles (`service.method.remote(...)`,
+`.remote.aio(...)`, `.remote_gen(...)`) and return deterministic results, so
+the client side can be run and benchmarked offline. The orchestrator stand-in
+carries out its canned decision with the real tool code from
+orchestrator_modal, so ShowUI calls (and speculation) go to the ShowUI
+stand-in the same way they would on Modal. Its plans' preconditions hold
+once the screen has changed since the plan was made. Traced calls return
+their spans like the real services do (see tracing.py); the simulated
+inference shows up as generate and check spans. Every call counts the bytes
+its arguments and results would take on the wire (transfer_stats()).
+
+Latency knobs (milliseconds):
+  GHOSTY_LOCAL_LOOKUP_MS  - simulated service handle lookup
+  GHOSTY_LOCAL_INVOKE_MS  - simulated orchestrator inference
+  GHOSTY_LOCAL_TOKEN_MS   - simulated time per streamed word (invoke_stream)
+  GHOSTY_LOCAL_SHOWUI_MS  - simulated ShowUI grounding per call
+  GHOSTY_LOCAL_CHECK_MS   - simulated precondition check (continue_plan)
+"""
+import asyncio
+import contextlib
+import inspect
+import os
+import re
+import sys
+import threading
+import time
+
+import session_history
+import tracing
+from frame_cache import FrameCache
+
+
+def _delay(env_var: str, default: float = 0.0, stage: str = None):
+    ms = float(os.environ.get(env_var, default))
+    if ms > 0:
+        with tracing.span(stage) if stage else contextlib.nullcontext():
+            time.sleep(ms / 1000.0)
+
+
+_transfer_lock = threading.Lock()
+# "Service.method" -> {"calls", "sent_bytes", "received_bytes"}
+_transfers = {}
+
+
+def payload_bytes(value) -> int:
+    """Approximate serialized size of call arguments or results: bytes and strings in full, numbers 8 bytes."""
+    if isinstance(value, (bytes, bytearray)):
+        return len(value)
+    if isinstance(value, str):
+        return len(value.encode("utf-8"))
+    if isinstance(value, dict):
+        return sum(payload_bytes(k) + payload_bytes(v) for k, v in value.items())
+    if isinstance(value, (list, tuple)):
+        return sum(payload_bytes(v) for v in value)
+    return 8 if isinstance(value, (int, float)) else 0
+
+
+def _count(name: str, sent: int = 0, received: int = 0, call: bool = False):
+    with _transfer_lock:
+        entry = _transfers.setdefault(name, {"calls": 0, "sent_bytes": 0, "received_bytes": 0})
+        entry["calls"] += call
+        entry["sent_bytes"] += sent
+        entry["received_bytes"] += received
+
+
+def transfer_stats() -> dict:
+    """Calls and bytes sent to / received from each stand-in method so far."""
+    with _transfer_lock:
+        return {name: dict(entry) for name, entry in _transfers.items()}
+
+
+def reset_transfer_stats():
+    with _transfer_lock:
+        _transfers.clear()
+
+
+def _metered(fn):
+    name = fn.__qualname__.replace("Local", "", 1).replace("._", ".")
+
+    def call(*args, **kwargs):
+        _count(name, sent=payload_bytes(args) + payload_bytes(kwargs), call=True)
+        result = fn(*args, **kwargs)
+        if inspect.isgenerator(result):
+            return _metered_chunks(name, result)
+        _count(name, received=payload_bytes(result))
+        return result
+    return call
+
+
+def _metered_chunks(name: str, chunks):
+    for chunk in chunks:
+        _count(name, received=payload_bytes(chunk))
+        yield chunk
+
+
+class LocalRemote:
+    """`.remote(...)` blocks; `.remote.aio(...)` runs the call on a worker thread, like a Modal call in flight."""
+
+    def __init__(self, fn):
+        self._fn = fn
+
+    def __call__(self, *args, **kwargs):
+        return self._fn(*args, **kwargs)
+
+    async def aio(self, *args, **kwargs):
+        return await asyncio.get_running_loop().run_in_executor(None, lambda: self._fn(*args, **kwargs))
+
+
+class LocalMethod:
+    """Mimics a Modal method handle: call it through `.remote(...)`, `.remote.aio(...)` or `.remote_gen(...)`."""
+
+    def __init__(self, fn):
+        self._fn = _metered(fn)
+        self.remote = LocalRemote(self._fn)
+
+    def remote_gen(self, *args, **kwargs):
+        yield from self._fn(*args, **kwargs)
+
+
+def _steps(intent: str) -> list:
+    """(step, precondition) pairs the stand-in plans for an intent: open the chat, type, send; anything else is a click."""
+    import service_clients
+
+    if not service_clients.looks_like_messaging(intent):
+        return [("Click the main window", "")]
+    quoted = re.search(r"['\"](.+?)['\"]", intent)
+    text = quoted.group(1) if quoted else intent.split()[-1]
+    chat = re.search(r"\b(?:my|to) ([A-Z]\w*)", intent)
+    if chat is None:
+        return [(f"Type '{text}' in the chat box", ""), ("Press enter", "")]
+    return [
+        (f"Click the {chat.group(1)} chat on the left side", ""),
+        (f"Type '{text}' in the chat box", f"The {chat.group(1)} chat is open"),
+        ("Press enter", ""),
+    ]
+
+
+def _decision(user_prompt: str) -> dict:
+    """The stand-in's decision: the planned steps not in the ACTION HISTORY yet.
+
+    Like the model, it returns the rest of the plan with preconditions; with
+    GHOSTY_PLAN=0 it answers one step per turn, like the model did before plans.
+    """
+    intent, _, history = user_prompt.partition("\n\nACTION HISTORY:")
+    done = sum(1 for line in history.splitlines() if line.startswith("- Turn:"))
+    steps = _steps(intent)
+    remaining = steps[done:]
+    if not remaining:
+        return {"thought": "Every step is done.", "tool": "chat", "tool_input": ["Done."], "task_status": "completed"}
+    if os.environ.get("GHOSTY_PLAN", "1") == "0":
+        remaining = remaining[:1]
+    last = done + len(remaining) == len(steps)
+    return {
+        "thought": f"Local stand-in, {len(steps) - done} of {len(steps)} step(s) to go.",
+        "tool": "gui_action",
+        "tool_input": [step for step, _ in remaining],
+        "preconditions": [""] + [condition for _, condition in remaining[1:]],
+        "task_status": "completed" if last else "working",
+    }
+
+
+class LocalOrchestrator:
+    def __init__(self):
+        _delay("GHOSTY_LOCAL_LOOKUP_MS")
+        self.frames = FrameCache()
+        self.sessions = session_history.SessionStore()
+        self.invoke = LocalMethod(self._invoke)
+        self.invoke_stream = LocalMethod(self._invoke_stream)
+        self.continue_plan = LocalMethod(self._continue_plan)
+        # Frame the last decision was made on: a precondition "holds" once the screen has changed since
+        self._planned_on = None
+        # Simulated reasoning calls and precondition checks so far, for the benchmarks
+        self.decisions = 0
+        self.checks = 0
+
+    def _prompt(self, user_prompt: str, session: dict = None) -> str:
+        # Same session handling as OrchestratorAgent._session_prompt, SessionMiss included
+        if session is None:
+            return user_prompt
+        entry = self.sessions.update(session["id"], session.get("intent"), session.get("lines", []), session.get("base", 0))
+        return session_history.render_prompt(entry["intent"], entry["lines"])
+
+    def _resolve(self, image_bytes: bytes = None, image_key: str = None, image_delta: dict = None):
+        import orchestrator_modal
+
+        with tracing.span("frame", upload="full" if image_bytes else ("delta" if image_delta else "ref")):
+            image_key, img = self.frames.resolve(image_bytes, image_key, image_delta)
+        # Indexed as OrchestratorAgent._resolve_frame does, for the real resolve_targets
+        orchestrator_modal.text_indexes.start(image_key, img)
+        return image_key, img
+
+    def _invoke(self, user_prompt: str = "", image_bytes: bytes = None, image_key: str = None, image_delta: dict = None, session: dict = None, trace: dict = None) -> str:
+        import orchestrator_modal
+
+        return orchestrator_modal.traced(trace, lambda: self._respond(user_prompt, image_bytes, image_key, image_delta, session))
+
+    def _respond(self, user_prompt: str, image_bytes: bytes = None, image_key: str = None, image_delta: dict = None, session: dict = None) -> str:
+        user_prompt = self._prompt(user_prompt, session)
+        image_key, img = self._resolve(image_bytes, image_key, image_delta)
+        return self._decide(user_prompt, img, image_bytes, image_key)
+
+    def _decide(self, user_prompt: str, img, image_bytes: bytes = None, image_key: str = None) -> str:
+        import orchestrator_modal
+
+        self.decisions += 1
+        lower = user_prompt.lower()
+        if any(word in lower for word in ("thanks", "done", "go away", "hide")):
+            _delay("GHOSTY_LOCAL_INVOKE_MS", stage="generate")
+            return "TASK_STATUS: completed\nTHOUGHT: The user is done.\nCOMMAND_HIDE_GHOSTY"
+        if img is None:
+            _delay("GHOSTY_LOCAL_INVOKE_MS", stage="generate")
+            return (
+                "TASK_STATUS: working\nTHOUGHT: Local stand-in saw no screenshot.\n"
+                'GUI Action executed. Result from vision model: {"action": "CLICK", "position": [0.5, 0.9]}'
+            )
+
+        # Reasoning is simulated; the decision is carried out by the real tool code against LocalShowUI.
+        # Its [Orchestrator] logging goes to stderr: stdout carries the client's response.
+        frame = image_bytes or self.frames.get_bytes(image_key)
+        with contextlib.redirect_stdout(sys.stderr):
+            prefetch = orchestrator_modal.speculate(user_prompt, frame, image_key)
+            try:
+                _delay("GHOSTY_LOCAL_INVOKE_MS", stage="generate")
+                self._planned_on = image_key
+                return orchestrator_modal.respond(_decision(user_prompt), frame, image_key, prefetch)
+            finally:
+                if prefetch is not None:
+                    prefetch.finish()
+
+    def _continue_plan(self, user_prompt: str = "", plan: dict = None, image_bytes: bytes = None, image_key: str = None, image_delta: dict = None, session: dict = None, trace: dict = None) -> str:
+        import orchestrator_modal
+
+        return orchestrator_modal.traced(trace, lambda: self._continue(user_prompt, plan, image_bytes, image_key, image_delta, session))
+
+    def _continue(self, user_prompt: str, plan: dict, image_bytes: bytes = None, image_key: str = None, image_delta: dict = None, session: dict = None) -> str:
+        import orchestrator_modal
+
+        user_prompt = self._prompt(user_prompt, session)
+        image_key, img = self._resolve(image_bytes, image_key, image_delta)
+        self.checks += 1
+        if img is not None and image_key != self._planned_on:
+            frame = image_bytes or self.frames.get_bytes(image_key)
+            with contextlib.redirect_stdout(sys.stderr):
+                prefetch = orchestrator_modal.speculate(user_prompt, frame, image_key)
+                try:
+                    _delay("GHOSTY_LOCAL_CHECK_MS", stage="check")
+                    decision = {
+                        "thought": f"{plan['preconditions'][0]}, continuing with: {plan['steps'][0]}",
+                        "tool": "gui_action",
+                        "tool_input": plan["steps"],
+                        "preconditions": [""] + list(plan["preconditions"][1:]),
+                        "task_status": plan.get("task_status", "working"),
+                    }
+                    return orchestrator_modal.respond(decision, frame, image_key, prefetch)
+                finally:
+                    if prefetch is not None:
+                        prefetch.finish()
+        # The screen didn't change: the precondition fails and the prompt is re-planned
+        _delay("GHOSTY_LOCAL_CHECK_MS", stage="check")
+        return self._decide(user_prompt, img, image_bytes, image_key)
+
+    def _invoke_stream(self, user_prompt: str = "", image_bytes: bytes = None, image_key: str = None, image_delta: dict = None, session: dict = None, trace: dict = None):
+        trace = tracing.from_arg(trace, "orchestrator")
+        chunks = self._stream(user_prompt, image_bytes, image_key, image_delta, session)
+        if trace is None:
+            yield from chunks
+            return
+        yield from tracing.stream(chunks, trace)
+        yield "\n" + tracing.trace_line(trace)
+
+    def _stream(self, user_prompt: str, image_bytes: bytes = None, image_key: str = None, image_delta: dict = None, session: dict = None):
+        # Same content as _invoke, in invoke_stream's order: thought first, any pending plan, status last
+        with tracing.span("invoke", stream=True):
+            lines = self._respond(user_prompt, image_bytes, image_key, image_delta, session).split("\n")
+            status, thought, rest = lines[0], lines[1], lines[2:]
+            plan = [line for line in rest if line.startswith("PLAN_PENDING: ")]
+            rest = [line for line in rest if line not in plan]
+            for word in thought.split(" "):
+                _delay("GHOSTY_LOCAL_TOKEN_MS")
+                yield word if word == "THOUGHT:" else " " + word
+            yield "\n" + "\n".join(rest) + "\n"
+            for line in plan:
+                yield line + "\n"
+            yield status
+
+
+class LocalShowUI:
+    """Answers grounding prompts with fixed positions: the chat input for the INPUT short-circuit, else the window."""
+
+    def __init__(self):
+        _delay("GHOSTY_LOCAL_LOOKUP_MS")
+        self.frames = FrameCache(capacity=16)
+        self.run_inference = LocalMethod(self._run_inference)
+        self.run_inference_batch = LocalMethod(self._run_inference_batch)
+
+    @staticmethod
+    def _answer(prompt: str) -> str:
+        if prompt.startswith("Click on the text input field"):
+            return "{'action': 'CLICK', 'position': [0.49, 0.94]}"
+        return "{'action': 'CLICK', 'position': [0.5, 0.9]}"
+
+    def _run_inference(self, image_url: str = None, image_bytes: bytes = None, prompt: str = "", system_prompt: str = "", image_key: str = None) -> str:
+        return self._run_inference_batch(image_bytes=image_bytes, prompts=[prompt], image_key=image_key)[0]
+
+    def _run_inference_batch(self, image_bytes: bytes = None, prompts: list = None, image_key: str = None, trace: dict = None, regions: list = None):
+        # `regions` are accepted and ignored: the fixed answers are already in full-frame coordinates
+        trace = tracing.from_arg(trace, "showui")
+        if trace is None:
+            return self._ground(image_bytes, prompts, image_key)
+        with tracing.serve(trace), tracing.span("invoke", prompts=len(prompts or [])):
+            answers = self._ground(image_bytes, prompts, image_key)
+        return {"answers": answers, "spans": trace.spans}
+
+    def _ground(self, image_bytes: bytes = None, prompts: list = None, image_key: str = None) -> list:
+        # Raises FrameCacheMiss for a key this stand-in doesn't have, like the real service
+        with tracing.span("frame", upload="full" if image_bytes else "ref"):
+            self.frames.resolve(image_bytes=image_bytes, image_key=image_key)
+        _delay("GHOSTY_LOCAL_SHOWUI_MS", stage="generate")
+        return [self._answer(prompt) for prompt in prompts or []]
+
+
+# service_clients.SERVICES name -> stand-in
+LOCAL_SERVICES = {"orchestrator": LocalOrchestrator, "showui": LocalShowUI}
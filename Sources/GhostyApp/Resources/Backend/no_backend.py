@@ -2,6 +2,11 @@ import sys
 import time
 
 def main() -> int:
+    if sys.argv[1:2] == ["--settle"]:
+        # No screen to watch: the fixed settle pause
+        time.sleep(1)
+        print('{"reason": "unchanged", "changed": false, "ms": 1000.0, "samples": 0}')
+        return 0
     text = " ".join(sys.argv[1:]).strip()
     time.sleep(1)
     # GhostyApp expects the response on stdout
@@ -1,4 +1,19 @@
 import modal
+import threading
+from collections import OrderedDict
+
+import batching
+import cold_start
+import inference_profiles
+import json_grammar
+import partial_json
+import roi
+import service_clients
+import session_history
+import text_index
+import tracing
+import vl_decoding
+from frame_cache import FrameCache, is_cache_miss
 
 # Shared volume for Hugging Face cache
 volume = modal.Volume.from_name("showui-model-cache", create_if_missing=True)
@@ -16,23 +31,716 @@ image = (
         "numpy",
         "langchain>=0.3.0",
         "langchain-huggingface>=0.1.0",
+        "bitsandbytes>=0.46.1",
+        "rapidocr-onnxruntime",
     )
+    # OpenCV (RapidOCR's image handling) needs these on debian-slim
+    .apt_install("libgl1", "libglib2.0-0")
+    # The deployment's inference profile and snapshot settings (see inference_profiles.py, cold_start.py)
+    .env({"GHOSTY_PROFILE": inference_profiles.default(), **cold_start.image_env()})
+    .add_local_python_source("batching", "cold_start", "frame_cache", "inference_profiles", "json_grammar", "partial_json", "roi", "service_clients", "session_history", "text_index", "tracing", "vl_decoding")
 )
 
 app = modal.App("ghosty-orchestrator")
 
+# Use the newer 2.5 7B model for stronger reasoning capabilities
+MODEL_ID = "Qwen/Qwen2.5-VL-7B-Instruct"
+
+SYSTEM_INSTRUCTIONS = """You are Ghosty, a helpful MacOS assistant. 
+Analyze the user's screen and request. 
+
+CRITICAL SPATIAL AWARENESS:
+1. **Ghosty Zone**: Your own UI, usually a panel at the top center of the screen, has been BLACKED OUT in the screenshot. NEVER interact with anything in this black area. The screenshot may also show just one application window instead of the whole screen.
+2. **Chat Inputs**: In almost all Mac applications (Discord, iMessage, Slack), the text input field is at the BOTTOM of the window, typically at `y` coordinates greater than `0.8`.
+3. **Sidebars**: Navigation lists are usually on the LEFT, typically at `x` coordinates less than `0.2`.
+
+Your goal is to find the REAL application UI behind or around the black "Ghosty Zone".
+
+Your prompt may contain an "ACTION HISTORY" section. Use this to:
+1. Avoid repeating the same failed clicks or inputs.
+2. Realize when a task is progressing or stalled.
+3. If you see "Action refused", it means your target coordinate was inside the Ghosty panel. You MUST find the correct target in the background application instead (e.g., look lower on the screen for chat boxes).
+
+Available Tools:
+1. "gui_action": Use this to interact with the UI. 
+   - `tool_input` is a PLAN: the steps to carry out, in order, one instruction per step.
+   - List several steps when you can predict what each one leads to (e.g. open a chat, type the message, press enter). Stop the plan where you would need to see the result before deciding what comes next.
+   - `preconditions` has one entry per step: what must be visible on screen before that step can run (e.g. "The DIBZS chat is open"), or "" if the step can follow the previous one right away. The first step's is always "".
+   - Do NOT use "SEND". In messenging apps, follow "Type '...' in the chat box" with a "Press enter" step.
+2. "hide": Dismiss yourself.
+3. "chat": Response to the user or summarize a completed task.
+
+Rule: If you just typed text into a chat box (check ACTION HISTORY), and the intention is to send a message, your next step should almost always be a "Press enter" gui_action.
+
+You MUST respond in strict JSON format:
+{
+    "thought": "Explain your reasoning for this step, referencing previous actions or why you are avoiding the Ghosty Zone if applicable.",
+    "tool": "gui_action" | "hide" | "chat",
+    "tool_input": ["<first step>", "<next step>", ...],
+    "preconditions": ["", "<what must be on screen before the next step>", ...],
+    "task_status": "working" | "completed"
+}
+
+Rule: Set `task_status` to "completed" ONLY when the user's request is fully finished once all steps in `tool_input` have run. Otherwise, use "working".
+
+Rule: `tool_input` MUST ALWAYS be a JSON array of strings, even if there is only one instruction. `preconditions` is a JSON array of strings of the same length ([] for "hide" and "chat").
+
+Example 1:
+User: "Tell my DIBZS group chat 67"
+Response: {"thought": "The user wants to send a message. I can see the blacked out area in the center, so I will ignore it and look for the DIBZS chat in the sidebar on the left, then type the message and send it.", "tool": "gui_action", "tool_input": ["Click the DIBZS chat on the left side", "Type '67' in the chat box", "Press enter"], "preconditions": ["", "The DIBZS chat is open", ""], "task_status": "completed"}
+
+Example 2:
+User: "Thanks, I'm done"
+Response: {"tool": "hide", "tool_input": ["Listening..."], "preconditions": [], "task_status": "completed"}
+
+Example 3:
+User: "What does that error mean?"
+Response: {"tool": "chat", "tool_input": ["That error means the network is disconnected..."], "preconditions": [], "task_status": "completed"}
+
+Example 4 (Multi-turn):
+Action History: ["- Turn: INPUT at (0.50, 0.90) with value '67'"]
+User: "Tell my DIBZS group chat 67"
+Response: {"thought": "I have already typed '67' into the chat box at the bottom. Now I need to press enter to send the message.", "tool": "gui_action", "tool_input": ["Press enter"], "preconditions": [""], "task_status": "completed"}
+"""
+
+# The decision object above; decoding is constrained to it and stops at its closing brace
+DECISION_GRAMMAR = json_grammar.Grammar(json_grammar.obj([
+    ("thought", json_grammar.string()),
+    ("tool", json_grammar.enum("gui_action", "hide", "chat")),
+    ("tool_input", json_grammar.array(json_grammar.string(), min_items=1)),
+    ("preconditions", json_grammar.array(json_grammar.string())),
+    ("task_status", json_grammar.enum("working", "completed")),
+]))
+
+# Answer to check_prompt(): whether a plan step's precondition holds on the current screen
+CHECK_GRAMMAR = json_grammar.Grammar(json_grammar.obj([("holds", json_grammar.choice("true", "false"))]))
+
+# Response line carrying the steps of a plan that wait for a precondition (see split_plan)
+PLAN_MARKER = "PLAN_PENDING: "
+
+
+def check_prompt(condition: str) -> str:
+    return (
+        f"PRECONDITION CHECK: Look only at the current screen. Is the following true: \"{condition}\"? "
+        'Respond with JSON: {"holds": true} or {"holds": false}'
+    )
+
+
+def parse_check(text: str) -> bool:
+    """Whether a CHECK_GRAMMAR answer says the precondition holds; anything unreadable counts as not holding."""
+    import json
+    try:
+        return json.loads(text.strip()).get("holds") is True
+    except (ValueError, AttributeError):
+        return False
+
+
+def build_messages(user_prompt: str, img=None, min_pixels: int = None, max_pixels: int = None, image_last: bool = False) -> list:
+    """System and user turn. With `image_last` the screenshot follows the text, so everything before it
+    (system prompt, intent, action history) is text that a session's KV cache can carry over between turns."""
+    user_content = [{"type": "text", "text": user_prompt}]
+    if img is not None:
+        image = {"type": "image", "image": img, "min_pixels": min_pixels, "max_pixels": max_pixels}
+        user_content.insert(1 if image_last else 0, image)
+    return [
+        {"role": "system", "content": [{"type": "text", "text": SYSTEM_INSTRUCTIONS}]},
+        {"role": "user", "content": user_content}
+    ]
+
+
+def generate_reference(model, processor, messages: list, max_new_tokens: int = 256, streamer=None, grammar=None, assistant_model=None) -> str:
+    """Full prefill through processor + model.generate. The reference path for generate_cached.
+
+    With an `assistant_model` (the speculative profile's draft) decoding is transformers' assisted generation.
+    """
+    from qwen_vl_utils import process_vision_info
+
+    with tracing.span("preprocess"):
+        text = processor.apply_chat_template(messages, tokenize=False, add_generation_prompt=True)
+        image_inputs, video_inputs = process_vision_info(messages)
+        inputs = processor(
+            text=[text], images=image_inputs, videos=video_inputs, padding=True, return_tensors="pt",
+        ).to(model.device)
+    with tracing.span("generate", assisted=assistant_model is not None) as attrs:
+        generated_ids = model.generate(
+            **inputs, max_new_tokens=max_new_tokens, do_sample=False, streamer=streamer, assistant_model=assistant_model,
+            **(json_grammar.generate_kwargs(grammar, processor.tokenizer) if grammar is not None else {}),
+        )
+        generated_ids_trimmed = [out_ids[len(in_ids) :] for in_ids, out_ids in zip(inputs.input_ids, generated_ids)]
+        attrs["tokens"] = len(generated_ids_trimmed[0])
+    return processor.batch_decode(generated_ids_trimmed, skip_special_tokens=True)[0]
+
+
+def build_prefix(model, processor) -> dict:
+    """KV cache of the rendered system turn, which every request starts with."""
+    text = processor.apply_chat_template(build_messages("")[:1], tokenize=False, add_generation_prompt=False)
+    return vl_decoding.prefill_prefix(model, processor, text)
+
+
+def session_prefix(model, processor, messages: list, prefix: dict) -> dict:
+    """The prefix for a conversation built with image_last: everything up to its screenshot.
+
+    Extended from `prefix` (the system prompt's, or the same session's previous
+    turn), so only the tokens that changed since are prefilled.
+    """
+    text = processor.apply_chat_template(messages, tokenize=False, add_generation_prompt=True)
+    # Cut right before a special token, where the text tokenizes the same with or without the rest
+    cut = text.find("<|vision_start|>", len(prefix["text"]))
+    if cut < 0:
+        cut = text.rindex("<|im_end|>")
+    return vl_decoding.extend_prefix(model, processor, prefix, text[:cut])
+
+
+def generate_cached_batch(model, processor, batch_messages: list, prefix: dict, max_new_tokens: int = 256, streamers: list = None, grammar=None) -> list:
+    """Same outputs as generate_reference per conversation, but prefill only covers the images and user turns.
+
+    `grammar` is one grammar for every conversation, or a list with one (or None) per conversation.
+    """
+    texts, images, unique = [], [], {}
+    for messages in batch_messages:
+        texts.append(processor.apply_chat_template(messages, tokenize=False, add_generation_prompt=True))
+        image = next((c for c in messages[-1]["content"] if c["type"] == "image"), None)
+        images.append(image)
+        if image is not None:
+            unique.setdefault(id(image["image"]), image)
+    if unique:
+        first = next(iter(unique.values()))
+        encoded = vl_decoding.encode_images(
+            model, processor, [image["image"] for image in unique.values()], first["min_pixels"], first["max_pixels"]
+        )
+        encoded = dict(zip(unique, encoded))
+        images = [encoded[id(image["image"])] if image is not None else None for image in images]
+    batch = vl_decoding.prepare_batch(model, processor, texts, images, prefix=prefix)
+    cache = vl_decoding.prefix_cache(prefix, rows=len(texts))
+    grammars = grammar if isinstance(grammar, list) else [grammar] * len(texts)
+    matchers = [json_grammar.Matcher(g, processor.tokenizer) if g is not None else None for g in grammars]
+    if all(matcher is None for matcher in matchers):
+        matchers = None
+    generated_ids = vl_decoding.greedy_generate(model, batch, max_new_tokens, past_key_values=cache, streamers=streamers, matchers=matchers)
+    return processor.batch_decode(generated_ids, skip_special_tokens=True)
+
+
+def generate_cached(model, processor, messages: list, prefix: dict, max_new_tokens: int = 256, grammar=None) -> str:
+    return generate_cached_batch(model, processor, [messages], prefix, max_new_tokens, grammar=grammar)[0]
+
+
+def generate_many(model, processor, batch_messages: list, prefix: dict = None, max_new_tokens: int = 256, streamers: list = None, grammar=None, assistant_model=None) -> list:
+    """One padded batch with the prefix cache; without one, each conversation goes through generate_reference
+    (with `assistant_model` as its draft, if given).
+
+    `prefix` may also be a list with one prefix per conversation (sessions carry their own);
+    conversations sharing a prefix are batched together.
+    """
+    streamers = streamers or [None] * len(batch_messages)
+    grammars = grammar if isinstance(grammar, list) else [grammar] * len(batch_messages)
+    if isinstance(prefix, list):
+        groups = OrderedDict()
+        for row, row_prefix in enumerate(prefix):
+            groups.setdefault(id(row_prefix), (row_prefix, []))[1].append(row)
+        results = [None] * len(batch_messages)
+        for group_prefix, rows in groups.values():
+            outputs = generate_many(
+                model, processor, [batch_messages[row] for row in rows], group_prefix, max_new_tokens,
+                [streamers[row] for row in rows], [grammars[row] for row in rows], assistant_model,
+            )
+            for row, output in zip(rows, outputs):
+                results[row] = output
+        return results
+    if prefix is not None:
+        return generate_cached_batch(model, processor, batch_messages, prefix, max_new_tokens, streamers, grammars)
+    return [
+        generate_reference(model, processor, messages, max_new_tokens, streamer, g, assistant_model)
+        for messages, streamer, g in zip(batch_messages, streamers, grammars)
+    ]
+
+
+def compare_prefix_cache(model, processor, prefix: dict, prompts: list, img=None, min_pixels: int = None, max_pixels: int = None, max_new_tokens: int = 256, grammar=None) -> dict:
+    """Greedy outputs with and without the prefix cache, and time to first token of each."""
+    import time
+    import torch
+
+    def timed(fn, *args, **kwargs):
+        if torch.cuda.is_available():
+            torch.cuda.synchronize()
+        start = time.perf_counter()
+        result = fn(*args, **kwargs)
+        if torch.cuda.is_available():
+            torch.cuda.synchronize()
+        return result, (time.perf_counter() - start) * 1000
+
+    rows = []
+    for prompt in prompts:
+        messages = build_messages(prompt, img, min_pixels, max_pixels)
+        reference = generate_reference(model, processor, messages, max_new_tokens, grammar=grammar)
+        cached = generate_cached(model, processor, messages, prefix, max_new_tokens, grammar)
+        # One new token = prefill + first decode step
+        _, ttft_full = timed(generate_reference, model, processor, messages, 1)
+        _, ttft_cached = timed(generate_cached, model, processor, messages, prefix, 1)
+        rows.append({
+            "prompt": prompt,
+            "match": reference == cached,
+            "reference": reference,
+            "cached": cached,
+            "ttft_full_ms": ttft_full,
+            "ttft_cached_ms": ttft_cached,
+        })
+    return {"prefix_tokens": prefix["length"], "rows": rows}
+
+
+def decision_streamer(tokenizer, prefix):
+    """The streamer invoke_stream reads a decision from, which only ever sees the generated text.
+
+    Without a `prefix` generate_many decodes with model.generate() (GHOSTY_PREFIX_CACHE=0, the speculative
+    profile), which puts the prompt first; greedy_generate never does, so its first put() must not be skipped.
+    """
+    from transformers import TextIteratorStreamer
+
+    return TextIteratorStreamer(tokenizer, skip_prompt=prefix is None, skip_special_tokens=True, timeout=300)
+
+
+def compare_streamed(model, processor, prefix: dict, prompts: list, img=None, min_pixels: int = None, max_pixels: int = None, max_new_tokens: int = 256, grammar=None, draft=None) -> list:
+    """Per prompt, what invoke_stream streams vs. the decision generate_many returns: the text and stream_decision's THOUGHT.
+
+    `prefix` None (and `draft`) decode through model.generate(), as with GHOSTY_PREFIX_CACHE=0 and the speculative profile.
+    """
+    from concurrent.futures import ThreadPoolExecutor
+
+    rows = []
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        for prompt in prompts:
+            messages = build_messages(prompt, img, min_pixels, max_pixels)
+            streamer, chunks = decision_streamer(processor.tokenizer, prefix), []
+
+            def tee():
+                for chunk in streamer:
+                    chunks.append(chunk)
+                    yield chunk
+
+            generation = executor.submit(generate_many, model, processor, [messages], prefix, max_new_tokens, [streamer], grammar, draft)
+            lines = "".join(stream_decision(tee()))
+            text = generation.result()[0]
+            thought = partial_json.partial_string(text, "thought")[0] or ""
+            shown = lines[len("THOUGHT: "):] if lines.startswith("THOUGHT: ") else ""
+            rows.append({
+                "prompt": prompt,
+                "text": text,
+                "streamed": "".join(chunks),
+                "thought": shown.split("\n")[0],
+                "match": "".join(chunks) == text and shown.startswith(thought),
+            })
+    return rows
+
+
+def compare_constrained(model, processor, prefix: dict, prompts: list, img=None, min_pixels: int = None, max_pixels: int = None, max_new_tokens: int = 256) -> dict:
+    """Parse failures and generated tokens per decision, free-form vs. constrained to DECISION_GRAMMAR."""
+    import json
+    import time
+
+    report = {}
+    for mode, grammar in (("free", None), ("constrained", DECISION_GRAMMAR)):
+        rows = []
+        for prompt in prompts:
+            messages = build_messages(prompt, img, min_pixels, max_pixels)
+            counter = vl_decoding.TokenCounter(skip_prompt=prefix is None)
+            start = time.perf_counter()
+            text = generate_many(model, processor, [messages], prefix, max_new_tokens, [counter], grammar)[0]
+            ms = (time.perf_counter() - start) * 1000
+            try:
+                parsed = isinstance(parse_decision(text), dict)
+            except json.JSONDecodeError:
+                parsed = False
+            rows.append({"prompt": prompt, "text": text, "parsed": parsed, "tokens": counter.count, "ms": ms})
+        report[mode] = rows
+    return report
+
+
+def compare_session_prefill(model, processor, prefix: dict, intent: str, actions: list, img=None, min_pixels: int = None, max_pixels: int = None, max_new_tokens: int = 256) -> list:
+    """Per turn of a task: prompt tokens, prefilled tokens and time to first token, with the whole
+    transcript re-sent (the app's old history lines, screenshot first) vs. a session carrying its KV
+    cache over (compact lines, screenshot last). Session outputs are checked against generate_reference.
+    """
+    import time
+    import torch
+
+    def timed(fn):
+        if torch.cuda.is_available():
+            torch.cuda.synchronize()
+        start = time.perf_counter()
+        result = fn()
+        if torch.cuda.is_available():
+            torch.cuda.synchronize()
+        return result, (time.perf_counter() - start) * 1000
+
+    def prompt_tokens(messages, row_prefix):
+        text = processor.apply_chat_template(messages, tokenize=False, add_generation_prompt=True)
+        image = vl_decoding.encode_image(model, processor, img, min_pixels, max_pixels) if img is not None else None
+        return vl_decoding.prepare_batch(model, processor, [text], image, prefix=row_prefix)["input_ids"].shape[1]
+
+    def transcript_line(action):
+        # GhostAssistantModel's format before structured turns
+        position = action.get("position")
+        where = f"Optional(({position[0]}, {position[1]}))" if position else "nil"
+        value = f" with value '{action['value']}'" if action.get("value") is not None else ""
+        return f"- Turn: {action['action']} at {where}{value}"
+
+    rows = []
+    previous = prefix
+    for turn in range(len(actions) + 1):
+        transcript = build_messages(
+            session_history.render_prompt(intent, [transcript_line(a) for a in actions[:turn]]), img, min_pixels, max_pixels,
+        )
+        _, transcript_ms = timed(lambda: generate_cached(model, processor, transcript, prefix, 1))
+        compact = build_messages(
+            session_history.render_prompt(intent, [session_history.format_action(a) for a in actions[:turn]]),
+            img, min_pixels, max_pixels, image_last=True,
+        )
+        row_prefix, extend_ms = timed(lambda: session_prefix(model, processor, compact, previous))
+        _, session_ms = timed(lambda: generate_cached(model, processor, compact, row_prefix, 1))
+        total = prompt_tokens(compact, row_prefix)
+        rows.append({
+            "turn": turn + 1,
+            "transcript_tokens": prompt_tokens(transcript, prefix),
+            "transcript_prefilled": prompt_tokens(transcript, prefix) - prefix["length"],
+            "transcript_ms": transcript_ms,
+            "session_tokens": total,
+            "session_prefilled": total - row_prefix["reused"],
+            "session_ms": extend_ms + session_ms,
+            "match": generate_cached(model, processor, compact, row_prefix, max_new_tokens)
+            == generate_reference(model, processor, compact, max_new_tokens),
+        })
+        previous = row_prefix
+    return rows
+
+
+def warm_up(model, processor, grammar=None, draft=None) -> dict:
+    """Container start after the weights are on the GPU; returns the system prompt's prefix cache (or None)."""
+    import os
+    import time
+
+    # The system prompt is the same for every request: prefill it once and reuse its KV cache.
+    # Assisted generation (speculative) goes through model.generate(), which doesn't take it
+    prefix = None
+    if os.environ.get("GHOSTY_PREFIX_CACHE", "1") != "0" and draft is None:
+        start = time.perf_counter()
+        prefix = build_prefix(model, processor)
+        print(f"Cached system prompt prefix: {prefix['length']} tokens in {time.perf_counter() - start:.2f}s")
+    # Build the grammars' token masks now rather than on the first request
+    if grammar is not None:
+        size = model.get_output_embeddings().weight.shape[0]
+        json_grammar.warm(
+            grammar, processor.tokenizer,
+            '{"thought": "I see the chat.", "tool": "gui_action", "tool_input": ["Click the chat", "Press enter"], '
+            '"preconditions": ["", "The chat is open"], "task_status": "working"}',
+            size, model.device,
+        )
+        json_grammar.warm(CHECK_GRAMMAR, processor.tokenizer, '{"holds": false}', size, model.device)
+    # One short decode, so the first request doesn't pay for kernel selection and allocator growth
+    generate_many(model, processor, [build_messages("Hi")], prefix, 1, assistant_model=draft)
+    return prefix
+
+
+def measure_profile(model, processor, prefix: dict, prompts: list, img=None, min_pixels: int = None, max_pixels: int = None, max_new_tokens: int = 256, grammar=None, draft=None) -> dict:
+    """Outputs, generated tokens and latency per prompt, decoded the way OrchestratorAgent decodes under
+    its profile: the prefix cache path, or assisted generation with `draft` (prefix None).
+    """
+    import time
+    import torch
+
+    rows = []
+    for prompt in prompts:
+        messages = build_messages(prompt, img, min_pixels, max_pixels)
+        # model.generate() streams the prompt first; the prefix cache path only the generated tokens
+        counter = vl_decoding.TokenCounter(skip_prompt=prefix is None)
+        if torch.cuda.is_available():
+            torch.cuda.synchronize()
+        start = time.perf_counter()
+        text = generate_many(model, processor, [messages], prefix, max_new_tokens, [counter], grammar, draft)[0]
+        if torch.cuda.is_available():
+            torch.cuda.synchronize()
+        rows.append({"prompt": prompt, "text": text, "tokens": counter.count, "ms": (time.perf_counter() - start) * 1000})
+    tokens, ms = sum(row["tokens"] for row in rows), sum(row["ms"] for row in rows)
+    return {"rows": rows, "tokens_per_s": tokens / ms * 1000 if ms else 0.0, "peak_memory_mb": inference_profiles.peak_memory_mb()}
+
+
+def parse_decision(output_text: str) -> dict:
+    """The model's JSON decision, with any ``` fence stripped. Raises json.JSONDecodeError."""
+    import json
+    clean_json = output_text.strip()
+    if clean_json.startswith("```json"):
+        clean_json = clean_json[7:-3]
+    elif clean_json.startswith("```"):
+        clean_json = clean_json[3:-3]
+    return json.loads(clean_json)
+
+
+def split_plan(decision: dict):
+    """(steps to carry out now, pending plan or None) for a gui_action decision.
+
+    Steps run together up to the first one with a precondition; that one and the
+    rest wait for a fresh screenshot on which the precondition can be checked.
+    The first step's precondition is ignored: the model has just looked at the screen.
+    """
+    steps = list(decision.get("tool_input", []))
+    if decision.get("tool") != "gui_action":
+        return steps, None
+    conditions = [str(c or "").strip() for c in decision.get("preconditions", [])]
+    conditions += [""] * (len(steps) - len(conditions))
+    for i in range(1, len(steps)):
+        if conditions[i]:
+            pending = {"steps": steps[i:], "preconditions": conditions[i:len(steps)], "task_status": decision.get("task_status", "working")}
+            return steps[:i], pending
+    return steps, None
+
+
+def plan_line(pending: dict) -> str:
+    import json
+    return PLAN_MARKER + json.dumps(pending)
+
+
+def respond(decision: dict, image_bytes: bytes = None, image_key: str = None, prefetch=None) -> str:
+    """invoke()'s response for a decision: status and thought lines, the tool's output, then any pending plan."""
+    steps, pending = split_plan(decision)
+    status = "working" if pending else decision.get("task_status", "working")
+    thought = decision.get("thought", "")
+    print(f"[Orchestrator] Thought: {thought} | Status: {status}" + (f" | {len(pending['steps'])} step(s) pending" if pending else ""))
+    output = run_tool(dict(decision, tool_input=steps), image_bytes, image_key, prefetch=prefetch)
+    return f"TASK_STATUS: {status}\nTHOUGHT: {thought}\n{output}" + (f"\n{plan_line(pending)}" if pending else "")
+
+
+def route_output(output_text: str, image_bytes: bytes = None, image_key: str = None, prefetch=None) -> str:
+    """invoke()'s response for the model's raw output: its JSON decision carried out, or the parse failure."""
+    import json
+
+    try:
+        with tracing.span("parse"):
+            decision = parse_decision(output_text)
+    except json.JSONDecodeError:
+        print(f"[Orchestrator] Failed to parse JSON. Raw output: {output_text}")
+        return f"TASK_STATUS: working\nTHOUGHT: Failed to parse model output.\n{output_text}"
+    return respond(decision, image_bytes, image_key, prefetch)
+
+
+def run_tool(decision: dict, image_bytes: bytes = None, image_key: str = None, gui_results: list = None, prefetch=None) -> str:
+    """Carries out the decision's tool and returns its output lines. `gui_results` are used if already dispatched."""
+    tool = decision.get("tool")
+    tool_input = decision.get("tool_input", [])
+    if tool == "gui_action":
+        results = gui_results if gui_results is not None else execute_gui_actions(tool_input, image_bytes, image_key, prefetch)
+        return "\n".join(results)
+    elif tool == "hide":
+        return hide_ghosty()
+    elif tool == "chat":
+        return "\n".join(tool_input)
+    else:
+        return f"I thought about doing '{tool}', but I don't know how to do that yet."
+
+
+def stream_decision(chunks, image_bytes: bytes = None, image_key: str = None, prefetch=None):
+    """Turns the decision's text chunks into response chunks as they arrive.
+
+    Yields "THOUGHT: <thought>" while the thought is being written, then the tool's
+    output, any pending plan and "TASK_STATUS: <status>" last; joined, these are
+    the same lines invoke() returns. A gui_action is dispatched as soon as its
+    steps and their preconditions are complete, while the model is still writing
+    the rest of the JSON.
+    """
+    import json
+    from concurrent.futures import ThreadPoolExecutor
+
+    text, thought_sent, thought_done, dispatched = "", 0, False, None
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        for chunk in chunks:
+            text += chunk
+            if not thought_done:
+                thought, thought_done = partial_json.partial_string(text, "thought")
+                if thought is not None and len(thought) > thought_sent:
+                    yield ("THOUGHT: " if thought_sent == 0 else "") + thought[thought_sent:]
+                    thought_sent = len(thought)
+                if thought_done:
+                    yield "THOUGHT: \n" if thought_sent == 0 else "\n"
+            if dispatched is None and partial_json.complete_value(text, "tool") == ("gui_action", True):
+                tool_input, complete = partial_json.complete_value(text, "tool_input")
+                preconditions, known = partial_json.complete_value(text, "preconditions")
+                if complete and known:
+                    steps, _ = split_plan({"tool": "gui_action", "tool_input": tool_input, "preconditions": preconditions})
+                    print(f"[Orchestrator] Early dispatch of {len(steps)} GUI step(s)")
+                    dispatched = executor.submit(tracing.wrap(execute_gui_actions), steps, image_bytes, image_key, prefetch)
+
+        try:
+            with tracing.span("parse"):
+                decision = parse_decision(text)
+        except json.JSONDecodeError:
+            print(f"[Orchestrator] Failed to parse JSON. Raw output: {text}")
+            if not thought_done:
+                yield "\n" if thought_sent else "THOUGHT: Failed to parse model output.\n"
+            yield f"{text}\nTASK_STATUS: working"
+            return
+
+        if not thought_done:
+            # No (complete) thought field in the stream; send whatever the decision has
+            thought = decision.get("thought", "")
+            yield (thought[thought_sent:] if thought_sent else f"THOUGHT: {thought}") + "\n"
+        steps, pending = split_plan(decision)
+        gui_results = dispatched.result() if dispatched is not None else None
+        yield run_tool(dict(decision, tool_input=steps), image_bytes, image_key, gui_results, prefetch) + "\n"
+        if pending:
+            yield plan_line(pending) + "\n"
+        yield f"TASK_STATUS: {'working' if pending else decision.get('task_status', 'working')}"
+
+
+# Recent screenshots by content hash, so clients can send a reference or a delta instead of the whole image
+frames = FrameCache(capacity=16)
+# Text of recent frames, indexed while the model reasons, for grounding named targets without ShowUI
+text_indexes = text_index.IndexCache(capacity=16)
+# Action history and KV prefix per app session (see session_history.py)
+sessions = session_history.SessionStore(session_history.capacity(), session_history.ttl_s())
+# Frames ShowUI has already been sent (most recent last); those go over as a reference only.
+# Shared by the concurrent inputs and the service_clients loop, so only touched under the lock
+_showui_keys = OrderedDict()
+_showui_keys_lock = threading.Lock()
+
+
+def _showui_has(image_key: str) -> bool:
+    with _showui_keys_lock:
+        return image_key in _showui_keys
+
+
+def _showui_sent(image_key: str):
+    with _showui_keys_lock:
+        _showui_keys[image_key] = True
+        _showui_keys.move_to_end(image_key)
+        while len(_showui_keys) > 16:
+            _showui_keys.popitem(last=False)
+
+
+async def _call_with_frame(method, image_bytes: bytes = None, image_key: str = None, **kwargs):
+    """Calls a ShowUI method, sending just the frame key when ShowUI should still have it."""
+    if image_key is not None and _showui_has(image_key):
+        try:
+            return await service_clients.call(method, image_key=image_key, **kwargs)
+        except Exception as e:
+            if not is_cache_miss(e):
+                raise
+            print("[Orchestrator] ShowUI no longer has the frame, re-sending it.")
+    if image_bytes is None:
+        image_bytes = frames.get_bytes(image_key)
+    result = await service_clients.call(method, image_bytes=image_bytes, image_key=image_key, **kwargs)
+    if image_key:
+        _showui_sent(image_key)
+    return result
+
+
+async def run_showui_batch(showui, prompts: list, image_bytes: bytes = None, image_key: str = None, regions: list = None) -> list:
+    """All prompts against the same frame in one call: ShowUI encodes the screenshot once.
+
+    `regions` (one roi region name or None per prompt) ground those prompts on crops.
+    Under a trace, ShowUI gets it too and its spans join the current traces.
+    """
+    kwargs = {"prompts": prompts}
+    if regions and any(region is not None for region in regions):
+        kwargs["regions"] = [list(roi.box(region)) if region is not None else None for region in regions]
+    traces = tracing.current()
+    if not traces:
+        return await _call_with_frame(showui.run_inference_batch, image_bytes, image_key, **kwargs)
+    with tracing.span("showui", prompts=len(prompts)):
+        result = await _call_with_frame(showui.run_inference_batch, image_bytes, image_key, trace=traces[0].arg(), **kwargs)
+    tracing.extend(result["spans"])
+    return result["answers"]
+
+
+async def ground_prompts(prompts: list, image_bytes: bytes = None, image_key: str = None, prefetch=None, regions: list = None) -> list:
+    """ShowUI's answer per prompt: speculative answers where `prefetch` started one, one batched call for the rest.
+
+    The batched call and the speculative ones still in flight are awaited together.
+    A speculative call that failed is retried with the batch path. `regions` as for run_showui_batch;
+    a prompt and its region are what a speculative call is started and looked up by.
+    """
+    import asyncio
+
+    keys = list(zip(prompts, regions or [None] * len(prompts)))
+    speculative = {}
+    for key in dict.fromkeys(keys):
+        pending = prefetch.take(key) if prefetch is not None else None
+        if pending is not None:
+            speculative[key] = pending
+    rest = [key for key in keys if key not in speculative]
+
+    async def batch(batch_keys):
+        if not batch_keys:
+            return []
+        return await run_showui_batch(
+            service_clients.get("showui"), [prompt for prompt, _ in batch_keys], image_bytes, image_key,
+            [region for _, region in batch_keys],
+        )
+
+    prefetched, batched = await service_clients.fan_out(
+        asyncio.gather(*speculative.values(), return_exceptions=True), batch(rest),
+    )
+    answers = dict(zip(rest, batched))
+    failed = []
+    for key, answer in zip(speculative, prefetched):
+        if isinstance(answer, BaseException):
+            print(f"[Orchestrator] Speculative grounding failed ({answer}), grounding again.")
+            failed.append(key)
+        else:
+            print(f"[Orchestrator] Using speculative grounding for: '{key[0][:60]}'")
+            answers[key] = answer
+    answers.update(zip(failed, await batch(failed)))
+    return [answers[key] for key in keys]
+
+
+def speculate(user_prompt: str, image_bytes: bytes = None, image_key: str = None):
+    """Starts locating the chat input while the model reasons, if the intent is a message to send.
+
+    Returns the Prefetch to pass on to run_tool (and finish() once the turn is over),
+    or None. Not started right after an INPUT or ENTER, when the next step is
+    pressing enter or nothing.
+    """
+    import re
+
+    intent, _, history = user_prompt.partition("\n\nACTION HISTORY:")
+    last = history.strip().splitlines()[-1] if history.strip() else ""
+    if not service_clients.speculation_enabled() or not service_clients.looks_like_messaging(intent):
+        return None
+    if re.match(r"- Turn: (?:INPUT|ENTER)\b", last):
+        return None
+
+    # The region the INPUT step will be grounded on (see plan_gui_action), so the answer can be used for it
+    region = roi.region_for(INPUT_FIELD_PROMPT) if roi.enabled() else None
+
+    async def locate_input_field():
+        showui = service_clients.get("showui")
+        return (await run_showui_batch(showui, [INPUT_FIELD_PROMPT], image_bytes, image_key, [region]))[0]
+
+    print("[Orchestrator] Messaging intent: locating the chat input in parallel with reasoning.")
+    prefetch = service_clients.Prefetch()
+    prefetch.start((INPUT_FIELD_PROMPT, region), locate_input_field())
+    return prefetch
+
+
+# ShowUI prompt for the INPUT short-circuit. Constant, so ShowUI's grounding cache can answer it
+# again while the input field looks the same, and speculate() can ask it before the decision is made.
+INPUT_FIELD_PROMPT = (
+    "Click on the text input field or chat box where a message can be typed. "
+    "IGNORE the black box at the top center. The input field is at the BOTTOM (y > 0.8). "
+    "Respond with JSON: {\"action\": \"CLICK\", \"position\": [x, y]}"
+)
+
+
 # Define tools
-def execute_gui_action(instruction: str, image_bytes: bytes) -> str:
-    """Invokes the ShowUI remote Modal app to click, type, or navigate the UI."""
-    print(f"[Orchestrator] Calling ShowUI tool for: '{instruction}'")
-    
+def plan_gui_action(instruction: str) -> dict:
+    """Decides how a gui_action step is carried out: which ShowUI prompt it needs, if any.
+
+    With GHOSTY_ROI=1, also the screen region ShowUI should look at (None: the full frame).
+    A step that names text on the screen also gets that text as its "target".
+    """
     # Short-circuit: ShowUI is a vision model and can't handle keyboard actions.
     # Detect "press enter/return" instructions and return the action directly.
     lower_instr = instruction.lower().strip()
     if any(phrase in lower_instr for phrase in ["press enter", "press return", "hit enter", "hit return", "send the message"]):
         print("[Orchestrator] Keyboard action detected, bypassing ShowUI.")
-        return "GUI Action executed. Result from vision model: {'action': 'ENTER', 'position': None}"
-    
+        return {"kind": "enter", "prompt": None}
+
     # Short-circuit: For "type X" instructions, compose CLICK + INPUT directly.
     # ShowUI is unreliable at separating instructions from typed content.
     import re
@@ -41,53 +749,131 @@ def execute_gui_action(instruction: str, image_bytes: bytes) -> str:
         text_to_type = type_match.group(1)
         print(f"[Orchestrator] INPUT short-circuit: will type '{text_to_type}' — using ShowUI only for click position.")
         # Still call ShowUI to find WHERE the input field is
-        try:
-            showui = modal.Cls.from_name("showui-service", "ShowUI")()
-            click_prompt = (
-                f"Click on the text input field or chat box where a message can be typed. "
-                f"IGNORE the black box at the top center. The input field is at the BOTTOM (y > 0.8). "
-                f"Respond with JSON: {{\"action\": \"CLICK\", \"position\": [x, y]}}"
-            )
-            click_result = showui.run_inference.remote(image_bytes=image_bytes, prompt=click_prompt)
+        region = roi.region_for(INPUT_FIELD_PROMPT) if roi.enabled() else None
+        return {"kind": "type", "prompt": INPUT_FIELD_PROMPT, "text": text_to_type, "region": region}
+
+    # Minimal prompt — only ask for the action, keep instructions separate
+    gui_prompt = (
+        f"Based on this instruction: '{instruction}'\n"
+        f"IGNORE any black box at the top center of the screen.\n"
+        f"Chat input fields are at the BOTTOM (y > 0.8).\n"
+        f"Respond with JSON. Allowed actions: CLICK, INPUT, ENTER.\n"
+        f"CLICK: {{\"action\": \"CLICK\", \"position\": [x, y]}}\n"
+        f"INPUT: {{\"action\": \"INPUT\", \"value\": \"text\", \"position\": [x, y]}}\n"
+        f"ENTER: {{\"action\": \"ENTER\", \"position\": null}}"
+    )
+    # A named target (text on the screen) may be found in the frame's text index instead (see resolve_targets)
+    target = text_index.target_of(instruction) if text_index.enabled() else None
+    return {
+        "kind": "gui",
+        "prompt": gui_prompt,
+        "region": roi.region_for(instruction) if roi.enabled() else None,
+        "target": target,
+        "target_region": roi.region_for(instruction) if target else None,
+    }
+
+
+def action_json(result: str) -> str:
+    """ShowUI's action dict (Python literal syntax) as strict JSON; other text is returned unchanged."""
+    import ast
+    import json
+    try:
+        action = ast.literal_eval(result.strip())
+    except (ValueError, SyntaxError):
+        return result
+    return json.dumps(action) if isinstance(action, dict) else result
+
+
+def format_gui_result(plan: dict, result: str = None, error: Exception = None) -> str:
+    """Turns ShowUI's answer (or failure) for a planned step into the text the client parses."""
+    import json
+    import re
+    if plan["kind"] == "enter":
+        return f"GUI Action executed. Result from vision model: {json.dumps({'action': 'ENTER', 'position': None})}"
+
+    if plan["kind"] == "type":
+        text_to_type = plan["text"]
+        x, y = 0.49, 0.94  # Fallback: type at bottom-center
+        if error is not None:
+            print(f"[Orchestrator] ShowUI click-for-INPUT failed: {error}")
+        else:
             # Extract position from click result
-            pos_match = re.search(r"\[(\d+\.?\d*),\s*(\d+\.?\d*)\]", click_result)
+            pos_match = re.search(r"\[(\d+\.?\d*),\s*(\d+\.?\d*)\]", result)
             if pos_match:
                 x, y = float(pos_match.group(1)), float(pos_match.group(2))
-                return (
-                    f"GUI Action executed. Result from vision model: "
-                    f"{{'action': 'CLICK', 'position': [{x}, {y}]}},"
-                    f"{{'action': 'INPUT', 'value': '{text_to_type}', 'position': [{x}, {y}]}}"
-                )
+        click = json.dumps({"action": "CLICK", "position": [x, y]})
+        type_text = json.dumps({"action": "INPUT", "value": text_to_type, "position": [x, y]})
+        return f"GUI Action executed. Result from vision model: {click},{type_text}"
+
+    if error is not None:
+        return f"Error executing GUI action: {error}"
+    return f"GUI Action executed. Result from vision model: {action_json(result)}"
+
+
+def resolve_targets(plans: list, image_key: str = None) -> dict:
+    """ShowUI-style answers, by plan index, for the steps whose target the frame's text index finds unambiguously."""
+    targets = [i for i, plan in enumerate(plans) if plan.get("target")]
+    if not targets or image_key is None:
+        return {}
+    answers = {}
+    with tracing.span("text_lookup", targets=len(targets)) as attrs:
+        for i in targets:
+            target = plans[i]["target"]
+            position, outcome = text_indexes.lookup(image_key, target, plans[i]["target_region"], text_index.wait_s())
+            print(f"[Orchestrator] Text index: {outcome} '{target}'" + (f" at {position}" if position else ", asking ShowUI"))
+            if position is not None:
+                answers[i] = text_index.click_answer(position)
+        attrs["resolved"] = len(answers)
+    print(f"[Orchestrator] Text index: {text_indexes.stats()}")
+    return answers
+
+
+def execute_gui_actions(instructions: list, image_bytes: bytes = None, image_key: str = None, prefetch=None) -> list:
+    """Invokes the ShowUI remote Modal app for every step of a turn in one batched call.
+
+    All steps look at the same screenshot, so ShowUI encodes it once and answers
+    the grounding prompts together (ShowUI.run_inference_batch). Prompts already
+    started speculatively (see speculate) use that answer instead, and steps whose
+    named target is in the frame's text index (see resolve_targets) skip ShowUI.
+    """
+    plans = []
+    for instruction in instructions:
+        print(f"[Orchestrator] Calling ShowUI tool for: '{instruction}'")
+        plans.append(plan_gui_action(instruction))
+        if plans[-1].get("region"):
+            print(f"[Orchestrator] Grounding on the {plans[-1]['region']} region only.")
+    resolved = resolve_targets(plans, image_key)
+    grounded = [plan for i, plan in enumerate(plans) if plan["prompt"] is not None and i not in resolved]
+    prompts = [plan["prompt"] for plan in grounded]
+
+    answers, error = [], None
+    if prompts:
+        try:
+            answers = service_clients.run(ground_prompts(prompts, image_bytes, image_key, prefetch, [plan["region"] for plan in grounded]))
         except Exception as e:
-            print(f"[Orchestrator] ShowUI click-for-INPUT failed: {e}")
-        # Fallback: type at bottom-center
-        return (
-            f"GUI Action executed. Result from vision model: "
-            f"{{'action': 'CLICK', 'position': [0.49, 0.94]}},"
-            f"{{'action': 'INPUT', 'value': '{text_to_type}', 'position': [0.49, 0.94]}}"
-        )
+            error = e
+
+    answers = iter(answers)
+    return [
+        format_gui_result(plan, resolved[i]) if i in resolved
+        else format_gui_result(plan, None if plan["prompt"] is None or error else next(answers), error)
+        for i, plan in enumerate(plans)
+    ]
+
+
+def execute_gui_action(instruction: str, image_bytes: bytes = None, image_key: str = None) -> str:
+    """Invokes the ShowUI remote Modal app to click, type, or navigate the UI."""
+    return execute_gui_actions([instruction], image_bytes, image_key)[0]
+
+def traced(trace: dict, run) -> str:
+    """run()'s response; under the caller's `trace` (tracing.py), followed by a TRACE_SPANS line."""
+    trace = tracing.from_arg(trace, "orchestrator")
+    if trace is None:
+        return run()
+    with tracing.serve(trace), tracing.span("invoke"):
+        response = run()
+    return response + "\n" + tracing.trace_line(trace)
 
-    # Dynamically lookup the ShowUI app we already built
-    try:
-        showui = modal.Cls.from_name("showui-service", "ShowUI")()
-        # Minimal prompt — only ask for the action, keep instructions separate
-        gui_prompt = (
-            f"Based on this instruction: '{instruction}'\n"
-            f"IGNORE any black box at the top center of the screen.\n"
-            f"Chat input fields are at the BOTTOM (y > 0.8).\n"
-            f"Respond with JSON. Allowed actions: CLICK, INPUT, ENTER.\n"
-            f"CLICK: {{\"action\": \"CLICK\", \"position\": [x, y]}}\n"
-            f"INPUT: {{\"action\": \"INPUT\", \"value\": \"text\", \"position\": [x, y]}}\n"
-            f"ENTER: {{\"action\": \"ENTER\", \"position\": null}}"
-        )
-        
-        result = showui.run_inference.remote(
-            image_bytes=image_bytes, 
-            prompt=gui_prompt
-        )
-        return f"GUI Action executed. Result from vision model: {result}"
-    except Exception as e:
-        return f"Error executing GUI action: {e}"
 
 def hide_ghosty() -> str:
     """Outputs a specific command to tell the Ghosty app to retreat into the menu bar."""
@@ -95,162 +881,284 @@ def hide_ghosty() -> str:
     return "COMMAND_HIDE_GHOSTY"
 
 
-@app.cls(gpu="L4", image=image, volumes={"/root/.cache/huggingface": volume}, timeout=600, min_containers=1)
+# The CPU cores are for the text index's OCR, which runs while the GPU reasons
+@app.cls(gpu=inference_profiles.gpu(), cpu=4.0, image=image, volumes={"/root/.cache/huggingface": volume}, timeout=600, min_containers=1, **cold_start.cls_options())
+@modal.concurrent(max_inputs=16)
 class OrchestratorAgent:
-    @modal.enter()
-    def setup(self):
-        import os
+    # Inference profile (see inference_profiles.py); empty means the deployment's GHOSTY_PROFILE
+    profile: str = modal.parameter(default="")
+
+    @modal.enter(snap=cold_start.snapshots_enabled())
+    def load(self):
+        """Processor and weights. With memory snapshots this runs once; later containers are restored after it."""
         from transformers import Qwen2_5_VLForConditionalGeneration, AutoProcessor
-        import torch
 
-        # Use the newer 2.5 7B model for stronger reasoning capabilities
-        self.model_id = "Qwen/Qwen2.5-VL-7B-Instruct"
-        print(f"Loading Orchestrator Model {self.model_id} in bfloat16...")
-        
-        self.model = Qwen2_5_VLForConditionalGeneration.from_pretrained(
-            self.model_id,
-            torch_dtype=torch.bfloat16,
-            device_map="auto"
-        )
+        self.model_id = MODEL_ID
+        profile = inference_profiles.resolve(self.profile)
+        self.cold_start = cold_start.PhaseTimer("orchestrator", profile)
+        print(f"Loading Orchestrator Model {self.model_id} with the {profile} profile...")
+
         self.min_pixels = 256*28*28
         self.max_pixels = 1344*28*28
-        self.processor = AutoProcessor.from_pretrained(
-            self.model_id, 
-            min_pixels=self.min_pixels, 
+        self.processor = cold_start.load_processor(
+            self.cold_start, AutoProcessor, self.model_id, profile,
+            min_pixels=self.min_pixels,
             max_pixels=self.max_pixels
         )
+        # self.draft is the speculative profile's draft model, None otherwise
+        self.model = self.draft = None
+        device_map = cold_start.snapshot_device(profile)
+        if device_map is not None:
+            self.model, self.draft, self.load_stats = cold_start.load_weights(
+                self.cold_start, Qwen2_5_VLForConditionalGeneration, self.model_id, profile, device_map,
+            )
+
+    @modal.enter(snap=False)
+    def setup(self):
+        from transformers import Qwen2_5_VLForConditionalGeneration
+
+        self.cold_start.step = "restore"
+        if self.model is None:
+            self.model, self.draft, self.load_stats = cold_start.load_weights(
+                self.cold_start, Qwen2_5_VLForConditionalGeneration, self.model_id, self.cold_start.profile, "auto",
+            )
+        elif self.model.device.type == "cpu":
+            cold_start.to_gpu(self.cold_start, self.model, self.draft)
+        print(f"Loaded in {self.load_stats['load_s']:.1f}s, {self.load_stats['memory_mb']:.0f} MiB of weights")
+        # Decisions are constrained to DECISION_GRAMMAR
+        self.grammar = DECISION_GRAMMAR if json_grammar.enabled() else None
+        with self.cold_start.phase("warmup"):
+            self.prefix = warm_up(self.model, self.processor, self.grammar, self.draft)
+        # Concurrent invokes (and precondition checks) are decoded together in padded batches;
+        # a request is (messages, streamer, grammar, session id or None)
+        self.batcher = batching.MicroBatcher(
+            self._generate,
+            max_batch_size=batching.max_batch_size(),
+            window_ms=batching.window_ms(),
+            name="orchestrator-batcher",
+        )
+        self.cold_start.log()
         print("Orchestrator loaded successfully.")
 
+    def _generate(self, requests: list) -> list:
+        # Runs on the batcher thread, so session prefills are serialized with decoding
+        prefixes = [self._session_prefix(session_id, messages) for messages, _, _, session_id in requests]
+        return generate_many(
+            self.model, self.processor, [messages for messages, _, _, _ in requests], prefixes,
+            streamers=[streamer for _, streamer, _, _ in requests], grammar=[grammar for _, _, grammar, _ in requests],
+            assistant_model=self.draft,
+        )
+
+    def _session_prefix(self, session_id: str, messages: list) -> dict:
+        """The session's KV prefix carried over to this turn; the system prompt's for requests without a session."""
+        import time
+
+        session = sessions.get(session_id) if session_id is not None else None
+        if session is None or self.prefix is None:
+            return self.prefix
+        start = time.perf_counter()
+        with tracing.span("session_prefill") as attrs:
+            prefix = session_prefix(self.model, self.processor, messages, session.get("prefix") or self.prefix)
+            attrs["tokens"] = prefix["length"] - prefix["reused"]
+        session["prefix"] = prefix
+        print(
+            f"[Orchestrator] Session {session_id[:8]}: reused {prefix['reused']} of {prefix['length']} prefix tokens, "
+            f"prefilled {prefix['length'] - prefix['reused']} in {(time.perf_counter() - start) * 1000:.0f} ms"
+        )
+        return prefix
+
+    @staticmethod
+    def _session_prompt(user_prompt: str, session: dict = None) -> str:
+        """The user prompt, rebuilt from the session's stored history plus the lines sent with this turn.
+
+        Raises SessionMiss if this container doesn't have the lines the client assumes; nothing has been
+        generated yet, so the client can simply re-send the whole history.
+        """
+        if session is None:
+            return user_prompt
+        entry = sessions.update(session["id"], session.get("intent"), session.get("lines", []), session.get("base", 0))
+        print(f"[Orchestrator] Session {session['id'][:8]}: {len(session.get('lines', []))} new of {len(entry['lines'])} history lines | {sessions.stats()}")
+        return session_history.render_prompt(entry["intent"], entry["lines"])
+
+    def _resolve_frame(self, image_bytes: bytes = None, image_key: str = None, image_delta: dict = None):
+        upload = "full" if image_bytes else ("delta" if image_delta else "ref")
+        with tracing.span("frame", upload=upload):
+            image_key, img = frames.resolve(image_bytes, image_key, image_delta)
+        text_indexes.start(image_key, img)
+        if img is not None:
+            print(f"[Orchestrator] Image context {img.size} via {upload} upload | frame cache: {frames.stats()}")
+        return image_key, img
+
+    def _decide(self, user_prompt: str, img=None, image_bytes: bytes = None, image_key: str = None, session_id: str = None) -> str:
+        """Reasons about the prompt and screenshot and carries out the decision; invoke()'s response."""
+        messages = build_messages(user_prompt, img, self.min_pixels, self.max_pixels, image_last=session_id is not None)
+        prefetch = speculate(user_prompt, image_bytes, image_key) if img is not None else None
+
+        try:
+            print("[Orchestrator] Reasoning...")
+            output_text = self.batcher.submit((messages, None, self.grammar, session_id))
+            print(f"[Orchestrator] Model Output: {output_text}")
+            print(f"[Orchestrator] Batcher: {self.batcher.stats()}")
+            return route_output(output_text, image_bytes, image_key, prefetch)
+        finally:
+            if prefetch is not None:
+                prefetch.finish()
+                print(f"[Orchestrator] Speculation: {service_clients.prefetch_stats()}")
+
+    def check_preconditions(self, img, conditions: list) -> list:
+        """Whether each condition holds on the screenshot: one short constrained answer each, batched."""
+        grammar = CHECK_GRAMMAR if self.grammar is not None else None
+        requests = [(build_messages(check_prompt(c), img, self.min_pixels, self.max_pixels), None, grammar, None) for c in conditions]
+        with tracing.span("check", conditions=len(conditions)):
+            answers = self.batcher.submit_many(requests)
+        print(f"[Orchestrator] Precondition checks: {list(zip(conditions, answers))}")
+        return [parse_check(answer) for answer in answers]
+
     @modal.method()
-    def invoke(self, user_prompt: str, image_bytes: bytes = None) -> str:
+    def invoke(self, user_prompt: str = "", image_bytes: bytes = None, image_key: str = None, image_delta: dict = None, session: dict = None, trace: dict = None) -> str:
         """
         Takes the user's raw prompt and the screenshot, uses the Qwen2-VL model directly 
         to reason about which tool to call, and returns the result.
+
+        The screenshot arrives as full `image_bytes`, as an `image_key` of a frame this
+        container already has, or as an `image_delta` against one (see frame_cache.py).
+        Raises FrameCacheMiss if the referenced frame is gone; the client re-sends it.
+
+        With a `session` ({"id", "intent", "base", "lines"}, see session_history.py) the
+        prompt is rebuilt from the history this container keeps for the session plus the
+        new lines, and the session's KV cache from its previous turn is extended instead
+        of prefilling the whole prompt again. Raises SessionMiss if the history is gone.
+
+        A gui_action plan whose later steps have preconditions comes back with a
+        PLAN_PENDING line; the client hands it to continue_plan() on its next turn.
+
+        With a `trace` ({"id"}, see tracing.py) the response ends with a TRACE_SPANS
+        line holding this turn's orchestrator and ShowUI spans.
         
         Note: True LangChain ReAct loops inside Modal with Vision models require complex 
         custom LLM wrappers parsing image interleaving. For the MVP, we use the model's 
         native JSON output capabilities as a lightweight functional orchestrator.
         """
-        from PIL import Image
-        from io import BytesIO
-        from qwen_vl_utils import process_vision_info
-        import json
-        import torch
+        return traced(trace, lambda: self._invoke(user_prompt, image_bytes, image_key, image_delta, session))
 
-        user_content = []
+    def _invoke(self, user_prompt: str, image_bytes: bytes = None, image_key: str = None, image_delta: dict = None, session: dict = None) -> str:
+        user_prompt = self._session_prompt(user_prompt, session)
+        image_key, img = self._resolve_frame(image_bytes, image_key, image_delta)
+        return self._decide(user_prompt, img, image_bytes, image_key, session and session["id"])
 
-        system_instructions = """You are Ghosty, a helpful MacOS assistant. 
-Analyze the user's screen and request. 
-
-CRITICAL SPATIAL AWARENESS:
-1. **Ghosty Zone**: The top-center area `[x: 0.3 to 0.7, y: 0.0 to 0.6]` is your own UI. It has been BLACKED OUT in the screenshot. NEVER interact with anything in this black area.
-2. **Chat Inputs**: In almost all Mac applications (Discord, iMessage, Slack), the text input field is at the BOTTOM of the window, typically at `y` coordinates greater than `0.8`.
-3. **Sidebars**: Navigation lists are usually on the LEFT, typically at `x` coordinates less than `0.2`.
-
-Your goal is to find the REAL application UI behind or around the black "Ghosty Zone".
-
-Your prompt may contain an "ACTION HISTORY" section. Use this to:
-1. Avoid repeating the same failed clicks or inputs.
-2. Realize when a task is progressing or stalled.
-3. If you see "Action refused", it means your target coordinate was inside the Ghosty panel. You MUST find the correct target in the background application instead (e.g., look lower on the screen for chat boxes).
-
-Available Tools:
-1. "gui_action": Use this to interact with the UI. 
-   - Provide an instruction for the NEXT IMMEDIATE STEP only.
-   - Do NOT use "SEND". In messenging apps, follow "Type '...' in the chat box" with "Press enter" in the NEXT turn.
-2. "hide": Dismiss yourself.
-3. "chat": Response to the user or summarize a completed task.
+    @modal.method()
+    def continue_plan(self, user_prompt: str = "", plan: dict = None, image_bytes: bytes = None, image_key: str = None, image_delta: dict = None, session: dict = None, trace: dict = None) -> str:
+        """
+        Carries on with a plan from an earlier PLAN_PENDING line, on a fresh screenshot.
 
-Rule: If you just typed text into a chat box in the previous turn (check ACTION HISTORY), and the intention is to send a message, your NEXT action should almost always be a "Press enter" gui_action.
+        If the next step's precondition holds, that step and the ones after it up
+        to the next precondition are carried out without reasoning again. If it
+        doesn't, the prompt is re-planned from this screenshot, exactly like invoke().
+        Same response format, `session` and `trace` handling as invoke().
+        """
+        return traced(trace, lambda: self._continue_plan(user_prompt, plan, image_bytes, image_key, image_delta, session))
 
-You MUST respond in strict JSON format:
-{
-    "thought": "Explain your reasoning for this step, referencing previous actions or why you are avoiding the Ghosty Zone if applicable.",
-    "tool": "gui_action" | "hide" | "chat",
-    "tool_input": ["<specific instruction for this turn>"],
-    "task_status": "working" | "completed"
-}
+    def _continue_plan(self, user_prompt: str, plan: dict, image_bytes: bytes = None, image_key: str = None, image_delta: dict = None, session: dict = None) -> str:
+        user_prompt = self._session_prompt(user_prompt, session)
+        image_key, img = self._resolve_frame(image_bytes, image_key, image_delta)
+        condition = plan["preconditions"][0] if plan.get("preconditions") else ""
+        # The chat input is located while the precondition is checked, as it is while reasoning
+        prefetch = speculate(user_prompt, image_bytes, image_key) if img is not None else None
+        try:
+            if img is not None and self.check_preconditions(img, [condition])[0]:
+                decision = {
+                    "thought": f"{condition}, continuing with: {plan['steps'][0]}",
+                    "tool": "gui_action",
+                    "tool_input": plan["steps"],
+                    "preconditions": [""] + list(plan["preconditions"][1:]),
+                    "task_status": plan.get("task_status", "working"),
+                }
+                return respond(decision, image_bytes, image_key, prefetch)
+        finally:
+            if prefetch is not None:
+                prefetch.finish()
+        print(f"[Orchestrator] Precondition failed ({condition!r}), re-planning.")
+        return self._decide(user_prompt, img, image_bytes, image_key, session and session["id"])
 
-Rule: Set `task_status` to "completed" ONLY when the user's request is fully finished. Otherwise, use "working".
+    @modal.method()
+    def invoke_stream(self, user_prompt: str = "", image_bytes: bytes = None, image_key: str = None, image_delta: dict = None, session: dict = None, trace: dict = None):
+        """
+        Streaming invoke(): yields the response while the model is still generating.
 
-Rule: `tool_input` MUST ALWAYS be a JSON array of strings, even if there is only one instruction.
+        The thought is streamed as it is written; a gui_action is dispatched to ShowUI
+        as soon as its steps and preconditions are complete (see stream_decision).
+        With a `trace`, the TRACE_SPANS line is the last chunk. Call with `.remote_gen(...)`.
+        """
+        trace = tracing.from_arg(trace, "orchestrator")
+        chunks = self._invoke_stream(user_prompt, image_bytes, image_key, image_delta, session)
+        if trace is None:
+            yield from chunks
+            return
+        yield from tracing.stream(chunks, trace)
+        yield "\n" + tracing.trace_line(trace)
 
-Example 1:
-User: "Tell my DIBZS group chat 67"
-Response: {"thought": "The user wants to send a message. I can see the blacked out area in the center, so I will ignore it and look for the DIBZS chat in the sidebar on the left.", "tool": "gui_action", "tool_input": ["Click the DIBZS chat on the left side"], "task_status": "working"}
+    def _invoke_stream(self, user_prompt: str, image_bytes: bytes = None, image_key: str = None, image_delta: dict = None, session: dict = None):
+        with tracing.span("invoke", stream=True):
+            user_prompt = self._session_prompt(user_prompt, session)
+            image_key, img = self._resolve_frame(image_bytes, image_key, image_delta)
+            messages = build_messages(user_prompt, img, self.min_pixels, self.max_pixels, image_last=session is not None)
+            streamer = decision_streamer(self.processor.tokenizer, self.prefix)
+            prefetch = speculate(user_prompt, image_bytes, image_key) if img is not None else None
+            print("[Orchestrator] Reasoning (streaming)...")
+            generation = self.batcher.submit_async((messages, streamer, self.grammar, session and session["id"]))
+            try:
+                yield from stream_decision(streamer, image_bytes, image_key, prefetch)
+            finally:
+                if prefetch is not None:
+                    prefetch.finish()
+                    print(f"[Orchestrator] Speculation: {service_clients.prefetch_stats()}")
+            print(f"[Orchestrator] Model Output: {generation.result()}")
 
-Example 2:
-User: "Thanks, I'm done"
-Response: {"tool": "hide", "tool_input": ["Listening..."], "task_status": "completed"}
+    @modal.method()
+    def prefix_cache_report(self, prompts: list, image_bytes: bytes = None) -> dict:
+        """Greedy equality and time to first token, with vs. without the system prompt cache."""
+        prefix = self.prefix or build_prefix(self.model, self.processor)
+        img = frames.resolve(image_bytes)[1] if image_bytes else None
+        return compare_prefix_cache(
+            self.model, self.processor, prefix, prompts, img, self.min_pixels, self.max_pixels, grammar=self.grammar,
+        )
 
-Example 3:
-User: "What does that error mean?"
-Response: {"tool": "chat", "tool_input": ["That error means the network is disconnected..."], "task_status": "completed"}
+    @modal.method()
+    def session_report(self, intent: str, actions: list, image_bytes: bytes = None) -> list:
+        """Prompt tokens and time to first token per turn, whole transcript vs. session KV reuse."""
+        prefix = self.prefix or build_prefix(self.model, self.processor)
+        img = frames.resolve(image_bytes)[1] if image_bytes else None
+        return compare_session_prefill(self.model, self.processor, prefix, intent, actions, img, self.min_pixels, self.max_pixels)
 
-Example 4 (Multi-turn):
-Action History: ["- Turn: INPUT at Optional((0.5, 0.9)) with value '67'"]
-User: "Tell my DIBZS group chat 67"
-Response: {"thought": "I have already typed '67' into the chat box at the bottom. Now I need to press enter to send the message.", "tool": "gui_action", "tool_input": ["Press enter"], "task_status": "completed"}
-"""
-        
-        if image_bytes:
-            print(f"[Orchestrator] Loading image context ({len(image_bytes)} bytes)")
-            img = Image.open(BytesIO(image_bytes))
-            user_content.append({"type": "image", "image": img, "min_pixels": self.min_pixels, "max_pixels": self.max_pixels})
-        
-        user_content.append({"type": "text", "text": user_prompt})
+    @modal.method()
+    def profile_report(self, prompts: list, image_bytes: bytes = None) -> dict:
+        """Load time, memory and tokens/s of this container's profile on a fixed prompt set."""
+        img = frames.resolve(image_bytes)[1] if image_bytes else None
+        report = measure_profile(
+            self.model, self.processor, self.prefix, prompts, img, self.min_pixels, self.max_pixels,
+            grammar=self.grammar, draft=self.draft,
+        )
+        return {**self.load_stats, **report}
 
-        messages = [
-            {"role": "system", "content": [{"type": "text", "text": system_instructions}]},
-            {"role": "user", "content": user_content}
-        ]
+    @modal.method()
+    def constrained_report(self, prompts: list, image_bytes: bytes = None) -> dict:
+        """Parse failures and generated tokens, free-form vs. grammar-constrained decoding."""
+        prefix = self.prefix or build_prefix(self.model, self.processor)
+        img = frames.resolve(image_bytes)[1] if image_bytes else None
+        return compare_constrained(self.model, self.processor, prefix, prompts, img, self.min_pixels, self.max_pixels)
 
-        text = self.processor.apply_chat_template(messages, tokenize=False, add_generation_prompt=True)
-        image_inputs, video_inputs = process_vision_info(messages)
-        inputs = self.processor(
-            text=[text], images=image_inputs, videos=video_inputs, padding=True, return_tensors="pt",
-        ).to(self.model.device)
+@app.function(gpu="L4", image=image, volumes={"/root/.cache/huggingface": volume}, timeout=1800)
+def bake_weights(profile: str = "") -> list:
+    """Writes the profile's weights and processor (and the speculative draft's) to the volume; see cold_start.py."""
+    from transformers import Qwen2_5_VLForConditionalGeneration, AutoProcessor
 
-        print("[Orchestrator] Reasoning...")
-        generated_ids = self.model.generate(**inputs, max_new_tokens=256, do_sample=False)
-        generated_ids_trimmed = [out_ids[len(in_ids) :] for in_ids, out_ids in zip(inputs.input_ids, generated_ids)]
-        output_text = self.processor.batch_decode(generated_ids_trimmed, skip_special_tokens=True)[0]
-        print(f"[Orchestrator] Model Output: {output_text}")
+    profile = inference_profiles.resolve(profile)
+    paths = [cold_start.bake(Qwen2_5_VLForConditionalGeneration, AutoProcessor, MODEL_ID, profile)]
+    if profile == "speculative":
+        paths.append(cold_start.bake(Qwen2_5_VLForConditionalGeneration, AutoProcessor, inference_profiles.draft_model_id(), "bf16"))
+    volume.commit()
+    return paths
 
-        # Parse the JSON and route
-        try:
-            clean_json = output_text.strip()
-            if clean_json.startswith("```json"):
-                clean_json = clean_json[7:-3]
-            elif clean_json.startswith("```"):
-                clean_json = clean_json[3:-3]
-                
-            decision = json.loads(clean_json)
-            status = decision.get("task_status", "working")
-            thought = decision.get("thought", "")
-            print(f"[Orchestrator] Thought: {thought} | Status: {status}")
-            
-            tool = decision.get("tool")
-            tool_input = decision.get("tool_input", [])
-            
-            prefix = f"TASK_STATUS: {status}\nTHOUGHT: {thought}\n"
-            
-            if tool == "gui_action":
-                results = []
-                for step_instruction in tool_input:
-                    step_result = execute_gui_action(step_instruction, image_bytes)
-                    results.append(step_result)
-                return prefix + "\n".join(results)
-            elif tool == "hide":
-                return prefix + hide_ghosty()
-            elif tool == "chat":
-                return prefix + "\n".join(tool_input)
-            else:
-                return prefix + f"I thought about doing '{tool}', but I don't know how to do that yet."
-                
-        except json.JSONDecodeError:
-            print(f"[Orchestrator] Failed to parse JSON. Raw output: {output_text}")
-            return f"TASK_STATUS: working\nTHOUGHT: Failed to parse model output.\n{output_text}"
 
 @app.local_entrypoint()
 def main():
@@ -262,3 +1170,100 @@ def main():
     res = orch.invoke.remote("Hi Ghosty, are you there?")
     print(f"Test Result: {res}")
     os._exit(0)
+
+
+@app.local_entrypoint()
+def check_prefix_cache(image: str = ""):
+    """modal run orchestrator_modal.py::check_prefix_cache [--image screenshot.png]"""
+    import os
+    prompts = ["Hi Ghosty, are you there?", "Tell my DIBZS group chat 67", "Thanks, I'm done"]
+    image_bytes = open(image, "rb").read() if image else None
+    report = OrchestratorAgent().prefix_cache_report.remote(prompts, image_bytes)
+    print(f"System prompt prefix: {report['prefix_tokens']} tokens")
+    for row in report["rows"]:
+        print(
+            f"{'OK ' if row['match'] else 'DIFF'} ttft {row['ttft_full_ms']:7.1f} ms -> {row['ttft_cached_ms']:7.1f} ms  {row['prompt']}"
+        )
+        if not row["match"]:
+            print(f"     reference: {row['reference']}\n     cached:    {row['cached']}")
+    os._exit(0 if all(row["match"] for row in report["rows"]) else 1)
+
+
+@app.local_entrypoint()
+def check_constrained(image: str = ""):
+    """modal run orchestrator_modal.py::check_constrained [--image screenshot.png]"""
+    import os
+    prompts = [
+        "Hi Ghosty, are you there?",
+        "Tell my DIBZS group chat 67",
+        "Thanks, I'm done",
+        "Open Safari and search for the weather",
+        "What does that error mean?",
+    ]
+    image_bytes = open(image, "rb").read() if image else None
+    report = OrchestratorAgent().constrained_report.remote(prompts, image_bytes)
+    for mode, rows in report.items():
+        failed = sum(not row["parsed"] for row in rows)
+        tokens = sum(row["tokens"] for row in rows) / len(rows)
+        ms = sum(row["ms"] for row in rows) / len(rows)
+        print(f"{mode:<12} parse failures {failed}/{len(rows)}  mean tokens {tokens:6.1f}  mean {ms:7.1f} ms")
+        for row in rows:
+            print(f"    {'ok  ' if row['parsed'] else 'FAIL'} {row['prompt'][:40]:<40} {row['text'][:70]!r}")
+    os._exit(0)
+
+
+@app.local_entrypoint()
+def check_sessions(image: str = ""):
+    """modal run orchestrator_modal.py::check_sessions [--image screenshot.png]"""
+    import os
+    intent = "Tell my DIBZS group chat 67"
+    actions = [
+        {"action": "CLICK", "position": [0.1, 0.3 + 0.02 * i]} if i % 3 else {"action": "INPUT", "position": [0.49, 0.94], "value": "67"}
+        for i in range(9)
+    ]
+    image_bytes = open(image, "rb").read() if image else None
+    rows = OrchestratorAgent().session_report.remote(intent, actions, image_bytes)
+    print(f"{'turn':>4} {'prompt tokens':>15} {'prefilled':>17} {'ttft ms':>19}")
+    for row in rows:
+        print(
+            f"{'OK ' if row['match'] else 'DIFF'}{row['turn']:>2} {row['transcript_tokens']:>6} -> {row['session_tokens']:<6} "
+            f"{row['transcript_prefilled']:>6} -> {row['session_prefilled']:<6} {row['transcript_ms']:>8.1f} -> {row['session_ms']:<8.1f}"
+        )
+    os._exit(0 if all(row["match"] for row in rows) else 1)
+
+
+@app.local_entrypoint()
+def check_profiles(image: str = "", profiles: str = ",".join(inference_profiles.PROFILES)):
+    """modal run orchestrator_modal.py::check_profiles [--image screenshot.png] [--profiles bf16,nf4]"""
+    import os
+    prompts = [
+        "Hi Ghosty, are you there?",
+        "Tell my DIBZS group chat 67",
+        "Open Safari and search for the weather",
+        "Thanks, I'm done",
+    ]
+    image_bytes = open(image, "rb").read() if image else None
+    # Each profile on the GPU it is deployed with, and bf16 on each of those GPUs: speedups compare on the same GPU
+    runs = [(p, inference_profiles.gpu(p)) for p in profiles.split(",")]
+    runs += [("bf16", gpu) for gpu in dict.fromkeys(gpu for _, gpu in runs) if ("bf16", gpu) not in runs]
+    reports = {
+        (p, gpu): OrchestratorAgent.with_options(gpu=gpu)(profile=p).profile_report.remote(prompts, image_bytes)
+        for p, gpu in runs
+    }
+    print(f"{'profile':<12} {'gpu':<5} {'load s':>7} {'weights MiB':>12} {'peak MiB':>9} {'tokens/s':>9} {'vs bf16':>8} {'same as bf16':>13}")
+    for (name, gpu), report in reports.items():
+        baseline = reports[("bf16", gpu)]
+        same = sum(a["text"] == b["text"] for a, b in zip(report["rows"], baseline["rows"]))
+        speedup = report["tokens_per_s"] / baseline["tokens_per_s"] if baseline["tokens_per_s"] else 0.0
+        print(
+            f"{name:<12} {gpu:<5} {report['load_s']:>7.1f} {report['memory_mb']:>12.0f} {report['peak_memory_mb']:>9.0f} "
+            f"{report['tokens_per_s']:>9.1f} {speedup:>7.2f}x {f'{same}/{len(prompts)}':>13}"
+        )
+    os._exit(0)
+
+
+@app.local_entrypoint()
+def bake(profile: str = ""):
+    """modal run orchestrator_modal.py::bake [--profile nf4] - then redeploy, so the snapshot is taken from the baked weights"""
+    for path in bake_weights.remote(profile):
+        print(f"Baked {path}")
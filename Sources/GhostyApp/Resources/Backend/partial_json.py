@@ -0,0 +1,87 @@
+"""Reads fields out of a JSON object that is still being generated.
+
+The orchestrator's decision arrives token by token, e.g.
+    {"thought": "The user wants to send a mess
+so json.loads() can't be used until the very end. These helpers scan the text
+so far and return a field only once its value is complete (or, for strings,
+the part of the value generated so far).
+"""
+import json
+import re
+
+_KEY = r'"{key}"\s*:\s*'
+
+
+def _scan_string(text: str, start: int):
+    """From an opening quote at `start`, returns (raw contents, closed)."""
+    i = start + 1
+    while i < len(text):
+        if text[i] == "\\":
+            i += 2
+            continue
+        if text[i] == '"':
+            return text[start + 1 : i], True
+        i += 1
+    return text[start + 1 :], False
+
+
+def _decode(raw: str) -> str:
+    # Drop a trailing, not yet complete escape sequence before decoding
+    raw = re.sub(r"\\(u[0-9a-fA-F]{0,3})?$", "", raw)
+    try:
+        return json.loads(f'"{raw}"')
+    except json.JSONDecodeError:
+        return raw
+
+
+def _value_start(text: str, key: str) -> int:
+    match = re.search(_KEY.format(key=re.escape(key)), text)
+    return match.end() if match else -1
+
+
+def partial_string(text: str, key: str):
+    """(value so far, complete) for a string field, or (None, False) if it hasn't started."""
+    start = _value_start(text, key)
+    if start < 0 or start >= len(text) or text[start] != '"':
+        return None, False
+    raw, closed = _scan_string(text, start)
+    return _decode(raw), closed
+
+
+def complete_value(text: str, key: str):
+    """(value, True) once a field's value (string, array, object, literal) is fully generated, else (None, False)."""
+    start = _value_start(text, key)
+    if start < 0 or start >= len(text):
+        return None, False
+    opener = text[start]
+    if opener == '"':
+        raw, closed = _scan_string(text, start)
+        return (_decode(raw), True) if closed else (None, False)
+    if opener in "[{":
+        closer = "]" if opener == "[" else "}"
+        depth, i = 0, start
+        while i < len(text):
+            char = text[i]
+            if char == '"':
+                raw, closed = _scan_string(text, i)
+                if not closed:
+                    return None, False
+                i += len(raw) + 2
+                continue
+            if char in "[{":
+                depth += 1
+            elif char in "]}":
+                depth -= 1
+                if depth == 0:
+                    if char != closer:
+                        return None, False
+                    try:
+                        return json.loads(text[start : i + 1]), True
+                    except json.JSONDecodeError:
+                        return None, False
+            i += 1
+        return None, False
+    match = re.match(r"(true|false|null|-?\d+(?:\.\d+)?)(?=\s*[,}\]])", text[start:])
+    if match:
+        return json.loads(match.group(1)), True
+    return None, False
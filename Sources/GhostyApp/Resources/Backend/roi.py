@@ -0,0 +1,119 @@
+"""Region-of-interest grounding: ShowUI looks at the part of the screen a step is about.
+
+The full frame is downscaled to the processor's pixel budget, so small targets
+lose detail and most vision tokens go to areas the step doesn't care about.
+With ROI on, a step that names a region (the chat input, the sidebar, the
+toolbar) is grounded on a crop of that region instead:
+
+  region_for()   the region an instruction is about, by heuristic (None: the full frame)
+  crop()         the region of the frame, resized to fit ROI_MAX_PIXELS (upscaled by at most MAX_ZOOM)
+  map_answer()   ShowUI's answer with its crop-space 0-1 positions mapped back to the full frame
+
+The orchestrator picks the regions (plan_gui_action) and sends them with the
+ShowUI call; ShowUI crops the frame it already has. A crop only gains real
+detail if the frame has more pixels than the processor's budget, so with ROI
+on the client uploads frames at upload_max_pixels(): enough that every
+region's crop fits its budget with native pixels, not upsampled ones
+(~2.6 MP instead of ~1.05 MP, about 2.5x the upload bytes). Full frames are
+still resized to the processor budget on the server, so they cost the same
+vision tokens as before.
+
+Configuration (client, orchestrator and ShowUI):
+  GHOSTY_ROI=1              - ground region steps on crops, and upload frames large enough for them
+                              (default: off, full frames)
+  GHOSTY_ROI_MAX_PIXELS     - pixel budget of a crop (default 672*28*28, half the full frame's)
+"""
+import ast
+import os
+import re
+
+# Normalized (x0, y0, x1, y1) boxes; generous, since a target cut off by the crop can't be found
+REGIONS = {
+    "input": (0.0, 0.75, 1.0, 1.0),
+    "sidebar": (0.0, 0.0, 0.35, 1.0),
+    "toolbar": (0.0, 0.0, 1.0, 0.2),
+}
+MAX_ZOOM = 2.0
+PATCH_SIZE = 28
+
+# Phrases that put a step's target in a region, checked in order
+_HINTS = [
+    ("input", re.compile(r"\b(?:text input|input field|chat box|message box|text field|compose|type\b|typed)", re.IGNORECASE)),
+    ("sidebar", re.compile(r"\b(?:sidebar|side bar|on the left|left side|left panel|left pane)\b", re.IGNORECASE)),
+    ("toolbar", re.compile(r"\b(?:toolbar|tool bar|menu bar|address bar|tab bar|at the top)\b", re.IGNORECASE)),
+]
+
+
+def enabled() -> bool:
+    return os.environ.get("GHOSTY_ROI", "0") == "1"
+
+
+def max_pixels() -> int:
+    return int(os.environ.get("GHOSTY_ROI_MAX_PIXELS", 672 * PATCH_SIZE * PATCH_SIZE))
+
+
+def upload_max_pixels() -> int:
+    """Frame size at which every region's crop still has at least its budget of native pixels."""
+    return max(round(max_pixels() / ((x1 - x0) * (y1 - y0))) for x0, y0, x1, y1 in REGIONS.values())
+
+
+def region_for(text: str):
+    """The name of the region `text` (a step or a ShowUI prompt) is about, or None for the full frame."""
+    for name, pattern in _HINTS:
+        if pattern.search(text or ""):
+            return name
+    return None
+
+
+def box(region) -> tuple:
+    """A region name or an explicit [x0, y0, x1, y1] as a normalized box; None for the full frame."""
+    if region is None:
+        return None
+    if isinstance(region, str):
+        return REGIONS[region]
+    x0, y0, x1, y1 = (min(1.0, max(0.0, float(v))) for v in region)
+    if x1 <= x0 or y1 <= y0:
+        raise ValueError(f"Empty region: {region}")
+    return (x0, y0, x1, y1)
+
+
+def crop(img, region_box: tuple, budget: int = None):
+    """The box's part of `img`, resized to the crop budget on the patch grid (upscaled at most MAX_ZOOM times)."""
+    import math
+    from PIL import Image
+
+    width, height = img.size
+    x0, y0, x1, y1 = region_box
+    part = img.crop((round(x0 * width), round(y0 * height), round(x1 * width), round(y1 * height)))
+    w, h = part.size
+    scale = min(MAX_ZOOM, math.sqrt((budget or max_pixels()) / (w * h)))
+    new_w = max(PATCH_SIZE, math.floor(w * scale / PATCH_SIZE) * PATCH_SIZE)
+    new_h = max(PATCH_SIZE, math.floor(h * scale / PATCH_SIZE) * PATCH_SIZE)
+    return part.resize((new_w, new_h), Image.BICUBIC) if (new_w, new_h) != (w, h) else part
+
+
+def to_frame(position, region_box: tuple):
+    """A crop-space [x, y] (or [[x, y], [x, y]]) mapped back to the full frame's 0-1 space."""
+    if position is None:
+        return None
+    if position and isinstance(position[0], (list, tuple)):
+        return [to_frame(point, region_box) for point in position]
+    x0, y0, x1, y1 = region_box
+    return [round(x0 + float(position[0]) * (x1 - x0), 4), round(y0 + float(position[1]) * (y1 - y0), 4)]
+
+
+def map_answer(answer: str, region_box: tuple) -> str:
+    """ShowUI's answer for a crop, with its position in full-frame coordinates; other text is returned unchanged."""
+    if region_box is None:
+        return answer
+    try:
+        action = ast.literal_eval(answer.strip())
+    except (ValueError, SyntaxError):
+        return answer
+    if not isinstance(action, dict) or not isinstance(action.get("position"), (list, tuple)):
+        return answer
+    try:
+        action["position"] = to_frame(action["position"], region_box)
+    except (TypeError, ValueError, IndexError):
+        return answer
+    return repr(action)
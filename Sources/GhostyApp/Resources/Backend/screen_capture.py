@@ -0,0 +1,528 @@
+"""Screen capture backends and the in-memory screenshot pipeline.
+
+capture -> mask the Ghosty panel in place -> downscale to the model's pixel
+budget -> encode once. Nothing touches the disk on the critical path; archiving
+to ~/Ghosty/screenshots happens on a background thread after the bytes have
+been handed back.
+
+The backend is picked with GHOSTY_CAPTURE:
+  auto (default)      Quartz if pyobjc is installed, else `screencapture`
+  quartz              CoreGraphics display or window image, raw pixels, no PNG round-trip
+  screencapture       macOS `screencapture` piped through stdout
+  file:<path>         replay a fixed screenshot
+  synthetic[:WxH]     generated frames, for benchmarks on any platform
+GHOSTY_ARCHIVE_SCREENSHOTS=0 disables archiving.
+
+What Quartz captures is picked with GHOSTY_CAPTURE_TARGET (`--targets` on
+template_backend.py lists the displays and windows):
+  display (default)   the main display
+  display:N           the Nth active display, 0 being the main one
+  display:front       the display the frontmost window is on
+  window[:front]      the frontmost window that isn't Ghosty's
+  window:<app>        the frontmost window of an app, e.g. window:Messages
+  window:<id>         one window by its number
+A window target without a matching window falls back to the main display.
+Display frames mask Ghosty's windows where they really are; a window frame
+has none of them. Each frame comes with its transform, where it is on the
+screen ({"origin": [x, y], "size": [w, h]} in global display points, top-left
+origin), which the app uses to map normalized 0-1 positions back. The other
+backends capture the main display with the Ghosty Zone masked and no transform.
+
+Upload size:
+  GHOSTY_IMAGE_FORMAT   png (default) | webp (lossless) | jpeg
+  GHOSTY_JPEG_QUALITY   JPEG quality, default 90
+  GHOSTY_MIN_PIXELS / GHOSTY_MAX_PIXELS  pixel budget, defaults match the processors
+                        (with GHOSTY_ROI=1 the maximum is roi.upload_max_pixels(), so crops keep detail)
+  GHOSTY_DOWNSCALE=0    upload the full-resolution frame
+"""
+import os
+import sys
+import io
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+
+import tracing
+
+# Ghosty Zone: [x: 0.3 to 0.7, y: 0.0 to 0.6] is our own UI and gets blacked out when the backend can't
+# tell where Ghosty's windows really are
+GHOSTY_ZONE = (0.3, 0.0, 0.7, 0.6)
+# Window owners that are Ghosty itself
+GHOSTY_OWNERS = {"Ghosty", "GhostyApp"}
+
+# Pixel budget of the Orchestrator and ShowUI processors, on the Qwen2-VL 28px patch grid
+PATCH_SIZE = 28
+MIN_PIXELS = 256 * 28 * 28
+MAX_PIXELS = 1344 * 28 * 28
+
+IMAGE_FORMATS = {"png": "PNG", "webp": "WEBP", "jpeg": "JPEG", "jpg": "JPEG"}
+
+SCREENSHOT_DIR = os.path.expanduser("~/Ghosty/screenshots")
+
+_archive_executor = None
+
+
+class CaptureBackend:
+    name = "base"
+
+    def capture(self):
+        """Returns the current frame as an RGB PIL image."""
+        raise NotImplementedError
+
+    def transform(self):
+        """Where the last frame is on the screen (see frame_transform); None for the main display as a whole."""
+        return None
+
+    def ghosty_zones(self) -> list:
+        """Ghosty's windows in the last frame, as normalized (x0, y0, x1, y1) boxes."""
+        return [GHOSTY_ZONE]
+
+
+def capture_target(spec: str = None) -> str:
+    return (spec or os.environ.get("GHOSTY_CAPTURE_TARGET", "") or "display").strip()
+
+
+def is_ghosty(window: dict) -> bool:
+    return window.get("owner") in GHOSTY_OWNERS
+
+
+def _centre_in(window: dict, bounds: tuple) -> bool:
+    x, y, w, h = window["bounds"]
+    bx, by, bw, bh = bounds
+    return bx <= x + w / 2 < bx + bw and by <= y + h / 2 < by + bh
+
+
+def resolve_target(spec: str, displays: list, windows: list) -> dict:
+    """What a GHOSTY_CAPTURE_TARGET spec captures now: {"kind": "display" | "window", "id", "bounds"}.
+
+    `displays` are {"id", "bounds", "main"} and `windows` {"id", "owner", "name", "layer", "alpha", "bounds"},
+    front to back, bounds being (x, y, width, height) in global display points.
+    """
+    kind, _, arg = capture_target(spec).partition(":")
+    arg = arg.strip()
+    main = next((d for d in displays if d.get("main")), displays[0])
+    # Normal windows of other apps, frontmost first
+    candidates = [
+        w for w in windows
+        if w.get("layer", 0) == 0 and w.get("alpha", 1.0) > 0 and not is_ghosty(w) and min(w["bounds"][2:]) > 1
+    ]
+    front = candidates[0] if candidates else None
+    if kind == "display":
+        if arg == "front":
+            display = next((d for d in displays if front is not None and _centre_in(front, d["bounds"])), main)
+        elif arg.isdigit():
+            # The main display first, the others in the order the system lists them
+            ordered = [main] + [d for d in displays if d is not main]
+            display = ordered[int(arg)] if int(arg) < len(ordered) else main
+        else:
+            display = main
+        return {"kind": "display", "id": display["id"], "bounds": tuple(display["bounds"])}
+    if kind != "window":
+        raise ValueError(f"Unknown capture target: {spec}")
+    if arg and arg != "front":
+        if arg.isdigit():
+            matches = [w for w in windows if w["id"] == int(arg)]
+        else:
+            matches = [w for w in candidates if (w.get("owner") or "").lower() == arg.lower()]
+        front = matches[0] if matches else None
+    if front is None:
+        return {"kind": "display", "id": main["id"], "bounds": tuple(main["bounds"])}
+    return {"kind": "window", "id": front["id"], "bounds": tuple(front["bounds"])}
+
+
+def ghosty_zones(bounds: tuple, windows: list) -> list:
+    """Ghosty's windows overlapping `bounds`, as normalized boxes of a frame of it."""
+    bx, by, bw, bh = bounds
+    zones = []
+    for window in windows:
+        if not is_ghosty(window):
+            continue
+        x, y, w, h = window["bounds"]
+        x0, y0 = max(0.0, (x - bx) / bw), max(0.0, (y - by) / bh)
+        x1, y1 = min(1.0, (x + w - bx) / bw), min(1.0, (y + h - by) / bh)
+        if x0 < x1 and y0 < y1:
+            zones.append((x0, y0, x1, y1))
+    return zones
+
+
+def frame_transform(target: dict) -> dict:
+    """The frame-to-screen transform of a resolved target: a normalized (x, y) is at origin + (x, y) * size."""
+    x, y, w, h = target["bounds"]
+    return {"origin": [x, y], "size": [w, h], target["kind"]: target["id"]}
+
+
+def to_screen(position, transform: dict) -> list:
+    """A normalized 0-1 position in a frame as global display points."""
+    return [transform["origin"][0] + position[0] * transform["size"][0],
+            transform["origin"][1] + position[1] * transform["size"][1]]
+
+
+class TargetCaptureBackend(CaptureBackend):
+    """Captures a display or window picked by a GHOSTY_CAPTURE_TARGET spec, resolved again on every capture.
+
+    Subclasses enumerate the window server (displays(), windows()) and grab images (grab_display(), grab_window()).
+    """
+
+    def __init__(self, target: str = None):
+        self.target = capture_target(target)
+        if self.target.partition(":")[0] not in ("display", "window"):
+            raise ValueError(f"Unknown capture target: {self.target}")
+        self._resolved = None
+        self._zones = [GHOSTY_ZONE]
+
+    def displays(self) -> list:
+        raise NotImplementedError
+
+    def windows(self) -> list:
+        """On-screen windows, front to back."""
+        raise NotImplementedError
+
+    def grab_display(self, display_id: int):
+        raise NotImplementedError
+
+    def grab_window(self, window_id: int):
+        """Only that window, without its shadow."""
+        raise NotImplementedError
+
+    def capture(self):
+        windows = self.windows()
+        target = resolve_target(self.target, self.displays(), windows)
+        if self._resolved is None or (target["kind"], target["id"]) != (self._resolved["kind"], self._resolved["id"]):
+            print(f"DEBUG: Capturing {target['kind']} {target['id']} at {target['bounds']} ({self.target})",
+                  file=sys.stderr, flush=True)
+        if target["kind"] == "window":
+            # Nothing of Ghosty is in a window's own image
+            img, zones = self.grab_window(target["id"]), []
+        else:
+            img, zones = self.grab_display(target["id"]), ghosty_zones(target["bounds"], windows)
+        self._resolved, self._zones = target, zones
+        return img
+
+    def transform(self):
+        return frame_transform(self._resolved) if self._resolved is not None else None
+
+    def ghosty_zones(self) -> list:
+        return self._zones
+
+
+class QuartzCaptureBackend(TargetCaptureBackend):
+    name = "quartz"
+
+    def __init__(self, target: str = None):
+        import Quartz  # optional: pyobjc-framework-Quartz
+        self._quartz = Quartz
+        super().__init__(target)
+
+    def displays(self) -> list:
+        Quartz = self._quartz
+        _, ids, _ = Quartz.CGGetActiveDisplayList(16, None, None)
+        main = Quartz.CGMainDisplayID()
+        displays = []
+        for display_id in ids or [main]:
+            rect = Quartz.CGDisplayBounds(display_id)
+            displays.append({
+                "id": int(display_id),
+                "bounds": (rect.origin.x, rect.origin.y, rect.size.width, rect.size.height),
+                "main": display_id == main,
+            })
+        return displays
+
+    def windows(self) -> list:
+        Quartz = self._quartz
+        info = Quartz.CGWindowListCopyWindowInfo(
+            Quartz.kCGWindowListOptionOnScreenOnly | Quartz.kCGWindowListExcludeDesktopElements, Quartz.kCGNullWindowID
+        )
+        windows = []
+        for entry in info or []:
+            rect = entry.get("kCGWindowBounds") or {}
+            windows.append({
+                "id": int(entry["kCGWindowNumber"]),
+                "owner": entry.get("kCGWindowOwnerName"),
+                "name": entry.get("kCGWindowName"),
+                "layer": int(entry.get("kCGWindowLayer", 0)),
+                "alpha": float(entry.get("kCGWindowAlpha", 1.0)),
+                "bounds": (rect.get("X", 0), rect.get("Y", 0), rect.get("Width", 0), rect.get("Height", 0)),
+            })
+        return windows
+
+    def grab_display(self, display_id: int):
+        return self._to_image(self._quartz.CGDisplayCreateImage(display_id))
+
+    def grab_window(self, window_id: int):
+        Quartz = self._quartz
+        return self._to_image(Quartz.CGWindowListCreateImage(
+            Quartz.CGRectNull, Quartz.kCGWindowListOptionIncludingWindow, window_id,
+            Quartz.kCGWindowImageBoundsIgnoreFraming,
+        ))
+
+    def _to_image(self, image_ref):
+        from PIL import Image
+
+        Quartz = self._quartz
+        if image_ref is None:
+            raise RuntimeError("Quartz returned no image (screen recording permission?)")
+        width = Quartz.CGImageGetWidth(image_ref)
+        height = Quartz.CGImageGetHeight(image_ref)
+        bytes_per_row = Quartz.CGImageGetBytesPerRow(image_ref)
+        data = Quartz.CGDataProviderCopyData(Quartz.CGImageGetDataProvider(image_ref))
+        # BGRA rows straight from the window server; one copy into an RGB image
+        return Image.frombuffer("RGB", (width, height), bytes(data), "raw", "BGRX", bytes_per_row, 1)
+
+
+class ScreencaptureBackend(CaptureBackend):
+    name = "screencapture"
+
+    def capture(self):
+        from PIL import Image
+
+        # -x: disable sound
+        proc = subprocess.run(["screencapture", "-x", "-t", "png", "/dev/stdout"], capture_output=True)
+        data = proc.stdout
+        if not data:
+            # Some macOS versions refuse to write to a pipe; fall back to a temp file
+            import tempfile
+            fd, path = tempfile.mkstemp(suffix=".png")
+            os.close(fd)
+            try:
+                subprocess.run(["screencapture", "-x", path], check=True)
+                with open(path, "rb") as f:
+                    data = f.read()
+            finally:
+                os.unlink(path)
+        img = Image.open(io.BytesIO(data))
+        img.load()
+        return img.convert("RGB") if img.mode != "RGB" else img
+
+
+class FileCaptureBackend(CaptureBackend):
+    name = "file"
+
+    def __init__(self, path: str):
+        self.path = path
+
+    def capture(self):
+        from PIL import Image
+
+        with Image.open(self.path) as img:
+            return img.convert("RGB")
+
+
+class SyntheticCaptureBackend(CaptureBackend):
+    """Deterministic desktop-like frames: sidebar, message list and input box.
+
+    Each capture moves a "cursor" block so consecutive frames differ slightly.
+    """
+    name = "synthetic"
+
+    def __init__(self, width: int = 2880, height: int = 1800):
+        self.width = width
+        self.height = height
+        self.frame_index = 0
+
+    def capture(self):
+        from PIL import Image, ImageDraw
+
+        w, h = self.width, self.height
+        img = Image.new("RGB", (w, h), (40, 44, 52))
+        draw = ImageDraw.Draw(img)
+        draw.rectangle([0, 0, int(0.2 * w), h], fill=(30, 33, 40))
+        for row in range(12):
+            y = int((0.08 + row * 0.06) * h)
+            draw.rectangle([int(0.02 * w), y, int(0.18 * w), y + int(0.03 * h)], fill=(60 + row * 8, 70, 90))
+            draw.rectangle([int(0.25 * w), y, int((0.5 + (row % 4) * 0.1) * w), y + int(0.02 * h)], fill=(200, 200, 205))
+        draw.rectangle([int(0.22 * w), int(0.9 * h), int(0.98 * w), int(0.96 * h)], fill=(64, 68, 75))
+        x = int((0.25 + 0.01 * (self.frame_index % 50)) * w)
+        draw.rectangle([x, int(0.92 * h), x + 4, int(0.94 * h)], fill=(255, 255, 255))
+        self.frame_index += 1
+        return img
+
+
+class AutoCaptureBackend(CaptureBackend):
+    """Quartz when available, falling back to `screencapture` for good on the first failure."""
+    name = "auto"
+
+    def __init__(self):
+        try:
+            self._backend = QuartzCaptureBackend()
+        except ImportError:
+            self._backend = ScreencaptureBackend()
+
+    def capture(self):
+        try:
+            return self._backend.capture()
+        except Exception as e:
+            if isinstance(self._backend, ScreencaptureBackend):
+                raise
+            print(f"DEBUG: {self._backend.name} capture failed ({e}), using screencapture", file=sys.stderr)
+            self._backend = ScreencaptureBackend()
+            return self._backend.capture()
+
+    def transform(self):
+        return self._backend.transform()
+
+    def ghosty_zones(self) -> list:
+        return self._backend.ghosty_zones()
+
+
+def list_targets(backend: CaptureBackend = None) -> dict:
+    """The displays and on-screen windows a GHOSTY_CAPTURE_TARGET can name (needs Quartz)."""
+    backend = backend or QuartzCaptureBackend()
+    return {"displays": backend.displays(), "windows": backend.windows()}
+
+
+def get_capture_backend(spec: str = None) -> CaptureBackend:
+    spec = spec or os.environ.get("GHOSTY_CAPTURE", "")
+    # Older knob from the benchmarks: a fixed screenshot to replay
+    if not spec and os.environ.get("GHOSTY_SCREENSHOT"):
+        spec = "file:" + os.environ["GHOSTY_SCREENSHOT"]
+
+    name, _, arg = (spec or "auto").partition(":")
+    if name == "file":
+        return FileCaptureBackend(arg)
+    if name == "synthetic":
+        if arg:
+            width, height = (int(v) for v in arg.lower().split("x"))
+            return SyntheticCaptureBackend(width, height)
+        return SyntheticCaptureBackend()
+    if name == "screencapture":
+        return ScreencaptureBackend()
+    if name == "quartz":
+        return QuartzCaptureBackend()
+    if name == "auto":
+        return AutoCaptureBackend()
+    raise ValueError(f"Unknown capture backend: {spec}")
+
+
+def mask_ghosty_zone(img, zone=GHOSTY_ZONE):
+    """Blacks out the Ghosty Zone directly in the image's pixel buffer."""
+    width, height = img.size
+    left = int(zone[0] * width)
+    top = int(zone[1] * height)
+    right = min(width, int(zone[2] * width) + 1)
+    bottom = min(height, int(zone[3] * height) + 1)
+    img.paste((0, 0, 0), (left, top, right, bottom))
+    return img
+
+
+def mask_ghosty_zones(img, zones=(GHOSTY_ZONE,)):
+    for zone in zones:
+        mask_ghosty_zone(img, zone)
+    return img
+
+
+def smart_resize(height: int, width: int, factor: int = PATCH_SIZE,
+                 min_pixels: int = MIN_PIXELS, max_pixels: int = MAX_PIXELS):
+    """Same rounding as qwen_vl_utils.smart_resize, so the server-side resize becomes a no-op."""
+    import math
+
+    h_bar = max(factor, round(height / factor) * factor)
+    w_bar = max(factor, round(width / factor) * factor)
+    if h_bar * w_bar > max_pixels:
+        beta = math.sqrt((height * width) / max_pixels)
+        h_bar = max(factor, math.floor(height / beta / factor) * factor)
+        w_bar = max(factor, math.floor(width / beta / factor) * factor)
+    elif h_bar * w_bar < min_pixels:
+        beta = math.sqrt(min_pixels / (height * width))
+        h_bar = math.ceil(height * beta / factor) * factor
+        w_bar = math.ceil(width * beta / factor) * factor
+    return h_bar, w_bar
+
+
+def upload_max_pixels() -> int:
+    if "GHOSTY_MAX_PIXELS" in os.environ:
+        return int(os.environ["GHOSTY_MAX_PIXELS"])
+    import roi
+
+    return max(MAX_PIXELS, roi.upload_max_pixels()) if roi.enabled() else MAX_PIXELS
+
+
+def fit_to_model(img):
+    """Resizes to the processors' pixel budget. Normalized 0-1 coordinates are unaffected."""
+    if os.environ.get("GHOSTY_DOWNSCALE", "1") == "0":
+        return img
+    from PIL import Image
+
+    width, height = img.size
+    new_height, new_width = smart_resize(
+        height, width,
+        min_pixels=int(os.environ.get("GHOSTY_MIN_PIXELS", MIN_PIXELS)),
+        max_pixels=upload_max_pixels(),
+    )
+    if (new_width, new_height) == (width, height):
+        return img
+    # BICUBIC matches the processor; reducing_gap does most of a large downscale with a cheap box filter first
+    return img.resize((new_width, new_height), Image.BICUBIC, reducing_gap=3.0)
+
+
+def image_format(name: str = None) -> str:
+    name = (name or os.environ.get("GHOSTY_IMAGE_FORMAT", "png")).lower()
+    if name not in IMAGE_FORMATS:
+        raise ValueError(f"Unsupported image format: {name}")
+    return IMAGE_FORMATS[name]
+
+
+def encode_image(img, fmt: str = "PNG") -> bytes:
+    buffer = io.BytesIO()
+    if fmt == "WEBP":
+        img.save(buffer, format="WEBP", lossless=True, method=1)
+    elif fmt == "JPEG":
+        img.save(buffer, format="JPEG", quality=int(os.environ.get("GHOSTY_JPEG_QUALITY", "90")))
+    else:
+        img.save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+def _write_archive(data: bytes, path: str):
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "wb") as f:
+            f.write(data)
+        print(f"DEBUG: Screenshot archived to {path}", file=sys.stderr, flush=True)
+    except OSError as e:
+        print(f"DEBUG: Screenshot archive failed: {e}", file=sys.stderr, flush=True)
+
+
+def archive_screenshot(data: bytes, extension: str = "png"):
+    """Queues the encoded screenshot for writing to SCREENSHOT_DIR off the critical path."""
+    global _archive_executor
+    from datetime import datetime
+
+    if os.environ.get("GHOSTY_ARCHIVE_SCREENSHOTS", "1") == "0":
+        return None
+    if _archive_executor is None:
+        _archive_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="ghosty-archive")
+    timestamp = datetime.now().strftime("%Y-%m-%d_%H-%M-%S_%f")
+    path = os.path.join(SCREENSHOT_DIR, f"ghosty_{timestamp}.{extension}")
+    return _archive_executor.submit(_write_archive, data, path)
+
+
+def capture_frame(backend: CaptureBackend = None, fmt: str = None) -> dict:
+    """Captures, masks, downscales and encodes a screenshot entirely in memory.
+
+    Returns {"data", "format", "size", "source_size", "image", "source", "zones",
+    "transform"}; "image" is the fitted frame before encoding, used for delta
+    uploads, "source" the masked full-resolution grab, "zones" what was masked
+    and "transform" where the frame is on the screen (None: the main display).
+    Each step is a span of the current trace (tracing.py).
+    """
+    backend = backend or get_capture_backend()
+    with tracing.span("grab", backend=backend.name):
+        img = backend.capture()
+    source_size = img.size
+    zones = backend.ghosty_zones()
+    with tracing.span("mask", zones=len(zones)):
+        source = mask_ghosty_zones(img, zones)
+    with tracing.span("fit"):
+        img = fit_to_model(source)
+    fmt = image_format(fmt)
+    with tracing.span("encode", format=fmt) as attrs:
+        data = encode_image(img, fmt)
+        attrs["bytes"] = len(data)
+    archive_screenshot(data, "jpg" if fmt == "JPEG" else fmt.lower())
+    return {
+        "data": data, "format": fmt, "size": img.size, "source_size": source_size, "image": img, "source": source,
+        "zones": zones, "transform": backend.transform(),
+    }
+
+
+def capture_screenshot(backend: CaptureBackend = None) -> bytes:
+    return capture_frame(backend)["data"]
@@ -0,0 +1,116 @@
+"""Wait for the screen to react to the actions of a turn before capturing the next one.
+
+The app used to sleep a fixed second after executing actions: too long when
+the UI reacts at once, too short for a window that is still opening, in which
+case the next turn reasons over a stale frame. wait_for_settle() samples small
+grayscale thumbnails instead and returns as soon as the screen has changed
+and then held still, or gives up after a timeout:
+
+  settled     changed from the baseline, then STABLE_SAMPLES samples in a row without change
+  unchanged   nothing changed within the quiet period (the action had no visible effect)
+  timeout     changed but still changing (a video, a progress bar) when the timeout ran out
+
+The baseline is a thumbnail of the full-resolution grab the last turn was
+reasoned over (the daemon keeps it; the downscaled upload samples differently);
+without one the first sample is used, which misses changes that were
+over before sampling started. Ghosty's own windows (where the capture backend
+masks them) are ignored, and so are changes too small to matter, like a
+blinking caret.
+
+Configuration:
+  GHOSTY_SETTLE_TIMEOUT     seconds to wait for the screen to settle (default 3.0)
+  GHOSTY_SETTLE_QUIET       seconds without any change before giving up on one (default 1.0, the old
+                            fixed pause, so a slow reaction is caught no later than it used to be)
+  GHOSTY_SETTLE_INTERVAL    seconds between samples (default 0.05)
+"""
+import os
+import time
+
+import screen_capture
+
+# Thumbnail width; the height follows the frame's aspect ratio
+THUMB_WIDTH = 160
+# Point-sample at this multiple of the thumbnail size, then average down: ~1 ms for a 5K frame, where
+# averaging every pixel takes ~15
+SUBSAMPLE = 4
+# A thumbnail pixel counts as changed above this gray-level difference ...
+PIXEL_THRESHOLD = 16
+# ... and a frame as changed when more than this fraction of pixels did (~16 of 160x100)
+CHANGE_FRACTION = 0.001
+# Consecutive unchanged samples that make a settled screen
+STABLE_SAMPLES = 2
+
+
+def timeout() -> float:
+    return float(os.environ.get("GHOSTY_SETTLE_TIMEOUT", "3.0"))
+
+
+def quiet_period() -> float:
+    return float(os.environ.get("GHOSTY_SETTLE_QUIET", "1.0"))
+
+
+def interval() -> float:
+    return float(os.environ.get("GHOSTY_SETTLE_INTERVAL", "0.05"))
+
+
+def thumbnail(img, width: int = THUMB_WIDTH, zones=(screen_capture.GHOSTY_ZONE,)):
+    """`img` as a small int16 grayscale array with Ghosty's windows (normalized boxes) zeroed, for cheap differencing."""
+    import numpy as np
+    from PIL import Image
+
+    height = max(1, round(img.height * width / img.width))
+    small = img.resize((width * SUBSAMPLE, height * SUBSAMPLE), Image.NEAREST).convert("L").reduce(SUBSAMPLE)
+    pixels = np.asarray(small, dtype=np.int16)
+    for x0, y0, x1, y1 in zones:
+        pixels[int(y0 * height):int(y1 * height) + 1, int(x0 * width):int(x1 * width) + 1] = 0
+    return pixels
+
+
+def changed_fraction(a, b) -> float:
+    """The fraction of thumbnail pixels that differ by more than PIXEL_THRESHOLD (1.0 if the shapes differ)."""
+    import numpy as np
+
+    if a.shape != b.shape:
+        return 1.0
+    return float(np.count_nonzero(np.abs(a - b) > PIXEL_THRESHOLD)) / a.size
+
+
+def wait_for_settle(backend, baseline=None, timeout_s: float = None, quiet_s: float = None,
+                    interval_s: float = None, sleep=time.sleep, clock=time.monotonic) -> dict:
+    """Samples `backend` until the screen has changed from `baseline` (a thumbnail()) and held still.
+
+    Returns {"reason": "settled" | "unchanged" | "timeout", "changed", "ms", "samples"}.
+    """
+    timeout_s = timeout() if timeout_s is None else timeout_s
+    quiet_s = quiet_period() if quiet_s is None else quiet_s
+    interval_s = interval() if interval_s is None else interval_s
+
+    start = clock()
+    base = baseline
+    previous = None
+    changed = False
+    stable = 0
+    samples = 0
+    while True:
+        sampled_at = clock()
+        frame = thumbnail(backend.capture(), zones=backend.ghosty_zones())
+        samples += 1
+        if base is None:
+            base = frame
+        if not changed and changed_fraction(base, frame) > CHANGE_FRACTION:
+            changed = True
+        if previous is not None:
+            stable = stable + 1 if changed_fraction(previous, frame) <= CHANGE_FRACTION else 0
+        previous = frame
+
+        elapsed = clock() - start
+        reason = None
+        if changed and stable >= STABLE_SAMPLES:
+            reason = "settled"
+        elif not changed and elapsed >= quiet_s:
+            reason = "unchanged"
+        elif elapsed >= timeout_s:
+            reason = "timeout" if changed else "unchanged"
+        if reason is not None:
+            return {"reason": reason, "changed": changed, "ms": round(elapsed * 1000, 1), "samples": samples}
+        sleep(max(0.0, interval_s - (clock() - sampled_at)))
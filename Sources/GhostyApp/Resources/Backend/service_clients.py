@@ -0,0 +1,139 @@
+"""Shared handles to the Modal services and an asyncio layer for calling them.
+
+Handles are resolved once per process and reused; `modal.Cls.from_name(...)()`
+isn't repeated per call. Calls go through `.remote.aio` on one background event
+loop, so independent calls (fan_out) and speculative ones (Prefetch) overlap
+instead of queueing behind each other. Synchronous code reaches the loop with
+run() and spawn().
+
+With GHOSTY_SERVICES=local the handles are the in-process stand-ins from
+local_services.py, which expose the same `.remote` / `.remote.aio` surface.
+
+Configuration:
+  GHOSTY_SERVICES=local   - in-process stand-ins instead of Modal
+  GHOSTY_SPECULATE=0      - don't prefetch the chat input's position for messaging intents
+"""
+import asyncio
+import os
+import re
+import threading
+
+import tracing
+
+# name -> (Modal app, class)
+SERVICES = {
+    "orchestrator": ("ghosty-orchestrator", "OrchestratorAgent"),
+    "showui": ("showui-service", "ShowUI"),
+}
+
+# Intents that end with typing into a chat box ("tell my group chat 67", "reply to Sam ...")
+MESSAGING = re.compile(
+    r"\b(?:tell|message|msg|text|dm|reply|respond|send|say|write|type|ask|ping|chat)\b", re.IGNORECASE
+)
+
+_handles = {}
+_handles_lock = threading.Lock()
+_loop = None
+_loop_lock = threading.Lock()
+_prefetch_stats = {"started": 0, "used": 0, "wasted": 0}
+_stats_lock = threading.Lock()
+
+
+def speculation_enabled() -> bool:
+    return os.environ.get("GHOSTY_SPECULATE", "1") != "0"
+
+
+def looks_like_messaging(intent: str) -> bool:
+    return MESSAGING.search(intent or "") is not None
+
+
+def get(name: str):
+    """The handle for a service in SERVICES, resolved on first use. Raises if the lookup fails."""
+    with _handles_lock:
+        if name in _handles:
+            return _handles[name]
+        if os.environ.get("GHOSTY_SERVICES") == "local":
+            import local_services
+            handle = local_services.LOCAL_SERVICES[name]()
+        else:
+            import modal
+            app_name, class_name = SERVICES[name]
+            handle = modal.Cls.from_name(app_name, class_name)()
+        _handles[name] = handle
+        return handle
+
+
+def reset():
+    """Forgets all handles (e.g. after switching GHOSTY_SERVICES)."""
+    with _handles_lock:
+        _handles.clear()
+
+
+def loop() -> asyncio.AbstractEventLoop:
+    """The background event loop all calls run on, started on first use."""
+    global _loop
+    with _loop_lock:
+        if _loop is None:
+            _loop = asyncio.new_event_loop()
+            threading.Thread(target=_loop.run_forever, name="service-clients", daemon=True).start()
+        return _loop
+
+
+async def call(method, *args, **kwargs):
+    """Awaits a remote method (`handle.method`) without blocking the loop."""
+    return await method.remote.aio(*args, **kwargs)
+
+
+async def fan_out(*aws) -> list:
+    """Awaits coroutines concurrently; results in order. The first error is raised."""
+    return list(await asyncio.gather(*aws))
+
+
+def spawn(coro):
+    """Schedules a coroutine on the background loop; returns a concurrent.futures.Future.
+
+    The coroutine runs under the caller's traces (tracing.py).
+    """
+    return asyncio.run_coroutine_threadsafe(tracing.carry(coro), loop())
+
+
+def run(coro):
+    """Runs a coroutine on the background loop and waits for its result. Not for use on the loop itself."""
+    return spawn(coro).result()
+
+
+class Prefetch:
+    """Speculative calls started ahead of need, by key. take() claims one; finish() counts the rest as wasted."""
+
+    def __init__(self):
+        self._pending = {}
+
+    def start(self, key, coro):
+        self._pending[key] = spawn(coro)
+        _count("started")
+
+    def take(self, key):
+        """An awaitable for `key`'s result if a call was started (and not taken yet), else None."""
+        future = self._pending.pop(key, None)
+        if future is None:
+            return None
+        _count("used")
+        return asyncio.wrap_future(future)
+
+    def finish(self):
+        for future in self._pending.values():
+            future.cancel()
+        _count("wasted", len(self._pending))
+        self._pending.clear()
+
+
+def _count(name: str, n: int = 1):
+    with _stats_lock:
+        _prefetch_stats[name] += n
+
+
+def prefetch_stats() -> dict:
+    """Speculative calls this process started, used and wasted."""
+    with _stats_lock:
+        started = _prefetch_stats["started"]
+        return dict(_prefetch_stats, hit_rate=_prefetch_stats["used"] / started if started else 0.0)
@@ -0,0 +1,143 @@
+"""Structured action history, kept per session instead of re-sent every turn.
+
+Shared by the client (template_backend.py) and the orchestrator. The app
+used to send the whole transcript each turn: the intent plus one free-text
+"- Turn: CLICK at Optional((0.5, 0.9))" line per action so far. Now it sends
+a turn as JSON:
+
+  {"session": "<id>", "intent": "...", "base": 3, "actions": [{"action": "INPUT", "position": [x, y], "value": "67"}]}
+
+`actions` are the ones executed since the previous turn and `base` is how
+many came before them. Both the daemon and the orchestrator keep a
+SessionStore of the history so far, rendered as compact lines
+("- Turn: INPUT at (0.49, 0.94) with value '67'"). A store that doesn't
+have those `base` lines (evicted, restarted, another container) raises
+SessionMiss. The sender then re-sends the whole history with base 0.
+
+Configuration:
+  GHOSTY_SESSION_CAPACITY  - sessions kept per store (default 8)
+  GHOSTY_SESSION_TTL_S     - seconds a session is kept after its last turn (default 900)
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+
+HISTORY_MARKER = "\n\nACTION HISTORY:"
+
+
+class SessionMiss(KeyError):
+    pass
+
+
+def is_session_miss(error: Exception) -> bool:
+    # Remote exceptions may come back re-wrapped; match on the name as well
+    return isinstance(error, SessionMiss) or "SessionMiss" in type(error).__name__
+
+
+def capacity() -> int:
+    return int(os.environ.get("GHOSTY_SESSION_CAPACITY", "8"))
+
+
+def ttl_s() -> float:
+    return float(os.environ.get("GHOSTY_SESSION_TTL_S", "900"))
+
+
+def format_action(action) -> str:
+    """One history line for an executed action dict ({"action", "position", "value"} or {"error"})."""
+    if isinstance(action, str):
+        return action if action.startswith("- Turn: ") else f"- Turn: {action}"
+    if action.get("error"):
+        return f"- Turn: {action['error']}"
+    position = action.get("position")
+    where = f" at ({float(position[0]):.2f}, {float(position[1]):.2f})" if position else ""
+    value = f" with value '{action['value']}'" if action.get("value") is not None else ""
+    return f"- Turn: {action['action']}{where}{value}"
+
+
+def render_prompt(intent: str, lines: list) -> str:
+    """The orchestrator's user prompt: the intent, then the ACTION HISTORY if there is one."""
+    if not lines:
+        return intent
+    return intent + HISTORY_MARKER + "\n" + "\n".join(lines)
+
+
+class SessionStore:
+    """Thread-safe LRU of session id -> {"intent", "lines"} plus whatever else a holder attaches."""
+
+    def __init__(self, capacity: int = 8, ttl_s: float = 900.0):
+        self.capacity = capacity
+        self.ttl_s = ttl_s
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def update(self, session_id: str, intent: str = None, lines: list = (), base: int = 0) -> dict:
+        """Appends `lines` after the first `base` lines of the session's history and returns the session.
+
+        Raises SessionMiss if `base` > 0 and the store doesn't have that many lines for the session.
+        A new intent (a different task under the same id) starts the history over.
+        """
+        now = time.monotonic()
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is not None and now - session["time"] > self.ttl_s:
+                del self._sessions[session_id]
+                session = None
+            if base and (session is None or len(session["lines"]) < base or (intent and intent != session["intent"])):
+                self.misses += 1
+                raise SessionMiss(session_id)
+            if session is None or (intent and intent != session["intent"]):
+                session = {"intent": intent or "", "lines": []}
+                self._sessions[session_id] = session
+            elif base:
+                self.hits += 1
+            session["lines"] = session["lines"][:base] + list(lines)
+            session["time"] = now
+            self._sessions.move_to_end(session_id)
+            while len(self._sessions) > self.capacity:
+                self._sessions.popitem(last=False)
+            return session
+
+    def get(self, session_id: str) -> dict:
+        with self._lock:
+            return self._sessions.get(session_id)
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "sessions": len(self._sessions),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+            }
+
+
+class SessionUploader:
+    """Client side: sends the orchestrator only the history lines it doesn't have yet."""
+
+    def __init__(self):
+        # session id -> lines the orchestrator has
+        self._sent = {}
+        self._pending = None
+
+    def prepare(self, session_id: str, intent: str, lines: list) -> dict:
+        """The `session` argument for invoke() and friends."""
+        base = self._sent.get(session_id, 0)
+        if base > len(lines):
+            base = 0
+        self._pending = (session_id, len(lines))
+        return {"id": session_id, "intent": intent, "base": base, "lines": list(lines[base:])}
+
+    def full(self, session_id: str, intent: str, lines: list) -> dict:
+        """The `session` argument re-sending the whole history after a SessionMiss."""
+        return {"id": session_id, "intent": intent, "base": 0, "lines": list(lines)}
+
+    def commit(self):
+        session_id, sent = self._pending
+        self._sent[session_id] = sent
+        # Old sessions are dropped from the map; a miss just re-sends them
+        while len(self._sent) > 64:
+            self._sent.pop(next(iter(self._sent)))
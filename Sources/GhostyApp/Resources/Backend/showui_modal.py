@@ -1,4 +1,15 @@
 import modal
+
+import batching
+import cold_start
+import grounding_cache
+import inference_profiles
+import json_grammar
+import roi
+import tracing
+import vl_decoding
+from frame_cache import FrameCache
+
 # if you run ./Sources/GhostyApp/Resources/Backend/.venv/bin/python3 Sources/GhostyApp/Resources/Backend/template_backend.py "Click the Login button"
 # it will run the showui on modal. Did not test integration yet bc I am on Sonoma 14.5
 
@@ -16,6 +27,9 @@ image = (
         "numpy",
         "bitsandbytes>=0.46.1",
     )
+    # The deployment's inference profile and snapshot settings (see inference_profiles.py, cold_start.py)
+    .env({"GHOSTY_PROFILE": inference_profiles.default(), **cold_start.image_env()})
+    .add_local_python_source("batching", "cold_start", "frame_cache", "grounding_cache", "inference_profiles", "json_grammar", "roi", "tracing", "vl_decoding")
 )
 
 # Create a persistent volume for the Hugging Face cache
@@ -23,51 +37,319 @@ volume = modal.Volume.from_name("showui-model-cache", create_if_missing=True)
 
 app = modal.App("showui-service")
 
-@app.cls(gpu="L4", image=image, volumes={"/root/.cache/huggingface": volume}, timeout=600, min_containers=1)
+MODEL_ID = "showlab/ShowUI-2B"
+
+# Integrate official ShowUI _NAV_SYSTEM and action_map
+_NAV_SYSTEM = """You are an assistant trained to navigate the web screen. 
+Given a task instruction, a screen observation, and an action history sequence, 
+output the next action and wait for the next observation. 
+Here is the action space:
+1. `CLICK`: Click on an element, value is not applicable and the position [x,y] is required. 
+2. `INPUT`: Type a string into an element, value is a string to type and the position [x,y] is required. 
+3. `SELECT`: Select a value for an element, value is not applicable and the position [x,y] is required. 
+4. `HOVER`: Hover on an element, value is not applicable and the position [x,y] is required.
+5. `ANSWER`: Answer the question, value is the answer and the position is not applicable.
+6. `ENTER`: Enter operation, value and position are not applicable.
+7. `SCROLL`: Scroll the screen, value is the direction to scroll and the position is not applicable.
+8. `SELECT_TEXT`: Select some text content, value is not applicable and position [[x1,y1], [x2,y2]] is the start and end position of the select operation.
+9. `COPY`: Copy the text, value is the text to copy and the position is not applicable.
+"""
+
+_NAV_FORMAT = """
+Format the action as a dictionary with the following keys:
+{'action': 'ACTION_TYPE', 'value': 'element', 'position': [x,y]}
+
+If value or position is not applicable, set it as `None`.
+Position might be [[x1,y1], [x2,y2]] if the action requires a start and end position.
+Position represents the relative coordinates on the screenshot and should be scaled to a range of 0-1.
+"""
+
+# The action dict exactly as ShowUI writes it (Python literal syntax); decoding is constrained to it
+_COORD = json_grammar.choice(
+    json_grammar.sequence("0", json_grammar.optional(json_grammar.sequence(".", json_grammar.repeat(json_grammar.chars(json_grammar.DIGITS), 1, 4)))),
+    json_grammar.sequence("1", json_grammar.optional(json_grammar.sequence(".", json_grammar.repeat("0", 1, 4)))),
+)
+_POINT = json_grammar.sequence("[", _COORD, ", ", _COORD, "]")
+ACTION_GRAMMAR = json_grammar.Grammar(json_grammar.obj([
+    ("action", json_grammar.enum("CLICK", "INPUT", "SELECT", "HOVER", "ANSWER", "ENTER", "SCROLL", "SELECT_TEXT", "COPY", quote="'")),
+    ("value", json_grammar.choice(json_grammar.string("'"), "None")),
+    ("position", json_grammar.choice("None", _POINT, json_grammar.sequence("[", _POINT, ", ", _POINT, "]"))),
+], quote="'"))
+
+
+def build_messages(prompt: str, img, min_pixels: int, max_pixels: int) -> list:
+    return [
+        {
+            "role": "user",
+            "content": [
+                {"type": "text", "text": _NAV_SYSTEM + _NAV_FORMAT},
+                {"type": "text", "text": f'Task: {prompt}'},
+                {"type": "image", "image": img, "min_pixels": min_pixels, "max_pixels": max_pixels},
+            ]
+        }
+    ]
+
+
+def parse_action(text: str) -> dict:
+    """ShowUI's answer as a dict, or None if it isn't one."""
+    import ast
+    try:
+        action = ast.literal_eval(text.strip())
+    except (ValueError, SyntaxError):
+        return None
+    return action if isinstance(action, dict) and "action" in action else None
+
+
+def generate_single(model, processor, img, prompt: str, min_pixels: int, max_pixels: int, max_new_tokens: int = 512, grammar=None) -> str:
+    """One prompt through processor + model.generate. The reference path for generate_batch."""
+    from qwen_vl_utils import process_vision_info
+
+    messages = build_messages(prompt, img, min_pixels, max_pixels)
+    text = processor.apply_chat_template(messages, tokenize=False, add_generation_prompt=True)
+    image_inputs, video_inputs = process_vision_info(messages)
+    inputs = processor(
+        text=[text],
+        images=image_inputs,
+        videos=video_inputs,
+        padding=True,
+        return_tensors="pt",
+    )
+    inputs = inputs.to(model.device)
+    generated_ids = model.generate(
+        **inputs,
+        max_new_tokens=max_new_tokens,
+        do_sample=False,
+        num_beams=1,
+        **(json_grammar.generate_kwargs(grammar, processor.tokenizer) if grammar is not None else {}),
+    )
+    generated_ids_trimmed = [
+        out_ids[len(in_ids) :] for in_ids, out_ids in zip(inputs.input_ids, generated_ids)
+    ]
+    output_text = processor.batch_decode(
+        generated_ids_trimmed, skip_special_tokens=True, clean_up_tokenization_spaces=False
+    )
+    return output_text[0]
+
+
+def generate_requests(model, processor, requests: list, min_pixels: int, max_pixels: int, max_new_tokens: int = 512, grammar=None, streamers: list = None) -> list:
+    """Answers (image, prompt) pairs as one padded batch; each distinct image is encoded once.
+
+    With a `grammar` (ACTION_GRAMMAR), every answer is constrained to it and ends at its closing brace.
+    """
+    unique = {}
+    for img, _ in requests:
+        unique.setdefault(id(img), img)
+    encodings = dict(zip(unique, vl_decoding.encode_images(model, processor, list(unique.values()), min_pixels, max_pixels)))
+    texts = [
+        processor.apply_chat_template(build_messages(prompt, img, min_pixels, max_pixels), tokenize=False, add_generation_prompt=True)
+        for img, prompt in requests
+    ]
+    batch = vl_decoding.prepare_batch(model, processor, texts, [encodings[id(img)] for img, _ in requests])
+    matchers = [json_grammar.Matcher(grammar, processor.tokenizer) for _ in requests] if grammar is not None else None
+    generated_ids = vl_decoding.greedy_generate(model, batch, max_new_tokens, streamers=streamers, matchers=matchers)
+    return processor.batch_decode(generated_ids, skip_special_tokens=True, clean_up_tokenization_spaces=False)
+
+
+def generate_batch(model, processor, img, prompts: list, min_pixels: int, max_pixels: int, max_new_tokens: int = 512, grammar=None) -> list:
+    """Same answers as generate_single per prompt, but the screenshot goes through the vision tower once."""
+    return generate_requests(model, processor, [(img, prompt) for prompt in prompts], min_pixels, max_pixels, max_new_tokens, grammar)
+
+
+def ground_cached(cache, requests: list, run, keys: list = None) -> list:
+    """Answers (image, prompt) requests from the grounding cache where it can, the rest with run(misses).
+
+    `keys` (default: the prompts) are what answers are cached under.
+    """
+    if cache is None:
+        return run(requests)
+    keys = keys or [prompt for _, prompt in requests]
+    with tracing.span("grounding_cache", prompts=len(requests)) as attrs:
+        results = [cache.lookup(key, img) for key, (img, _) in zip(keys, requests)]
+        misses = [i for i, result in enumerate(results) if result is None]
+        attrs["hits"] = len(requests) - len(misses)
+    if misses:
+        for i, result in zip(misses, run([requests[i] for i in misses])):
+            results[i] = result
+            cache.store(keys[i], requests[i][0], result)
+    return results
+
+
+def crop_requests(img, prompts: list, regions: list = None) -> tuple:
+    """(image, prompt) requests with each prompt's roi region cropped out of `img`, and the boxes used.
+
+    Prompts on the same region share one crop, so it still goes through the vision tower once.
+    """
+    boxes = [roi.box(region) for region in regions] if regions else [None] * len(prompts)
+    crops = {}
+    with tracing.span("roi", regions=len({b for b in boxes if b is not None})):
+        for b in boxes:
+            if b is not None and b not in crops:
+                crops[b] = roi.crop(img, b)
+    return [(crops[b] if b is not None else img, prompt) for prompt, b in zip(prompts, boxes)], boxes
+
+
+def vision_tokens(img, min_pixels: int, max_pixels: int) -> int:
+    """Vision tokens the processor turns `img` into (28x28 pixels per token after merging)."""
+    from qwen_vl_utils import smart_resize
+
+    height, width = smart_resize(img.height, img.width, 28, min_pixels=min_pixels, max_pixels=max_pixels)
+    return (height // 28) * (width // 28)
+
+
+def compare_roi(model, processor, img, targets: list, min_pixels: int, max_pixels: int, grammar=None) -> list:
+    """Per target ({"prompt", "region", "box"}): vision tokens, answer and hit, full frame vs. its ROI crop."""
+    import time
+
+    rows = []
+    for target in targets:
+        row = {"prompt": target["prompt"], "region": target["region"]}
+        for mode, regions in (("full", None), ("roi", [target["region"]])):
+            requests, boxes = crop_requests(img, [target["prompt"]], regions)
+            start = time.perf_counter()
+            answer = roi.map_answer(generate_requests(model, processor, requests, min_pixels, max_pixels, grammar=grammar)[0], boxes[0])
+            action = parse_action(answer) or {}
+            position = action.get("position")
+            if position and isinstance(position[0], (list, tuple)):
+                position = position[0]
+            x0, y0, x1, y1 = target["box"]
+            row[mode] = {
+                "tokens": vision_tokens(requests[0][0], min_pixels, max_pixels),
+                "answer": answer,
+                "hit": bool(position) and x0 <= position[0] <= x1 and y0 <= position[1] <= y1,
+                "ms": (time.perf_counter() - start) * 1000,
+            }
+        rows.append(row)
+    return rows
+
+
+def compare_batch(model, processor, img, prompts: list, min_pixels: int, max_pixels: int, run, max_new_tokens: int = 512, grammar=None) -> dict:
+    """Unbatched generate_single answers per prompt vs. one run(requests) call, e.g. the batcher; never cached."""
+    import time
+
+    start = time.perf_counter()
+    reference = [generate_single(model, processor, img, prompt, min_pixels, max_pixels, max_new_tokens, grammar) for prompt in prompts]
+    reference_s = time.perf_counter() - start
+    start = time.perf_counter()
+    batched = run([(img, prompt) for prompt in prompts])
+    return {"reference": reference, "reference_s": reference_s, "batched": batched, "batched_s": time.perf_counter() - start}
+
+
+def compare_constrained(model, processor, img, prompts: list, min_pixels: int, max_pixels: int, max_new_tokens: int = 512) -> dict:
+    """Parse failures and generated tokens per answer, free-form vs. constrained to ACTION_GRAMMAR."""
+    import time
+
+    report = {}
+    for mode, grammar in (("free", None), ("constrained", ACTION_GRAMMAR)):
+        rows = []
+        for prompt in prompts:
+            counter = vl_decoding.TokenCounter()
+            start = time.perf_counter()
+            text = generate_requests(model, processor, [(img, prompt)], min_pixels, max_pixels, max_new_tokens, grammar, [counter])[0]
+            rows.append({
+                "prompt": prompt,
+                "text": text,
+                "parsed": parse_action(text) is not None,
+                "tokens": counter.count,
+                "ms": (time.perf_counter() - start) * 1000,
+            })
+        report[mode] = rows
+    return report
+
+
+@app.cls(gpu="L4", image=image, volumes={"/root/.cache/huggingface": volume}, timeout=600, min_containers=1, **cold_start.cls_options())
+@modal.concurrent(max_inputs=16)
 class ShowUI:
-    @modal.enter()
+    # Inference profile (see inference_profiles.py); empty means the deployment's GHOSTY_PROFILE
+    profile: str = modal.parameter(default="")
+
+    @modal.enter(snap=cold_start.snapshots_enabled())
     def load_model(self):
+        """Processor and weights. With memory snapshots this runs once; later containers are restored after it."""
         import os
         # Disable telemetry and symlinks to reduce background threads and file issues
         os.environ["HF_HUB_DISABLE_TELEMETRY"] = "1"
         os.environ["HF_HUB_OFFLINE"] = "0"
         
-        from transformers import Qwen2VLForConditionalGeneration, AutoProcessor, BitsAndBytesConfig
-        import torch
+        from transformers import Qwen2VLForConditionalGeneration, AutoProcessor
+
+        self.model_id = MODEL_ID
+        profile = inference_profiles.resolve(self.profile)
+        if profile == "speculative":
+            # There is no smaller ShowUI to draft with; answers are a few dozen tokens anyway
+            profile = "bf16"
+        self.cold_start = cold_start.PhaseTimer("showui", profile)
+        print(f"Loading model {self.model_id} with the {profile} profile...")
 
-        self.model_id = "showlab/ShowUI-2B"
-        print(f"Loading model {self.model_id} in native bfloat16 (no quantization for faster startup)...")
-        
-        self.model = Qwen2VLForConditionalGeneration.from_pretrained(
-            self.model_id,
-            torch_dtype=torch.bfloat16,
-            device_map="auto"
-        )
-        
         # Official pixel constraints
         self.min_pixels = 256*28*28
         self.max_pixels = 1344*28*28
         
-        self.processor = AutoProcessor.from_pretrained(
-            self.model_id, 
+        self.processor = cold_start.load_processor(
+            self.cold_start, AutoProcessor, self.model_id, profile,
             min_pixels=self.min_pixels, 
             max_pixels=self.max_pixels
         )
+        self.model = None
+        device_map = cold_start.snapshot_device(profile)
+        if device_map is not None:
+            self.model, _, self.load_stats = cold_start.load_weights(
+                self.cold_start, Qwen2VLForConditionalGeneration, self.model_id, profile, device_map,
+            )
+
+    @modal.enter(snap=False)
+    def setup(self):
+        from transformers import Qwen2VLForConditionalGeneration
+
+        self.cold_start.step = "restore"
+        if self.model is None:
+            self.model, _, self.load_stats = cold_start.load_weights(
+                self.cold_start, Qwen2VLForConditionalGeneration, self.model_id, self.cold_start.profile, "auto",
+            )
+        elif self.model.device.type == "cpu":
+            cold_start.to_gpu(self.cold_start, self.model)
+        print(f"Loaded in {self.load_stats['load_s']:.1f}s, {self.load_stats['memory_mb']:.0f} MiB of weights")
+
+        # Screenshots by content hash, so repeated calls on the same frame can send just the key
+        self.frames = FrameCache(capacity=16)
+        with self.cold_start.phase("warmup"):
+            # Answers are constrained to the action dict and stop at its closing brace
+            self.grammar = ACTION_GRAMMAR if json_grammar.enabled() else None
+            if self.grammar is not None:
+                json_grammar.warm(
+                    self.grammar, self.processor.tokenizer, "{'action': 'INPUT', 'value': 'Hi', 'position': [0.49, 0.94]}",
+                    self.model.get_output_embeddings().weight.shape[0], self.model.device,
+                )
+            # One short decode, so the first request doesn't pay for kernel selection and allocator growth
+            from PIL import Image
+            generate_single(self.model, self.processor, Image.new("RGB", (1288, 784)), "Click the search icon.", self.min_pixels, self.max_pixels, 1)
+        # Concurrent requests (from all callers) are grounded together in padded batches
+        self.batcher = batching.MicroBatcher(
+            lambda requests: generate_requests(
+                self.model, self.processor, requests, self.min_pixels, self.max_pixels, grammar=self.grammar,
+            ),
+            max_batch_size=batching.max_batch_size(),
+            window_ms=batching.window_ms(),
+            name="showui-batcher",
+        )
+        # Repeated targets (the chat input, the same sidebar row) are answered without the model
+        # while the screen region around the previous answer is unchanged
+        self.grounding = grounding_cache.GroundingCache(ttl_s=grounding_cache.ttl_s()) if grounding_cache.enabled() else None
+        self.cold_start.log()
         print("Model loaded successfully.")
 
     @modal.method()
-    def run_inference(self, image_url: str = None, image_bytes: bytes = None, prompt: str = "", system_prompt: str = ""):
+    def run_inference(self, image_url: str = None, image_bytes: bytes = None, prompt: str = "", system_prompt: str = "", image_key: str = None):
         print("[DEBUG] Inference request received")
         from PIL import Image
         from io import BytesIO
-        from qwen_vl_utils import process_vision_info
         import requests
-        import torch
         
-        # 1. Fetch/Load Image
-        if image_bytes:
-            print(f"[DEBUG] Loading image from bytes ({len(image_bytes)} bytes)")
-            img = Image.open(BytesIO(image_bytes))
+        # 1. Fetch/Load Image (FrameCacheMiss if only a key was sent and the frame is gone)
+        if image_bytes or image_key:
+            source = f"bytes ({len(image_bytes)} bytes)" if image_bytes else f"frame cache ({image_key})"
+            print(f"[DEBUG] Loading image from {source}")
+            image_key, img = self.frames.resolve(image_bytes=image_bytes, image_key=image_key)
+            print(f"[DEBUG] Frame cache: {self.frames.stats()}")
         elif image_url:
             print(f"[DEBUG] Fetching image from URL: {image_url}")
             headers = {'User-Agent': 'Mozilla/5.0'}
@@ -79,83 +361,86 @@ class ShowUI:
         
         print(f"[DEBUG] Image loaded. Size: {img.size}")
 
-        # 2. Prepare Messages
-        # Integrate official ShowUI _NAV_SYSTEM and action_map
-        _NAV_SYSTEM = """You are an assistant trained to navigate the web screen. 
-Given a task instruction, a screen observation, and an action history sequence, 
-output the next action and wait for the next observation. 
-Here is the action space:
-1. `CLICK`: Click on an element, value is not applicable and the position [x,y] is required. 
-2. `INPUT`: Type a string into an element, value is a string to type and the position [x,y] is required. 
-3. `SELECT`: Select a value for an element, value is not applicable and the position [x,y] is required. 
-4. `HOVER`: Hover on an element, value is not applicable and the position [x,y] is required.
-5. `ANSWER`: Answer the question, value is the answer and the position is not applicable.
-6. `ENTER`: Enter operation, value and position are not applicable.
-7. `SCROLL`: Scroll the screen, value is the direction to scroll and the position is not applicable.
-8. `SELECT_TEXT`: Select some text content, value is not applicable and position [[x1,y1], [x2,y2]] is the start and end position of the select operation.
-9. `COPY`: Copy the text, value is the text to copy and the position is not applicable.
-"""
+        # 2. Prepare, generate and decode, batched with any concurrent requests (see generate_requests)
+        print("[DEBUG] Generating tokens...")
+        result = ground_cached(self.grounding, [(img, prompt)], self.batcher.submit_many)[0]
+        print(f"[DEBUG] Result: {result} | batcher: {self.batcher.stats()} | grounding cache: {self.grounding.stats() if self.grounding else 'off'}")
+        return result
 
-        _NAV_FORMAT = """
-Format the action as a dictionary with the following keys:
-{'action': 'ACTION_TYPE', 'value': 'element', 'position': [x,y]}
+    @modal.method()
+    def run_inference_batch(self, image_bytes: bytes = None, prompts: list = None, image_key: str = None, trace: dict = None, regions: list = None):
+        """Grounds several prompts against one screenshot: one vision-tower pass, one padded batch.
 
-If value or position is not applicable, set it as `None`.
-Position might be [[x1,y1], [x2,y2]] if the action requires a start and end position.
-Position represents the relative coordinates on the screenshot and should be scaled to a range of 0-1.
-"""
-        
-        full_system_prompt = _NAV_SYSTEM + _NAV_FORMAT
-        
-        messages = [
-            {
-                "role": "user",
-                "content": [
-                    {"type": "text", "text": full_system_prompt},
-                    {"type": "text", "text": f'Task: {prompt}'},
-                    {"type": "image", "image": img, "min_pixels": self.min_pixels, "max_pixels": self.max_pixels},
-                ]
-            }
-        ]
+        Returns one answer per prompt, identical to calling run_inference for each.
+        `regions` (one [x0, y0, x1, y1] or None per prompt, see roi.py) ground prompts on
+        crops of the frame; their answers are mapped back to full-frame coordinates.
+        With a `trace` ({"id"}, see tracing.py) returns {"answers": [...], "spans": [...]}.
+        """
+        trace = tracing.from_arg(trace, "showui")
+        if trace is None:
+            return self._run_inference_batch(image_bytes, prompts, image_key, regions)
+        with tracing.serve(trace), tracing.span("invoke", prompts=len(prompts or [])):
+            answers = self._run_inference_batch(image_bytes, prompts, image_key, regions)
+        return {"answers": answers, "spans": trace.spans}
 
-        # 3. Process and Generate
+    def _run_inference_batch(self, image_bytes: bytes = None, prompts: list = None, image_key: str = None, regions: list = None) -> list:
+        prompts = list(prompts or [])
+        print(f"[DEBUG] Batch inference request received ({len(prompts)} prompts)")
+        if not prompts:
+            return []
+        if not (image_bytes or image_key):
+            raise ValueError("Either image_bytes or image_key must be provided.")
+        with tracing.span("frame", upload="full" if image_bytes else "ref"):
+            image_key, img = self.frames.resolve(image_bytes=image_bytes, image_key=image_key)
+        print(f"[DEBUG] Image loaded. Size: {img.size} | frame cache: {self.frames.stats()}")
+        requests, boxes = crop_requests(img, prompts, regions)
+        # Answers for a crop are in its own coordinates, so they are cached per region
+        keys = [prompt if b is None else f"{prompt} @{b}" for prompt, b in zip(prompts, boxes)]
+        results = ground_cached(self.grounding, requests, self.batcher.submit_many, keys)
+        results = [roi.map_answer(result, b) for result, b in zip(results, boxes)]
+        for (crop, prompt), result in zip(requests, results):
+            tokens = vision_tokens(crop, self.min_pixels, self.max_pixels)
+            print(f"[DEBUG] Result for {prompt[:60]!r} ({crop.size}, {tokens} vision tokens): {result}")
+        print(f"[DEBUG] Grounding cache: {self.grounding.stats() if self.grounding else 'off'}")
+        return results
 
-        print("[DEBUG] Applying chat template...")
-        text = self.processor.apply_chat_template(
-            messages, tokenize=False, add_generation_prompt=True
-        )
-        image_inputs, video_inputs = process_vision_info(messages)
-        inputs = self.processor(
-            text=[text],
-            images=image_inputs,
-            videos=video_inputs,
-            padding=True,
-            return_tensors="pt",
-        )
-        inputs = inputs.to(self.model.device)
+    @modal.method()
+    def grounding_cache_stats(self) -> dict:
+        """Hit/miss counters of this container's grounding cache (empty when it is disabled)."""
+        return self.grounding.stats() if self.grounding is not None else {}
 
-        print("[DEBUG] Generating tokens...")
-        generated_ids = self.model.generate(
-            **inputs, 
-            max_new_tokens=512,
-            do_sample=False,
-            num_beams=1,
-        )
+    @modal.method()
+    def roi_report(self, targets: list, image_bytes: bytes) -> list:
+        """Vision tokens and grounding hits per labelled target, full frame vs. ROI crop."""
+        img = self.frames.resolve(image_bytes=image_bytes)[1]
+        return compare_roi(self.model, self.processor, img, targets, self.min_pixels, self.max_pixels, self.grammar)
+
+    @modal.method()
+    def batch_report(self, prompts: list, image_bytes: bytes) -> dict:
+        """The served batching path vs. unbatched model.generate per prompt, bypassing the grounding cache."""
+        img = self.frames.resolve(image_bytes=image_bytes)[1]
+        return compare_batch(self.model, self.processor, img, prompts, self.min_pixels, self.max_pixels, self.batcher.submit_many, grammar=self.grammar)
+
+    @modal.method()
+    def constrained_report(self, prompts: list, image_bytes: bytes) -> dict:
+        """Parse failures and generated tokens, free-form vs. grammar-constrained decoding."""
+        img = self.frames.resolve(image_bytes=image_bytes)[1]
+        return compare_constrained(self.model, self.processor, img, prompts, self.min_pixels, self.max_pixels)
+
+@app.function(gpu="L4", image=image, volumes={"/root/.cache/huggingface": volume}, timeout=1800)
+def bake_weights(profile: str = "") -> str:
+    """Writes the profile's weights and processor to the volume; see cold_start.py."""
+    from transformers import Qwen2VLForConditionalGeneration, AutoProcessor
+
+    profile = inference_profiles.resolve(profile)
+    path = cold_start.bake(Qwen2VLForConditionalGeneration, AutoProcessor, MODEL_ID, "bf16" if profile == "speculative" else profile)
+    volume.commit()
+    return path
 
-        # 4. Decode Result
-        print("[DEBUG] Decoding output...")
-        generated_ids_trimmed = [
-            out_ids[len(in_ids) :] for in_ids, out_ids in zip(inputs.input_ids, generated_ids)
-        ]
-        output_text = self.processor.batch_decode(
-            generated_ids_trimmed, skip_special_tokens=True, clean_up_tokenization_spaces=False
-        )
-        
-        print(f"[DEBUG] Result: {output_text[0]}")
-        return output_text[0]
 
 @app.local_entrypoint()
-def main():
+def main(image: str = ""):
+    """modal run showui_modal.py [--image screenshot.png]; without --image, ShowUI's example screenshot from the Hub."""
     import os
     # Use a standard screenshot for action testing
     test_image = "https://huggingface.co/showlab/ShowUI-2B/resolve/main/examples/web_dbd7514b-9ca3-40cd-b09a-990f7b955da1.png"
@@ -175,8 +460,104 @@ def main():
 
     for i, p in enumerate(action_prompts):
         print(f"\n=== ACTION TEST {i+1}: {p} ===")
-        res = showui.run_inference.remote(image_url=test_image, prompt=p, system_prompt=sys_prompt)
+        if image:
+            res = showui.run_inference.remote(image_bytes=open(image, "rb").read(), prompt=p, system_prompt=sys_prompt)
+        else:
+            res = showui.run_inference.remote(image_url=test_image, prompt=p, system_prompt=sys_prompt)
         print(f"Result {i+1}: {res}")
     
     print("\nForcing exit to prevent shutdown delay...")
     os._exit(0)
+
+
+@app.local_entrypoint()
+def check_batch():
+    """modal run showui_modal.py::check_batch - batched answers must equal unbatched model.generate ones."""
+    import os
+    import urllib.request
+
+    test_image = "https://huggingface.co/showlab/ShowUI-2B/resolve/main/examples/web_dbd7514b-9ca3-40cd-b09a-990f7b955da1.png"
+    request = urllib.request.Request(test_image, headers={'User-Agent': 'Mozilla/5.0'})
+    image_bytes = urllib.request.urlopen(request).read()
+    prompts = [
+        "Click the search icon.",
+        "Type 'Modal' in the search bar.",
+        "Click on the text input field or chat box where a message can be typed.",
+    ]
+    # Both sides are generated in the container: run_inference calls would fill the grounding cache
+    # and the batched call would then be answered from it
+    report = ShowUI().batch_report.remote(prompts, image_bytes)
+
+    for p, a, b in zip(prompts, report["reference"], report["batched"]):
+        print(f"{'OK ' if a == b else 'DIFF'} {p}\n     unbatched: {a}\n     batched:   {b}")
+    print(f"unbatched {report['reference_s']:.2f}s, batched {report['batched_s']:.2f}s")
+    os._exit(0 if report["reference"] == report["batched"] else 1)
+
+
+@app.local_entrypoint()
+def check_constrained():
+    """modal run showui_modal.py::check_constrained - parse failures and token counts with and without the grammar."""
+    import os
+    import urllib.request
+
+    test_image = "https://huggingface.co/showlab/ShowUI-2B/resolve/main/examples/web_dbd7514b-9ca3-40cd-b09a-990f7b955da1.png"
+    request = urllib.request.Request(test_image, headers={'User-Agent': 'Mozilla/5.0'})
+    image_bytes = urllib.request.urlopen(request).read()
+    prompts = [
+        "Click the search icon.",
+        "Type 'Modal' in the search bar.",
+        "Scroll down the page.",
+        "Click on the text input field or chat box where a message can be typed.",
+    ]
+    report = ShowUI().constrained_report.remote(prompts, image_bytes)
+    for mode, rows in report.items():
+        failed = sum(not row["parsed"] for row in rows)
+        tokens = sum(row["tokens"] for row in rows) / len(rows)
+        ms = sum(row["ms"] for row in rows) / len(rows)
+        print(f"{mode:<12} parse failures {failed}/{len(rows)}  mean tokens {tokens:6.1f}  mean {ms:7.1f} ms")
+        for row in rows:
+            print(f"    {'ok  ' if row['parsed'] else 'FAIL'} {row['prompt'][:40]:<40} {row['text'][:70]!r}")
+    os._exit(0)
+
+
+@app.local_entrypoint()
+def check_roi(targets: str = ""):
+    """modal run showui_modal.py::check_roi [--targets labelled.jsonl] - vision tokens and hits, full frame vs. ROI crop.
+
+    A target is {"screen", "prompt", "region", "box"}: "screen" a capture spec (file:<path> for a real
+    screenshot), "box" the target's [x0, y0, x1, y1] in 0-1 coordinates. Defaults to benchmarks/corpus/roi_targets.jsonl.
+    """
+    import json
+    import os
+    import screen_capture
+
+    path = targets or os.path.join(os.path.dirname(os.path.abspath(__file__)), "benchmarks", "corpus", "roi_targets.jsonl")
+    by_screen = {}
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                target = json.loads(line)
+                by_screen.setdefault(target["screen"], []).append(target)
+
+    # Frames go up the way the client uploads them with ROI on, so crops have native pixels
+    os.environ.setdefault("GHOSTY_ROI", "1")
+    showui = ShowUI()
+    rows = []
+    for screen, screen_targets in by_screen.items():
+        frame = screen_capture.capture_frame(screen_capture.get_capture_backend(screen))
+        rows += showui.roi_report.remote(screen_targets, frame["data"])
+    for row in rows:
+        print(f"{row['region']:<8} {row['prompt'][:48]:<48}")
+        for mode in ("full", "roi"):
+            print(f"    {mode:<5} {'hit ' if row[mode]['hit'] else 'MISS'} {row[mode]['tokens']:>5} tokens {row[mode]['ms']:>7.1f} ms  {row[mode]['answer']}")
+    for mode in ("full", "roi"):
+        hits = sum(row[mode]["hit"] for row in rows)
+        tokens = sum(row[mode]["tokens"] for row in rows) / len(rows)
+        print(f"{mode:<5} hits {hits}/{len(rows)}  mean vision tokens {tokens:7.1f}")
+    os._exit(0)
+
+
+@app.local_entrypoint()
+def bake(profile: str = ""):
+    """modal run showui_modal.py::bake [--profile nf4] - then redeploy, so the snapshot is taken from the baked weights"""
+    print(f"Baked {bake_weights.remote(profile)}")
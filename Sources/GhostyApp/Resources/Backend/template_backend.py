@@ -1,76 +1,290 @@
 #!/usr/bin/env python3
 import sys
 import os
-import modal
+import json
+import re
+import socket
+import time
+
+# Unix socket of the long-lived backend daemon (see serve_socket / request_daemon)
+SOCKET_PATH = os.path.expanduser(os.environ.get("GHOSTY_SOCKET", "~/Ghosty/backend.sock"))
+DAEMON_LOG_PATH = os.path.expanduser("~/Ghosty/backend.log")
+DAEMON_IDLE_TIMEOUT = float(os.environ.get("GHOSTY_DAEMON_IDLE_TIMEOUT", "900"))
+DAEMON_START_TIMEOUT = float(os.environ.get("GHOSTY_DAEMON_START_TIMEOUT", "15"))
+# Stream the orchestrator's response to stdout as it is generated (GHOSTY_STREAM=0 to print it at the end)
+STREAM = os.environ.get("GHOSTY_STREAM", "1") != "0"
+# Carry on with the orchestrator's multi-step plans instead of re-planning every turn (GHOSTY_PLAN=0 to re-plan)
+PLAN = os.environ.get("GHOSTY_PLAN", "1") != "0"
+# Response line with the steps of a plan still waiting for a precondition (orchestrator_modal.PLAN_MARKER)
+PLAN_LINE = re.compile(r"^PLAN_PENDING: (.*)(?:\n|$)", re.MULTILINE)
+HISTORY_MARKER = "\n\nACTION HISTORY:"
+# Response line with where the turn's frame is on the screen, for the app to map normalized positions back
+FRAME_PREFIX = "FRAME_TRANSFORM: "
+# Append every turn as a JSON line here, for benchmarks/replay_sessions.py
+SESSION_LOG = os.environ.get("GHOSTY_SESSION_LOG", "")
+
+_capture_backend = None
+_router = None
+_frame_uploader = None
+# Action history per app session (structured turns) and what the orchestrator already has of it
+_sessions = None
+_session_uploader = None
+# The pending plan of the current task: {"task": session id or intent, "plan": {"steps", "preconditions", "task_status"}}
+_plan = None
+# Details of the most recent turn, returned alongside the daemon's response
+_last_turn = {}
+# Thumbnail of the frame the last turn was reasoned over, what settle_screen() waits for the screen to move away from
+_settle_baseline = None
 
 # Setup Modal Orchestrator client
 def get_orchestrator_client():
+    # service_clients caches the handle, so a long-lived process only pays the lookup once
+    import service_clients
+
     try:
-        # Look up the newly deployed Orchestrator class
-        return modal.Cls.from_name("ghosty-orchestrator", "OrchestratorAgent")()
+        return service_clients.get("orchestrator")
     except Exception as e:
         print(f"DEBUG: Failed to lookup Orchestrator service: {e}", file=sys.stderr)
         return None
 
+def get_intent_router():
+    # None when disabled (GHOSTY_ROUTER=0); kept for the life of the process so its cache stays warm
+    global _router
+    import intent_router
+
+    if _router is None and intent_router.enabled():
+        _router = intent_router.IntentRouter(capacity=int(os.environ.get("GHOSTY_ROUTER_CACHE", "64")))
+    return _router
+
+def capture_frame():
+    # Capture, mask and encode in memory; archiving to ~/Ghosty/screenshots is async
+    global _capture_backend
+    import screen_capture
+
+    if _capture_backend is None:
+        _capture_backend = screen_capture.get_capture_backend()
+    frame = screen_capture.capture_frame(_capture_backend)
+    update_settle_baseline(frame)
+    frame_info = {
+        "format": frame["format"],
+        "size": list(frame["size"]),
+        "source_size": list(frame["source_size"]),
+        "bytes": len(frame["data"]),
+        "transform": frame["transform"],
+    }
+    _last_turn["capture"] = frame_info
+    print(
+        f"DEBUG: Captured via {_capture_backend.name}: {frame_info['source_size']} -> "
+        f"{frame_info['size']} {frame_info['format']}, {frame_info['bytes']} bytes",
+        file=sys.stderr, flush=True,
+    )
+    return frame
+
+def update_settle_baseline(frame: dict):
+    # Best effort: without numpy only settle detection is lost, never the capture
+    global _settle_baseline
+    try:
+        import screen_settle
+
+        _settle_baseline = screen_settle.thumbnail(frame["source"], zones=frame["zones"])
+    except ImportError as e:
+        _settle_baseline = None
+        print(f"DEBUG: No settle baseline: {e}", file=sys.stderr, flush=True)
+
 def get_screenshot():
-    import tempfile
-    from datetime import datetime
-    
-    # 1. Ensure screenshot directory exists
-    screenshot_dir = os.path.expanduser("~/Ghosty/screenshots")
-    if not os.path.exists(screenshot_dir):
-        os.makedirs(screenshot_dir, exist_ok=True)
-    
-    # 2. Generate timestamped filename
-    timestamp = datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
-    permanent_path = os.path.join(screenshot_dir, f"ghosty_{timestamp}.png")
-    
-    # 3. Capture screen using macOS screencapture utility
-    # -x: disable sound
-    os.system(f"screencapture -x {permanent_path}")
-    print(f"DEBUG: Screenshot saved to {permanent_path}", file=sys.stderr, flush=True)
-    
-    # 4. Mask the "Ghosty Zone" (top center) using Pillow
-    from PIL import Image, ImageDraw
+    return capture_frame()["data"]
+
+def with_transform(result: str, frame: dict) -> str:
+    """The response with its frame's FRAME_TRANSFORM line; without one the app maps positions to the main display."""
+    if not frame.get("transform"):
+        return result
+    return f"{result}\n{FRAME_PREFIX}{json.dumps(frame['transform'])}"
+
+def settle_screen(timeout: float = None) -> dict:
+    """Waits until the screen has reacted to the last turn's actions and stopped changing (screen_settle.py)."""
+    global _capture_backend
+    import screen_capture
+    import screen_settle
+
+    if _capture_backend is None:
+        _capture_backend = screen_capture.get_capture_backend()
     try:
-        with Image.open(permanent_path) as img:
-            width, height = img.size
-            draw = ImageDraw.Draw(img)
-            
-            # Define Ghosty Zone: [0.3 to 0.7, 0.0 to 0.6]
-            # We use a black rectangle to "cut out" the Ghosty UI
-            left = int(0.3 * width)
-            top = 0
-            right = int(0.7 * width)
-            bottom = int(0.6 * height)
-            
-            draw.rectangle([left, top, right, bottom], fill="black")
-            
-            # Save the masked image back to a buffer or the file
-            img.save(permanent_path)
-            print(f"DEBUG: Masked Ghosty Zone in {permanent_path}", file=sys.stderr, flush=True)
-            
-            import io
-            img_byte_arr = io.BytesIO()
-            img.save(img_byte_arr, format='PNG')
-            return img_byte_arr.getvalue()
-    except Exception as e:
-        print(f"DEBUG: Masking failed: {e}", file=sys.stderr)
-        with open(permanent_path, "rb") as f:
-            return f.read()
+        result = screen_settle.wait_for_settle(_capture_backend, _settle_baseline, timeout)
+    except ImportError as e:
+        # The app falls back to its fixed pause
+        return {"error": f"settle detection unavailable: {e}"}
+    print(
+        f"DEBUG: Screen {result['reason']} after {result['ms']:.0f} ms ({result['samples']} samples)",
+        file=sys.stderr, flush=True,
+    )
+    return result
+
+def _call_orchestrator(orch, prompt: str, kwargs: dict, on_chunk=None, plan: dict = None) -> str:
+    import service_clients
+
+    # With a session the orchestrator rebuilds the prompt from the history it keeps
+    if "session" not in kwargs:
+        kwargs = dict(kwargs, user_prompt=prompt)
+    if plan is not None:
+        # Nothing to stream: without reasoning the response is ready at once
+        result = service_clients.run(service_clients.call(orch.continue_plan, plan=plan, **kwargs))
+        if on_chunk is not None:
+            on_chunk(result)
+        return result
+    if on_chunk is None:
+        return service_clients.run(service_clients.call(orch.invoke, **kwargs))
+    chunks = []
+    for chunk in orch.invoke_stream.remote_gen(**kwargs):
+        chunks.append(chunk)
+        on_chunk(chunk)
+    return "".join(chunks)
+
+def invoke_orchestrator(orch, prompt: str, frame: dict, on_chunk=None, plan: dict = None, session: str = None) -> str:
+    """Calls invoke() with a frame reference or delta when the orchestrator already has the previous frame.
+
+    With `on_chunk`, uses invoke_stream() instead and passes each piece of the response on as it arrives.
+    With a pending `plan`, calls continue_plan() instead. With a `session` id, only the history lines
+    the orchestrator doesn't have yet are sent instead of the prompt.
+    """
+    global _frame_uploader, _session_uploader
+    import frame_cache
+    import session_history
+    import tracing
+
+    if _frame_uploader is None:
+        _frame_uploader = frame_cache.FrameUploader()
+    if _session_uploader is None:
+        _session_uploader = session_history.SessionUploader()
+    with tracing.span("frame_delta") as attrs:
+        kwargs, report = _frame_uploader.prepare(frame)
+        attrs.update(mode=report["mode"], bytes=report["sent_bytes"])
+    entry = _sessions.get(session) if session is not None else None
+    if entry is not None:
+        kwargs = dict(kwargs, session=_session_uploader.prepare(session, entry["intent"], entry["lines"]))
+    if tracing.current():
+        # The orchestrator's spans (and ShowUI's) come back on a TRACE_SPANS line
+        kwargs = dict(kwargs, trace=tracing.current()[0].arg())
+    # A miss is raised before anything is streamed, so retrying can't duplicate output
+    for _ in range(3):
+        try:
+            with tracing.span("remote", call="continue_plan" if plan is not None else ("invoke_stream" if on_chunk else "invoke")):
+                result = _call_orchestrator(orch, prompt, kwargs, on_chunk, plan)
+            break
+        except Exception as e:
+            if frame_cache.is_cache_miss(e):
+                print("DEBUG: Orchestrator no longer has the previous frame, re-sending it in full", file=sys.stderr, flush=True)
+                report = dict(report, mode="full", sent_bytes=report["sent_bytes"] + report["full_bytes"])
+                kwargs = dict(kwargs, **_frame_uploader.full(frame))
+                kwargs.pop("image_delta", None)
+            elif entry is not None and session_history.is_session_miss(e):
+                print("DEBUG: Orchestrator no longer has this session, re-sending its history", file=sys.stderr, flush=True)
+                kwargs = dict(kwargs, session=_session_uploader.full(session, entry["intent"], entry["lines"]))
+            else:
+                raise
+    else:
+        raise RuntimeError("Orchestrator kept missing its frame or session")
+    result, spans = tracing.take_spans(result)
+    tracing.extend(spans)
+
+    if entry is not None:
+        _session_uploader.commit()
+    report = _frame_uploader.commit(report)
+    _last_turn["upload"] = {k: v for k, v in report.items() if k != "key"}
+    print(
+        f"DEBUG: Upload {report['mode']}: sent {report['sent_bytes']} of {report['full_bytes']} bytes "
+        f"(saved {report['saved_bytes']}, hit rate {report['hit_rate']:.0%}, "
+        f"{report['total_saved_bytes']} bytes saved this session)",
+        file=sys.stderr, flush=True,
+    )
+    return result
+
+def strip_plan(text: str) -> str:
+    """The response without its PLAN_PENDING line; the app never sees it."""
+    return PLAN_LINE.sub("", text)
+
+def take_plan(result: str):
+    """(response without the PLAN_PENDING line, pending plan or None)."""
+    match = PLAN_LINE.search(result)
+    if match is None:
+        return result, None
+    try:
+        plan = json.loads(match.group(1))
+    except json.JSONDecodeError:
+        plan = None
+    return strip_plan(result), plan
+
+def record_turn(prompt: str, result: str, kind: str, start: float):
+    if not SESSION_LOG:
+        return
+    entry = {"time": time.time(), "prompt": prompt, "result": result, "kind": kind, "ms": (time.perf_counter() - start) * 1000}
+    with open(os.path.expanduser(SESSION_LOG), "a", encoding="utf-8") as log:
+        log.write(json.dumps(entry) + "\n")
+
+def generate_turn(turn: dict, on_chunk=None) -> str:
+    """A structured turn from the app: {"session", "intent", "base", "actions"} (see session_history.py).
+
+    Raises SessionMiss if this process doesn't have the session's first `base` actions; the app then
+    sends the turn again with all of them.
+    """
+    global _sessions
+    import session_history
+
+    if _sessions is None:
+        _sessions = session_history.SessionStore(session_history.capacity(), session_history.ttl_s())
+    lines = [session_history.format_action(action) for action in turn.get("actions", [])]
+    entry = _sessions.update(turn["session"], (turn.get("intent") or "").strip(), lines, int(turn.get("base", 0)))
+    return generate_response(session_history.render_prompt(entry["intent"], entry["lines"]), on_chunk, session=turn["session"])
+
+def generate_response(text: str, on_chunk=None, session: str = None) -> str:
+    """The response to one turn. With GHOSTY_TRACE set, the turn's spans and the services' are written out."""
+    import tracing
+
+    trace = tracing.Trace() if tracing.enabled() else None
+    try:
+        with tracing.attach(trace), tracing.span("turn"):
+            return _generate_response(text, on_chunk, session)
+    finally:
+        if trace is not None:
+            _last_turn["trace"] = trace.id
+            tracing.write(trace.spans)
+
+def _generate_response(text: str, on_chunk=None, session: str = None) -> str:
+    global _plan
+    import tracing
 
-def generate_response(text: str) -> str:
     normalized = (text or "").strip()
     if not normalized:
         return "Ghosty: I didn't catch that. What should I do on the screen?"
     
     print(f"DEBUG: Processing intent: {normalized}", file=sys.stderr)
-    
+
+    # 0. Trivial intents (hide, press enter, greetings) are answered locally: no capture, no network
+    router = get_intent_router()
+    turn_start = time.perf_counter()
+    with tracing.span("route"):
+        routed = router.route(normalized) if router is not None else None
+    if routed is not None:
+        router.record(routed)
+        stats = router.stats()
+        _last_turn["router"] = dict(stats, rule=routed[0])
+        print(
+            f"DEBUG: Intent router hit ({routed[0]}): hit rate {stats['hit_rate']:.0%}, "
+            f"~{stats['saved_ms']:.0f} ms saved this session",
+            file=sys.stderr, flush=True,
+        )
+        record_turn(normalized, routed[1], "routed", turn_start)
+        return routed[1]
+
+    # A follow-up turn of the task whose plan is pending carries on with it; anything else drops it
+    task = session or normalized.split(HISTORY_MARKER)[0]
+    plan = _plan["plan"] if PLAN and _plan and _plan["task"] == task and HISTORY_MARKER in normalized else None
+    _plan = None
+
     # 1. Capture screen
     try:
         print("DEBUG: Capturing screenshot...", file=sys.stderr, flush=True)
-        image_bytes = get_screenshot()
-        print(f"DEBUG: Captured {len(image_bytes)} bytes", file=sys.stderr, flush=True)
+        with tracing.span("capture"):
+            frame = capture_frame()
     except Exception as e:
         return f"Error capturing screen: {str(e)}"
 
@@ -81,20 +295,267 @@ def generate_response(text: str) -> str:
         if not orch:
             return "Error: Could not connect to Modal Orchestrator service."
         
-        print(f"DEBUG: Calling Orchestrator remote inference with prompt: {normalized}", file=sys.stderr, flush=True)
-        result = orch.invoke.remote(
-            user_prompt=normalized,
-            image_bytes=image_bytes
-        )
+        if plan is not None:
+            print(f"DEBUG: Continuing plan: {plan['steps']} if {plan['preconditions'][0]!r}", file=sys.stderr, flush=True)
+        else:
+            print(f"DEBUG: Calling Orchestrator remote inference with prompt: {normalized}", file=sys.stderr, flush=True)
+        emit = None
+        if on_chunk is not None:
+            def emit(chunk):
+                chunk = tracing.strip_spans(strip_plan(chunk))
+                if chunk:
+                    on_chunk(chunk)
+        result, pending = take_plan(invoke_orchestrator(orch, normalized, frame, emit, plan, session))
         print(f"DEBUG: Received result from Orchestrator: {result}", file=sys.stderr, flush=True)
-        return result
+        if pending is not None and PLAN:
+            _plan = {"task": task, "plan": pending}
+        _last_turn["plan"] = {"continued": plan is not None, "pending_steps": len(pending["steps"]) if pending else 0}
+        record_turn(normalized, result, "continue" if plan is not None else "invoke", turn_start)
+        if router is not None:
+            router.record(None, (time.perf_counter() - turn_start) * 1000)
+            router.learn(normalized, result)
+            _last_turn["router"] = router.stats()
+        return with_transform(result, frame)
     except Exception as e:
         return f"Error calling Orchestrator: {str(e)}"
 
+def _script_version() -> str:
+    # A daemon started from an older copy of this file must not serve newer clients
+    return str(os.stat(os.path.abspath(__file__)).st_mtime_ns)
+
+def _unstreamed(result: str, streamed: str) -> str:
+    """The part of the final result that still has to be printed after `streamed` went out."""
+    if not streamed:
+        return result
+    return result[len(streamed):] if result.startswith(streamed) else "\n" + result
+
+def handle_request(request: dict, emit=None) -> dict:
+    """Handles one line-delimited JSON request: {"op": ..., ...}.
+
+    With {"stream": true} and an `emit` callback, the response is also sent as
+    {"chunk": ...} messages while it is generated, ahead of the final response.
+    """
+    op = request.get("op", "generate")
+    if op == "generate":
+        import session_history
+
+        _last_turn.clear()
+        streamed = []
+        on_chunk = None
+        if request.get("stream") and emit is not None:
+            def on_chunk(chunk):
+                streamed.append(chunk)
+                emit({"chunk": chunk})
+        if "turn" not in request:
+            result = generate_response(request.get("text", ""), on_chunk)
+        else:
+            try:
+                result = generate_turn(request["turn"], on_chunk)
+            except session_history.SessionMiss:
+                return {"ok": False, "error": "session_miss"}
+        return {"ok": True, "result": result, "streamed": "".join(streamed), "turn": dict(_last_turn)}
+    if op == "settle":
+        return {"ok": True, "result": settle_screen(request.get("timeout"))}
+    if op == "ping":
+        return {"ok": True, "result": "pong"}
+    return {"ok": False, "error": f"Unknown op: {op}"}
+
+def _warm_up():
+    # Pay the imports and the service lookup once, before the first turn arrives
+    global _capture_backend
+    import screen_capture
+
+    _capture_backend = screen_capture.get_capture_backend()
+    get_orchestrator_client()
+    get_intent_router()
+
+def serve_stdio() -> int:
+    """Daemon mode over stdin/stdout: one JSON request per line, one JSON response per line."""
+    _warm_up()
+    for line in sys.stdin:
+        if not line.strip():
+            continue
+        try:
+            response = handle_request(json.loads(line), emit=lambda message: print(json.dumps(message), flush=True))
+        except Exception as e:
+            response = {"ok": False, "error": str(e)}
+        print(json.dumps(response), flush=True)
+    return 0
+
+def serve_socket(path: str = SOCKET_PATH) -> int:
+    """Daemon mode over a Unix socket. Exits after DAEMON_IDLE_TIMEOUT seconds without requests."""
+    import socketserver
+
+    version = _script_version()
+
+    class Handler(socketserver.StreamRequestHandler):
+        def handle(self):
+            line = self.rfile.readline()
+            if not line.strip():
+                return
+            try:
+                request = json.loads(line)
+                if request.get("version", version) != version:
+                    response = {"ok": False, "error": "stale"}
+                    self.server.done = True
+                elif request.get("op") == "shutdown":
+                    response = {"ok": True, "result": "bye"}
+                    self.server.done = True
+                else:
+                    response = handle_request(request, emit=self.send)
+            except Exception as e:
+                response = {"ok": False, "error": str(e)}
+            self.send(response)
+
+        def send(self, message: dict):
+            self.wfile.write((json.dumps(message) + "\n").encode("utf-8"))
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    if os.path.exists(path):
+        os.unlink(path)
+
+    _warm_up()
+    # Requests are handled one at a time; the app runs one turn at a time anyway
+    server = socketserver.UnixStreamServer(path, Handler)
+    server.timeout = DAEMON_IDLE_TIMEOUT
+    server.done = False
+
+    def on_idle():
+        server.done = True
+    server.handle_timeout = on_idle
+
+    print(f"DEBUG: Backend daemon listening on {path}", file=sys.stderr, flush=True)
+    try:
+        while not server.done:
+            server.handle_request()
+    finally:
+        server.server_close()
+        if os.path.exists(path):
+            os.unlink(path)
+    return 0
+
+def _spawn_daemon(path: str):
+    import subprocess
+
+    os.makedirs(os.path.dirname(DAEMON_LOG_PATH), exist_ok=True)
+    with open(DAEMON_LOG_PATH, "ab") as log:
+        # stdout must not be inherited: the app reads ours until EOF
+        subprocess.Popen(
+            [sys.executable, os.path.abspath(__file__), "--serve", "--socket", path],
+            stdin=subprocess.DEVNULL,
+            stdout=subprocess.DEVNULL,
+            stderr=log,
+            start_new_session=True,
+        )
+
+def _send_to_daemon(path: str, request: dict, on_chunk=None) -> dict:
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.connect(path)
+        sock.sendall((json.dumps(request) + "\n").encode("utf-8"))
+        with sock.makefile("rb") as reader:
+            while True:
+                line = reader.readline()
+                if not line:
+                    raise ConnectionError("Backend daemon closed the connection")
+                message = json.loads(line)
+                if "chunk" not in message:
+                    return message
+                if on_chunk is not None:
+                    on_chunk(message["chunk"])
+
+def request_daemon(request: dict, path: str = SOCKET_PATH, spawn: bool = True, on_chunk=None):
+    """Sends a request to the daemon, starting it if needed. Returns None if it can't be reached.
+
+    Streamed {"chunk": ...} messages are passed to `on_chunk` as they arrive.
+    """
+    import time
+
+    request = dict(request, version=_script_version())
+    deadline = None
+    while True:
+        try:
+            response = _send_to_daemon(path, request, on_chunk)
+            if response.get("error") != "stale":
+                return response
+            # The old daemon exits after answering "stale"; start a fresh one
+            time.sleep(0.1)
+        except (FileNotFoundError, ConnectionRefusedError):
+            if not spawn:
+                return None
+        except OSError as e:
+            print(f"DEBUG: Backend daemon unavailable: {e}", file=sys.stderr)
+            return None
+
+        if deadline is None:
+            _spawn_daemon(path)
+            deadline = time.monotonic() + DAEMON_START_TIMEOUT
+        elif time.monotonic() > deadline:
+            print("DEBUG: Backend daemon did not start in time", file=sys.stderr)
+            return None
+        time.sleep(0.05)
+
 def main() -> int:
-    text = " ".join(sys.argv[1:]).strip()
-    # GhostyApp expects the response on stdout
-    print(generate_response(text))
+    args = sys.argv[1:]
+    if args[:1] == ["--serve"]:
+        if "--stdio" in args:
+            return serve_stdio()
+        path = args[args.index("--socket") + 1] if "--socket" in args else SOCKET_PATH
+        return serve_socket(path)
+
+    # Between turns the app waits for the screen to settle (--settle [timeout]); prints the result as JSON
+    if args[:1] == ["--settle"]:
+        timeout = float(args[1]) if len(args) > 1 else None
+        if os.environ.get("GHOSTY_DAEMON", "1") != "0":
+            response = request_daemon({"op": "settle", "timeout": timeout})
+            if response is not None:
+                print(json.dumps(response.get("result") if response.get("ok") else {"error": response.get("error")}))
+                return 0
+        print(json.dumps(settle_screen(timeout)))
+        return 0
+
+    # The displays and windows GHOSTY_CAPTURE_TARGET can name, as JSON
+    if args[:1] == ["--targets"]:
+        import screen_capture
+
+        print(json.dumps(screen_capture.list_targets(), indent=2))
+        return 0
+
+    # A structured turn from the app (--turn JSON) or a plain prompt
+    turn = json.loads(args[args.index("--turn") + 1]) if "--turn" in args else None
+    text = " ".join(args).strip()
+
+    # GhostyApp expects the response on stdout; when streaming it reads it as it arrives
+    def write_chunk(chunk: str):
+        sys.stdout.write(chunk)
+        sys.stdout.flush()
+    on_chunk = write_chunk if STREAM else None
+
+    # Thin client: hand the turn to the warm daemon, or run it in-process as before
+    if os.environ.get("GHOSTY_DAEMON", "1") != "0":
+        request = {"op": "generate", "turn": turn} if turn is not None else {"op": "generate", "text": text}
+        response = request_daemon(dict(request, stream=STREAM), on_chunk=on_chunk)
+        if response is not None:
+            if response.get("ok"):
+                print(_unstreamed(response["result"], response.get("streamed", "")))
+            else:
+                print(f"Error: {response.get('error')}")
+            return 0
+
+    streamed = []
+    if on_chunk is not None:
+        def on_chunk(chunk: str):
+            streamed.append(chunk)
+            write_chunk(chunk)
+    if turn is None:
+        result = generate_response(text, on_chunk)
+    else:
+        import session_history
+        try:
+            result = generate_turn(turn, on_chunk)
+        except session_history.SessionMiss:
+            # Nothing was printed yet; the app re-sends the turn with the whole history
+            result = "Error: session_miss"
+    print(_unstreamed(result, "".join(streamed)))
     return 0
 
 if __name__ == "__main__":
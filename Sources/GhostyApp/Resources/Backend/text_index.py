@@ -0,0 +1,271 @@
+"""Text index of a frame: which text is visible where, to ground named targets without ShowUI.
+
+Many steps name text on the screen ("Click the DIBZS chat on the left side",
+"Click the Login button"). For those the orchestrator looks the name up in an
+index of the frame's text instead of asking ShowUI:
+
+  target_of()        the text a click step names: quoted text, or "the X button/chat/..." (None: not a named target)
+  build()            OCR (RapidOCR, CPU) of a frame into lines of text with normalized boxes
+  TextIndex.lookup() fuzzy match of a target, optionally within a roi region; no answer when missing or ambiguous
+  IndexCache         indexes by frame key, built on a background thread as frames arrive, so the
+                     OCR runs while the orchestrator is still reasoning
+
+Steps without an unambiguous match fall back to ShowUI as before.
+
+An index is only used if it is already built when the steps are grounded.
+A build takes about 1 s of CPU (bench_text_index), more than a short decision
+takes to decode, and waiting for it would add to the turn whatever it saves
+on ShowUI. So a fast decision goes to ShowUI exactly as without the index,
+and the index pays off on slower decisions and on later steps and turns
+grounded against the same frame. GHOSTY_TEXT_INDEX_WAIT_MS trades some
+latency on fast decisions for more steps resolved from the index.
+
+Configuration (orchestrator):
+  GHOSTY_TEXT_INDEX=0        - always ground with ShowUI (default: on when rapidocr-onnxruntime is installed)
+  GHOSTY_TEXT_MATCH          - minimum similarity of a match, 0-1 (default 0.85)
+  GHOSTY_TEXT_INDEX_WAIT_MS  - how long grounding waits for an index still being built (default 0: it doesn't)
+"""
+import difflib
+import os
+import re
+import sys
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import roi
+import tracing
+
+# Another match this close to the best one makes the target ambiguous ...
+AMBIGUITY_MARGIN = 0.05
+# ... unless it is at the same place (the same text found twice)
+SAME_PLACE = 0.02
+
+_CLICK = re.compile(r"^\s*(?:double[- ]click|right[- ]click|click|tap|select)\s+(?:on\s+)?(.+)$", re.IGNORECASE)
+_QUOTED = re.compile(r"[\"'“‘]([^\"'”’]{1,60})[\"'”’]")
+# Where the target is, what it is for: not part of its text
+_TAIL = re.compile(
+    r"(?:,|\s+(?:on|in|at|from|near|under|inside|within|of|to|so|and|or|where|which|that|located)\b).*$",
+    re.IGNORECASE,
+)
+_ARTICLE = re.compile(r"^(?:the|a|an)\s+", re.IGNORECASE)
+# What kind of element the target is
+_KIND = re.compile(
+    r"(?:^|\s+)(?:button|link|tab|chat|group chat|group|conversation|thread|contact|channel|folder|file|item|icon|"
+    r"menu item|menu|option|entry|row|label|checkbox|toggle)$",
+    re.IGNORECASE,
+)
+# Elements drawn rather than written: "the Safari icon" has no text to find (the Safari menu does)
+_GRAPHIC = re.compile(r"\s+(?:icon|logo|image|picture|avatar|checkbox|toggle)$", re.IGNORECASE)
+# Targets described by position or look rather than by their text
+_DESCRIPTIVE = {
+    "first", "second", "third", "last", "top", "bottom", "left", "right", "next", "previous", "other",
+    "red", "green", "yellow", "blue", "grey", "gray", "this", "that", "text", "input", "search",
+}
+MAX_TARGET_WORDS = 4
+
+_engine = None
+_engine_lock = threading.Lock()
+_build_executor = None
+
+
+def enabled() -> bool:
+    if os.environ.get("GHOSTY_TEXT_INDEX", "1") == "0":
+        return False
+    try:
+        import rapidocr_onnxruntime  # noqa: F401  optional: the OCR engine
+    except ImportError:
+        return False
+    return True
+
+
+def min_similarity() -> float:
+    return float(os.environ.get("GHOSTY_TEXT_MATCH", "0.85"))
+
+
+def wait_s() -> float:
+    return float(os.environ.get("GHOSTY_TEXT_INDEX_WAIT_MS", "0")) / 1000
+
+
+def normalize(text: str) -> str:
+    return " ".join(re.sub(r"[^\w\s]", " ", text.lower()).split())
+
+
+def target_of(instruction: str):
+    """The text a click step names, e.g. "DIBZS" for "Click the DIBZS chat on the left side"; None if it names none."""
+    match = _CLICK.match(instruction or "")
+    if match is None:
+        return None
+    quoted = _QUOTED.search(match.group(1))
+    if quoted is not None:
+        target = quoted.group(1).strip()
+        return target or None
+    target = _TAIL.sub("", match.group(1).strip().rstrip("."))
+    # "the DIBZS chat" names the chat DIBZS; without the article the kind may be part of the text ("Work chat")
+    if _GRAPHIC.search(target):
+        return None
+    if _ARTICLE.match(target):
+        target = _KIND.sub("", _ARTICLE.sub("", target))
+    words = normalize(target).split()
+    if not words or len(words) > MAX_TARGET_WORDS or words[0] in _DESCRIPTIVE:
+        return None
+    return target
+
+
+def _get_engine():
+    global _engine
+    with _engine_lock:
+        if _engine is None:
+            from rapidocr_onnxruntime import RapidOCR
+
+            _engine = RapidOCR()
+        return _engine
+
+
+def build(img) -> "TextIndex":
+    """OCR of `img` (an RGB PIL image) into a TextIndex of its lines."""
+    import numpy as np
+
+    start = time.perf_counter()
+    width, height = img.size
+    # The text angle classifier only matters for rotated text
+    result, _ = _get_engine()(np.asarray(img), use_cls=False)
+    lines = []
+    for points, text, score in result or []:
+        xs = [x for x, _ in points]
+        ys = [y for _, y in points]
+        box = (min(xs) / width, min(ys) / height, max(xs) / width, max(ys) / height)
+        lines.append({"text": text, "box": tuple(round(min(1.0, max(0.0, v)), 4) for v in box), "score": float(score)})
+    return TextIndex(lines, (time.perf_counter() - start) * 1000)
+
+
+class TextIndex:
+    """Lines of text with normalized (x0, y0, x1, y1) boxes; `lookup` matches within a line too."""
+
+    def __init__(self, lines: list, build_ms: float = 0.0):
+        self.lines = lines
+        self.build_ms = build_ms
+
+    def candidates(self, target: str) -> list:
+        """(similarity, box) of every line part at least min_similarity() like `target`, best first."""
+        wanted = normalize(target)
+        size = len(wanted.split())
+        threshold = min_similarity() if len(wanted) > 3 else 1.0
+        found = []
+        for line in self.lines:
+            words = normalize(line["text"]).split()
+            text = " ".join(words)
+            x0, y0, x1, y1 = line["box"]
+            # Parts of the line with about as many words as the target; their box is estimated by character offset
+            for n in {max(1, size - 1), size, size + 1}:
+                for i in range(0, max(1, len(words) - n + 1)):
+                    part = " ".join(words[i:i + n])
+                    similarity = difflib.SequenceMatcher(None, wanted, part).ratio()
+                    if similarity < threshold:
+                        continue
+                    begin = len(" ".join(words[:i])) + (1 if i else 0)
+                    left = x0 + (x1 - x0) * begin / max(1, len(text))
+                    right = x0 + (x1 - x0) * (begin + len(part)) / max(1, len(text))
+                    found.append((similarity, (left, y0, right, y1)))
+        return sorted(found, key=lambda item: -item[0])
+
+    def lookup(self, target: str, region=None) -> tuple:
+        """([x, y] centre of `target`, "resolved"), or (None, "missing" | "ambiguous").
+
+        With a roi `region` (a name or a box) only matches whose centre lies in it count.
+        """
+        found = [(similarity, _centre(box)) for similarity, box in self.candidates(target)]
+        if region is not None:
+            rx0, ry0, rx1, ry1 = roi.box(region)
+            found = [(s, (x, y)) for s, (x, y) in found if rx0 <= x <= rx1 and ry0 <= y <= ry1]
+        if not found:
+            return None, "missing"
+        best, (x, y) = found[0]
+        for similarity, (ox, oy) in found[1:]:
+            if similarity < best - AMBIGUITY_MARGIN:
+                break
+            if abs(ox - x) > SAME_PLACE or abs(oy - y) > SAME_PLACE:
+                return None, "ambiguous"
+        return [round(x, 4), round(y, 4)], "resolved"
+
+
+def _centre(box: tuple) -> tuple:
+    return ((box[0] + box[2]) / 2, (box[1] + box[3]) / 2)
+
+
+def click_answer(position: list) -> str:
+    """A resolved target as ShowUI would have answered it."""
+    return repr({"action": "CLICK", "value": None, "position": position})
+
+
+class IndexCache:
+    """Text indexes by frame key, built in the background; counts lookups by outcome."""
+
+    def __init__(self, capacity: int = 16, builder=build):
+        self.capacity = capacity
+        self.builder = builder
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.builds = 0
+        self.build_ms = 0.0
+        self.outcomes = {"resolved": 0, "ambiguous": 0, "missing": 0, "unavailable": 0}
+
+    def start(self, key: str, img):
+        """Starts indexing the frame `key` unless it already is (or indexing is off)."""
+        global _build_executor
+        if key is None or img is None or not enabled():
+            return
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                return
+            if _build_executor is None:
+                _build_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="ghosty-text-index")
+            self._entries[key] = _build_executor.submit(tracing.wrap(self._build), img)
+            while len(self._entries) > self.capacity:
+                self._entries.popitem(last=False)[1].cancel()
+
+    def _build(self, img) -> TextIndex:
+        with tracing.span("text_index") as attrs:
+            index = self.builder(img)
+            attrs["lines"] = len(index.lines)
+        with self._lock:
+            self.builds += 1
+            self.build_ms += index.build_ms
+        return index
+
+    def get(self, key: str, timeout: float = None):
+        """The frame's index, waiting up to `timeout` seconds for it; None if there is none (yet)."""
+        from concurrent.futures import TimeoutError as FutureTimeout
+
+        with self._lock:
+            future = self._entries.get(key)
+        if future is None:
+            return None
+        try:
+            return future.result(timeout=timeout)
+        except FutureTimeout:
+            return None
+        except Exception as e:
+            print(f"[TextIndex] Indexing failed: {e}", file=sys.stderr)
+            return None
+
+    def lookup(self, key: str, target: str, region=None, timeout: float = None) -> tuple:
+        """As TextIndex.lookup on the frame's index; (None, "unavailable") without one."""
+        index = self.get(key, timeout)
+        position, outcome = index.lookup(target, region) if index is not None else (None, "unavailable")
+        with self._lock:
+            self.outcomes[outcome] += 1
+        return position, outcome
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = sum(self.outcomes.values())
+            return dict(
+                self.outcomes,
+                frames=len(self._entries),
+                builds=self.builds,
+                mean_build_ms=self.build_ms / self.builds if self.builds else 0.0,
+                resolved_rate=self.outcomes["resolved"] / lookups if lookups else 0.0,
+            )
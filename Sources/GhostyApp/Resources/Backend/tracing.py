@@ -0,0 +1,217 @@
+"""Per-turn latency tracing across the client, the orchestrator and ShowUI.
+
+Each turn gets a trace id. The client (template_backend.py) times its own
+stages and passes `trace={"id": ...}` to the orchestrator, which passes it on
+to ShowUI. A traced call collects its spans and hands them back: ShowUI
+inside its return value, the orchestrator on a last "TRACE_SPANS: [...]"
+response line, which the client strips before the app sees the response.
+The client then writes every span of the turn as one JSON line:
+
+  {"trace": "3f2a...", "service": "orchestrator", "name": "prefill", "start": 1760000000.12, "ms": 412.5, "tokens": 1630}
+
+Stages: turn, route, capture (split into grab, mask, fit and encode),
+frame_delta and remote on the client; invoke, frame, queue_wait, preprocess, vision, prefill, decode,
+generate (assisted generation, not split), parse, check and showui on the
+orchestrator (plus session_prefill when a session's KV cache is extended);
+the same model stages plus grounding_cache on ShowUI.
+benchmarks/trace_summary.py prints p50/p95 per stage.
+
+Spans go to every trace in the current context (a ContextVar): a batch
+decoded for several requests records its prefill and decode in each of
+their traces. Work handed to another thread or the asyncio loop takes the
+context along with wrap() / carry(), a generator with stream(). Without a
+trace, span() does nothing.
+
+Configuration (client side):
+  GHOSTY_TRACE  - "stderr" or a JSONL file path to write spans to (default: off)
+"""
+import contextvars
+import json
+import os
+import re
+import sys
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+TRACE_MARKER = "TRACE_SPANS: "
+# The orchestrator's last response line; it may arrive as a chunk of its own
+TRACE_LINE = re.compile(r"\n?^TRACE_SPANS: (.*)(?:\n|$)", re.MULTILINE)
+
+_current = contextvars.ContextVar("ghosty_traces", default=())
+_write_lock = threading.Lock()
+
+
+def target() -> str:
+    return os.environ.get("GHOSTY_TRACE", "")
+
+
+def enabled() -> bool:
+    return bool(target())
+
+
+class Trace:
+    """The spans one service records for one turn."""
+
+    def __init__(self, trace_id: str = None, service: str = "client"):
+        self.id = trace_id or uuid.uuid4().hex
+        self.service = service
+        self.spans = []
+        self._lock = threading.Lock()
+
+    def add(self, name: str, start: float, ms: float, **attrs):
+        """Records a span that started at `start` (time.time()) and took `ms`."""
+        span = {"trace": self.id, "service": self.service, "name": name, "start": round(start, 4), "ms": round(ms, 2), **attrs}
+        with self._lock:
+            self.spans.append(span)
+
+    def extend(self, spans: list):
+        """Adds spans another service recorded for this trace."""
+        with self._lock:
+            self.spans.extend(spans)
+
+    def arg(self) -> dict:
+        """The `trace` argument for a traced remote call."""
+        return {"id": self.id}
+
+
+def from_arg(trace: dict = None, service: str = "client"):
+    """The Trace for a `trace` argument a caller sent, or None."""
+    return Trace(trace["id"], service) if trace else None
+
+
+def current() -> tuple:
+    return _current.get()
+
+
+@contextmanager
+def attach(*traces):
+    """Records spans into `traces` (None skipped) inside the block, in addition to the current ones."""
+    merged = list(current())
+    for trace in traces:
+        if trace is not None and trace not in merged:
+            merged.append(trace)
+    token = _current.set(tuple(merged))
+    try:
+        yield
+    finally:
+        _current.reset(token)
+
+
+@contextmanager
+def serve(trace: Trace):
+    """Records spans into `trace` alone inside the block: a service handling a traced call.
+
+    Its spans stay out of the caller's traces when both run in one process (GHOSTY_SERVICES=local).
+    """
+    token = _current.set((trace,) if trace is not None else ())
+    try:
+        yield
+    finally:
+        _current.reset(token)
+
+
+@contextmanager
+def span(name: str, **attrs):
+    """Times the block as a span of every current trace. Yields a dict for attributes known only later."""
+    traces = current()
+    if not traces:
+        yield attrs
+        return
+    start, wall = time.perf_counter(), time.time()
+    try:
+        yield attrs
+    finally:
+        ms = (time.perf_counter() - start) * 1000
+        for trace in traces:
+            trace.add(name, wall, ms, **attrs)
+
+
+def add(name: str, start: float, ms: float, **attrs):
+    """Records an already-timed span in every current trace."""
+    for trace in current():
+        trace.add(name, start, ms, **attrs)
+
+
+def extend(spans: list):
+    """Adds spans another service returned to every current trace."""
+    for trace in current():
+        trace.extend(spans)
+
+
+def wrap(fn):
+    """`fn` bound to the current traces, for running on another thread."""
+    traces = current()
+
+    def run(*args, **kwargs):
+        with attach(*traces):
+            return fn(*args, **kwargs)
+    return run
+
+
+async def _carried(traces: tuple, coro):
+    with attach(*traces):
+        return await coro
+
+
+def carry(coro):
+    """`coro` wrapped to run under the current traces, for scheduling on the background loop."""
+    traces = current()
+    return _carried(traces, coro) if traces else coro
+
+
+def stream(chunks, trace: Trace):
+    """Iterates the generator `chunks` like serve(trace) would run it.
+
+    serve() inside a generator would leak its trace into whoever consumes it
+    between chunks; here every step of `chunks` runs in a context of its own.
+    """
+    context = contextvars.copy_context()
+    context.run(_current.set, (trace,))
+    try:
+        while True:
+            try:
+                chunk = context.run(next, chunks)
+            except StopIteration:
+                return
+            yield chunk
+    finally:
+        context.run(chunks.close)
+
+
+def trace_line(trace: Trace) -> str:
+    return TRACE_MARKER + json.dumps(trace.spans)
+
+
+def strip_spans(text: str) -> str:
+    """The response without its TRACE_SPANS line."""
+    return TRACE_LINE.sub("", text)
+
+
+def take_spans(text: str) -> tuple:
+    """(response without the TRACE_SPANS line, the spans on it or [])."""
+    match = TRACE_LINE.search(text)
+    if match is None:
+        return text, []
+    try:
+        spans = json.loads(match.group(1))
+    except json.JSONDecodeError:
+        spans = []
+    return strip_spans(text), spans
+
+
+def write(spans: list):
+    """Writes spans as JSON lines to GHOSTY_TRACE (stderr or a file)."""
+    if not spans or not enabled():
+        return
+    lines = "".join(json.dumps(span) + "\n" for span in spans)
+    with _write_lock:
+        if target() == "stderr":
+            sys.stderr.write(lines)
+            sys.stderr.flush()
+        else:
+            path = os.path.expanduser(target())
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            with open(path, "a", encoding="utf-8") as f:
+                f.write(lines)
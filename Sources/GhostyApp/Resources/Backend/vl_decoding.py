@@ -0,0 +1,364 @@
+"""Batched greedy decoding for the Qwen2-VL family (ShowUI-2B, Qwen2.5-VL-7B).
+
+model.generate() runs the vision tower once per prompt, even when every
+prompt is about the same screenshot. These helpers split a request into its
+stages so callers can share the expensive ones:
+
+  encode_images()    image preprocessing + vision tower, once per distinct screenshot
+  prepare_batch()    chat texts -> left-padded ids, embeddings and M-RoPE positions
+  greedy_generate()  prefill + token-by-token greedy decode of the whole batch
+  prefill_prefix()   KV cache of a constant text prefix (e.g. a system prompt), reused via prefix_cache()
+  extend_prefix()    a prefix's KV cache carried over to a longer (or edited) text prefix
+
+greedy_generate() also takes json_grammar Matchers to constrain rows to a grammar.
+Under a trace (tracing.py) the stages record preprocess, vision, prefill and
+decode spans; the vision span then waits for the GPU to finish.
+
+Only the model's own forward() is used, so the same code runs against the
+transformers versions the Modal images install (4.49+) and 5.x.
+"""
+import copy
+import functools
+import inspect
+import time
+
+import tracing
+
+IMAGE_PAD = "<|image_pad|>"
+
+
+def encode_images(model, processor, imgs: list, min_pixels: int = None, max_pixels: int = None) -> list:
+    """Preprocesses screenshots exactly like process_vision_info + processor do and runs them
+    through the vision tower in one pass. Returns one encoding per image."""
+    import torch
+    from qwen_vl_utils import process_vision_info
+
+    contents = []
+    for img in imgs:
+        content = {"type": "image", "image": img}
+        if min_pixels is not None:
+            content.update(min_pixels=min_pixels, max_pixels=max_pixels)
+        contents.append(content)
+    with tracing.span("preprocess", images=len(imgs)):
+        image_inputs, _ = process_vision_info([{"role": "user", "content": contents}])
+        pixels = processor.image_processor(images=image_inputs, return_tensors="pt")
+        grid_thw = pixels["image_grid_thw"].to(model.device)
+        pixel_values = pixels["pixel_values"].to(model.device, dtype=model.dtype)
+
+    with tracing.span("vision", images=len(imgs)), torch.no_grad():
+        if hasattr(model, "get_image_features"):
+            embeds = model.get_image_features(pixel_values, grid_thw)
+        else:
+            embeds = getattr(model, "visual", None) or model.model.visual
+            embeds = embeds(pixel_values, grid_thw=grid_thw)
+        # 5.x wraps the result in a ModelOutput; some versions split it per image
+        embeds = getattr(embeds, "pooler_output", embeds)
+        if isinstance(embeds, (tuple, list)):
+            embeds = torch.cat(list(embeds), dim=0)
+        if tracing.current() and embeds.is_cuda:
+            torch.cuda.synchronize()
+
+    merge = processor.image_processor.merge_size
+    tokens = [int(grid.prod()) // (merge * merge) for grid in grid_thw]
+    return [
+        {"grid_thw": grid_thw[i : i + 1], "embeds": chunk, "tokens": tokens[i]}
+        for i, chunk in enumerate(torch.split(embeds, tokens, dim=0))
+    ]
+
+
+def encode_image(model, processor, img, min_pixels: int = None, max_pixels: int = None) -> dict:
+    return encode_images(model, processor, [img], min_pixels, max_pixels)[0]
+
+
+def _get_rope_index(model):
+    # Lives on the inner Qwen2VLModel in 5.x and on the ForConditionalGeneration class before that
+    inner = getattr(model, "model", None)
+    return getattr(inner, "get_rope_index", None) or model.get_rope_index
+
+
+def rope_positions(model, input_ids, attention_mask, grid_thw=None):
+    """3D (t, h, w) M-RoPE position ids for a left-padded batch, shape (3, batch, seq)."""
+    get_rope_index = _get_rope_index(model)
+    kwargs = {"attention_mask": attention_mask}
+    if grid_thw is not None:
+        kwargs["image_grid_thw"] = grid_thw
+    if "mm_token_type_ids" in inspect.signature(get_rope_index).parameters:
+        kwargs["mm_token_type_ids"] = (input_ids == model.config.image_token_id).int()
+    position_ids, _ = get_rope_index(input_ids, **kwargs)
+    return position_ids
+
+
+def prepare_batch(model, processor, texts: list, image: dict = None, prefix: dict = None) -> dict:
+    """Tokenizes chat texts (left padded) and builds their input embeddings.
+
+    Every image placeholder in a text stands for the same screenshot: the
+    already-encoded `image` embeddings are scattered into each of them. Pass
+    a list with one encoding (or None) per text when the texts differ.
+    With a `prefix` from prefill_prefix(), every text must start with the
+    prefix text and only the rest is embedded; the attention mask and
+    positions still cover the whole sequence.
+    """
+    import torch
+
+    if prefix is not None:
+        for text in texts:
+            if not text.startswith(prefix["text"]):
+                raise ValueError("Text does not start with the cached prefix")
+        texts = [text[len(prefix["text"]):] for text in texts]
+    images = image if isinstance(image, list) else [image] * len(texts)
+    texts = [
+        text.replace(IMAGE_PAD, IMAGE_PAD * encoding["tokens"]) if encoding is not None else text
+        for text, encoding in zip(texts, images)
+    ]
+    tokenizer = processor.tokenizer
+    padding_side = tokenizer.padding_side
+    tokenizer.padding_side = "left"
+    try:
+        encoded = tokenizer(texts, padding=True, return_tensors="pt")
+    finally:
+        tokenizer.padding_side = padding_side
+    input_ids = encoded["input_ids"].to(model.device)
+    attention_mask = encoded["attention_mask"].to(model.device)
+
+    with torch.no_grad():
+        inputs_embeds = model.get_input_embeddings()(input_ids)
+    grid_thw = None
+    image_mask = input_ids == model.config.image_token_id
+    # masked_scatter fills placeholders in row order, which is also the order get_rope_index reads grids in
+    embeds, grids = [], []
+    for row, encoding in enumerate(images):
+        copies = int(image_mask[row].sum()) // encoding["tokens"] if encoding is not None else 0
+        if copies:
+            embeds.append(encoding["embeds"].repeat(copies, 1))
+            grids.append(encoding["grid_thw"].repeat(copies, 1))
+    if embeds:
+        image_embeds = torch.cat(embeds).to(inputs_embeds.device, inputs_embeds.dtype)
+        inputs_embeds = inputs_embeds.masked_scatter(image_mask.unsqueeze(-1).expand_as(inputs_embeds), image_embeds)
+        grid_thw = torch.cat(grids)
+
+    if prefix is None:
+        position_ids = rope_positions(model, input_ids, attention_mask, grid_thw)
+    else:
+        # Layout per row is [prefix | padding | text]; positions come from the full sequence
+        rows = input_ids.shape[0]
+        prefix_ids = prefix["input_ids"].to(input_ids.device).expand(rows, -1)
+        input_ids = torch.cat([prefix_ids, input_ids], dim=1)
+        attention_mask = torch.cat([torch.ones_like(prefix_ids), attention_mask], dim=1)
+        position_ids = rope_positions(model, input_ids, attention_mask, grid_thw)[:, :, prefix["length"]:]
+
+    return {
+        "input_ids": input_ids,
+        "attention_mask": attention_mask,
+        "inputs_embeds": inputs_embeds,
+        "position_ids": position_ids,
+    }
+
+
+def prefill_prefix(model, processor, text: str) -> dict:
+    """Runs prefill over a constant, text-only prefix once and keeps its KV cache.
+
+    The prefix should end on a special token (e.g. the <|im_end|>\n that closes a chat turn,
+    just before the next <|im_start|>) so texts tokenize the same with or without it.
+    """
+    import torch
+    from transformers import DynamicCache
+
+    input_ids = processor.tokenizer(text, return_tensors="pt")["input_ids"].to(model.device)
+    attention_mask = torch.ones_like(input_ids)
+    cache = DynamicCache()
+    keep = _logits_kwarg(type(model))
+    with torch.no_grad():
+        model(
+            input_ids=input_ids,
+            attention_mask=attention_mask,
+            position_ids=rope_positions(model, input_ids, attention_mask),
+            past_key_values=cache,
+            use_cache=True,
+            **({keep: 1} if keep else {}),
+        )
+    return {"text": text, "input_ids": input_ids, "length": input_ids.shape[1], "cache": cache}
+
+
+def extend_prefix(model, processor, prefix: dict, text: str) -> dict:
+    """A prefix for `text` built from an existing one: only the tokens after their common start are prefilled.
+
+    Same rules as prefill_prefix(): text-only, ending right before a special token.
+    The given prefix and its cache are left untouched.
+    """
+    import torch
+
+    input_ids = processor.tokenizer(text, return_tensors="pt")["input_ids"].to(model.device)
+    old = prefix["input_ids"][0].to(model.device)
+    new = input_ids[0]
+    common = min(len(old), len(new))
+    mismatch = (old[:common] != new[:common]).nonzero()
+    if len(mismatch):
+        common = int(mismatch[0])
+    cache = copy.deepcopy(prefix["cache"])
+    if prefix["length"] > common:
+        # A negative crop removes that many tokens on every transformers version
+        cache.crop(common - prefix["length"])
+    if common < len(new):
+        attention_mask = torch.ones_like(input_ids)
+        keep = _logits_kwarg(type(model))
+        with torch.no_grad():
+            model(
+                input_ids=input_ids[:, common:],
+                attention_mask=attention_mask,
+                position_ids=rope_positions(model, input_ids, attention_mask)[:, :, common:],
+                past_key_values=cache,
+                use_cache=True,
+                **({keep: 1} if keep else {}),
+            )
+    return {"text": text, "input_ids": input_ids, "length": input_ids.shape[1], "cache": cache, "reused": common}
+
+
+def prefix_cache(prefix: dict, rows: int = 1):
+    """A private copy of the prefix KV cache for one batch; decoding appends to it."""
+    cache = copy.deepcopy(prefix["cache"])
+    if rows > 1:
+        cache.batch_repeat_interleave(rows)
+    return cache
+
+
+class TokenCounter:
+    """A streamer that only counts the tokens it is given (EOS included).
+
+    With `skip_prompt`, the first put() is ignored: model.generate() hands its streamer the prompt first.
+    """
+
+    def __init__(self, skip_prompt: bool = False):
+        self.count = 0
+        self._skip = skip_prompt
+
+    def put(self, value):
+        if self._skip:
+            self._skip = False
+            return
+        self.count += value.numel()
+
+    def end(self):
+        pass
+
+
+@functools.lru_cache(maxsize=None)
+def _logits_kwarg(model_cls) -> str:
+    parameters = inspect.signature(model_cls.forward).parameters
+    for name in ("logits_to_keep", "num_logits_to_keep"):
+        if name in parameters:
+            return name
+    return None
+
+
+def _eos_ids(model) -> set:
+    eos = model.generation_config.eos_token_id
+    return set(eos if isinstance(eos, (list, tuple)) else [eos])
+
+
+def greedy_generate(model, batch: dict, max_new_tokens: int = 512, past_key_values=None, streamers: list = None, matchers: list = None) -> list:
+    """Greedy decode of a prepared batch. Returns the new token ids per row, without the EOS token.
+
+    Matches model.generate(do_sample=False) token for token. `past_key_values`
+    may hold an already-prefilled prefix that `batch` continues. `streamers`
+    (one transformers streamer or None per row) receive each row's tokens as
+    they are generated, like generate(streamer=...) does for a single row.
+    `matchers` (one json_grammar.Matcher or None per row) restrict a row to
+    its grammar; the row stops as soon as the grammar is complete.
+    """
+    import torch
+    from transformers import DynamicCache
+
+    cache = past_key_values if past_key_values is not None else DynamicCache()
+    eos_ids = _eos_ids(model)
+    pad_id = model.generation_config.pad_token_id
+    if pad_id is None:
+        pad_id = next(iter(eos_ids))
+    keep = _logits_kwarg(type(model))
+    extra = {keep: 1} if keep else {}
+
+    attention_mask = batch["attention_mask"]
+    # Text generated after the prompt continues from the largest position used so far
+    next_position = batch["position_ids"].amax(dim=(0, 2)) + 1
+    rows = attention_mask.shape[0]
+    finished = torch.zeros(rows, dtype=torch.bool, device=attention_mask.device)
+    generated = []
+    streamers = [(row, streamer) for row, streamer in enumerate(streamers or []) if streamer is not None]
+    matchers = list(matchers or [])
+    constrained = [(row, matcher) for row, matcher in enumerate(matchers) if matcher is not None]
+    if constrained:
+        from json_grammar import mask_logits
+    # Rows ended by their grammar keep their last token (there is no EOS to drop)
+    lengths = [None] * rows
+    # The prefill ends when its first token reaches the CPU
+    start, wall = time.perf_counter(), time.time()
+    prefilled = None
+
+    try:
+        with torch.no_grad():
+            outputs = model(
+                inputs_embeds=batch["inputs_embeds"],
+                attention_mask=attention_mask,
+                position_ids=batch["position_ids"],
+                past_key_values=cache,
+                use_cache=True,
+                **extra,
+            )
+            for _ in range(max_new_tokens):
+                logits = outputs.logits[:, -1, :]
+                if constrained:
+                    logits = mask_logits(logits, matchers)
+                tokens = logits.argmax(dim=-1)
+                tokens = torch.where(finished, torch.full_like(tokens, pad_id), tokens)
+                generated.append(tokens)
+                if streamers:
+                    was_finished = finished.tolist()
+                    cpu_tokens = tokens.cpu()
+                    for row, streamer in streamers:
+                        if not was_finished[row]:
+                            streamer.put(cpu_tokens[row : row + 1])
+                if constrained:
+                    was_finished = finished.tolist()
+                    cpu_tokens = tokens.tolist()
+                    for row, matcher in constrained:
+                        if not was_finished[row]:
+                            matcher.advance(cpu_tokens[row])
+                            if matcher.done and cpu_tokens[row] not in eos_ids:
+                                lengths[row] = len(generated)
+                                finished[row] = True
+                finished |= torch.isin(tokens, torch.tensor(sorted(eos_ids), device=tokens.device))
+                done = bool(finished.all())
+                if prefilled is None:
+                    prefilled = time.perf_counter()
+                if done:
+                    break
+                attention_mask = torch.cat([attention_mask, attention_mask.new_ones((rows, 1))], dim=1)
+                position_ids = next_position.view(1, rows, 1).expand(3, rows, 1)
+                next_position = next_position + 1
+                outputs = model(
+                    input_ids=tokens[:, None],
+                    attention_mask=attention_mask,
+                    position_ids=position_ids,
+                    past_key_values=outputs.past_key_values,
+                    use_cache=True,
+                    **extra,
+                )
+    finally:
+        # Consumers iterating a streamer must not wait forever if decoding fails
+        for _, streamer in streamers:
+            streamer.end()
+
+    if prefilled is not None:
+        decoded = time.perf_counter()
+        tracing.add("prefill", wall, (prefilled - start) * 1000, rows=rows, tokens=int(batch["inputs_embeds"].shape[1]))
+        tracing.add("decode", wall + prefilled - start, (decoded - prefilled) * 1000, rows=rows, tokens=len(generated))
+
+    results = []
+    steps = torch.stack(generated, dim=1).tolist() if generated else [[] for _ in range(rows)]
+    for row, length in zip(steps, lengths):
+        ids = []
+        for token in row[:length]:
+            if token in eos_ids:
+                break
+            ids.append(token)
+        results.append(ids)
+    return results
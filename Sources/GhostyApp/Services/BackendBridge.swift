@@ -1,4 +1,5 @@
 import Foundation
+import CoreGraphics
 import Darwin
 
 struct BackendStateUpdate: Decodable {
@@ -7,6 +8,44 @@ struct BackendStateUpdate: Decodable {
     let intent: String?
 }
 
+/// Result of `--settle`: how the screen settled after the last actions (see screen_settle.py).
+struct BackendSettleResult: Decodable {
+    let reason: String?
+    let changed: Bool?
+    let ms: Double?
+    let error: String?
+}
+
+/// Where the frame a turn's positions refer to is on the screen: a normalized position (x, y) is at
+/// `origin + (x, y) * size`, in global display points with a top-left origin (what CGEvent takes).
+/// Sent on the response's `FRAME_TRANSFORM:` line (see screen_capture.py).
+struct BackendFrameTransform: Decodable {
+    static let linePrefix = "FRAME_TRANSFORM: "
+
+    let origin: [Double]
+    let size: [Double]
+    let display: Int?
+    let window: Int?
+
+    func screenPoint(for position: CGPoint) -> CGPoint? {
+        guard origin.count >= 2, size.count >= 2 else { return nil }
+        return CGPoint(x: origin[0] + position.x * size[0], y: origin[1] + position.y * size[1])
+    }
+
+    /// The transform on the response's FRAME_TRANSFORM line, if any, and the response without that line.
+    static func extract(from response: String) -> (BackendFrameTransform?, String) {
+        var transform: BackendFrameTransform?
+        let lines = response.components(separatedBy: "\n").filter { line in
+            guard line.hasPrefix(linePrefix) else { return true }
+            transform = try? JSONDecoder().decode(
+                BackendFrameTransform.self, from: Data(line.dropFirst(linePrefix.count).utf8)
+            )
+            return false
+        }
+        return (transform, lines.joined(separator: "\n"))
+    }
+}
+
 final class BackendBridge: @unchecked Sendable {
     var onStateUpdate: ((BackendStateUpdate) -> Void)?
 
@@ -24,44 +63,64 @@ final class BackendBridge: @unchecked Sendable {
 
     func runPythonTemplate(input: String) throws -> String {
         let scriptURL = try pythonTemplateScriptURL()
-        let response = try runBundledPythonScript(scriptURL: scriptURL, input: input)
+        let response = try runBundledPythonScript(scriptURL: scriptURL, arguments: [input])
         return response.trimmingCharacters(in: .whitespacesAndNewlines)
     }
 
+    /// Waits until the screen has reacted to the last actions and stopped changing, or the backend's timeout.
+    /// Returns nil if the backend couldn't tell; callers then fall back to a fixed pause.
+    func awaitScreenSettle(timeout: Double? = nil) async -> BackendSettleResult? {
+        let arguments = ["--settle"] + (timeout.map { [String($0)] } ?? [])
+        return await Task.detached { [self] () -> BackendSettleResult? in
+            guard let scriptURL = try? self.pythonTemplateScriptURL(),
+                  let output = try? self.runBundledPythonScript(scriptURL: scriptURL, arguments: arguments),
+                  let line = output.split(separator: "\n").last,
+                  let result = try? JSONDecoder().decode(BackendSettleResult.self, from: Data(line.utf8)),
+                  result.error == nil else { return nil }
+            return result
+        }.value
+    }
+
     /// Launches the bundled Python script and streams its stdout back via `onChunk`.
     /// `onChunk` and `onComplete` are called on a background dispatch queue.
     func runPythonTemplateStreaming(
         input: String,
         onChunk: @escaping @Sendable (String) -> Void,
         onComplete: @escaping @Sendable (Result<Void, Error>) -> Void
+    ) throws {
+        try runPythonTemplateStreaming(arguments: [input], onChunk: onChunk, onComplete: onComplete)
+    }
+
+    /// Same, with explicit script arguments (e.g. `["--turn", json]` for a structured agent turn).
+    func runPythonTemplateStreaming(
+        arguments: [String],
+        onChunk: @escaping @Sendable (String) -> Void,
+        onComplete: @escaping @Sendable (Result<Void, Error>) -> Void
     ) throws {
         let scriptURL = try pythonTemplateScriptURL()
         print("[DEBUG] runPythonTemplateStreaming: backendScript=\(backendScript), scriptURL=\(scriptURL.path)")
         let process = Process()
-
-        let venvURL = scriptURL.deletingLastPathComponent()
-            .appendingPathComponent(".venv/bin/python3")
-        if FileManager.default.fileExists(atPath: venvURL.path) {
-            process.executableURL = venvURL
-            process.arguments = [scriptURL.path, input]
-        } else {
-            process.executableURL = URL(fileURLWithPath: "/usr/bin/env")
-            process.arguments = ["python3", scriptURL.path, input]
-        }
+        configurePython(process, scriptURL: scriptURL, arguments: arguments)
 
         let outputPipe = Pipe()
         let errorPipe  = Pipe()
         process.standardOutput = outputPipe
         process.standardError  = errorPipe
 
+        // Chunk boundaries can split a multi-byte character; the decoder holds those bytes back
+        let decoder = UTF8StreamDecoder()
         outputPipe.fileHandleForReading.readabilityHandler = { handle in
             let data = handle.availableData
-            guard !data.isEmpty, let text = String(data: data, encoding: .utf8) else { return }
-            onChunk(text)
+            guard !data.isEmpty else { return }
+            let text = decoder.decode(data)
+            if !text.isEmpty { onChunk(text) }
         }
 
         process.terminationHandler = { process in
             outputPipe.fileHandleForReading.readabilityHandler = nil
+            // Output written right before exit may not have reached the handler yet
+            let rest = decoder.decode(outputPipe.fileHandleForReading.readDataToEndOfFile(), final: true)
+            if !rest.isEmpty { onChunk(rest) }
             if process.terminationStatus == 0 {
                 onComplete(.success(()))
             } else {
@@ -91,9 +150,8 @@ final class BackendBridge: @unchecked Sendable {
         }
     }
 
-    private func runBundledPythonScript(scriptURL: URL, input: String) throws -> String {
-        let process = Process()
-
+    /// Points `process` at the first python3 found in the known .venv locations, or the system one.
+    private func configurePython(_ process: Process, scriptURL: URL, arguments: [String]) {
         // Try to find a valid python3 executable in potential .venv locations
         let venvCandidates: [URL] = [
             // 1. Absolute path from compilation time (source-level uv .venv)
@@ -109,12 +167,17 @@ final class BackendBridge: @unchecked Sendable {
 
         if let venvURL = venvCandidates.first(where: { FileManager.default.fileExists(atPath: $0.path) }) {
             process.executableURL = venvURL
-            process.arguments = [scriptURL.path, input]
+            process.arguments = [scriptURL.path] + arguments
         } else {
             // Fallback to system python3
             process.executableURL = URL(fileURLWithPath: "/usr/bin/env")
-            process.arguments = ["python3", scriptURL.path, input]
+            process.arguments = ["python3", scriptURL.path] + arguments
         }
+    }
+
+    private func runBundledPythonScript(scriptURL: URL, arguments: [String]) throws -> String {
+        let process = Process()
+        configurePython(process, scriptURL: scriptURL, arguments: arguments)
 
         let outputPipe = Pipe()
         let errorPipe = Pipe()
@@ -202,6 +265,30 @@ final class BackendBridge: @unchecked Sendable {
     }
 }
 
+/// Decodes a UTF-8 byte stream chunk by chunk, carrying an incomplete trailing character over to the next chunk.
+private final class UTF8StreamDecoder: @unchecked Sendable {
+    private var pending = Data()
+    private let lock = NSLock()
+
+    func decode(_ data: Data, final: Bool = false) -> String {
+        lock.lock()
+        defer { lock.unlock() }
+        pending.append(data)
+        if !final {
+            // A UTF-8 character is at most 4 bytes, so at most 3 can be missing
+            for held in 0...min(3, pending.count) {
+                if let text = String(data: pending.prefix(pending.count - held), encoding: .utf8) {
+                    pending = Data(pending.suffix(held))
+                    return text
+                }
+            }
+        }
+        let text = String(decoding: pending, as: UTF8.self)
+        pending.removeAll()
+        return text
+    }
+}
+
 private enum ShellCommandRunner {
     static func run(executable: String, arguments: [String]) async throws -> String {
         try await withCheckedThrowingContinuation { continuation in